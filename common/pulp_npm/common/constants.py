@@ -15,8 +15,70 @@ CONFIG_VALUE_PUBLISH_DIRECTORY = '/var/lib/pulp/published/npm'
 CONFIG_KEY_PUBLISH_DOMAIN = 'npm_publish_domain'
 CONFIG_VALUE_PUBLISH_DOMAIN = 'localhost'
 
+CONFIG_KEY_LATEST_README_ONLY = 'latest_readme_only'
+
 # Config keys for the importer plugin conf
 CONFIG_KEY_PACKAGE_NAMES = 'package_names'
+CONFIG_KEY_DOWNLOAD_POLICY = 'download_policy'
+CONFIG_KEY_LOCKED_PACKAGES = 'locked_packages'
+CONFIG_KEY_RESOLVE_DEPENDENCIES = 'resolve_dependencies'
+CONFIG_KEY_DEPENDENCY_TYPES = 'dependency_types'
+CONFIG_KEY_VERSION_RANGES = 'version_ranges'
+CONFIG_KEY_LATEST_MAJORS = 'latest_majors'
+CONFIG_KEY_LATEST_MINORS = 'latest_minors'
+CONFIG_KEY_EXCLUDE_PRERELEASES = 'exclude_prereleases'
+CONFIG_KEY_CHANGES_FEED = 'changes_feed'
+CONFIG_KEY_METADATA_CONCURRENCY = 'metadata_concurrency'
+CONFIG_KEY_PACKAGE_CONCURRENCY = 'package_concurrency'
+CONFIG_KEY_FEEDS = 'feeds'
+CONFIG_KEY_SYNC_SHARDS = 'sync_shards'
+CONFIG_KEY_LATENCY_LOG = 'latency_log'
+CONFIG_KEY_SLOWEST_PACKAGES = 'slowest_packages'
+CONFIG_KEY_METADATA_FIELDS = 'metadata_fields'
+CONFIG_KEY_EXCLUDED_METADATA_FIELDS = 'excluded_metadata_fields'
+CONFIG_KEY_SEPARATE_READMES = 'separate_readmes'
+# Config key of the importer that is only honored in the override config of a sync
+CONFIG_KEY_DRY_RUN = 'dry_run'
+# Config keys of the importer that are usually given in the override config of a copy
+CONFIG_KEY_COPY_PACKAGES = 'copy_packages'
+CONFIG_KEY_RECURSIVE = 'recursive'
+# Config key of both the importer and the distributor
+CONFIG_KEY_PROFILE_STEPS = 'profile_steps'
+CONFIG_KEY_METRICS_DIR = 'metrics_textfile_dir'
+
+# The key of the feeds config that lists the feeds of the packages whose scope has none of its own
+DEFAULT_FEED_ROUTE = '*'
+
+# The number of concurrent downloads used when neither the step's concurrency nor max_downloads
+# is configured
+DEFAULT_CONCURRENCY = 5
+
+# Values for the importer's download_policy
+DOWNLOAD_IMMEDIATE = 'immediate'
+DOWNLOAD_ON_DEMAND = 'on_demand'
+DOWNLOAD_POLICIES = (DOWNLOAD_IMMEDIATE, DOWNLOAD_ON_DEMAND)
+
+# The package.json sections whose dependencies are followed when resolving dependencies. The
+# first one is always followed, and the others only if they are listed in dependency_types.
+DEPENDENCY_TYPES = ('dependencies', 'optionalDependencies', 'peerDependencies')
+
+# Keys of the repository scratchpad, used to remember where the _changes feed was left off
+SCRATCHPAD_KEY_CHANGES_FEED = 'changes_feed'
+SCRATCHPAD_KEY_CHANGES_SEQ = 'changes_seq'
+# Key of the repository scratchpad that holds the download throughput of past syncs
+SCRATCHPAD_KEY_THROUGHPUT = 'download_throughput'
+
+# Unit metadata keys used to track packages whose tarball has not been downloaded yet
+METADATA_KEY_DEFERRED = '_deferred'
+METADATA_KEY_UPSTREAM_URL = '_upstream_url'
+# Unit metadata key that refers to the unit's readme in the readme store, when readmes are stored
+# separately
+METADATA_KEY_README = '_readme'
+# Unit metadata key of the normalised dependency edges of the unit's version, which are indexed
+METADATA_KEY_DEPENDENCIES = '_dependencies'
+
+# Suffix of the file the publisher writes next to a deferred tarball link
+DEFERRED_RECORD_SUFFIX = '.deferred'
 
 # STEP_ID
 PUBLISH_STEP_PUBLISHER = 'npm_publish_step'
@@ -0,0 +1,194 @@
+"""
+This module contains the parts of npm's dependency resolution that the sync, the copy of packages
+and the dependency queries of the admin client share: reading the requirements of a version of a
+package, selecting the version of a package that npm would install for a requirement, and walking
+the dependency graph.
+
+Each unit stores the normalised dependency edges of its version under
+constants.METADATA_KEY_DEPENDENCIES, as a list of objects with the "name" of the package it
+depends on, the version "range" and the "type" of dependency. Aliases are resolved to the real
+package, and dependencies that aren't retrieved from a registry are left out. The names of the
+edges are indexed, so that the units that depend on a package are found without reading every
+unit.
+"""
+from pulp_npm.common import constants, semver
+
+
+def parse_requirement(spec):
+    """
+    Split a requirement in the form <name>[@<range>] into the package name and the version range.
+    The range defaults to the "latest" dist-tag.
+
+    :param spec: A requirement, such as "left-pad", "left-pad@^1.1.0" or "@scope/name@2.x"
+    :type  spec: basestring
+    :return:     A 2-tuple of the package name and the version range or dist-tag
+    :rtype:      tuple
+    """
+    # The name of a scoped package starts with "@", so it can't end there
+    index = spec.rfind('@')
+    if index > 0:
+        return spec[:index], spec[index + 1:].strip() or 'latest'
+    return spec, 'latest'
+
+
+def get_requirements(version_metadata, dependency_types):
+    """
+    Return the dependencies of one version of a package that should be followed. Dependencies
+    that are not retrieved from a registry, such as git, file and tarball URL dependencies, are
+    skipped.
+
+    :param version_metadata: The metadata of the version, such as the entry of a manifest's
+                             "versions" object
+    :type  version_metadata: dict
+    :param dependency_types: The sections of package.json whose dependencies are followed
+    :type  dependency_types: list of basestring
+    :return:                 A list of 2-tuples of a package name and a version range
+    :rtype:                  list
+    """
+    requirements = []
+    for dependency_type in dependency_types:
+        for name, spec in sorted((version_metadata.get(dependency_type) or {}).items()):
+            if not isinstance(spec, basestring):
+                continue
+            if spec.startswith('npm:'):
+                # An aliased dependency, in the form npm:<real name>@<range>
+                name, spec = parse_requirement(spec[len('npm:'):])
+            if ':' in spec or '/' in spec:
+                continue
+            requirements.append((name, spec.strip()))
+    return requirements
+
+
+def get_edges(version_metadata):
+    """
+    Return the normalised dependency edges of one version of a package, for every type of
+    dependency.
+
+    :param version_metadata: The metadata of the version, such as its package.json
+    :type  version_metadata: dict
+    :return:                 The edges, each a dict with a "name", "range" and "type"
+    :rtype:                  list of dict
+    """
+    edges = []
+    for dependency_type in constants.DEPENDENCY_TYPES:
+        for name, spec in get_requirements(version_metadata, [dependency_type]):
+            edges.append({'name': name, 'range': spec, 'type': dependency_type})
+    return edges
+
+
+def get_edge_requirements(version_metadata, dependency_types):
+    """
+    Return the dependencies of one version of a package that should be followed, from its
+    dependency edges. Units that were stored before their edges were recorded fall back to the
+    sections of their package.json.
+
+    :param version_metadata: The metadata of the version's unit
+    :type  version_metadata: dict
+    :param dependency_types: The sections of package.json whose dependencies are followed
+    :type  dependency_types: list of basestring
+    :return:                 A list of 2-tuples of a package name and a version range
+    :rtype:                  list
+    """
+    edges = version_metadata.get(constants.METADATA_KEY_DEPENDENCIES)
+    if edges is None:
+        return get_requirements(version_metadata, dependency_types)
+    requirements = []
+    for dependency_type in dependency_types:
+        requirements.extend([(e['name'], e['range']) for e in edges
+                             if e['type'] == dependency_type])
+    return requirements
+
+
+def resolve_closure(roots, find_versions, dependency_types, find_dist_tags=None):
+    """
+    Walk the dependency graph from the given versions of packages, one level at a time. Each
+    requirement selects the version that npm would install, and the versions of the packages that
+    a level requires are looked up at once.
+
+    :param roots:            The versions to start from, as 2-tuples of a name and a version
+    :type  roots:            list of tuple
+    :param find_versions:    Called with a list of package names, returns a dict that maps each
+                             of them that is known to a dict of its versions' metadata by version
+    :type  find_versions:    callable
+    :param dependency_types: The sections of package.json whose dependencies are followed
+    :type  dependency_types: list of basestring
+    :param find_dist_tags:   Called with a list of package names, returns a dict that maps them to
+                             their dist-tags. Defaults to no dist-tags.
+    :type  find_dist_tags:   callable
+    :return:                 A 2-tuple of the versions the roots depend on, directly or not, that
+                             aren't roots, as 2-tuples of a name and a version in the order they
+                             were found, and the requirements that no version satisfies, as
+                             2-tuples of a name and a version range
+    :rtype:                  tuple
+    """
+    # Maps the names of the packages that were looked up to the metadata of their versions
+    versions = {}
+    dist_tags = {}
+
+    def load(names):
+        names = sorted(set(names) - set(versions))
+        if not names:
+            return
+        for name in names:
+            versions[name] = {}
+        versions.update(find_versions(names))
+        if find_dist_tags is not None:
+            dist_tags.update(find_dist_tags(names))
+
+    selected = set(roots)
+    level = sorted(selected)
+    load([name for name, version in level])
+    closure = []
+    unsatisfied = []
+    while level:
+        requirements = set()
+        for name, version in level:
+            if version in versions[name]:
+                requirements.update(get_edge_requirements(versions[name][version],
+                                                          dependency_types))
+        load([name for name, spec in requirements])
+        level = []
+        for name, spec in sorted(requirements):
+            version = select_version(versions[name], spec, dist_tags.get(name))
+            if version is None:
+                if (name, spec) not in unsatisfied:
+                    unsatisfied.append((name, spec))
+            elif (name, version) not in selected:
+                selected.add((name, version))
+                level.append((name, version))
+                closure.append((name, version))
+    return closure, unsatisfied
+
+
+def select_version(versions, spec, dist_tags=None):
+    """
+    Return the version that npm would install for the given version range or dist-tag: the
+    version the "latest" dist-tag points to if it satisfies the range, and the highest version
+    satisfying the range otherwise.
+
+    :param versions:  The versions of the package to choose from
+    :type  versions:  collection of basestring
+    :param spec:      A version range or a dist-tag
+    :type  spec:      basestring
+    :param dist_tags: The dist-tags of the package
+    :type  dist_tags: dict
+    :return:          The selected version, or None if no version could be selected
+    :rtype:           basestring
+    """
+    dist_tags = dist_tags or {}
+    if spec in dist_tags:
+        version = dist_tags[spec]
+    else:
+        try:
+            version_range = semver.Range(spec)
+        except ValueError:
+            version_range = None
+        if version_range is None:
+            version = None
+        elif dist_tags.get('latest') in versions and version_range.test(dist_tags['latest']):
+            version = dist_tags['latest']
+        else:
+            version = semver.max_satisfying(versions, version_range)
+    if version not in versions:
+        return None
+    return version
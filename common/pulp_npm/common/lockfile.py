@@ -0,0 +1,149 @@
+"""
+This module contains the means for reading npm package-lock.json files, so that the admin client can
+send the importer exactly the packages that they list, and the importer can verify them.
+"""
+import base64
+import binascii
+from gettext import gettext as _
+import hashlib
+
+# The hashing algorithms that may appear in Subresource Integrity strings, strongest first
+INTEGRITY_ALGORITHMS = ('sha512', 'sha384', 'sha256', 'sha1')
+
+
+def collect(lockfiles):
+    """
+    Return the packages listed in the given lockfiles, with duplicates removed. Each package is a
+    dictionary with the following keys: name, version, resolved, and integrity. The resolved and
+    integrity keys index None if the lockfile did not record them. Packages that are not retrieved
+    from a registry, such as links, bundled dependencies, and git or file dependencies, are skipped.
+
+    :param lockfiles: The parsed contents of package-lock.json (or npm-shrinkwrap.json) files
+    :type  lockfiles: list of dict
+    :return:          The distinct packages listed in the lockfiles, in the order they were found
+    :rtype:           list of dict
+    """
+    packages = {}
+    order = []
+    for lockfile in lockfiles:
+        for package in _parse(lockfile):
+            key = (package['name'], package['version'])
+            if key not in packages:
+                packages[key] = package
+                order.append(key)
+            elif not (packages[key]['resolved'] and packages[key]['integrity']):
+                # Prefer an entry that lets us skip fetching the package manifest
+                if package['resolved'] and package['integrity']:
+                    packages[key] = package
+    return [packages[k] for k in order]
+
+
+def verify_integrity(path, integrity):
+    """
+    Determine whether the file at the given path matches the given Subresource Integrity string.
+    The strongest of the supported hashes listed in the string is checked.
+
+    :param path:      A path to a file
+    :type  path:      basestring
+    :param integrity: A Subresource Integrity string, such as "sha512-<base64 digest>"
+    :type  integrity: basestring
+    :return:          A 2-tuple of the expected and the actual hexadecimal digests
+    :rtype:           tuple
+    :raises:          ValueError if the integrity string does not contain a supported hash
+    """
+    algorithm, expected = parse_integrity(integrity)
+    hasher = hashlib.new(algorithm)
+    with open(path, 'rb') as file_handle:
+        bits = file_handle.read(1024 * 1024)
+        while bits:
+            hasher.update(bits)
+            bits = file_handle.read(1024 * 1024)
+    return expected, hasher.hexdigest()
+
+
+def parse_integrity(integrity):
+    """
+    Return the strongest supported algorithm listed in the given Subresource Integrity string, and
+    its digest as a hexadecimal string.
+
+    :param integrity: A Subresource Integrity string, such as "sha512-<base64 digest>"
+    :type  integrity: basestring
+    :return:          A 2-tuple of the hashlib algorithm name and the hexadecimal digest
+    :rtype:           tuple
+    :raises:          ValueError if the integrity string does not contain a supported hash
+    """
+    digests = {}
+    for token in integrity.split():
+        algorithm, _sep, digest = token.partition('-')
+        # Options may follow the digest, separated by a question mark
+        digests.setdefault(algorithm, digest.split('?')[0])
+    for algorithm in INTEGRITY_ALGORITHMS:
+        if algorithm in digests:
+            try:
+                return algorithm, binascii.hexlify(base64.b64decode(digests[algorithm]))
+            except (TypeError, binascii.Error):
+                break
+    raise ValueError(_('%(integrity)s is not a supported integrity string.') %
+                     {'integrity': integrity})
+
+
+def _parse(lockfile):
+    """
+    Yield the packages listed in one lockfile. Both the "packages" section of lockfileVersion 2
+    and 3, and the nested "dependencies" section of lockfileVersion 1 are understood. When a
+    lockfile has both, the "packages" section is used.
+
+    :param lockfile: The parsed contents of a package-lock.json file
+    :type  lockfile: dict
+    :return:         A generator of package dictionaries, as described in collect()
+    :rtype:          generator
+    """
+    if 'packages' in lockfile:
+        for path, entry in lockfile['packages'].iteritems():
+            # Paths outside of node_modules are the project itself and its workspaces
+            if 'node_modules/' not in path or entry.get('link') or entry.get('inBundle'):
+                continue
+            name = entry.get('name') or path.rsplit('node_modules/', 1)[-1]
+            package = _package(name, entry)
+            if package is not None:
+                yield package
+        return
+
+    dependencies = [lockfile.get('dependencies', {})]
+    while dependencies:
+        for name, entry in dependencies.pop().iteritems():
+            if entry.get('dependencies'):
+                dependencies.append(entry['dependencies'])
+            if entry.get('bundled'):
+                continue
+            package = _package(name, entry)
+            if package is not None:
+                yield package
+
+
+def _package(name, entry):
+    """
+    Build a package dictionary from a lockfile entry, or return None if the entry does not describe
+    a package that is retrieved from a registry.
+
+    :param name:  The name the package is installed under
+    :type  name:  basestring
+    :param entry: The lockfile entry for the package
+    :type  entry: dict
+    :return:      A package dictionary, as described in collect(), or None
+    :rtype:       dict
+    """
+    version = entry.get('version')
+    if not version:
+        return None
+    if version.startswith('npm:'):
+        # An aliased dependency, in the form npm:<real name>@<version>
+        name, version = version[len('npm:'):].rsplit('@', 1)
+    resolved = entry.get('resolved')
+    if resolved and not resolved.startswith(('http://', 'https://')):
+        return None
+    if ':' in version or '/' in version:
+        # git, file, and tarball URL dependencies carry a URL where the version would be
+        return None
+    return {'name': name, 'version': version, 'resolved': resolved,
+            'integrity': entry.get('integrity')}
@@ -0,0 +1,329 @@
+"""
+This module contains the means for comparing npm package versions and matching them against the
+version ranges that package.json files use, following the rules of npm's node-semver.
+"""
+from gettext import gettext as _
+import re
+
+
+VERSION_REGEX = re.compile(
+    r'^\s*[v=]*\s*(\d+)\.(\d+)\.(\d+)(?:-?([0-9A-Za-z][0-9A-Za-z.-]*?))?(?:\+[0-9A-Za-z.-]+)?\s*$')
+PARTIAL_REGEX = re.compile(
+    r'^[v=]*(\d+|[xX*])(?:\.(\d+|[xX*])(?:\.(\d+|[xX*])(?:-?([0-9A-Za-z][0-9A-Za-z.-]*?))?)?)?'
+    r'(?:\+[0-9A-Za-z.-]+)?$')
+COMPARATOR_REGEX = re.compile(r'^(<=|>=|<|>|=|~>|~|\^)?\s*(.*)$')
+HYPHEN_REGEX = re.compile(r'^\s*(\S+)\s+-\s+(\S+)\s*$')
+
+
+class Version(tuple):
+    """
+    A parsed npm version. It is a tuple of the major, minor, and patch numbers and the tuple of
+    prerelease identifiers, and it compares the way npm orders versions.
+    """
+
+    def __new__(cls, major, minor, patch, prerelease=()):
+        """
+        Create a Version.
+
+        :param major:      The major version number
+        :type  major:      int
+        :param minor:      The minor version number
+        :type  minor:      int
+        :param patch:      The patch version number
+        :type  patch:      int
+        :param prerelease: The prerelease identifiers, with numeric identifiers as ints
+        :type  prerelease: tuple
+        :return:           A new Version
+        :rtype:            pulp_npm.common.semver.Version
+        """
+        return tuple.__new__(cls, (major, minor, patch, tuple(prerelease)))
+
+    @property
+    def major(self):
+        return self[0]
+
+    @property
+    def minor(self):
+        return self[1]
+
+    @property
+    def patch(self):
+        return self[2]
+
+    @property
+    def prerelease(self):
+        return self[3]
+
+    @property
+    def key(self):
+        """
+        A key that sorts Versions in npm's order. A release sorts after all of its prereleases,
+        numeric prerelease identifiers sort numerically and before alphanumeric ones, and a
+        prerelease sorts after the prereleases that it extends.
+
+        :return: The sort key
+        :rtype:  tuple
+        """
+        if not self[3]:
+            return self[0], self[1], self[2], (1,)
+        identifiers = tuple([(0, i, '') if isinstance(i, int) else (1, 0, i) for i in self[3]])
+        return self[0], self[1], self[2], (0, identifiers)
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def __le__(self, other):
+        return self.key <= other.key
+
+    def __gt__(self, other):
+        return self.key > other.key
+
+    def __ge__(self, other):
+        return self.key >= other.key
+
+    def __str__(self):
+        version = '%d.%d.%d' % self[:3]
+        if self[3]:
+            version += '-' + '.'.join([str(i) for i in self[3]])
+        return version
+
+
+def parse(version):
+    """
+    Parse the given version string.
+
+    :param version: A version, such as "1.2.3" or "1.2.3-beta.1"
+    :type  version: basestring
+    :return:        The parsed version
+    :rtype:         pulp_npm.common.semver.Version
+    :raises:        ValueError if the version is not valid
+    """
+    match = VERSION_REGEX.match(version)
+    if match is None:
+        raise ValueError(_('%(version)s is not a valid version.') % {'version': version})
+    major, minor, patch, prerelease = match.groups()
+    return Version(int(major), int(minor), int(patch), _identifiers(prerelease))
+
+
+def sort_key(version):
+    """
+    Return a key that sorts version strings in npm's order. Invalid versions sort before all valid
+    ones.
+
+    :param version: A version string
+    :type  version: basestring
+    :return:        The sort key
+    :rtype:         tuple
+    """
+    try:
+        return (1, parse(version).key)
+    except ValueError:
+        return (0, version)
+
+
+def is_prerelease(version):
+    """
+    Determine whether the given version string is a prerelease.
+
+    :param version: A version string
+    :type  version: basestring
+    :return:        True if the version is a valid prerelease version
+    :rtype:         bool
+    """
+    try:
+        return bool(parse(version).prerelease)
+    except ValueError:
+        return False
+
+
+def max_satisfying(versions, version_range):
+    """
+    Return the highest of the given versions that satisfies the given range.
+
+    :param versions:      Version strings
+    :type  versions:      iterable
+    :param version_range: A range, such as "^1.2.0"
+    :type  version_range: basestring or pulp_npm.common.semver.Range
+    :return:              The highest satisfying version string, or None if none satisfy it
+    :rtype:               basestring
+    """
+    if not isinstance(version_range, Range):
+        version_range = Range(version_range)
+    best = None
+    best_version = None
+    for version in versions:
+        try:
+            parsed = parse(version)
+        except ValueError:
+            continue
+        if version_range.test(parsed) and (best is None or parsed > best):
+            best = parsed
+            best_version = version
+    return best_version
+
+
+class Range(object):
+    """
+    A version range, such as "^1.2.0", ">=1.0.0 <2.0.0 || 3.x", or "1.2.3 - 1.4".
+    """
+
+    def __init__(self, spec):
+        """
+        Parse the given range.
+
+        :param spec: The range
+        :type  spec: basestring
+        :raises:     ValueError if the range is not valid
+        """
+        self.spec = spec
+        # A list of comparator sets. A version satisfies the range if it satisfies every
+        # comparator of any one set. Each comparator is a 2-tuple of an operator and a Version.
+        self.comparator_sets = [_parse_comparator_set(s) for s in spec.split('||')]
+
+    def test(self, version):
+        """
+        Determine whether the given version satisfies this range. As in npm, a prerelease version
+        only satisfies a range that mentions a prerelease of the same major, minor, and patch.
+
+        :param version: A version string or parsed version
+        :type  version: basestring or pulp_npm.common.semver.Version
+        :return:        True if the version satisfies this range
+        :rtype:         bool
+        """
+        if not isinstance(version, Version):
+            try:
+                version = parse(version)
+            except ValueError:
+                return False
+        for comparators in self.comparator_sets:
+            if not all([_compare(version, op, bound) for op, bound in comparators]):
+                continue
+            if not version.prerelease:
+                return True
+            for op, bound in comparators:
+                if bound.prerelease and bound[:3] == version[:3]:
+                    return True
+        return False
+
+    def __repr__(self):
+        return 'Range(%r)' % self.spec
+
+
+def _compare(version, op, bound):
+    """
+    Compare a version against one comparator.
+    """
+    if op == '>=':
+        return version >= bound
+    if op == '>':
+        return version > bound
+    if op == '<':
+        return version < bound
+    if op == '<=':
+        return version <= bound
+    return version.key == bound.key
+
+
+def _identifiers(prerelease):
+    """
+    Split a prerelease string into identifiers, turning the numeric ones into ints.
+    """
+    if not prerelease:
+        return ()
+    return tuple([int(i) if i.isdigit() else i for i in prerelease.split('.')])
+
+
+def _parse_partial(partial):
+    """
+    Parse a possibly partial version, such as "1", "1.2.x" or "1.2.3-rc.1". Missing or wildcard
+    parts are returned as None.
+    """
+    match = PARTIAL_REGEX.match(partial)
+    if match is None:
+        raise ValueError(_('%(version)s is not a valid version.') % {'version': partial})
+    parts = []
+    for part in match.groups()[:3]:
+        if part is None or part in ('x', 'X', '*'):
+            parts.append(None)
+        else:
+            parts.append(int(part))
+    # Everything after a wildcard is a wildcard too
+    for i in range(1, 3):
+        if parts[i - 1] is None:
+            parts[i] = None
+    return parts[0], parts[1], parts[2], _identifiers(match.group(4))
+
+
+def _lowest_above(major, minor):
+    """
+    Return the lowest version above the given partial version: the first prerelease of the next
+    major when only the major is given, or of the next minor otherwise.
+    """
+    if minor is None:
+        return Version(major + 1, 0, 0, (0,))
+    return Version(major, minor + 1, 0, (0,))
+
+
+def _desugar(op, partial):
+    """
+    Turn one comparator, such as "~1.2" or ">=2", into a list of primitive comparators.
+    """
+    major, minor, patch, pre = _parse_partial(partial)
+    if major is None:
+        if op in ('<', '>'):
+            # Nothing is above or below every version
+            return [('<', Version(0, 0, 0, (0,)))]
+        return [('>=', Version(0, 0, 0))]
+    floor = Version(major, minor or 0, patch or 0, pre)
+
+    if op in ('~', '~>'):
+        return [('>=', floor), ('<', _lowest_above(major, minor))]
+    if op == '^':
+        if major != 0 or minor is None:
+            upper = Version(major + 1, 0, 0, (0,))
+        elif minor != 0 or patch is None:
+            upper = Version(0, minor + 1, 0, (0,))
+        else:
+            upper = Version(0, 0, patch + 1, (0,))
+        return [('>=', floor), ('<', upper)]
+    if patch is None:
+        # An X-range
+        if op in ('', '='):
+            return [('>=', floor), ('<', _lowest_above(major, minor))]
+        if op == '>':
+            return [('>=', Version(*_lowest_above(major, minor)[:3]))]
+        if op == '<=':
+            return [('<', _lowest_above(major, minor))]
+        if op == '<':
+            return [('<', Version(major, minor or 0, 0, (0,)))]
+        return [('>=', floor)]
+    return [(op or '=', floor)]
+
+
+def _parse_comparator_set(spec):
+    """
+    Parse a range without "||" into a list of primitive comparators.
+    """
+    spec = spec.strip()
+    hyphen = HYPHEN_REGEX.match(spec)
+    if hyphen is not None:
+        low, high = hyphen.groups()
+        comparators = [c for c in _desugar('>=', low) if c[0] == '>=']
+        major, minor, patch, pre = _parse_partial(high)
+        if major is None:
+            return comparators or [('>=', Version(0, 0, 0))]
+        if patch is None:
+            comparators.append(('<', _lowest_above(major, minor)))
+        else:
+            comparators.append(('<=', Version(major, minor, patch, pre)))
+        return comparators
+
+    if not spec:
+        return [('>=', Version(0, 0, 0))]
+    # Allow a space between an operator and its version, as npm does
+    spec = re.sub(r'(<=|>=|<|>|=|~>|~|\^)\s+', r'\1', spec)
+    comparators = []
+    for token in spec.split():
+        op, partial = COMPARATOR_REGEX.match(token).groups()
+        comparators.extend(_desugar(op or '', partial))
+    return comparators
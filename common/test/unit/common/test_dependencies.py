@@ -0,0 +1,120 @@
+"""
+This module contains tests for the pulp_npm.common.dependencies module.
+"""
+import unittest
+
+from pulp_npm.common import constants, dependencies
+
+
+class TestParseRequirement(unittest.TestCase):
+    """
+    This class contains tests for the parse_requirement() function.
+    """
+    def test_parse_requirement(self):
+        self.assertEqual(dependencies.parse_requirement('left-pad'), ('left-pad', 'latest'))
+        self.assertEqual(dependencies.parse_requirement('left-pad@^1.1.0'),
+                         ('left-pad', '^1.1.0'))
+        self.assertEqual(dependencies.parse_requirement('@types/node@8.x'), ('@types/node', '8.x'))
+        self.assertEqual(dependencies.parse_requirement('@types/node'), ('@types/node', 'latest'))
+
+
+class TestGetRequirements(unittest.TestCase):
+    """
+    This class contains tests for the get_requirements() function.
+    """
+    def test_dependency_types(self):
+        """
+        Only the given sections are read, in order, and values that aren't ranges are skipped.
+        """
+        metadata = {'dependencies': {'b': '^1.0.0', 'a': '2.x', 'c': None},
+                    'optionalDependencies': {'d': '*'}, 'peerDependencies': {'e': '*'}}
+
+        self.assertEqual(
+            dependencies.get_requirements(metadata, ['dependencies', 'peerDependencies']),
+            [('a', '2.x'), ('b', '^1.0.0'), ('e', '*')])
+
+
+class TestSelectVersion(unittest.TestCase):
+    """
+    This class contains tests for the select_version() function.
+    """
+    def test_select_version(self):
+        """
+        The latest dist-tag is preferred when it satisfies the range, and dist-tags can be
+        required by name.
+        """
+        versions = ['1.0.0', '1.1.0', '1.2.0', '2.0.0-beta.1']
+        dist_tags = {'latest': '1.1.0', 'next': '2.0.0-beta.1'}
+
+        self.assertEqual(dependencies.select_version(versions, '^1.0.0', dist_tags), '1.1.0')
+        self.assertEqual(dependencies.select_version(versions, '^1.0.0'), '1.2.0')
+        self.assertEqual(dependencies.select_version(versions, 'next', dist_tags), '2.0.0-beta.1')
+        self.assertEqual(dependencies.select_version(versions, 'latest'), None)
+        self.assertEqual(dependencies.select_version(versions, '^3.0.0', dist_tags), None)
+        self.assertEqual(dependencies.select_version(versions, 'not a range'), None)
+
+
+class TestGetEdges(unittest.TestCase):
+    """
+    This class contains tests for the get_edges() and get_edge_requirements() functions.
+    """
+    def test_get_edges(self):
+        """
+        The edges of every type of dependency are normalised, and aliases point to the real
+        package.
+        """
+        metadata = {'dependencies': {'b': '^1.0.0', 'e': 'file:../e'},
+                    'peerDependencies': {'a': 'npm:c@~2.0.0'}}
+
+        self.assertEqual(dependencies.get_edges(metadata),
+                         [{'name': 'b', 'range': '^1.0.0', 'type': 'dependencies'},
+                          {'name': 'c', 'range': '~2.0.0', 'type': 'peerDependencies'}])
+
+    def test_get_edge_requirements(self):
+        """
+        The edges of the given types are followed, and units without edges fall back to their
+        package.json sections.
+        """
+        metadata = {constants.METADATA_KEY_DEPENDENCIES: [
+            {'name': 'b', 'range': '^1.0.0', 'type': 'dependencies'},
+            {'name': 'c', 'range': '~2.0.0', 'type': 'peerDependencies'}],
+            'dependencies': {'x': '*'}}
+
+        self.assertEqual(dependencies.get_edge_requirements(metadata, ['dependencies']),
+                         [('b', '^1.0.0')])
+        self.assertEqual(dependencies.get_edge_requirements({'dependencies': {'x': '*'}},
+                                                            ['dependencies']),
+                         [('x', '*')])
+
+
+class TestResolveClosure(unittest.TestCase):
+    """
+    This class contains tests for the resolve_closure() function.
+    """
+    def setUp(self):
+        self.versions = {
+            'express': {'4.16.0': {'dependencies': {'debug': '^2.6.0', 'gone': '^1.0.0'}}},
+            'debug': {'2.6.8': {'dependencies': {'ms': '2.0.0'}},
+                      '2.6.9': {'dependencies': {'ms': '2.0.0'}}},
+            'ms': {'2.0.0': {'dependencies': {'debug': '2.6.9'}}}}
+        self.lookups = []
+
+    def find_versions(self, names):
+        """
+        Return the versions of the given packages, and remember the lookup.
+        """
+        self.lookups.append(names)
+        return dict([(n, self.versions[n]) for n in names if n in self.versions])
+
+    def test_resolve_closure(self):
+        """
+        Each level of the graph is looked up at once, cycles end, and the requirements that no
+        version satisfies are returned.
+        """
+        closure, unsatisfied = dependencies.resolve_closure(
+            [('express', '4.16.0')], self.find_versions, ['dependencies'],
+            lambda names: {'debug': {'latest': '2.6.8'}})
+
+        self.assertEqual(closure, [('debug', '2.6.8'), ('ms', '2.0.0'), ('debug', '2.6.9')])
+        self.assertEqual(unsatisfied, [('gone', '^1.0.0')])
+        self.assertEqual(self.lookups, [['express'], ['debug', 'gone'], ['ms']])
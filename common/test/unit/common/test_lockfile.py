@@ -0,0 +1,137 @@
+"""
+This module contains tests for the pulp_npm.common.lockfile module.
+"""
+import base64
+import hashlib
+import os
+import tempfile
+import unittest
+
+from pulp_npm.common import lockfile
+
+
+LOCKFILE_V1 = {
+    'name': 'app', 'version': '1.0.0', 'lockfileVersion': 1,
+    'dependencies': {
+        'left-pad': {'version': '1.1.0',
+                     'resolved': 'https://registry.npmjs.org/left-pad/-/left-pad-1.1.0.tgz',
+                     'integrity': 'sha512-aaaa'},
+        'express': {'version': '4.16.0',
+                    'dependencies': {
+                        'debug': {'version': '2.6.9',
+                                  'resolved': 'https://registry.npmjs.org/debug/-/debug-2.6.9.tgz',
+                                  'integrity': 'sha1-bbbb'},
+                        'bundled-thing': {'version': '1.0.0', 'bundled': True}}},
+        'my-fork': {'version': 'github:someone/my-fork#abcdef'},
+        'aliased': {'version': 'npm:real-name@2.0.0'}}}
+
+LOCKFILE_V2 = {
+    'name': 'app', 'version': '1.0.0', 'lockfileVersion': 2,
+    'packages': {
+        '': {'name': 'app', 'version': '1.0.0'},
+        'node_modules/left-pad': {
+            'version': '1.1.0',
+            'resolved': 'https://registry.npmjs.org/left-pad/-/left-pad-1.1.0.tgz',
+            'integrity': 'sha512-aaaa'},
+        'node_modules/express/node_modules/@types/node': {
+            'version': '10.0.0',
+            'resolved': 'https://registry.npmjs.org/@types/node/-/node-10.0.0.tgz',
+            'integrity': 'sha512-cccc'},
+        'node_modules/local': {'resolved': 'packages/local', 'link': True},
+        'packages/local': {'version': '0.0.1'},
+        'node_modules/file-dep': {'version': '1.0.0', 'resolved': 'file:../file-dep'}},
+    'dependencies': {'should-be-ignored': {'version': '1.0.0'}}}
+
+
+class TestCollect(unittest.TestCase):
+    """
+    This class contains tests for the collect() function.
+    """
+    def test_lockfile_version_1(self):
+        """
+        The nested dependencies of a lockfileVersion 1 document are found.
+        """
+        packages = lockfile.collect([LOCKFILE_V1])
+
+        packages = dict([((p['name'], p['version']), p) for p in packages])
+        self.assertEqual(
+            set(packages.keys()),
+            set([('left-pad', '1.1.0'), ('express', '4.16.0'), ('debug', '2.6.9'),
+                 ('real-name', '2.0.0')]))
+        self.assertEqual(packages[('debug', '2.6.9')]['integrity'], 'sha1-bbbb')
+        self.assertEqual(packages[('express', '4.16.0')]['resolved'], None)
+
+    def test_lockfile_version_2(self):
+        """
+        The packages section of a lockfileVersion 2 document is preferred, and links, workspaces,
+        file dependencies, and the project itself are skipped.
+        """
+        packages = lockfile.collect([LOCKFILE_V2])
+
+        self.assertEqual(
+            sorted([(p['name'], p['version']) for p in packages]),
+            [('@types/node', '10.0.0'), ('left-pad', '1.1.0')])
+
+    def test_duplicates_removed(self):
+        """
+        A package that appears in several lockfiles is only listed once, preferring the entry that
+        records its resolved URL and integrity.
+        """
+        unresolved = {'dependencies': {'left-pad': {'version': '1.1.0'}}}
+
+        packages = lockfile.collect([unresolved, LOCKFILE_V1, LOCKFILE_V2])
+
+        left_pads = [p for p in packages if p['name'] == 'left-pad']
+        self.assertEqual(len(left_pads), 1)
+        self.assertEqual(left_pads[0]['integrity'], 'sha512-aaaa')
+
+
+class TestIntegrity(unittest.TestCase):
+    """
+    This class contains tests for the integrity helpers.
+    """
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.write(fd, 'Hello World!')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_parse_integrity_strongest(self):
+        """
+        The strongest hash in the integrity string is used.
+        """
+        sha1 = base64.b64encode(hashlib.sha1('x').digest())
+        sha512 = base64.b64encode(hashlib.sha512('x').digest())
+
+        algorithm, digest = lockfile.parse_integrity('sha1-%s sha512-%s' % (sha1, sha512))
+
+        self.assertEqual(algorithm, 'sha512')
+        self.assertEqual(digest, hashlib.sha512('x').hexdigest())
+
+    def test_parse_integrity_unsupported(self):
+        """
+        Integrity strings without a supported hash are rejected.
+        """
+        self.assertRaises(ValueError, lockfile.parse_integrity, 'md5-abcd')
+
+    def test_verify_integrity(self):
+        """
+        verify_integrity() returns matching digests for the right file.
+        """
+        integrity = 'sha512-' + base64.b64encode(hashlib.sha512('Hello World!').digest())
+
+        expected, actual = lockfile.verify_integrity(self.path, integrity)
+
+        self.assertEqual(expected, actual)
+
+    def test_verify_integrity_mismatch(self):
+        """
+        verify_integrity() returns differing digests for the wrong file.
+        """
+        integrity = 'sha1-' + base64.b64encode(hashlib.sha1('Goodbye').digest())
+
+        expected, actual = lockfile.verify_integrity(self.path, integrity)
+
+        self.assertNotEqual(expected, actual)
@@ -0,0 +1,107 @@
+"""
+This module contains tests for the pulp_npm.common.semver module.
+"""
+import unittest
+
+from pulp_npm.common import semver
+
+
+class TestParse(unittest.TestCase):
+    """
+    This class contains tests for parse() and the ordering of Versions.
+    """
+    def test_parse(self):
+        """
+        Versions are parsed into their parts, with numeric prerelease identifiers as ints.
+        """
+        version = semver.parse('v1.2.3-beta.4+build.5')
+
+        self.assertEqual(version, (1, 2, 3, ('beta', 4)))
+        self.assertEqual(str(version), '1.2.3-beta.4')
+
+    def test_parse_invalid(self):
+        """
+        Invalid versions raise ValueError.
+        """
+        for version in ('1.2', 'latest', '', '1.2.3.4'):
+            self.assertRaises(ValueError, semver.parse, version)
+
+    def test_ordering(self):
+        """
+        Versions sort in npm's order.
+        """
+        ordered = ['0.9.0', '1.0.0-alpha', '1.0.0-alpha.1', '1.0.0-alpha.beta', '1.0.0-beta',
+                   '1.0.0-beta.2', '1.0.0-beta.11', '1.0.0-rc.1', '1.0.0', '1.0.1', '1.10.0']
+
+        self.assertEqual(sorted(reversed(ordered), key=semver.sort_key), ordered)
+
+    def test_is_prerelease(self):
+        """
+        Prereleases are recognized.
+        """
+        self.assertTrue(semver.is_prerelease('1.0.0-rc.1'))
+        self.assertFalse(semver.is_prerelease('1.0.0'))
+        self.assertFalse(semver.is_prerelease('not a version'))
+
+
+class TestRange(unittest.TestCase):
+    """
+    This class contains tests for the Range class.
+    """
+    def assertMatches(self, spec, matching, not_matching):
+        version_range = semver.Range(spec)
+        for version in matching:
+            self.assertTrue(version_range.test(version), '%s should match %s' % (version, spec))
+        for version in not_matching:
+            self.assertFalse(version_range.test(version),
+                             '%s should not match %s' % (version, spec))
+
+    def test_caret(self):
+        self.assertMatches('^1.2.3', ['1.2.3', '1.9.9'], ['1.2.2', '2.0.0', '2.0.0-0'])
+        self.assertMatches('^0.2.3', ['0.2.3', '0.2.9'], ['0.3.0'])
+        self.assertMatches('^0.0.3', ['0.0.3'], ['0.0.4'])
+        self.assertMatches('^0.x', ['0.0.1', '0.9.0'], ['1.0.0'])
+
+    def test_tilde(self):
+        self.assertMatches('~1.2.3', ['1.2.3', '1.2.9'], ['1.3.0', '1.2.2'])
+        self.assertMatches('~1', ['1.0.0', '1.9.0'], ['2.0.0'])
+
+    def test_x_ranges(self):
+        self.assertMatches('1.2.x', ['1.2.0', '1.2.7'], ['1.3.0'])
+        self.assertMatches('1', ['1.0.0', '1.5.5'], ['2.0.0', '0.9.9'])
+        self.assertMatches('*', ['0.0.0', '9.9.9'], ['1.0.0-rc.1'])
+        self.assertMatches('', ['1.0.0'], [])
+
+    def test_comparators(self):
+        self.assertMatches('>=1.0.0 <2.0.0', ['1.0.0', '1.9.9'], ['2.0.0', '0.9.0'])
+        self.assertMatches('>1.2', ['1.3.0'], ['1.2.9'])
+        self.assertMatches('<=1.2', ['1.2.9'], ['1.3.0'])
+        self.assertMatches('>= 1.0.0', ['1.0.0'], ['0.1.0'])
+
+    def test_hyphen(self):
+        self.assertMatches('1.2.3 - 2.3.4', ['1.2.3', '2.3.4'], ['2.3.5', '1.2.2'])
+        self.assertMatches('1.2 - 2.3', ['1.2.0', '2.3.9'], ['2.4.0'])
+
+    def test_or(self):
+        self.assertMatches('1.x || >=3.0.0', ['1.5.0', '3.1.0'], ['2.0.0'])
+
+    def test_prereleases(self):
+        """
+        Prereleases only match ranges that mention a prerelease of the same version.
+        """
+        self.assertMatches('>=1.2.3-alpha.3', ['1.2.3-alpha.7', '1.2.3', '3.0.0'],
+                           ['3.4.5-alpha.9', '1.2.3-alpha.2'])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, semver.Range, 'not a range')
+
+
+class TestMaxSatisfying(unittest.TestCase):
+    """
+    This class contains tests for the max_satisfying() function.
+    """
+    def test_max_satisfying(self):
+        versions = ['1.0.0', '1.2.0', '1.10.0', '2.0.0', '1.11.0-rc.1', 'garbage']
+
+        self.assertEqual(semver.max_satisfying(versions, '^1.0.0'), '1.10.0')
+        self.assertEqual(semver.max_satisfying(versions, '>=3'), None)
@@ -1,4 +1,5 @@
 from gettext import gettext as _
+import json
 
 from okaara import parsers
 from pulp.client import arg_utils
@@ -8,8 +9,9 @@ from pulp.client.commands.repo.cudl import UpdateRepositoryCommand
 from pulp.client.commands.repo.importer_config import ImporterConfigMixin
 from pulp.client.extensions.extensions import PulpCliOption
 from pulp.common.constants import REPO_NOTE_TYPE_KEY
+from pulp.common.plugins import importer_constants
 
-from pulp_npm.common import constants
+from pulp_npm.common import constants, lockfile
 
 
 d = _('if "true", on each successful sync the repository will automatically be '
@@ -19,6 +21,75 @@ OPT_AUTO_PUBLISH = PulpCliOption('--auto-publish', d, required=False,
                                  parse_func=parsers.parse_boolean)
 d = _('a comma separated list of package names you wish Pulp to sync')
 OPT_PACKAGE_NAMES = PulpCliOption('--package-names', d, required=False)
+d = _('if "on_demand", package tarballs are not downloaded during a sync, but are retrieved the '
+      'first time a client requests them; if "immediate", every tarball is downloaded during the '
+      'sync; defaults to "immediate"')
+OPT_DOWNLOAD_POLICY = PulpCliOption('--download-policy', d, required=False)
+d = _('path to a package-lock.json file; exactly the packages it lists are synchronized; may be '
+      'specified multiple times')
+OPT_LOCKFILE = PulpCliOption('--lockfile', d, required=False, allow_multiple=True)
+d = _('if "true", the package names may be followed by "@" and a version range, and the versions '
+      'they select are synchronized along with their transitive dependencies; defaults to "false"')
+OPT_RESOLVE_DEPENDENCIES = PulpCliOption('--resolve-dependencies', d, required=False,
+                                         parse_func=parsers.parse_boolean)
+d = _('a comma separated list of the optionalDependencies and peerDependencies sections of '
+      'package.json, whose dependencies are also resolved; dependencies are always resolved')
+OPT_DEPENDENCY_TYPES = PulpCliOption('--dependency-types', d, required=False,
+                                     parse_func=parsers.csv)
+d = _('a package name, "@", and a version range, such as "left-pad@^1.0.0"; only the versions of '
+      'the package that satisfy the range are synchronized; may be specified multiple times')
+OPT_VERSION_RANGE = PulpCliOption('--version-range', d, required=False, allow_multiple=True)
+d = _('if set, only the versions of the latest this many major versions of each package are '
+      'synchronized')
+OPT_LATEST_MAJORS = PulpCliOption('--latest-majors', d, required=False,
+                                  parse_func=parsers.parse_positive_int)
+d = _('if set, only the versions of the latest this many minor versions of each package are '
+      'synchronized')
+OPT_LATEST_MINORS = PulpCliOption('--latest-minors', d, required=False,
+                                  parse_func=parsers.parse_positive_int)
+d = _('if "true", prerelease versions are not synchronized; defaults to "false"')
+OPT_EXCLUDE_PRERELEASES = PulpCliOption('--exclude-prereleases', d, required=False,
+                                        parse_func=parsers.parse_boolean)
+d = _('URL of a registry replica, such as https://replicate.npmjs.com/, whose _changes feed is '
+      'followed so that each sync only processes the packages that changed since the previous '
+      'one; if no package names are given, every changed package is synchronized')
+OPT_CHANGES_FEED = PulpCliOption('--changes-feed', d, required=False)
+d = _('maximum number of package manifests downloaded at once; defaults to --max-downloads')
+OPT_METADATA_CONCURRENCY = PulpCliOption('--metadata-concurrency', d, required=False,
+                                         parse_func=parsers.parse_positive_int)
+d = _('maximum number of package tarballs downloaded at once; defaults to --max-downloads')
+OPT_PACKAGE_CONCURRENCY = PulpCliOption('--package-concurrency', d, required=False,
+                                        parse_func=parsers.parse_positive_int)
+d = _('URL of a mirror of the feed, tried when the feed is slower or a download from it fails; '
+      'may be specified multiple times')
+OPT_MIRROR = PulpCliOption('--mirror', d, required=False, allow_multiple=True)
+d = _('registry that serves the packages of a scope, in the form <scope>=<url>, such as '
+      '"@ourco=https://npm.ourco.example/"; may be specified multiple times, and a scope may be '
+      'given several registries')
+OPT_SCOPE_FEED = PulpCliOption('--scope-feed', d, required=False, allow_multiple=True)
+d = _('number of worker tasks that the package names are split among during a sync; defaults '
+      'to 1')
+OPT_SYNC_SHARDS = PulpCliOption('--sync-shards', d, required=False,
+                                parse_func=parsers.parse_positive_int)
+d = _('if "true", versions that are no longer available upstream are removed from the repository '
+      'during a sync; defaults to "false"')
+OPT_REMOVE_MISSING = PulpCliOption('--remove-missing', d, required=False,
+                                   parse_func=parsers.parse_boolean)
+d = _('a comma separated list of the package.json fields that are stored for each version; the '
+      'fields that Pulp relies on, such as dist, are always stored; defaults to every field')
+OPT_METADATA_FIELDS = PulpCliOption('--metadata-fields', d, required=False,
+                                    parse_func=parsers.csv)
+d = _('a comma separated list of the package.json fields that are not stored for each version')
+OPT_EXCLUDED_METADATA_FIELDS = PulpCliOption('--excluded-metadata-fields', d, required=False,
+                                             parse_func=parsers.csv)
+d = _('if "true", each distinct readme of a package is stored once, instead of with every '
+      'version that has it; defaults to "false"')
+OPT_SEPARATE_READMES = PulpCliOption('--separate-readmes', d, required=False,
+                                     parse_func=parsers.parse_boolean)
+d = _('if "true", the published metadata of each package only includes the readme of its latest '
+      'version; defaults to "false"')
+OPT_LATEST_README_ONLY = PulpCliOption('--latest-readme-only', d, required=False,
+                                       parse_func=parsers.parse_boolean)
 
 DESC_FEED = _('URL for the upstream npm repo')
 
@@ -42,6 +113,25 @@ class NpmRepositoryOptions(object):
         """
         self.add_option(OPT_AUTO_PUBLISH)
         self.add_option(OPT_PACKAGE_NAMES)
+        self.add_option(OPT_DOWNLOAD_POLICY)
+        self.add_option(OPT_LOCKFILE)
+        self.add_option(OPT_RESOLVE_DEPENDENCIES)
+        self.add_option(OPT_DEPENDENCY_TYPES)
+        self.add_option(OPT_VERSION_RANGE)
+        self.add_option(OPT_LATEST_MAJORS)
+        self.add_option(OPT_LATEST_MINORS)
+        self.add_option(OPT_EXCLUDE_PRERELEASES)
+        self.add_option(OPT_CHANGES_FEED)
+        self.add_option(OPT_METADATA_CONCURRENCY)
+        self.add_option(OPT_PACKAGE_CONCURRENCY)
+        self.add_option(OPT_MIRROR)
+        self.add_option(OPT_SCOPE_FEED)
+        self.add_option(OPT_SYNC_SHARDS)
+        self.add_option(OPT_REMOVE_MISSING)
+        self.add_option(OPT_METADATA_FIELDS)
+        self.add_option(OPT_EXCLUDED_METADATA_FIELDS)
+        self.add_option(OPT_SEPARATE_READMES)
+        self.add_option(OPT_LATEST_README_ONLY)
         self.options_bundle.opt_feed.description = DESC_FEED
 
     def _describe_distributors(self, user_input):
@@ -57,6 +147,9 @@ class NpmRepositoryOptions(object):
         :rtype:            list of dict
         """
         config = {}
+        latest_readme_only = user_input.get(OPT_LATEST_README_ONLY.keyword)
+        if latest_readme_only is not None:
+            config[constants.CONFIG_KEY_LATEST_README_ONLY] = latest_readme_only
         auto_publish = user_input.get(OPT_AUTO_PUBLISH.keyword)
 
         if auto_publish is None:
@@ -84,9 +177,81 @@ class NpmRepositoryOptions(object):
         config = self.parse_user_input(user_input)
         if OPT_PACKAGE_NAMES.keyword in user_input:
             config[constants.CONFIG_KEY_PACKAGE_NAMES] = user_input.pop(OPT_PACKAGE_NAMES.keyword)
+        if OPT_DOWNLOAD_POLICY.keyword in user_input:
+            config[constants.CONFIG_KEY_DOWNLOAD_POLICY] = user_input.pop(
+                OPT_DOWNLOAD_POLICY.keyword)
+        if OPT_LOCKFILE.keyword in user_input:
+            paths = user_input.pop(OPT_LOCKFILE.keyword)
+            packages = None
+            if paths is not None:
+                # Lockfiles are keyed by package paths and names, which may contain dots that
+                # MongoDB does not allow in keys, so only the packages they list are stored
+                packages = lockfile.collect([_read_lockfile(path) for path in paths])
+            config[constants.CONFIG_KEY_LOCKED_PACKAGES] = packages
+        if OPT_RESOLVE_DEPENDENCIES.keyword in user_input:
+            config[constants.CONFIG_KEY_RESOLVE_DEPENDENCIES] = user_input.pop(
+                OPT_RESOLVE_DEPENDENCIES.keyword)
+        if OPT_DEPENDENCY_TYPES.keyword in user_input:
+            config[constants.CONFIG_KEY_DEPENDENCY_TYPES] = user_input.pop(
+                OPT_DEPENDENCY_TYPES.keyword)
+        if OPT_VERSION_RANGE.keyword in user_input:
+            # Stored as a list of specs, because package names may contain dots, which MongoDB
+            # does not allow in keys
+            config[constants.CONFIG_KEY_VERSION_RANGES] = user_input.pop(
+                OPT_VERSION_RANGE.keyword)
+        for option, key in ((OPT_LATEST_MAJORS, constants.CONFIG_KEY_LATEST_MAJORS),
+                            (OPT_LATEST_MINORS, constants.CONFIG_KEY_LATEST_MINORS),
+                            (OPT_EXCLUDE_PRERELEASES, constants.CONFIG_KEY_EXCLUDE_PRERELEASES),
+                            (OPT_CHANGES_FEED, constants.CONFIG_KEY_CHANGES_FEED),
+                            (OPT_METADATA_CONCURRENCY,
+                             constants.CONFIG_KEY_METADATA_CONCURRENCY),
+                            (OPT_PACKAGE_CONCURRENCY, constants.CONFIG_KEY_PACKAGE_CONCURRENCY),
+                            (OPT_SYNC_SHARDS, constants.CONFIG_KEY_SYNC_SHARDS),
+                            (OPT_REMOVE_MISSING, importer_constants.KEY_UNITS_REMOVE_MISSING),
+                            (OPT_METADATA_FIELDS, constants.CONFIG_KEY_METADATA_FIELDS),
+                            (OPT_EXCLUDED_METADATA_FIELDS,
+                             constants.CONFIG_KEY_EXCLUDED_METADATA_FIELDS),
+                            (OPT_SEPARATE_READMES, constants.CONFIG_KEY_SEPARATE_READMES)):
+            if option.keyword in user_input:
+                config[key] = user_input.pop(option.keyword)
+        if OPT_MIRROR.keyword in user_input or OPT_SCOPE_FEED.keyword in user_input:
+            mirrors = user_input.pop(OPT_MIRROR.keyword, None)
+            scope_feeds = user_input.pop(OPT_SCOPE_FEED.keyword, None)
+            feeds = {}
+            if mirrors:
+                feeds[constants.DEFAULT_FEED_ROUTE] = list(mirrors)
+            for scope, url in [_split_scope_feed(f) for f in scope_feeds or []]:
+                feeds.setdefault(scope, []).append(url)
+            config[constants.CONFIG_KEY_FEEDS] = feeds or None
         return config
 
 
+def _read_lockfile(path):
+    """
+    Read and parse the package-lock.json file at the given path.
+
+    :param path: The path to a package-lock.json file
+    :type  path: basestring
+    :return:     The parsed lockfile
+    :rtype:      dict
+    """
+    with open(path) as lockfile:
+        return json.load(lockfile)
+
+
+def _split_scope_feed(scope_feed):
+    """
+    Split a scope and the URL of its registry given in the form <scope>=<url>.
+
+    :param scope_feed: A scope, "=", and a URL, such as "@ourco=https://npm.ourco.example/"
+    :type  scope_feed: basestring
+    :return:           A 2-tuple of the scope and the URL
+    :rtype:            tuple
+    """
+    scope, _sep, url = scope_feed.partition('=')
+    return scope.strip(), url.strip()
+
+
 class CreateNpmRepositoryCommand(NpmRepositoryOptions, CreateAndConfigureRepositoryCommand,
                                  ImporterConfigMixin):
     """
@@ -148,6 +313,9 @@ class UpdateNpmRepositoryCommand(NpmRepositoryOptions, UpdateRepositoryCommand,
         value = kwargs.pop(OPT_AUTO_PUBLISH.keyword, None)
         if value is not None:
             web_config['auto_publish'] = value
+        value = kwargs.pop(OPT_LATEST_README_ONLY.keyword, None)
+        if value is not None:
+            web_config[constants.CONFIG_KEY_LATEST_README_ONLY] = value
 
         if web_config:
             kwargs['distributor_configs'] = {}
@@ -3,16 +3,44 @@ Commands related to searching for packages in a Npm repository.
 """
 from gettext import gettext as _
 
+from okaara import parsers
 from pulp.client.commands import options, unit
 from pulp.client.commands.criteria import DisplayUnitAssociationsCommand
 from pulp.client.commands.unit import UnitRemoveCommand
+from pulp.client.extensions.extensions import PulpCliCommand, PulpCliOption
 
-from pulp_npm.common import constants
+from pulp_npm.common import constants, dependencies, semver
 
+DESC_CLOSURE = _('list the packages in a repository that a package depends on, directly or not')
 DESC_COPY = _('copies packages from one repository to another')
+DESC_DEPENDENTS = _('list the packages in a repository that depend on a package')
 DESC_REMOVE = _('remove packages from a repository')
 DESC_SEARCH = _('search for packages in a repository')
 
+d = _('a package name, optionally followed by "@" and a version range, such as "left-pad" or '
+      '"left-pad@^1.0.0"; only the versions of the listed packages that satisfy their range are '
+      'copied; may be specified multiple times')
+OPT_PACKAGE = PulpCliOption('--package', d, required=False, allow_multiple=True)
+
+d = _('if "true", the dependencies of the copied packages are also copied, with the versions that '
+      'npm would install from the source repository; defaults to false')
+OPT_RECURSIVE = PulpCliOption('--recursive', d, required=False, parse_func=parsers.parse_boolean)
+
+d = _('a package name, optionally followed by "@" and a version, such as "ms" or "ms@2.0.0"; when '
+      'a version is given, only the packages whose range for the dependency it satisfies are '
+      'listed')
+OPT_DEPENDENCY = PulpCliOption('--package', d, required=True)
+
+d = _('a package name, optionally followed by "@" and a version range or dist-tag, such as '
+      '"express@^4.16.0"; the highest version in the repository that satisfies the range is the '
+      'one whose dependencies are listed')
+OPT_REQUIREMENT = PulpCliOption('--package', d, required=True)
+
+d = _('a comma separated list of the optionalDependencies and peerDependencies sections of '
+      'package.json, whose dependencies are also followed; dependencies are always followed')
+OPT_DEPENDENCY_TYPES = PulpCliOption('--dependency-types', d, required=False,
+                                     parse_func=parsers.csv)
+
 
 class CopyPackagesCommand(unit.UnitCopyCommand):
     """
@@ -28,6 +56,24 @@ class CopyPackagesCommand(unit.UnitCopyCommand):
         """
         super(CopyPackagesCommand, self).__init__(context, description=DESC_COPY,
                                                   type_id=constants.PACKAGE_TYPE_ID)
+        self.add_option(OPT_PACKAGE)
+        self.add_option(OPT_RECURSIVE)
+
+    def generate_override_config(self, **kwargs):
+        """
+        Pass the packages to copy, and whether to copy their dependencies, to the importer.
+
+        :param kwargs: The CLI options passed by the user
+        :type  kwargs: dict
+        :return:       The override config of the copy
+        :rtype:        dict
+        """
+        override_config = {}
+        if kwargs.get(OPT_PACKAGE.keyword):
+            override_config[constants.CONFIG_KEY_COPY_PACKAGES] = kwargs[OPT_PACKAGE.keyword]
+        if kwargs.get(OPT_RECURSIVE.keyword) is not None:
+            override_config[constants.CONFIG_KEY_RECURSIVE] = kwargs[OPT_RECURSIVE.keyword]
+        return override_config
 
     @staticmethod
     def get_formatter_for_type(type_id):
@@ -43,6 +89,143 @@ class CopyPackagesCommand(unit.UnitCopyCommand):
         return lambda x: '%(name)s-%(version)s' % x
 
 
+class DependentsCommand(PulpCliCommand):
+    """
+    Lists the packages in a repository that depend on a package, using the index of the units'
+    dependency edges.
+    """
+
+    def __init__(self, context):
+        """
+        Initialize the command.
+
+        :param context: The CLI context
+        :type  context: pulp.client.extensions.core.ClientContext
+        """
+        super(DependentsCommand, self).__init__('dependents', DESC_DEPENDENTS, self.run)
+        self.context = context
+        self.add_option(options.OPTION_REPO_ID)
+        self.add_option(OPT_DEPENDENCY)
+
+    def run(self, **kwargs):
+        """
+        Query the server for the units that depend on the package, and render them for the user.
+
+        :param kwargs: The CLI options passed by the user
+        :type  kwargs: dict
+        """
+        repo_id = kwargs[options.OPTION_REPO_ID.keyword]
+        spec = kwargs[OPT_DEPENDENCY.keyword]
+        # The name of a scoped package starts with "@", so it can't end there
+        index = spec.rfind('@')
+        if index > 0:
+            name, version = spec[:index], spec[index + 1:].strip()
+        else:
+            name, version = spec, None
+
+        key = constants.METADATA_KEY_DEPENDENCIES
+        units = self.context.server.repo_unit.search(
+            repo_id, type_ids=[constants.PACKAGE_TYPE_ID], filters={key + '.name': name},
+            fields=['name', 'version', key]).response_body
+
+        documents = []
+        for u in units:
+            for edge in u['metadata'][key]:
+                if edge['name'] == name and (not version or _satisfies(version, edge['range'])):
+                    documents.append({'name': u['metadata']['name'],
+                                      'version': u['metadata']['version'],
+                                      'range': edge['range'], 'type': edge['type']})
+        documents.sort(key=lambda d: (d['name'], d['version']))
+        self.context.prompt.render_document_list(documents,
+                                                 order=['name', 'version', 'range', 'type'])
+
+
+class ClosureCommand(PulpCliCommand):
+    """
+    Lists the packages in a repository that a version of a package depends on, directly or not,
+    in the versions that npm would install.
+    """
+
+    def __init__(self, context):
+        """
+        Initialize the command.
+
+        :param context: The CLI context
+        :type  context: pulp.client.extensions.core.ClientContext
+        """
+        super(ClosureCommand, self).__init__('closure', DESC_CLOSURE, self.run)
+        self.context = context
+        self.add_option(options.OPTION_REPO_ID)
+        self.add_option(OPT_REQUIREMENT)
+        self.add_option(OPT_DEPENDENCY_TYPES)
+
+    def run(self, **kwargs):
+        """
+        Walk the dependencies of the selected version one level at a time, querying the server for
+        the versions of the packages that each level requires, and render the closure for the
+        user.
+
+        :param kwargs: The CLI options passed by the user
+        :type  kwargs: dict
+        """
+        repo_id = kwargs[options.OPTION_REPO_ID.keyword]
+        name, spec = dependencies.parse_requirement(kwargs[OPT_REQUIREMENT.keyword])
+        configured = kwargs.get(OPT_DEPENDENCY_TYPES.keyword) or []
+        dependency_types = [t for t in constants.DEPENDENCY_TYPES
+                            if t == constants.DEPENDENCY_TYPES[0] or t in configured]
+
+        # The versions of the packages that were queried, so that the root is only queried once
+        found = {}
+
+        def find_versions(names):
+            missing = [n for n in names if n not in found]
+            if missing:
+                versions = self._find_versions(repo_id, missing)
+                for n in missing:
+                    found[n] = versions.get(n, {})
+            return dict([(n, found[n]) for n in names])
+
+        version = dependencies.select_version(find_versions([name]).get(name, {}), spec)
+        if version is None:
+            msg = _('No version of %(name)s in %(repo)s satisfies %(spec)s.')
+            self.context.prompt.render_failure_message(
+                msg % {'name': name, 'repo': repo_id, 'spec': spec})
+            return
+
+        closure, unsatisfied = dependencies.resolve_closure([(name, version)], find_versions,
+                                                            dependency_types)
+        self.context.prompt.render_document_list(
+            [{'name': n, 'version': v} for n, v in [(name, version)] + closure],
+            order=['name', 'version'])
+        for dependency, dependency_spec in unsatisfied:
+            msg = _('No version of %(name)s in %(repo)s satisfies %(spec)s.')
+            self.context.prompt.render_warning_message(
+                msg % {'name': dependency, 'repo': repo_id, 'spec': dependency_spec})
+
+    def _find_versions(self, repo_id, names):
+        """
+        Query the server for the versions of the given packages and their dependency edges.
+
+        :param repo_id: The ID of the repository
+        :type  repo_id: basestring
+        :param names:   The names of the packages
+        :type  names:   list of basestring
+        :return:        Maps the names of the packages to the metadata of their versions by
+                        version
+        :rtype:         dict
+        """
+        units = self.context.server.repo_unit.search(
+            repo_id, type_ids=[constants.PACKAGE_TYPE_ID], filters={'name': {'$in': names}},
+            fields=['name', 'version', constants.METADATA_KEY_DEPENDENCIES]).response_body
+        versions = {}
+        for u in units:
+            metadata = u['metadata']
+            # Units stored before their edges were recorded have no dependencies to follow
+            metadata.setdefault(constants.METADATA_KEY_DEPENDENCIES, [])
+            versions.setdefault(metadata['name'], {})[metadata['version']] = metadata
+        return versions
+
+
 class ListPackagesCommand(DisplayUnitAssociationsCommand):
     """
     This command is used to search for existing Npm packages in a repository.
@@ -112,3 +295,21 @@ class RemovePackagesCommand(UnitRemoveCommand):
             raise ValueError(_("The Npm package formatter can not process %s units.") % type_id)
 
         return lambda x: '%s-%s' % (x['name'], x['version'])
+
+
+def _satisfies(version, version_range):
+    """
+    Return whether the given version satisfies the given range. Ranges that can't be parsed, such
+    as dist-tags, are considered to be satisfied.
+
+    :param version:       A version
+    :type  version:       basestring
+    :param version_range: A version range
+    :type  version_range: basestring
+    :return:              False if the range excludes the version
+    :rtype:               bool
+    """
+    try:
+        return semver.Range(version_range).test(version)
+    except ValueError:
+        return True
@@ -4,7 +4,7 @@ from pulp.client.commands.repo import cudl, status, sync_publish
 from pulp.client.extensions.decorator import priority
 
 from pulp_npm.common import constants
-from pulp_npm.extensions.admin import packages, upload
+from pulp_npm.extensions.admin import packages, sync, upload
 from pulp_npm.extensions.admin.cudl import (
     CreateNpmRepositoryCommand, ListNpmRepositoriesCommand, UpdateNpmRepositoryCommand)
 
@@ -58,6 +58,8 @@ def _add_repo_section(context, parent_section):
     repo_section.add_command(packages.RemovePackagesCommand(context))
     repo_section.add_command(packages.CopyPackagesCommand(context))
     repo_section.add_command(packages.ListPackagesCommand(context))
+    repo_section.add_command(packages.DependentsCommand(context))
+    repo_section.add_command(packages.ClosureCommand(context))
 
 
 def _add_publish_section(context, parent_section):
@@ -95,4 +97,4 @@ def _add_sync_section(context, parent_section):
     renderer = status.PublishStepStatusRenderer(context)
 
     sync_section = parent_section.create_subsection(SECTION_SYNC, DESC_SYNC)
-    sync_section.add_command(sync_publish.RunSyncRepositoryCommand(context, renderer))
+    sync_section.add_command(sync.RunNpmSyncRepositoryCommand(context, renderer))
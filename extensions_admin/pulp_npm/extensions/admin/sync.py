@@ -0,0 +1,45 @@
+from gettext import gettext as _
+
+from okaara import parsers
+from pulp.client.commands.repo.sync_publish import RunSyncRepositoryCommand
+from pulp.client.extensions.extensions import PulpCliOption
+
+from pulp_npm.common import constants
+
+
+d = _('if "true", the sync only reports the versions it would download and associate, and how long '
+      'the downloads would take, without changing the repository; defaults to "false"')
+OPT_DRY_RUN = PulpCliOption('--dry-run', d, required=False, parse_func=parsers.parse_boolean)
+
+
+class RunNpmSyncRepositoryCommand(RunSyncRepositoryCommand):
+    """
+    Sync a repository. A dry run is asked for in the override config of this one sync, so that the
+    repository's scheduled syncs are left alone.
+    """
+
+    def __init__(self, context, renderer):
+        """
+        Initialize the command.
+
+        :param context:  The CLI context
+        :type  context:  pulp.client.extensions.core.ClientContext
+        :param renderer: Renders the progress of the sync
+        :type  renderer: pulp.client.commands.repo.status.PublishStepStatusRenderer
+        """
+        super(RunNpmSyncRepositoryCommand, self).__init__(context, renderer)
+        self.add_option(OPT_DRY_RUN)
+
+    def generate_override_config(self, **kwargs):
+        """
+        Pass whether the sync is a dry run to the importer.
+
+        :param kwargs: The CLI options passed by the user
+        :type  kwargs: dict
+        :return:       The override config of the sync
+        :rtype:        dict
+        """
+        override_config = {}
+        if kwargs.get(OPT_DRY_RUN.keyword):
+            override_config[constants.CONFIG_KEY_DRY_RUN] = True
+        return override_config
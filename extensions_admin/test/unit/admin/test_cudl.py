@@ -63,7 +63,17 @@ class TestNpmRespositoryOptions(unittest.TestCase):
         pro = TestNpmRespositoryOptions.MixinTestClass()
 
         added_options = set([c[1][0] for c in pro.add_option.mock_calls])
-        expected_options = set([cudl.OPT_AUTO_PUBLISH, cudl.OPT_PACKAGE_NAMES])
+        expected_options = set([cudl.OPT_AUTO_PUBLISH, cudl.OPT_PACKAGE_NAMES,
+                                cudl.OPT_DOWNLOAD_POLICY, cudl.OPT_LOCKFILE,
+                                cudl.OPT_RESOLVE_DEPENDENCIES, cudl.OPT_DEPENDENCY_TYPES,
+                                cudl.OPT_VERSION_RANGE, cudl.OPT_LATEST_MAJORS,
+                                cudl.OPT_LATEST_MINORS, cudl.OPT_EXCLUDE_PRERELEASES,
+                                cudl.OPT_CHANGES_FEED, cudl.OPT_METADATA_CONCURRENCY,
+                                cudl.OPT_PACKAGE_CONCURRENCY, cudl.OPT_MIRROR,
+                                cudl.OPT_SCOPE_FEED, cudl.OPT_SYNC_SHARDS,
+                                cudl.OPT_REMOVE_MISSING,
+                                cudl.OPT_METADATA_FIELDS, cudl.OPT_EXCLUDED_METADATA_FIELDS,
+                                cudl.OPT_SEPARATE_READMES, cudl.OPT_LATEST_README_ONLY])
         self.assertEqual(added_options, expected_options)
         self.assertEqual(pro.options_bundle.opt_feed.description, cudl.DESC_FEED)
 
@@ -88,6 +98,16 @@ class TestNpmRespositoryOptions(unittest.TestCase):
         result = command._describe_distributors(user_input)
         self.assertEquals(result[0]["auto_publish"], False)
 
+    def test_describe_distributors_latest_readme_only(self):
+        command = TestNpmRespositoryOptions.MixinTestClass()
+        user_input = {
+            'auto-publish': None,
+            'latest-readme-only': True
+        }
+        result = command._describe_distributors(user_input)
+        self.assertEqual(result[0]['distributor_config'],
+                         {constants.CONFIG_KEY_LATEST_README_ONLY: True})
+
     @mock.patch('pulp_npm.extensions.admin.cudl.NpmRepositoryOptions.parse_user_input',
                 create=True)
     def test__parse_importer_config_no_input(self, parse_user_input):
@@ -140,6 +160,110 @@ class TestNpmRespositoryOptions(unittest.TestCase):
                            'some': 'input'}
         compare_dict(result, expected_result)
 
+    @mock.patch('pulp_npm.extensions.admin.cudl.NpmRepositoryOptions.parse_user_input',
+                create=True)
+    def test__parse_importer_config_with_download_policy(self, parse_user_input):
+        """
+        Assert that _parse_importer_config passes the download policy on to the importer config.
+        """
+        command = TestNpmRespositoryOptions.MixinTestClass()
+        user_input = {'some': 'input',
+                      cudl.OPT_DOWNLOAD_POLICY.keyword: constants.DOWNLOAD_ON_DEMAND}
+        parse_user_input.return_value = {'some': 'input'}
+
+        result = command._parse_importer_config(user_input)
+
+        expected_result = {constants.CONFIG_KEY_DOWNLOAD_POLICY: constants.DOWNLOAD_ON_DEMAND,
+                           'some': 'input'}
+        compare_dict(result, expected_result)
+
+    @mock.patch('pulp_npm.extensions.admin.cudl.NpmRepositoryOptions.parse_user_input',
+                create=True)
+    @mock.patch('pulp_npm.extensions.admin.cudl._read_lockfile')
+    def test__parse_importer_config_with_lockfiles(self, _read_lockfile, parse_user_input):
+        """
+        Assert that _parse_importer_config stores the packages that the lockfiles list in the
+        importer config, rather than the lockfiles, whose keys may contain dots.
+        """
+        command = TestNpmRespositoryOptions.MixinTestClass()
+        user_input = {cudl.OPT_LOCKFILE.keyword: ['a/package-lock.json', 'b/package-lock.json']}
+        parse_user_input.return_value = {}
+        lockfiles = {
+            'a/package-lock.json': {'packages': {
+                'node_modules/lodash.merge': {
+                    'version': '4.6.2',
+                    'resolved': 'https://registry.npmjs.org/lodash.merge/-/lodash.merge-4.6.2.tgz',
+                    'integrity': 'sha512-aaaa'}}},
+            'b/package-lock.json': {'dependencies': {'socket.io': {'version': '2.0.0'}}}}
+        _read_lockfile.side_effect = lambda path: lockfiles[path]
+
+        result = command._parse_importer_config(user_input)
+
+        expected_result = {constants.CONFIG_KEY_LOCKED_PACKAGES: [
+            {'name': 'lodash.merge', 'version': '4.6.2',
+             'resolved': 'https://registry.npmjs.org/lodash.merge/-/lodash.merge-4.6.2.tgz',
+             'integrity': 'sha512-aaaa'},
+            {'name': 'socket.io', 'version': '2.0.0', 'resolved': None, 'integrity': None}]}
+        compare_dict(result, expected_result)
+
+    @mock.patch('pulp_npm.extensions.admin.cudl.NpmRepositoryOptions.parse_user_input',
+                create=True)
+    def test__parse_importer_config_with_dependency_resolution(self, parse_user_input):
+        """
+        Assert that _parse_importer_config passes the dependency options on to the importer config.
+        """
+        command = TestNpmRespositoryOptions.MixinTestClass()
+        user_input = {cudl.OPT_RESOLVE_DEPENDENCIES.keyword: True,
+                      cudl.OPT_DEPENDENCY_TYPES.keyword: ['peerDependencies']}
+        parse_user_input.return_value = {}
+
+        result = command._parse_importer_config(user_input)
+
+        expected_result = {constants.CONFIG_KEY_RESOLVE_DEPENDENCIES: True,
+                           constants.CONFIG_KEY_DEPENDENCY_TYPES: ['peerDependencies']}
+        compare_dict(result, expected_result)
+
+    @mock.patch('pulp_npm.extensions.admin.cudl.NpmRepositoryOptions.parse_user_input',
+                create=True)
+    def test__parse_importer_config_with_version_filters(self, parse_user_input):
+        """
+        Assert that _parse_importer_config passes the version filters on to the importer config.
+        """
+        command = TestNpmRespositoryOptions.MixinTestClass()
+        user_input = {cudl.OPT_VERSION_RANGE.keyword: ['left-pad@^1.0.0', '@types/node@8.x',
+                                                       'socket.io@2.x'],
+                      cudl.OPT_LATEST_MAJORS.keyword: 2,
+                      cudl.OPT_EXCLUDE_PRERELEASES.keyword: True}
+        parse_user_input.return_value = {}
+
+        result = command._parse_importer_config(user_input)
+
+        expected_result = {
+            constants.CONFIG_KEY_VERSION_RANGES: ['left-pad@^1.0.0', '@types/node@8.x',
+                                                  'socket.io@2.x'],
+            constants.CONFIG_KEY_LATEST_MAJORS: 2,
+            constants.CONFIG_KEY_EXCLUDE_PRERELEASES: True}
+        compare_dict(result, expected_result)
+
+    @mock.patch('pulp_npm.extensions.admin.cudl.NpmRepositoryOptions.parse_user_input',
+                create=True)
+    def test__parse_importer_config_with_feeds(self, parse_user_input):
+        """
+        Assert that _parse_importer_config routes the mirrors and scope feeds into the feeds config.
+        """
+        command = TestNpmRespositoryOptions.MixinTestClass()
+        user_input = {cudl.OPT_MIRROR.keyword: ['https://mirror.example/'],
+                      cudl.OPT_SCOPE_FEED.keyword: ['@ourco=https://npm-a.ourco.example/',
+                                                    '@ourco = https://npm-b.ourco.example/']}
+        parse_user_input.return_value = {}
+
+        result = command._parse_importer_config(user_input)
+
+        expected_result = {constants.CONFIG_KEY_FEEDS: {
+            '*': ['https://mirror.example/'],
+            '@ourco': ['https://npm-a.ourco.example/', 'https://npm-b.ourco.example/']}}
+        compare_dict(result, expected_result)
+
 
 class TestUpdateNpmRepositoryCommand(unittest.TestCase):
 
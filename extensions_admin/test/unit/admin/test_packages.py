@@ -14,8 +14,9 @@ class TestCopyPackagesCommand(unittest.TestCase):
     """
     This class contains tests for the CopyPackagesCommand class.
     """
+    @mock.patch('pulp_npm.extensions.admin.packages.unit.UnitCopyCommand.add_option')
     @mock.patch('pulp_npm.extensions.admin.packages.unit.UnitCopyCommand.__init__')
-    def test___init__(self, super___init__):
+    def test___init__(self, super___init__, add_option):
         """
         Assert correct behavior from __init__().
         """
@@ -25,6 +26,29 @@ class TestCopyPackagesCommand(unittest.TestCase):
 
         super___init__.assert_called_once_with(context, description=packages.DESC_COPY,
                                                type_id=constants.PACKAGE_TYPE_ID)
+        self.assertEqual(add_option.mock_calls,
+                         [mock.call(packages.OPT_PACKAGE), mock.call(packages.OPT_RECURSIVE)])
+
+    @mock.patch('pulp_npm.extensions.admin.packages.unit.UnitCopyCommand.add_option')
+    @mock.patch('pulp_npm.extensions.admin.packages.unit.UnitCopyCommand.__init__')
+    def test_generate_override_config(self, super___init__, add_option):
+        """
+        Assert that the packages to copy and the recursive flag are passed to the importer, and
+        nothing else.
+        """
+        command = packages.CopyPackagesCommand(mock.MagicMock())
+
+        self.assertEqual(
+            command.generate_override_config(**{packages.OPT_PACKAGE.keyword: ['left-pad@^1.0.0']}),
+            {constants.CONFIG_KEY_COPY_PACKAGES: ['left-pad@^1.0.0']})
+        self.assertEqual(
+            command.generate_override_config(**{packages.OPT_PACKAGE.keyword: ['left-pad'],
+                                                packages.OPT_RECURSIVE.keyword: True}),
+            {constants.CONFIG_KEY_COPY_PACKAGES: ['left-pad'],
+             constants.CONFIG_KEY_RECURSIVE: True})
+        self.assertEqual(command.generate_override_config(**{packages.OPT_PACKAGE.keyword: None,
+                                                             packages.OPT_RECURSIVE.keyword: None}),
+                         {})
 
     def test_get_formatter_for_type(self):
         """
@@ -36,6 +60,91 @@ class TestCopyPackagesCommand(unittest.TestCase):
                          'pulp_npm_plugins-0.0.0')
 
 
+class TestDependentsCommand(unittest.TestCase):
+    """
+    This class contains tests for the DependentsCommand class.
+    """
+    def test_run(self):
+        """
+        The units are found through their indexed dependency edges, and only those whose range
+        the given version satisfies are listed.
+        """
+        edges = constants.METADATA_KEY_DEPENDENCIES
+        context = mock.MagicMock()
+        context.server.repo_unit.search.return_value.response_body = [
+            {'metadata': {'name': 'debug', 'version': '2.6.9',
+                          edges: [{'name': 'ms', 'range': '2.0.0', 'type': 'dependencies'}]}},
+            {'metadata': {'name': 'send', 'version': '0.16.2',
+                          edges: [{'name': 'debug', 'range': '2.6.9', 'type': 'dependencies'},
+                                  {'name': 'ms', 'range': '^2.1.0', 'type': 'dependencies'}]}}]
+        command = packages.DependentsCommand(context)
+
+        command.run(**{options.OPTION_REPO_ID.keyword: 'repo',
+                       packages.OPT_DEPENDENCY.keyword: 'ms@2.0.0'})
+
+        context.server.repo_unit.search.assert_called_once_with(
+            'repo', type_ids=[constants.PACKAGE_TYPE_ID], filters={edges + '.name': 'ms'},
+            fields=['name', 'version', edges])
+        context.prompt.render_document_list.assert_called_once_with(
+            [{'name': 'debug', 'version': '2.6.9', 'range': '2.0.0', 'type': 'dependencies'}],
+            order=['name', 'version', 'range', 'type'])
+
+
+class TestClosureCommand(unittest.TestCase):
+    """
+    This class contains tests for the ClosureCommand class.
+    """
+    def setUp(self):
+        edges = constants.METADATA_KEY_DEPENDENCIES
+        self.units = [
+            {'name': 'express', 'version': '4.16.0',
+             edges: [{'name': 'debug', 'range': '^2.6.0', 'type': 'dependencies'},
+                     {'name': 'gone', 'range': '^1.0.0', 'type': 'dependencies'}]},
+            {'name': 'debug', 'version': '2.6.9',
+             edges: [{'name': 'ms', 'range': '2.0.0', 'type': 'dependencies'}]},
+            {'name': 'ms', 'version': '2.0.0'}]
+        self.context = mock.MagicMock()
+        self.context.server.repo_unit.search.side_effect = self.search
+
+    def search(self, repo_id, **kwargs):
+        """
+        Fakes the server search, which filters the units on their names.
+        """
+        response = mock.MagicMock()
+        response.response_body = [{'metadata': dict(u)} for u in self.units
+                                  if u['name'] in kwargs['filters']['name']['$in']]
+        return response
+
+    def test_run(self):
+        """
+        The closure of the selected version is listed, one query per level of the graph, and the
+        dependencies that no version satisfies are reported.
+        """
+        command = packages.ClosureCommand(self.context)
+
+        command.run(**{options.OPTION_REPO_ID.keyword: 'repo',
+                       packages.OPT_REQUIREMENT.keyword: 'express@4.x',
+                       packages.OPT_DEPENDENCY_TYPES.keyword: None})
+
+        self.context.prompt.render_document_list.assert_called_once_with(
+            [{'name': 'express', 'version': '4.16.0'}, {'name': 'debug', 'version': '2.6.9'},
+             {'name': 'ms', 'version': '2.0.0'}], order=['name', 'version'])
+        self.assertEqual(self.context.server.repo_unit.search.call_count, 3)
+        self.assertEqual(self.context.prompt.render_warning_message.call_count, 1)
+
+    def test_run_unsatisfied(self):
+        """
+        A failure is rendered when no version of the package satisfies the range.
+        """
+        command = packages.ClosureCommand(self.context)
+
+        command.run(**{options.OPTION_REPO_ID.keyword: 'repo',
+                       packages.OPT_REQUIREMENT.keyword: 'express@^5.0.0'})
+
+        self.assertEqual(self.context.prompt.render_failure_message.call_count, 1)
+        self.assertEqual(self.context.prompt.render_document_list.call_count, 0)
+
+
 class TestListPackagesCommand(unittest.TestCase):
     """
     This class contains tests for the ListPackagesCommand class.
@@ -5,10 +5,10 @@ from pulp.client.commands.repo.cudl import CreateRepositoryCommand, DeleteReposi
 from pulp.client.commands.repo.cudl import ListRepositoriesCommand
 from pulp.client.commands.repo.cudl import UpdateRepositoryCommand
 from pulp.client.commands.repo.sync_publish import PublishStatusCommand,\
-    RunPublishRepositoryCommand, RunSyncRepositoryCommand
+    RunPublishRepositoryCommand
 from pulp.client.extensions.core import PulpCli
 
-from pulp_npm.extensions.admin import packages, pulp_cli, upload
+from pulp_npm.extensions.admin import packages, pulp_cli, sync, upload
 
 
 class TestInitialize(unittest.TestCase):
@@ -35,9 +35,11 @@ class TestInitialize(unittest.TestCase):
         self.assertTrue(isinstance(repo_section.commands['upload'], upload.UploadPackageCommand))
         self.assertTrue(isinstance(repo_section.commands['remove'], packages.RemovePackagesCommand))
         self.assertTrue(isinstance(repo_section.commands['packages'], packages.ListPackagesCommand))
+        self.assertTrue(isinstance(repo_section.commands['dependents'], packages.DependentsCommand))
+        self.assertTrue(isinstance(repo_section.commands['closure'], packages.ClosureCommand))
 
         section = repo_section.subsections['sync']
-        self.assertTrue(isinstance(section.commands['run'], RunSyncRepositoryCommand))
+        self.assertTrue(isinstance(section.commands['run'], sync.RunNpmSyncRepositoryCommand))
 
         section = repo_section.subsections['publish']
         self.assertTrue(isinstance(section.commands['status'], PublishStatusCommand))
@@ -0,0 +1,40 @@
+"""
+This module contains tests for the pulp_npm.extensions.admin.sync module.
+"""
+import unittest
+
+import mock
+
+from pulp_npm.common import constants
+from pulp_npm.extensions.admin import sync
+
+
+class TestRunNpmSyncRepositoryCommand(unittest.TestCase):
+    """
+    This class contains tests for the RunNpmSyncRepositoryCommand class.
+    """
+    @mock.patch('pulp_npm.extensions.admin.sync.RunSyncRepositoryCommand.add_option')
+    @mock.patch('pulp_npm.extensions.admin.sync.RunSyncRepositoryCommand.__init__')
+    def test___init__(self, super___init__, add_option):
+        """
+        Assert correct behavior from __init__().
+        """
+        context = mock.MagicMock()
+        renderer = mock.MagicMock()
+
+        sync.RunNpmSyncRepositoryCommand(context, renderer)
+
+        super___init__.assert_called_once_with(context, renderer)
+        add_option.assert_called_once_with(sync.OPT_DRY_RUN)
+
+    @mock.patch('pulp_npm.extensions.admin.sync.RunSyncRepositoryCommand.add_option')
+    @mock.patch('pulp_npm.extensions.admin.sync.RunSyncRepositoryCommand.__init__')
+    def test_generate_override_config(self, super___init__, add_option):
+        """
+        A dry run is passed to the importer in the override config.
+        """
+        command = sync.RunNpmSyncRepositoryCommand(mock.MagicMock(), mock.MagicMock())
+
+        self.assertEqual(command.generate_override_config(**{sync.OPT_DRY_RUN.keyword: True}),
+                         {constants.CONFIG_KEY_DRY_RUN: True})
+        self.assertEqual(command.generate_override_config(**{sync.OPT_DRY_RUN.keyword: None}), {})
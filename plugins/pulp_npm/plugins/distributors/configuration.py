@@ -1,3 +1,4 @@
+from gettext import gettext as _
 import os
 
 from pulp_npm.common import constants
@@ -9,10 +10,20 @@ def validate_config(config):
 
     :param config: Pulp configuration for the distributor
     :type  config: pulp.plugins.config.PluginCallConfiguration
-    :return:       This always returns (True, None)
+    :return:       A 2-tuple of whether the config is valid, and an error message if it is not
     :rtype:        tuple
-    :raises:       PulpCodedValidationException if any validations failed
     """
+    metrics_dir = config.get(constants.CONFIG_KEY_METRICS_DIR)
+    if metrics_dir is not None and \
+            (not isinstance(metrics_dir, basestring) or not os.path.isabs(metrics_dir)):
+        msg = _('%(key)s must be an absolute path.')
+        return False, msg % {'key': constants.CONFIG_KEY_METRICS_DIR}
+
+    latest_readme_only = config.get(constants.CONFIG_KEY_LATEST_README_ONLY)
+    if latest_readme_only is not None and not isinstance(latest_readme_only, bool):
+        msg = _('%(key)s must be a boolean.')
+        return False, msg % {'key': constants.CONFIG_KEY_LATEST_README_ONLY}
+
     return True, None
 
 
@@ -0,0 +1,132 @@
+"""
+This module contains the WSGI application that serves the tarballs of packages that were
+synchronized with the on_demand download policy. Apache only routes requests here for tarballs that
+are missing from Pulp's storage. The tarball is retrieved from the feed, verified against the
+shasum listed in the package manifest, and stored at the unit's storage path so that every later
+request is served directly by Apache. The feed is reached with the proxy, SSL and basic auth
+settings that the repository's importer had when the repository was published.
+"""
+from gettext import gettext as _
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from pulp.common.config import read_json_config
+
+from pulp_npm.common import constants
+from pulp_npm.plugins import models
+from pulp_npm.plugins.distributors import configuration
+from pulp_npm.plugins.distributors.web import PLUGIN_DEFAULT_CONFIG
+from pulp_npm.plugins.importers import changes
+
+CHUNK_SIZE = 1024 * 1024
+# How long to wait for the feed to answer while retrieving a tarball, in seconds
+FETCH_TIMEOUT = 60
+
+_logger = logging.getLogger(__name__)
+
+
+def application(environ, start_response):
+    """
+    Serve the tarball at the requested path, retrieving it from the feed first if it has not been
+    downloaded yet.
+
+    :param environ:        The WSGI environment
+    :type  environ:        dict
+    :param start_response: The WSGI start_response callable
+    :type  start_response: callable
+    :return:               An iterable over the body of the response
+    :rtype:                iterable
+    """
+    relative_path = os.path.normpath(environ.get('PATH_INFO', '').lstrip('/'))
+    if relative_path.startswith('..') or os.path.isabs(relative_path):
+        return _respond(start_response, '404 Not Found')
+
+    record_path = os.path.join(_get_web_root(), relative_path) + constants.DEFERRED_RECORD_SUFFIX
+    try:
+        with open(record_path) as record_file:
+            record = json.load(record_file)
+    except (IOError, ValueError):
+        return _respond(start_response, '404 Not Found')
+
+    if not os.path.exists(record['storage_path']):
+        try:
+            _fetch(record)
+        except (IOError, ValueError) as e:
+            _logger.error(_('Unable to retrieve %(url)s: %(e)s') % {'url': record['url'], 'e': e})
+            return _respond(start_response, '502 Bad Gateway')
+
+    tarball = open(record['storage_path'], 'rb')
+    start_response('200 OK', [('Content-Type', 'application/octet-stream'),
+                              ('Content-Length', str(os.path.getsize(record['storage_path'])))])
+    file_wrapper = environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None:
+        return file_wrapper(tarball, CHUNK_SIZE)
+    return iter(lambda: tarball.read(CHUNK_SIZE), '')
+
+
+def _fetch(record):
+    """
+    Download the tarball described by the given deferred record to its storage path. The tarball is
+    written to a temporary file next to the storage path and only renamed into place once its
+    checksum has been verified, so a concurrent request never serves a partial tarball.
+
+    :param record: The deferred record that the publisher wrote for the tarball
+    :type  record: dict
+    :raises:       IOError if the tarball could not be downloaded
+    :raises:       ValueError if the checksum of the downloaded tarball doesn't match the record
+    """
+    storage_dir = os.path.dirname(record['storage_path'])
+    if not os.path.exists(storage_dir):
+        os.makedirs(storage_dir)
+
+    opener = changes.build_opener(record.get('feed_config') or {})
+    hasher = hashlib.new(models.DEFAULT_CHECKSUM_TYPE)
+    fd, temp_path = tempfile.mkstemp(dir=storage_dir)
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            response = opener.open(record['url'], timeout=FETCH_TIMEOUT)
+            try:
+                bits = response.read(CHUNK_SIZE)
+                while bits:
+                    hasher.update(bits)
+                    temp_file.write(bits)
+                    bits = response.read(CHUNK_SIZE)
+            finally:
+                response.close()
+        if hasher.hexdigest() != record['shasum']:
+            msg = _('expected checksum %(expected)s, got %(actual)s')
+            raise ValueError(msg % {'expected': record['shasum'], 'actual': hasher.hexdigest()})
+        os.rename(temp_path, record['storage_path'])
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _get_web_root():
+    """
+    Return the directory that the distributor publishes repositories into.
+
+    :return: The web publishing root directory
+    :rtype:  basestring
+    """
+    config = dict(PLUGIN_DEFAULT_CONFIG)
+    config.update(read_json_config(constants.DISTRIBUTOR_CONFIG_FILE_NAME))
+    return os.path.join(configuration.get_root_publish_directory(config), 'web')
+
+
+def _respond(start_response, status):
+    """
+    Send an empty response with the given status.
+
+    :param start_response: The WSGI start_response callable
+    :type  start_response: callable
+    :param status:         The HTTP status line to respond with
+    :type  status:         basestring
+    :return:               An empty body
+    :rtype:                list
+    """
+    start_response(status, [('Content-Type', 'text/plain'), ('Content-Length', '0')])
+    return []
@@ -3,13 +3,26 @@ import json
 import os
 
 from pulp.plugins.util.publish_step import AtomicDirectoryPublishStep, PluginStep
+from pulp.server.db.model import criteria
+from pulp.server.exceptions import MissingResource
+from pulp.server.managers import factory as manager_factory
 
 from pulp_npm.common import constants
+from pulp_npm.plugins import exporter, instrumentation, packuments, readmes
 from pulp_npm.plugins.distributors import configuration
+from pulp_npm.plugins.importers import changes
 from pulp_npm.plugins.models import Package
 
 
-class PublishContentStep(PluginStep):
+# The number of packages whose metadata is rendered from their packuments before it is written
+PUBLISH_BATCH_SIZE = 500
+# The unit metadata keys that only Pulp uses, which are left out of the published metadata: the
+# deferred download flag, the upstream tarball URL, and the index of the dependency edges
+INTERNAL_METADATA_KEYS = (constants.METADATA_KEY_DEFERRED, constants.METADATA_KEY_UPSTREAM_URL,
+                          constants.METADATA_KEY_DEPENDENCIES)
+
+
+class PublishContentStep(instrumentation.InstrumentedStepMixin, PluginStep):
     """
     Publish Content
     """
@@ -29,15 +42,46 @@ class PublishContentStep(PluginStep):
         """
         conduit = self.get_conduit()
         packages = conduit.get_units()
+        self.total_units = len(packages)
+        # The importer settings that deferred tarballs are retrieved with, read when needed
+        feed_config = None
         for p in packages:
             relative_path = os.path.join(p.unit_key['name'], '-', p.metadata['dist']['tarball'])
             symlink_path = os.path.join(self.parent.web_working_dir, relative_path)
             if not os.path.exists(os.path.dirname(symlink_path)):
                 os.makedirs(os.path.dirname(symlink_path))
             os.symlink(p.storage_path, symlink_path)
+            if p.metadata.get(constants.METADATA_KEY_DEFERRED) and \
+                    not os.path.exists(p.storage_path):
+                if feed_config is None:
+                    feed_config = _get_feed_config(self.get_repo().id)
+                self._write_deferred_record(p, symlink_path, feed_config)
+            self.progress_successes += 1
+
+    @staticmethod
+    def _write_deferred_record(unit, symlink_path, feed_config):
+        """
+        Write the file that the deferred download application uses to retrieve the tarball of a
+        unit that was synchronized with the on_demand download policy. It is written next to the
+        unit's symlink, which dangles until the tarball has been retrieved.
+
+        :param unit:         The unit whose tarball has not been downloaded yet
+        :type  unit:         pulp.plugins.model.Unit
+        :param symlink_path: The path of the symlink that was published for the unit
+        :type  symlink_path: basestring
+        :param feed_config:  The importer settings that the tarball is retrieved with, as returned
+                             by _get_feed_config()
+        :type  feed_config:  dict
+        """
+        record = {'url': unit.metadata[constants.METADATA_KEY_UPSTREAM_URL],
+                  'shasum': unit.metadata['dist']['shasum'],
+                  'storage_path': unit.storage_path,
+                  'feed_config': feed_config}
+        with open(symlink_path + constants.DEFERRED_RECORD_SUFFIX, 'w') as record_file:
+            json.dump(record, record_file)
 
 
-class PublishMetadataStep(PluginStep):
+class PublishMetadataStep(instrumentation.InstrumentedStepMixin, PluginStep):
     """
     Publish Metadata (refs, branch heads, etc)
     """
@@ -53,76 +97,171 @@ class PublishMetadataStep(PluginStep):
 
     def process_main(self):
         """
-        Publish all the Npm metadata.
+        Publish all the Npm metadata. The metadata of a package is rendered from its packument if
+        the packument holds exactly the versions of the package in the repository. The metadata of
+        the other packages is built from their units, and their packuments are rebuilt from them.
         """
 
         os.makedirs(self.parent.web_working_dir)
 
         conduit = self.get_conduit()
-        packages = conduit.get_units()
-        metadata = self._construct_metadata(packages, self.parent.publish_domain,
-                                            self.parent.repo_name)
+        store = self.parent.packument_store
+        repo_id = self.parent.repo_name
+        latest_readme_only = self.get_config().get(constants.CONFIG_KEY_LATEST_README_ONLY, False)
+
+        search = criteria.UnitAssociationCriteria(type_ids=[constants.PACKAGE_TYPE_ID],
+                                                  unit_fields=['name', 'version'])
+        in_repo = {}
+        for unit in conduit.get_units(criteria=search):
+            in_repo.setdefault(unit.unit_key['name'], set()).add(unit.unit_key['version'])
+        self.total_units = len(in_repo)
+
+        stale = set(in_repo)
+        removed = []
+        upstream_tags = {}
+        metadata = {}
+        for document in store.find(repo_id):
+            name = document['name']
+            if name not in in_repo:
+                removed.append(name)
+            elif not document.get('oversize') and \
+                    set(document.get('all_versions', [])) == in_repo[name]:
+                stale.discard(name)
+                metadata[name] = self._render_packument(document, self.parent.publish_domain,
+                                                        repo_id)
+                if len(metadata) >= PUBLISH_BATCH_SIZE:
+                    _finish_metadata(metadata, latest_readme_only)
+                    self._write_metadata(metadata)
+                    metadata = {}
+            else:
+                # The rebuilt packument keeps the dist-tags that the last sync stored in it
+                upstream_tags[name] = document.get('upstream_dist_tags')
+        _finish_metadata(metadata, latest_readme_only)
+        self._write_metadata(metadata)
+        store.remove(repo_id, removed)
+
+        stale = sorted(stale)
+        for i in xrange(0, len(stale), packuments.QUERY_BATCH_SIZE):
+            search = criteria.UnitAssociationCriteria(
+                type_ids=[constants.PACKAGE_TYPE_ID],
+                unit_filters={'name': {'$in': stale[i:i + packuments.QUERY_BATCH_SIZE]}})
+            packages = conduit.get_units(criteria=search)
+            versions = {}
+            for p in packages:
+                versions.setdefault(p.unit_key['name'], {})[p.unit_key['version']] = p.metadata
+            # The packuments are rebuilt first, as building the metadata decodes the units' in place
+            for name in sorted(versions):
+                store.replace(repo_id, name, versions[name], upstream_tags.get(name))
+            self._write_metadata(self._construct_metadata(
+                packages, self.parent.publish_domain, repo_id, latest_readme_only,
+                upstream_tags=upstream_tags))
 
+    def _write_metadata(self, metadata):
+        """
+        Write the metadata of each of the given packages to its file.
+
+        :param metadata: Maps package names to their metadata
+        :type  metadata: dict
+        """
         for package_name in metadata:
             meta_path = os.path.join(self.parent.web_working_dir, package_name + '.json')
+            if not os.path.exists(os.path.dirname(meta_path)):
+                os.makedirs(os.path.dirname(meta_path))
             with open(meta_path, 'w') as meta_file:
                 json.dump(metadata[package_name], meta_file)
+                self.bytes_moved += meta_file.tell()
+            self.progress_successes += 1
+
+    @staticmethod
+    def _render_packument(document, publish_domain, repo_name):
+        """
+        Render the metadata of a package from its packument.
+
+        :param document:       The packument
+        :type  document:       dict
+        :param publish_domain: The domain that the repository is published at
+        :type  publish_domain: basestring
+        :param repo_name:      The ID of the repository
+        :type  repo_name:      basestring
+        :return:               The package's metadata, whose readmes may still be in the readme
+                               store
+        :rtype:                dict
+        """
+        name = document['name']
+        package_meta = dict(document.get('fields', {}))
+        Package.decode_metadata(package_meta)
+        package_meta['versions'] = {}
+        for key, version_metadata in document['versions'].items():
+            version = packuments.decode_version(key)
+            package_meta['versions'][version] = _version_metadata(
+                name, version, version_metadata, publish_domain, repo_name)
+        package_meta.update({'name': name, '_id': name, '_attachments': {},
+                             'dist-tags': dict(document['dist-tags'])})
+        return package_meta
 
     @staticmethod
-    def _construct_metadata(packages, publish_domain, repo_name):
+    def _construct_metadata(packages, publish_domain, repo_name, latest_readme_only=False,
+                            readme_store=None, upstream_tags=None):
         """
         Method that reconstructs all the packages metadata into the format required by npm
+
+        :param packages:           The units of the repository
+        :type  packages:           list of pulp.plugins.model.Unit
+        :param publish_domain:     The domain that the repository is published at
+        :type  publish_domain:     basestring
+        :param repo_name:          The ID of the repository
+        :type  repo_name:          basestring
+        :param latest_readme_only: If True, the readme of the latest version of each package is
+                                   only published at the top of its metadata, and not with each
+                                   version
+        :type  latest_readme_only: bool
+        :param readme_store:       The store of the readmes that are kept out of the units.
+                                   Defaults to the one in Pulp's database.
+        :type  readme_store:       pulp_npm.plugins.readmes.ReadmeStore
+        :param upstream_tags:      Maps package names to their dist-tags in the registry they were
+                                   synchronized from. The tags that point to a version in the
+                                   repository are published.
+        :type  upstream_tags:      dict
+        :return:                   Maps package names to their metadata
+        :rtype:                    dict
         """
-        # TODO The metadata isn't complete, add as neccessary
         metadata = {}
-        # First pass which aggregates the packages by name, inserts simply deducable metadata
+        # First pass which inserts the metadata of each version
         for p in packages:
-            if p.unit_key['name'] not in metadata:
-                metadata[p.unit_key['name']] = {'versions': {}}
+            name, version = p.unit_key['name'], p.unit_key['version']
+            package_meta = metadata.setdefault(name, {'versions': {}})
+            package_meta['versions'][version] = _version_metadata(
+                name, version, p.metadata, publish_domain, repo_name)
 
-            package_meta = metadata[p.unit_key['name']]
-            package_meta['versions'][p.unit_key['version']] = p.metadata.copy()
-
-            version_meta = package_meta['versions'][p.unit_key['version']]
-            Package.decode_metadata(version_meta)
-            # Because _id is a reserved key in MongoDB
-            if 'id' in version_meta:
-                version_meta['_id'] = version_meta.pop('id', None)
-            else:
-                version_meta['_id'] = p.unit_key['name'] + '@' + p.unit_key['version']
-
-            version_meta['version'] = p.unit_key['version']
-            version_meta['name'] = p.unit_key['name']
-            # TODO add HTTPS
-            # The tarball must contain the whole link not just the name of the file
-            version_meta['dist']['tarball'] = 'http://' + publish_domain + '/pulp/npm/web/' + \
-                                              repo_name + '/' + p.unit_key['name'] + '/-/' + \
-                                              version_meta['dist']['tarball']
         # Second pass which inserts metadata for which we need to know all the versions
         # of a given package before we can correctly insert them
-        explicit_meta = ['author', 'bugs', 'contributors', 'description', 'homepage', 'keywords',
-                         'license', 'maintainers', 'readme', 'readmeFilename', 'repository']
-
         for package_name in metadata:
             package_meta = metadata[package_name]
             package_meta['name'] = package_name
             package_meta['_id'] = package_name
             package_meta['_attachments'] = {}
-            latest = _get_latest_version(package_meta['versions'].keys())
-            package_meta['dist-tags'] = {'latest': latest}
-            for meta in explicit_meta:
-                if meta in package_meta['versions'][latest]:
-                    package_meta[meta] = package_meta['versions'][latest][meta]
+            dist_tags, fields = packuments.summarize(package_meta['versions'],
+                                                     (upstream_tags or {}).get(package_name))
+            package_meta['dist-tags'] = dist_tags
+            package_meta.update(fields)
+
+        _finish_metadata(metadata, latest_readme_only, readme_store)
         return metadata
 
 
-class NpmPublisher(PluginStep):
+class PublishOverHttpStep(instrumentation.InstrumentedStepMixin, AtomicDirectoryPublishStep):
+    """
+    Move the published files into place, measuring how long it takes.
+    """
+
+
+class NpmPublisher(instrumentation.InstrumentedStepMixin, PluginStep):
     """
     Publisher class that is responsible for the actual publishing
     of a repository via a web server.
     """
 
-    def __init__(self, repo, publish_conduit, config):
+    def __init__(self, repo, publish_conduit, config, packument_store=None):
         """
         :param repo:            Pulp managed Npm repository
         :type  repo:            pulp.plugins.model.Repository
@@ -130,21 +269,31 @@ class NpmPublisher(PluginStep):
         :type  publish_conduit: pulp.plugins.conduits.repo_publish.RepoPublishConduit
         :param config:          Pulp configuration for the distributor
         :type  config:          pulp.plugins.config.PluginCallConfiguration
+        :param packument_store: The packuments of the packages. Defaults to the ones in Pulp's
+                                database.
+        :type  packument_store: pulp_npm.plugins.packuments.PackumentStore
         """
+        metrics_dir = config.get(constants.CONFIG_KEY_METRICS_DIR)
+        if metrics_dir:
+            publish_conduit = exporter.CountingConduit(publish_conduit)
         super(NpmPublisher, self).__init__(constants.PUBLISH_STEP_PUBLISHER,
                                            repo, publish_conduit, config)
+        if metrics_dir:
+            self._exporter = exporter.TextfileExporter(metrics_dir, 'distributor', repo.id,
+                                                       publish_conduit)
 
         self.repo_name = repo.id
+        self.packument_store = packument_store or packuments.PackumentStore()
         publish_dir = configuration.get_web_publish_dir(repo, config)
         self.publish_domain = configuration.get_web_publish_domain(config)
         if not os.path.exists(self.get_working_dir()):
             os.makedirs(self.get_working_dir())
         self.web_working_dir = os.path.join(self.get_working_dir(), repo.id)
         master_publish_dir = configuration.get_master_publish_dir(repo, config)
-        atomic_publish_step = AtomicDirectoryPublishStep(self.get_working_dir(),
-                                                         [(repo.id, publish_dir)],
-                                                         master_publish_dir,
-                                                         step_type=constants.PUBLISH_STEP_OVER_HTTP)
+        atomic_publish_step = PublishOverHttpStep(self.get_working_dir(),
+                                                  [(repo.id, publish_dir)],
+                                                  master_publish_dir,
+                                                  step_type=constants.PUBLISH_STEP_OVER_HTTP)
         atomic_publish_step.description = _('Making files available via web.')
 
         self.add_child(PublishMetadataStep())
@@ -152,54 +301,107 @@ class NpmPublisher(PluginStep):
         self.add_child(atomic_publish_step)
 
 
-def _get_latest_version(versions):
-    # Removes pre-release versions
-    without_pre = [ver for ver in versions if len(ver.split('.')) <= 3]
-    if len(without_pre) > 0:
-        return sorted(without_pre, cmp=_version_cmp)[-1]
+def _get_feed_config(repo_id):
+    """
+    Return the proxy, SSL and basic auth settings of the repository's importer, so that the
+    deferred download application reaches the feed the way the sync did.
+
+    :param repo_id: The ID of the repository
+    :type  repo_id: basestring
+    :return:        The importer's settings that are listed in changes.OPENER_CONFIG_KEYS
+    :rtype:         dict
+    """
+    try:
+        importer = manager_factory.repo_importer_manager().get_importer(repo_id)
+    except MissingResource:
+        return {}
+    config = importer.get('config') or {}
+    return dict([(k, config[k]) for k in changes.OPENER_CONFIG_KEYS if k in config])
+
+
+def _version_metadata(name, version, unit_metadata, publish_domain, repo_name):
+    """
+    Build the metadata that npm expects for a version of a package from the metadata of its unit.
+
+    :param name:           The name of the package
+    :type  name:           basestring
+    :param version:        The version
+    :type  version:        basestring
+    :param unit_metadata:  The metadata of the version's unit. The objects nested in it are
+                           decoded in place.
+    :type  unit_metadata:  dict
+    :param publish_domain: The domain that the repository is published at
+    :type  publish_domain: basestring
+    :param repo_name:      The ID of the repository
+    :type  repo_name:      basestring
+    :return:               The version's metadata
+    :rtype:                dict
+    """
+    version_meta = unit_metadata.copy()
+    Package.decode_metadata(version_meta)
+    for key in INTERNAL_METADATA_KEYS:
+        version_meta.pop(key, None)
+    # Because _id is a reserved key in MongoDB
+    if 'id' in version_meta:
+        version_meta['_id'] = version_meta.pop('id', None)
     else:
-        return sorted(versions, cmp=_version_cmp)[-1]
-
-
-def _version_cmp(v1, v2):
-    # This function assumes that two exactly same versions will never be compared
-    # If this predicate gets broken, the function will fail
-    ver1 = v1.split('-')[0].split('.')
-    ver2 = v2.split('-')[0].split('.')
-    for i in xrange(3):
-        if int(ver1[i]) < int(ver2[i]):
-            return -1
-        elif int(ver1[i]) > int(ver2[i]):
-            return 1
-    # If function arrives here, the X.X.X of the versions match,
-    # therefore a remainder must exist in at least one of them
-
-    # Ensures if a "worded" version is compared with a normal version
-    # The normal version is always bigger
-    if len(v1.split('-')) > len(v2.split('-')):
-        return -1
-    elif len(v1.split('-')) < len(v2.split('-')):
-        return 1
-
-    rem1 = v1.split('-')[1].split('.')[0]
-    rem2 = v2.split('-')[1].split('.')[0]
-    if rem1 < rem2:
-        return -1
-    elif rem1 > rem2:
-        return 1
-    # If function arrives here, the X.X.X-word of the versions match,
-    # therefore a pre-release must be specified in at least one of them
-
-    # Ensures if a pre release version is compared with a released version
-    # The pre release is always lower
-    if len(v1.split('.')) > len(v2.split('.')):
-        return -1
-    elif len(v1.split('.')) < len(v2.split('.')):
-        return 1
-
-    pre1 = v1.split('.')[-1]
-    pre2 = v2.split('.')[-1]
-    if int(pre1) < int(pre2):
-        return -1
-    elif int(pre1) > int(pre2):
-        return 1
+        version_meta['_id'] = name + '@' + version
+
+    version_meta['version'] = version
+    version_meta['name'] = name
+    # TODO add HTTPS
+    # The tarball must contain the whole link not just the name of the file
+    version_meta['dist'] = dict(version_meta['dist'])
+    version_meta['dist']['tarball'] = 'http://' + publish_domain + '/pulp/npm/web/' + \
+                                      repo_name + '/' + name + '/-/' + \
+                                      version_meta['dist']['tarball']
+    return version_meta
+
+
+def _finish_metadata(metadata, latest_readme_only=False, readme_store=None):
+    """
+    Settle the readmes of the given packages' metadata, whose top level fields are already set.
+
+    :param metadata:           Maps package names to their metadata
+    :type  metadata:           dict
+    :param latest_readme_only: If True, the readme of the latest version of each package is only
+                               published at the top of its metadata, and not with each version
+    :type  latest_readme_only: bool
+    :param readme_store:       The store of the readmes that are kept out of the units. Defaults
+                               to the one in Pulp's database.
+    :type  readme_store:       pulp_npm.plugins.readmes.ReadmeStore
+    """
+    if latest_readme_only:
+        for package_meta in metadata.values():
+            for version_meta in package_meta['versions'].values():
+                version_meta.pop('readme', None)
+                version_meta.pop(constants.METADATA_KEY_README, None)
+    _restore_readmes(metadata, readme_store)
+
+
+def _restore_readmes(metadata, readme_store=None):
+    """
+    Put the readmes that are kept out of the units back into the metadata of the packages and of
+    their versions. They are fetched from the readme store, which is only queried if there are
+    any.
+
+    :param metadata:     Maps package names to their metadata
+    :type  metadata:     dict
+    :param readme_store: The store of the readmes. Defaults to the one in Pulp's database.
+    :type  readme_store: pulp_npm.plugins.readmes.ReadmeStore
+    """
+    documents = []
+    for package_meta in metadata.values():
+        documents.append(package_meta)
+        documents.extend(package_meta['versions'].values())
+    keys = set([d[constants.METADATA_KEY_README] for d in documents
+                if constants.METADATA_KEY_README in d])
+    if not keys:
+        return
+    if readme_store is None:
+        readme_store = readmes.ReadmeStore()
+    found = readme_store.get_many(sorted(keys))
+    for document in documents:
+        key = document.pop(constants.METADATA_KEY_README, None)
+        if key in found:
+            document['readme'] = found[key]
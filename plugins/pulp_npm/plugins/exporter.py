@@ -0,0 +1,210 @@
+"""
+This module contains the export of the metrics of syncs and publishes in the textfile format of the
+Prometheus node exporter. The exporter rewrites the file of the repository each time a step
+completes, so that the node exporter's textfile collector can pick the metrics up without any other
+service. The file is replaced atomically, so the collector never reads a partial file.
+"""
+from gettext import gettext as _
+import logging
+import os
+import tempfile
+import threading
+import time
+
+# The conduit methods that reach Pulp's database
+DB_METHODS = ('associate_existing', 'get_repo_scratchpad', 'get_scratchpad', 'get_units',
+              'link_unit', 'remove_unit', 'save_unit', 'search_all_units', 'set_repo_scratchpad',
+              'set_scratchpad')
+
+# The metrics of each step, as (metric name, key in the step's metrics, help text)
+STEP_METRICS = (
+    ('pulp_npm_step_duration_seconds', 'wall_seconds', 'Wall time that the step took.'),
+    ('pulp_npm_step_cpu_seconds', 'cpu_seconds', 'CPU time that the process used during the step.'),
+    ('pulp_npm_step_bytes', 'bytes', 'Bytes that the step downloaded or wrote.'),
+    ('pulp_npm_step_items', 'items', 'Items that the step processed.'),
+    ('pulp_npm_step_failures', 'failures', 'Items, such as downloads, that failed in the step.'),
+    ('pulp_npm_step_retries', 'retries', 'Downloads that the step retried or failed over.'))
+
+_logger = logging.getLogger(__name__)
+
+
+class CountingConduit(object):
+    """
+    Forwards everything to a conduit, counting the calls to its methods that reach the database,
+    and the units that are associated with the repository. Steps call the conduit from the
+    downloader's threads too.
+    """
+
+    def __init__(self, conduit):
+        """
+        Initialize the CountingConduit.
+
+        :param conduit: The conduit to forward to
+        :type  conduit: pulp.plugins.conduits.mixins.RepoScratchPadMixin
+        """
+        self._conduit = conduit
+        self._lock = threading.Lock()
+        # Maps method names to the number of calls made to them
+        self.calls = {}
+        self.units_associated = 0
+
+    def __getattr__(self, name):
+        """
+        Return the conduit's attribute, wrapping the methods that reach the database.
+
+        :param name: The name of the attribute
+        :type  name: basestring
+        :return:     The attribute
+        :rtype:      object
+        """
+        attribute = getattr(self._conduit, name)
+        if name not in DB_METHODS:
+            return attribute
+
+        def counted(*args, **kwargs):
+            self._lock.acquire()
+            try:
+                self.calls[name] = self.calls.get(name, 0) + 1
+                if name == 'associate_existing':
+                    self.units_associated += len(args[1])
+            finally:
+                self._lock.release()
+            return attribute(*args, **kwargs)
+        return counted
+
+
+class TextfileExporter(object):
+    """
+    Writes the metrics of a sync or publish to <directory>/pulp_npm_<plugin>_<repo id>.prom.
+    """
+
+    def __init__(self, directory, plugin, repo_id, conduit):
+        """
+        Initialize the TextfileExporter.
+
+        :param directory: The directory that the node exporter's textfile collector reads
+        :type  directory: basestring
+        :param plugin:    importer or distributor
+        :type  plugin:    basestring
+        :param repo_id:   The ID of the repository
+        :type  repo_id:   basestring
+        :param conduit:   The conduit of the task, whose calls are counted
+        :type  conduit:   CountingConduit
+        """
+        self.path = os.path.join(directory, 'pulp_npm_%s_%s.prom' % (plugin, repo_id))
+        self._labels = {'plugin': plugin, 'repo': repo_id}
+        self._conduit = conduit
+        self._lock = threading.Lock()
+
+    def write(self, step):
+        """
+        Write the metrics of the given step and its descendants, replacing the previous file. A
+        file that can't be written is logged, rather than failing the task.
+
+        :param step: The top level step of the task
+        :type  step: pulp_npm.plugins.instrumentation.InstrumentedStepMixin
+        """
+        self._lock.acquire()
+        try:
+            self._write(self.render(step))
+        except (IOError, OSError) as e:
+            _logger.warning(_('Could not write the metrics to %(path)s: %(error)s') %
+                            {'path': self.path, 'error': e})
+        finally:
+            self._lock.release()
+
+    def render(self, step):
+        """
+        Render the metrics of the given step and its descendants in the textfile format.
+
+        :param step: The top level step of the task
+        :type  step: pulp_npm.plugins.instrumentation.InstrumentedStepMixin
+        :return:     The contents of the textfile
+        :rtype:      basestring
+        """
+        steps = []
+        pending = [step]
+        while pending:
+            s = pending.pop(0)
+            if getattr(s, 'metrics', None) is not None:
+                steps.append(s)
+            pending.extend(s.children)
+
+        lines = []
+        for metric, key, help_text in STEP_METRICS:
+            samples = [(dict(self._labels, step=m.step_id), m.metrics[key]) for m in steps
+                       if m.metrics.get(key) is not None]
+            lines.extend(_metric(metric, help_text, samples))
+
+        calls = sorted(self._conduit.calls.items())
+        lines.extend(_metric(
+            'pulp_npm_db_calls', 'Calls to Pulp\'s database made through the conduit.',
+            [(dict(self._labels, method=method), count) for method, count in calls]))
+        lines.extend(_metric('pulp_npm_units_added', 'Units that were saved to Pulp.',
+                             [(self._labels, self._conduit.calls.get('save_unit', 0))]))
+        lines.extend(_metric('pulp_npm_units_associated',
+                             'Units in Pulp that were associated with the repository.',
+                             [(self._labels, self._conduit.units_associated)]))
+        lines.extend(_metric('pulp_npm_last_update_timestamp_seconds',
+                             'When the metrics were last written.', [(self._labels, time.time())]))
+        return '\n'.join(lines) + '\n'
+
+    def _write(self, contents):
+        """
+        Replace the textfile with the given contents. They are written to a temporary file in the
+        same directory first, which is renamed over the textfile.
+
+        :param contents: The contents of the textfile
+        :type  contents: basestring
+        """
+        if isinstance(contents, unicode):
+            contents = contents.encode('utf-8')
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.pulp_npm_', suffix='.tmp')
+        try:
+            try:
+                os.write(fd, contents)
+            finally:
+                os.close(fd)
+            os.chmod(temp_path, 0644)
+            os.rename(temp_path, self.path)
+        except (IOError, OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def _metric(name, help_text, samples):
+    """
+    Render a gauge in the textfile format.
+
+    :param name:      The name of the metric
+    :type  name:      basestring
+    :param help_text: The description of the metric
+    :type  help_text: basestring
+    :param samples:   (labels, value) tuples, where labels is a dictionary
+    :type  samples:   list
+    :return:          The lines of the metric, or no lines if it has no samples
+    :rtype:           list
+    """
+    if not samples:
+        return []
+    lines = ['# HELP %s %s' % (name, help_text), '# TYPE %s gauge' % name]
+    for labels, value in samples:
+        label_text = ','.join(['%s="%s"' % (k, _escape(labels[k])) for k in sorted(labels)])
+        lines.append('%s{%s} %s' % (name, label_text, repr(float(value))))
+    return lines
+
+
+def _escape(value):
+    """
+    Escape a label value for the textfile format.
+
+    :param value: The value of a label
+    :type  value: basestring
+    :return:      The escaped value
+    :rtype:       basestring
+    """
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
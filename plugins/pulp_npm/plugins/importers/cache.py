@@ -0,0 +1,182 @@
+"""
+This module contains the download cache that lets a sync pick up where a failed one stopped.
+Tarballs are downloaded into a directory that outlives the sync, in a subdirectory named after
+their URL and checksum, so that they keep their own file names. A tarball that is still being
+downloaded carries a suffix, so that a later sync can tell it apart from a complete one and resume
+it with an HTTP Range request.
+"""
+from gettext import gettext as _
+import hashlib
+import logging
+import os
+import urllib2
+
+# The directory, inside the repository's working directory, that holds the download cache
+CACHE_DIR = 'download_cache'
+PARTIAL_SUFFIX = '.part'
+CHUNK_SIZE = 1024 * 1024
+# How long to wait for the server while resuming a download, in seconds
+RESUME_TIMEOUT = 60
+
+_logger = logging.getLogger(__name__)
+
+
+class DownloadCache(object):
+    """
+    A directory of downloaded tarballs, keyed by their URL and checksum.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize the DownloadCache.
+
+        :param path: The directory that holds the cached tarballs. It is created when needed.
+        :type  path: basestring
+        """
+        self.path = path
+
+    def entry_path(self, url, checksum):
+        """
+        Return the path that the complete tarball at the given URL is cached at.
+
+        :param url:      The URL of a tarball
+        :type  url:      basestring
+        :param checksum: The checksum or integrity string that the tarball is expected to have
+        :type  checksum: basestring
+        :return:         The path of the cache entry
+        :rtype:          basestring
+        """
+        key = hashlib.sha1('%s %s' % (url, checksum)).hexdigest()
+        return os.path.join(self.path, key, os.path.basename(url))
+
+    def partial_path(self, url, checksum):
+        """
+        Return the path that the tarball at the given URL is downloaded to, until it is complete.
+
+        :param url:      The URL of a tarball
+        :type  url:      basestring
+        :param checksum: The checksum or integrity string that the tarball is expected to have
+        :type  checksum: basestring
+        :return:         The path of the partial cache entry
+        :rtype:          basestring
+        """
+        return self.entry_path(url, checksum) + PARTIAL_SUFFIX
+
+    def prepare(self, url, checksum):
+        """
+        Create the directory that the tarball at the given URL is downloaded into.
+
+        :param url:      The URL of a tarball
+        :type  url:      basestring
+        :param checksum: The checksum or integrity string that the tarball is expected to have
+        :type  checksum: basestring
+        """
+        entry_dir = os.path.dirname(self.entry_path(url, checksum))
+        if not os.path.exists(entry_dir):
+            os.makedirs(entry_dir)
+
+    def lookup(self, url, checksum):
+        """
+        Return the path of the complete tarball at the given URL, if it is cached.
+
+        :param url:      The URL of a tarball
+        :type  url:      basestring
+        :param checksum: The checksum or integrity string that the tarball is expected to have
+        :type  checksum: basestring
+        :return:         The path of the cached tarball, or None if it isn't cached
+        :rtype:          basestring
+        """
+        path = self.entry_path(url, checksum)
+        if os.path.exists(path):
+            return path
+        return None
+
+    def has_partial(self, url, checksum):
+        """
+        Return whether part of the tarball at the given URL was downloaded by an earlier sync.
+
+        :param url:      The URL of a tarball
+        :type  url:      basestring
+        :param checksum: The checksum or integrity string that the tarball is expected to have
+        :type  checksum: basestring
+        :return:         True if a non-empty partial download exists
+        :rtype:          bool
+        """
+        path = self.partial_path(url, checksum)
+        return os.path.exists(path) and os.path.getsize(path) > 0
+
+    def commit(self, path):
+        """
+        Mark the download at the given path as complete.
+
+        :param path: The path of a partial or complete cache entry
+        :type  path: basestring
+        :return:     The path of the complete cache entry
+        :rtype:      basestring
+        """
+        if path.endswith(PARTIAL_SUFFIX):
+            complete_path = path[:-len(PARTIAL_SUFFIX)]
+            os.rename(path, complete_path)
+            return complete_path
+        return path
+
+    def discard(self, path):
+        """
+        Remove the cache entry at the given path, such as a tarball whose checksum didn't match or
+        one that has been moved into Pulp's storage.
+
+        :param path: The path of a partial or complete cache entry
+        :type  path: basestring
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        entry_dir = os.path.dirname(path)
+        if os.path.isdir(entry_dir) and not os.listdir(entry_dir):
+            os.rmdir(entry_dir)
+
+    def resume(self, url, checksum, opener=None):
+        """
+        Finish downloading the tarball at the given URL, asking the server for only the bytes that
+        an earlier sync didn't get. Servers that ignore the Range header send the whole tarball,
+        which then replaces the partial download.
+
+        :param url:      The URL of a tarball
+        :type  url:      basestring
+        :param checksum: The checksum or integrity string that the tarball is expected to have
+        :type  checksum: basestring
+        :param opener:   The opener to download with, as built by changes.build_opener(), so that
+                         the importer's proxy, SSL and basic auth settings are used
+        :type  opener:   urllib2.OpenerDirector
+        :return:         The path of the complete cache entry
+        :rtype:          basestring
+        :raises:         IOError if the tarball could not be downloaded
+        """
+        self.prepare(url, checksum)
+        path = self.partial_path(url, checksum)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        _logger.info(_('Resuming the download of %(url)s from byte %(offset)d.') %
+                     {'url': url, 'offset': offset})
+
+        opener = opener or urllib2.build_opener()
+        download_request = urllib2.Request(url)
+        if offset:
+            download_request.add_header('Range', 'bytes=%d-' % offset)
+        try:
+            response = opener.open(download_request, timeout=RESUME_TIMEOUT)
+        except urllib2.HTTPError as e:
+            if e.code != 416:
+                raise
+            # The partial download isn't a prefix of the tarball, so start over
+            os.remove(path)
+            response = opener.open(url, timeout=RESUME_TIMEOUT)
+
+        mode = 'ab' if response.getcode() == 206 else 'wb'
+        try:
+            with open(path, mode) as partial_file:
+                bits = response.read(CHUNK_SIZE)
+                while bits:
+                    partial_file.write(bits)
+                    bits = response.read(CHUNK_SIZE)
+        finally:
+            response.close()
+        return self.commit(path)
@@ -0,0 +1,165 @@
+"""
+This module contains the means for following the CouchDB _changes feed of an npm registry replica,
+such as https://replicate.npmjs.com/, so that a sync only needs to process the packages that
+changed since the previous one.
+"""
+import base64
+import json
+import ssl
+import urllib
+import urllib2
+from urlparse import urljoin
+
+from pulp.common.plugins import importer_constants
+
+# The number of changes that are requested from the feed at once
+CHANGES_BATCH_SIZE = 1000
+# How long to wait for the feed to answer a request, in seconds
+CHANGES_TIMEOUT = 60
+# The importer settings that build_opener() reads
+OPENER_CONFIG_KEYS = (importer_constants.KEY_PROXY_HOST, importer_constants.KEY_PROXY_PORT,
+                      importer_constants.KEY_PROXY_USER, importer_constants.KEY_PROXY_PASS,
+                      importer_constants.KEY_SSL_CA_CERT, importer_constants.KEY_SSL_VALIDATION,
+                      importer_constants.KEY_BASIC_AUTH_USER,
+                      importer_constants.KEY_BASIC_AUTH_PASS)
+
+
+def build_opener(config):
+    """
+    Build the opener that the feed is read with, which goes through the proxy, trusts the CA
+    certificate and sends the basic auth credentials that the importer is configured with.
+
+    :param config: plugin configuration
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+    :return:       The opener
+    :rtype:        urllib2.OpenerDirector
+    """
+    handlers = []
+    if config.get(importer_constants.KEY_PROXY_HOST):
+        proxy_url = _proxy_url(config)
+        handlers.append(urllib2.ProxyHandler({'http': proxy_url, 'https': proxy_url}))
+
+    ca_cert = config.get(importer_constants.KEY_SSL_CA_CERT)
+    validate = config.get(importer_constants.KEY_SSL_VALIDATION, True)
+    # Pythons older than 2.7.9 never validate the certificates of HTTPS servers
+    if (ca_cert or not validate) and hasattr(ssl, 'create_default_context'):
+        context = ssl.create_default_context(cadata=ca_cert)
+        if not validate:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        handlers.append(urllib2.HTTPSHandler(context=context))
+    opener = urllib2.build_opener(*handlers)
+
+    username = config.get(importer_constants.KEY_BASIC_AUTH_USER)
+    if username:
+        password = config.get(importer_constants.KEY_BASIC_AUTH_PASS) or ''
+        credentials = base64.b64encode('%s:%s' % (username, password))
+        opener.addheaders.append(('Authorization', 'Basic %s' % credentials))
+    return opener
+
+
+def get_update_seq(feed_url, opener=None):
+    """
+    Return the sequence number of the latest change in the given feed.
+
+    :param feed_url: The URL of the CouchDB database whose changes are followed
+    :type  feed_url: basestring
+    :param opener:   The opener to read the feed with, as built by build_opener()
+    :type  opener:   urllib2.OpenerDirector
+    :return:         The feed's current sequence number. CouchDB 2 sequence numbers are opaque
+                     strings, while older versions use integers.
+    :rtype:          basestring or int
+    :raises:         IOError if the feed could not be read
+    """
+    return _get_json(_database_url(feed_url), opener)['update_seq']
+
+
+def get_changed_packages(feed_url, since, batch_size=CHANGES_BATCH_SIZE, opener=None):
+    """
+    Return the names of the packages that changed in the given feed after the given sequence
+    number, and the sequence number of the last of those changes. Deleted packages and design
+    documents are left out.
+
+    :param feed_url:   The URL of the CouchDB database whose changes are followed
+    :type  feed_url:   basestring
+    :param since:      The sequence number that the previous sync stopped at
+    :type  since:      basestring or int
+    :param batch_size: The number of changes to request at once
+    :type  batch_size: int
+    :param opener:     The opener to read the feed with, as built by build_opener()
+    :type  opener:     urllib2.OpenerDirector
+    :return:           A 2-tuple of the list of changed package names, in the order that they
+                       first changed, and the sequence number to continue from next time
+    :rtype:            tuple
+    :raises:           IOError if the feed could not be read
+    """
+    changes_url = urljoin(_database_url(feed_url), '_changes')
+    names = []
+    seen = set()
+    while True:
+        query = urllib.urlencode({'since': since, 'limit': batch_size})
+        page = _get_json('%s?%s' % (changes_url, query), opener)
+        for change in page['results']:
+            name = change['id']
+            if change.get('deleted') or name.startswith('_design/') or name in seen:
+                continue
+            seen.add(name)
+            names.append(name)
+        since = page['last_seq']
+        if len(page['results']) < batch_size:
+            return names, since
+
+
+def _database_url(feed_url):
+    """
+    Return the given URL with a trailing slash, so that paths can be joined to it.
+
+    :param feed_url: The URL of a CouchDB database
+    :type  feed_url: basestring
+    :return:         The URL, ending with a slash
+    :rtype:          basestring
+    """
+    if not feed_url.endswith('/'):
+        feed_url += '/'
+    return feed_url
+
+
+def _proxy_url(config):
+    """
+    Return the URL of the configured proxy, with its port and credentials.
+
+    :param config: plugin configuration
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+    :return:       The URL of the proxy
+    :rtype:        basestring
+    """
+    scheme, separator, host = config.get(importer_constants.KEY_PROXY_HOST).rpartition('://')
+    port = config.get(importer_constants.KEY_PROXY_PORT)
+    if port:
+        host = '%s:%s' % (host.rstrip('/'), port)
+    username = config.get(importer_constants.KEY_PROXY_USER)
+    if username:
+        password = config.get(importer_constants.KEY_PROXY_PASS) or ''
+        host = '%s:%s@%s' % (urllib.quote(username, ''), urllib.quote(password, ''), host)
+    return '%s://%s' % (scheme or 'http', host)
+
+
+def _get_json(url, opener=None):
+    """
+    Retrieve and parse the JSON document at the given URL.
+
+    :param url:    The URL of a JSON document
+    :type  url:    basestring
+    :param opener: The opener to retrieve the document with. The default opener is used if None.
+    :type  opener: urllib2.OpenerDirector
+    :return:       The parsed document
+    :rtype:        dict
+    :raises:       IOError if the document could not be retrieved
+    """
+    if opener is None:
+        opener = urllib2.build_opener()
+    response = opener.open(url, timeout=CHANGES_TIMEOUT)
+    try:
+        return json.load(response)
+    finally:
+        response.close()
@@ -0,0 +1,148 @@
+"""
+This module contains the claims that keep sync tasks from downloading the same tarball at the same
+time. Before a task downloads a tarball, it records a claim in the database, keyed on the package's
+name, version and checksum. Other tasks that want the same tarball wait for the claim to be
+released, and then associate the unit that the claiming task saved instead of downloading it again.
+A task renews its claims while it works on them, so a claim that is held for too long, such as by
+a task that was killed, is considered abandoned and can be taken over.
+"""
+import time
+import uuid
+
+from pulp.server.db import connection
+from pymongo.errors import DuplicateKeyError
+
+COLLECTION_NAME = 'npm_download_claims'
+# How long a claim is honored, in seconds, before it is considered abandoned
+CLAIM_TIMEOUT = 60 * 60
+# How often a task that waits for other tasks' claims checks whether they were released, in seconds
+POLL_INTERVAL = 5
+# The number of packages that are claimed at once, just before their tarballs are downloaded
+CLAIM_BATCH_SIZE = 200
+# The fraction of the timeout after which a task renews its claims
+REFRESH_FRACTION = 0.25
+
+
+class DownloadClaims(object):
+    """
+    The claims of one sync task. Claims are records in a shared collection, so that tasks running
+    on different workers see each other's claims.
+    """
+
+    def __init__(self, collection=None, clock=time.time, timeout=CLAIM_TIMEOUT):
+        """
+        Initialize the DownloadClaims.
+
+        :param collection: The collection that holds the claims. Defaults to the
+                           npm_download_claims collection of Pulp's database, which is only
+                           opened once a claim is made.
+        :type  collection: pymongo.collection.Collection
+        :param clock:      Returns the current time in seconds
+        :type  clock:      callable
+        :param timeout:    How long a claim is honored, in seconds
+        :type  timeout:    float
+        """
+        self._collection = collection
+        self._clock = clock
+        self.timeout = timeout
+        self.owner = uuid.uuid4().hex
+        self._refreshed_at = clock()
+
+    @property
+    def collection(self):
+        """
+        The collection that holds the claims.
+
+        :rtype: pymongo.collection.Collection
+        """
+        if self._collection is None:
+            self._collection = connection.get_collection(COLLECTION_NAME, create=True)
+        return self._collection
+
+    def claim(self, packages):
+        """
+        Claim the given packages' tarballs for this task, except for the ones that another task
+        holds a claim on. Claims that this task already holds are renewed, and abandoned ones are
+        taken over. The whole batch takes three queries.
+
+        :param packages: Packages to download, as found in SyncStep._packages_to_download
+        :type  packages: list of dict
+        :return:         The keys of the claims that this task now holds on the packages
+        :rtype:          set
+        """
+        keys = sorted(set([claim_key(p) for p in packages]))
+        if not keys:
+            return set()
+        now = self._clock()
+        try:
+            self.collection.insert([{'_id': k, 'owner': self.owner, 'claimed_at': now}
+                                    for k in keys], continue_on_error=True)
+        except DuplicateKeyError:
+            # Some of the packages are claimed already
+            pass
+        # Take over the claims that were abandoned, and renew the ones that this task holds
+        self.collection.update(
+            {'_id': {'$in': keys}, '$or': [{'owner': self.owner},
+                                           {'claimed_at': {'$lt': now - self.timeout}}]},
+            {'$set': {'owner': self.owner, 'claimed_at': now}}, multi=True)
+        held = self.collection.find({'_id': {'$in': keys}, 'owner': self.owner}, fields=['_id'])
+        return set([c['_id'] for c in held])
+
+    def claimed_elsewhere(self, packages):
+        """
+        Return the keys of the claims that other tasks hold on the given packages' tarballs.
+
+        :param packages: Packages to download, as found in SyncStep._packages_to_download
+        :type  packages: list of dict
+        :return:         The keys of the claims on the packages that other tasks hold and that
+                         have not expired
+        :rtype:          set
+        """
+        keys = sorted(set([claim_key(p) for p in packages]))
+        if not keys:
+            return set()
+        claimed = self.collection.find(
+            {'_id': {'$in': keys}, 'owner': {'$ne': self.owner},
+             'claimed_at': {'$gte': self._clock() - self.timeout}},
+            fields=['_id'])
+        return set([c['_id'] for c in claimed])
+
+    def refresh(self):
+        """
+        Renew every claim that this task holds, so that they aren't taken for abandoned while the
+        task is still working on them. This is called often, but only touches the database once a
+        fraction of the timeout has passed since the last renewal.
+        """
+        now = self._clock()
+        if now - self._refreshed_at < self.timeout * REFRESH_FRACTION:
+            return
+        self._refreshed_at = now
+        self.collection.update({'owner': self.owner}, {'$set': {'claimed_at': now}}, multi=True)
+
+    def release(self, package):
+        """
+        Release this task's claim on the given package's tarball, if it holds one.
+
+        :param package: A package to download, as found in SyncStep._packages_to_download
+        :type  package: dict
+        """
+        self.collection.remove({'_id': claim_key(package), 'owner': self.owner})
+
+    def release_all(self):
+        """
+        Release every claim that this task holds.
+        """
+        self.collection.remove({'owner': self.owner})
+
+
+def claim_key(package):
+    """
+    Return the key of the claim on the given package's tarball.
+
+    :param package: A package to download, as found in SyncStep._packages_to_download
+    :type  package: dict
+    :return:        The package's name, version and checksum
+    :rtype:         basestring
+    """
+    return '%s@%s %s' % (package['name'], package['version'],
+                         package.get('shasum') or package.get('integrity'))
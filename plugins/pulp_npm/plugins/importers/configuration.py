@@ -0,0 +1,268 @@
+from gettext import gettext as _
+import os
+
+from pulp.common.plugins import importer_constants
+
+from pulp_npm.common import constants
+from pulp_npm.plugins.importers import filters
+
+
+def validate_config(config):
+    """
+    Validate a configuration.
+
+    :param config: Pulp configuration for the importer
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+    :return:       A 2-tuple of whether the configuration is valid, and a message describing the
+                   problem if it isn't
+    :rtype:        tuple
+    """
+    policy = config.get(constants.CONFIG_KEY_DOWNLOAD_POLICY)
+    if policy is not None and policy not in constants.DOWNLOAD_POLICIES:
+        msg = _('%(key)s must be one of %(values)s.')
+        msg = msg % {'key': constants.CONFIG_KEY_DOWNLOAD_POLICY,
+                     'values': ', '.join(constants.DOWNLOAD_POLICIES)}
+        return False, msg
+
+    locked_packages = config.get(constants.CONFIG_KEY_LOCKED_PACKAGES)
+    if locked_packages is not None:
+        if not isinstance(locked_packages, list) or \
+                not all([_is_locked_package(p) for p in locked_packages]):
+            msg = _('%(key)s must be a list of packages, each with a name, version, resolved and '
+                    'integrity.')
+            return False, msg % {'key': constants.CONFIG_KEY_LOCKED_PACKAGES}
+
+    resolve_dependencies = config.get(constants.CONFIG_KEY_RESOLVE_DEPENDENCIES)
+    if resolve_dependencies is not None and not isinstance(resolve_dependencies, bool):
+        msg = _('%(key)s must be a boolean.')
+        return False, msg % {'key': constants.CONFIG_KEY_RESOLVE_DEPENDENCIES}
+
+    dependency_types = config.get(constants.CONFIG_KEY_DEPENDENCY_TYPES)
+    if dependency_types is not None:
+        if not isinstance(dependency_types, list) or \
+                not set(dependency_types).issubset(constants.DEPENDENCY_TYPES):
+            msg = _('%(key)s must be a list containing only %(values)s.')
+            msg = msg % {'key': constants.CONFIG_KEY_DEPENDENCY_TYPES,
+                         'values': ', '.join(constants.DEPENDENCY_TYPES)}
+            return False, msg
+
+    version_ranges = config.get(constants.CONFIG_KEY_VERSION_RANGES)
+    if version_ranges is not None:
+        if not isinstance(version_ranges, list) or \
+                not all([isinstance(spec, basestring) for spec in version_ranges]):
+            msg = _('%(key)s must be a list of package names, each followed by @ and a version '
+                    'range.')
+            return False, msg % {'key': constants.CONFIG_KEY_VERSION_RANGES}
+        for spec in version_ranges:
+            try:
+                filters.VersionFilter(filters.parse_version_ranges([spec]))
+            except (AttributeError, ValueError):
+                msg = _('%(spec)s is not a valid package name and version range.')
+                return False, msg % {'spec': spec}
+
+    copy_packages = config.get(constants.CONFIG_KEY_COPY_PACKAGES)
+    if copy_packages is not None:
+        if not isinstance(copy_packages, list) or \
+                not all([isinstance(spec, basestring) for spec in copy_packages]):
+            msg = _('%(key)s must be a list of package names, each optionally followed by @ and a '
+                    'version range.')
+            return False, msg % {'key': constants.CONFIG_KEY_COPY_PACKAGES}
+        for spec in copy_packages:
+            try:
+                filters.PackageFilter([spec])
+            except (AttributeError, ValueError):
+                msg = _('%(spec)s is not a valid package name and version range.')
+                return False, msg % {'spec': spec}
+
+    for key in (constants.CONFIG_KEY_LATEST_MAJORS, constants.CONFIG_KEY_LATEST_MINORS,
+                constants.CONFIG_KEY_METADATA_CONCURRENCY,
+                constants.CONFIG_KEY_PACKAGE_CONCURRENCY, constants.CONFIG_KEY_SYNC_SHARDS,
+                constants.CONFIG_KEY_SLOWEST_PACKAGES):
+        value = config.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or
+                                  value < 1):
+            msg = _('%(key)s must be a positive integer.')
+            return False, msg % {'key': key}
+
+    if constants.CONFIG_KEY_DRY_RUN in (getattr(config, 'repo_plugin_config', None) or {}):
+        msg = _('%(key)s can only be given in the override config of a sync.')
+        return False, msg % {'key': constants.CONFIG_KEY_DRY_RUN}
+
+    for key in (constants.CONFIG_KEY_EXCLUDE_PRERELEASES, constants.CONFIG_KEY_DRY_RUN,
+                importer_constants.KEY_UNITS_REMOVE_MISSING, constants.CONFIG_KEY_PROFILE_STEPS,
+                constants.CONFIG_KEY_SEPARATE_READMES, constants.CONFIG_KEY_RECURSIVE):
+        value = config.get(key)
+        if value is not None and not isinstance(value, bool):
+            msg = _('%(key)s must be a boolean.')
+            return False, msg % {'key': key}
+
+    for key in (constants.CONFIG_KEY_METADATA_FIELDS,
+                constants.CONFIG_KEY_EXCLUDED_METADATA_FIELDS):
+        value = config.get(key)
+        if value is not None and (not isinstance(value, list) or
+                                  not all([isinstance(field, basestring) for field in value])):
+            msg = _('%(key)s must be a list of metadata field names.')
+            return False, msg % {'key': key}
+
+    for key in (constants.CONFIG_KEY_LATENCY_LOG, constants.CONFIG_KEY_METRICS_DIR):
+        path = config.get(key)
+        if path is not None and (not isinstance(path, basestring) or not os.path.isabs(path)):
+            msg = _('%(key)s must be an absolute path.')
+            return False, msg % {'key': key}
+
+    if config.get(constants.CONFIG_KEY_CHANGES_FEED) and \
+            config.get(constants.CONFIG_KEY_RESOLVE_DEPENDENCIES):
+        msg = _('%(changes)s cannot be used together with %(resolve)s.')
+        return False, msg % {'changes': constants.CONFIG_KEY_CHANGES_FEED,
+                             'resolve': constants.CONFIG_KEY_RESOLVE_DEPENDENCIES}
+
+    if config.get(constants.CONFIG_KEY_SYNC_SHARDS, 1) > 1:
+        for key in (constants.CONFIG_KEY_CHANGES_FEED, constants.CONFIG_KEY_RESOLVE_DEPENDENCIES,
+                    constants.CONFIG_KEY_LOCKED_PACKAGES):
+            if config.get(key):
+                msg = _('%(shards)s cannot be used together with %(key)s.')
+                return False, msg % {'shards': constants.CONFIG_KEY_SYNC_SHARDS, 'key': key}
+
+    feeds = config.get(constants.CONFIG_KEY_FEEDS)
+    if feeds is not None:
+        if not isinstance(feeds, dict):
+            msg = _('%(key)s must map scopes to lists of feed URLs.')
+            return False, msg % {'key': constants.CONFIG_KEY_FEEDS}
+        for scope, urls in feeds.items():
+            if scope != constants.DEFAULT_FEED_ROUTE and \
+                    (not scope.startswith('@') or '/' in scope or len(scope) < 2):
+                msg = _('%(scope)s is not a valid scope. Scopes start with "@", or are "%(all)s" '
+                        'for the packages that have no scope of their own.')
+                return False, msg % {'scope': scope, 'all': constants.DEFAULT_FEED_ROUTE}
+            if isinstance(urls, basestring):
+                urls = [urls]
+            if not isinstance(urls, list) or not urls or \
+                    not all([isinstance(url, basestring) and url for url in urls]):
+                msg = _('The feeds of %(scope)s must be a non-empty list of URLs.')
+                return False, msg % {'scope': scope}
+
+    return True, ''
+
+
+def get_download_policy(config):
+    """
+    Return the download policy that the importer should use for a sync.
+
+    :param config: Pulp configuration for the importer
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+    :return:       One of the values in constants.DOWNLOAD_POLICIES
+    :rtype:        basestring
+    """
+    return config.get(constants.CONFIG_KEY_DOWNLOAD_POLICY, constants.DOWNLOAD_IMMEDIATE)
+
+
+def is_dry_run(config):
+    """
+    Return whether a sync is a dry run. A dry run is only honored in the override config of a
+    sync, so that scheduled syncs of the repository are never dry runs.
+
+    :param config: Pulp configuration for the importer
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+    :return:       True if the sync should only plan its changes
+    :rtype:        bool
+    """
+    override_config = getattr(config, 'override_config', None) or {}
+    return bool(override_config.get(constants.CONFIG_KEY_DRY_RUN))
+
+
+def get_dependency_types(config):
+    """
+    Return the package.json sections whose dependencies should be followed when resolving the
+    dependencies of the synchronized packages.
+
+    :param config: Pulp configuration for the importer
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+    :return:       Keys of package.json, always starting with "dependencies"
+    :rtype:        list
+    """
+    configured = config.get(constants.CONFIG_KEY_DEPENDENCY_TYPES) or []
+    return [t for t in constants.DEPENDENCY_TYPES
+            if t == constants.DEPENDENCY_TYPES[0] or t in configured]
+
+
+def get_concurrency(config, key):
+    """
+    Return the number of concurrent downloads that a download step should use. Manifests and
+    tarballs can be given different concurrencies, and both default to the standard max_downloads
+    setting.
+
+    :param config: Pulp configuration for the importer
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+    :param key:    The config key of the step's concurrency
+    :type  key:    basestring
+    :return:       The maximum number of concurrent downloads
+    :rtype:        int
+    """
+    return (key and config.get(key)) or config.get(importer_constants.KEY_MAX_DOWNLOADS) or \
+        constants.DEFAULT_CONCURRENCY
+
+
+def get_feeds(config):
+    """
+    Return the feeds that serve each scope. The importer's feed is the first feed of the packages
+    whose scope has no feeds of its own, followed by the ones listed under "*".
+
+    :param config: Pulp configuration for the importer
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+    :return:       Maps scopes to lists of feed URLs, each ending with a slash
+    :rtype:        dict
+    """
+    routes = {}
+    for scope, urls in (config.get(constants.CONFIG_KEY_FEEDS) or {}).items():
+        if isinstance(urls, basestring):
+            urls = [urls]
+        routes[scope] = urls
+    default_feeds = routes.get(constants.DEFAULT_FEED_ROUTE, [])
+    feed = config.get(importer_constants.KEY_FEED)
+    if feed:
+        default_feeds = [feed] + default_feeds
+    routes[constants.DEFAULT_FEED_ROUTE] = default_feeds
+
+    for scope, urls in routes.items():
+        unique = []
+        for url in urls:
+            if not url.endswith('/'):
+                url += '/'
+            if url not in unique:
+                unique.append(url)
+        routes[scope] = unique
+    return routes
+
+
+def get_sync_shards(config):
+    """
+    Return the number of shards that a sync should be split into. Syncs of a single package are
+    never split.
+
+    :param config: Pulp configuration for the importer
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+    :return:       The number of shards, 1 if the sync shouldn't be split
+    :rtype:        int
+    """
+    package_names = config.get(constants.CONFIG_KEY_PACKAGE_NAMES) or ''
+    return min(config.get(constants.CONFIG_KEY_SYNC_SHARDS) or 1,
+               max(1, len(package_names.split(','))))
+
+
+def _is_locked_package(package):
+    """
+    Return whether the given value is a package as returned by lockfile.collect().
+
+    :param package: A value from the locked_packages list
+    :type  package: object
+    :return:        True if the value is a dictionary with a name and version, and a resolved
+                    URL and integrity that may be None
+    :rtype:         bool
+    """
+    if not isinstance(package, dict) or \
+            set(package) != set(['name', 'version', 'resolved', 'integrity']):
+        return False
+    return isinstance(package['name'], basestring) and \
+        isinstance(package['version'], basestring) and \
+        all([package[k] is None or isinstance(package[k], basestring)
+             for k in ('resolved', 'integrity')])
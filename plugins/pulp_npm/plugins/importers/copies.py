@@ -0,0 +1,196 @@
+"""
+This module contains the copy of packages from one repository to another. The units to copy are
+looked up with their unit keys only, narrowed down to the requested packages and version ranges,
+and associated with the destination repository in batches instead of one at a time. A recursive
+copy adds the versions that the copied units depend on, as npm would install them from the source
+repository.
+"""
+from gettext import gettext as _
+import logging
+import time
+
+from pulp.server.db.model import criteria
+from pulp.server.db.model.repository import RepoContentUnit
+from pulp.server.managers import factory as manager_factory
+
+from pulp_npm.common import constants, dependencies
+from pulp_npm.plugins import models, packuments
+from pulp_npm.plugins.importers import configuration, filters
+
+
+# The number of units associated with the destination repository by each call
+ASSOCIATE_BATCH_SIZE = 1000
+# The number of packages whose units are looked up with a single query
+QUERY_BATCH_SIZE = 500
+
+_logger = logging.getLogger(__name__)
+
+
+def copy_units(source_repo, dest_repo, conduit, config, units=None, packument_store=None):
+    """
+    Copy units from the source repository to the destination repository. When the configuration
+    lists packages to copy, only the versions of those packages that satisfy their version range
+    are copied. When it asks for a recursive copy, the dependencies of the copied units are copied
+    along with them.
+
+    :param source_repo:     metadata describing the repository containing the units to import
+    :type  source_repo:     pulp.plugins.model.Repository
+    :param dest_repo:       metadata describing the repository to import units into
+    :type  dest_repo:       pulp.plugins.model.Repository
+    :param conduit:         provides access to relevant Pulp functionality
+    :type  conduit:         pulp.plugins.conduits.unit_import.ImportUnitConduit
+    :param config:          plugin configuration
+    :type  config:          pulp.plugins.config.PluginCallConfiguration
+    :param units:           The units to copy. Defaults to every unit in the source repository.
+    :type  units:           list of pulp.plugins.model.Unit
+    :param packument_store: The packuments of the repositories. Defaults to the ones in Pulp's
+                            database.
+    :type  packument_store: pulp_npm.plugins.packuments.PackumentStore
+    :return:                The units that were copied
+    :rtype:                 list of pulp.plugins.model.Unit
+    """
+    started = time.time()
+    package_filter = filters.PackageFilter.from_config(config)
+    if units is None:
+        units = get_source_units(conduit, package_filter and sorted(package_filter.packages))
+    if package_filter is not None:
+        units = [u for u in units
+                 if package_filter.keeps(u.unit_key['name'], u.unit_key['version'])]
+
+    store = packument_store or packuments.PackumentStore()
+    if config.get(constants.CONFIG_KEY_RECURSIVE):
+        units = units + resolve_dependencies(conduit, units,
+                                             configuration.get_dependency_types(config),
+                                             store, source_repo.id)
+
+    associate(dest_repo.id, units)
+
+    names = set([u.unit_key['name'] for u in units])
+    packuments.reconcile(store, dest_repo.id, DestinationUnits(conduit), names,
+                         store.get_upstream_tags(source_repo.id, sorted(names)))
+
+    elapsed = time.time() - started
+    _logger.info(_('Copied %(count)d units of %(packages)d packages from %(source)s to %(dest)s '
+                   'in %(seconds).2f seconds, %(rate).1f units per second.') %
+                 {'count': len(units), 'packages': len(names), 'source': source_repo.id,
+                  'dest': dest_repo.id, 'seconds': elapsed,
+                  'rate': len(units) / max(elapsed, 0.001)})
+    return units
+
+
+def get_source_units(conduit, names=None, fields=None):
+    """
+    Return the unit keys of the units of the given packages, or of every package, in the source
+    repository.
+
+    :param conduit: provides access to relevant Pulp functionality
+    :type  conduit: pulp.plugins.conduits.unit_import.ImportUnitConduit
+    :param names:   The names of the packages. Defaults to every package.
+    :type  names:   list of basestring
+    :param fields:  The metadata fields to read along with the unit keys
+    :type  fields:  list of basestring
+    :return:        The units, which only carry their unit keys and the given fields
+    :rtype:         list of pulp.plugins.model.Unit
+    """
+    unit_fields = ['name', 'version'] + list(fields or [])
+    if names is None:
+        search = criteria.UnitAssociationCriteria(type_ids=[constants.PACKAGE_TYPE_ID],
+                                                  unit_fields=unit_fields)
+        return list(conduit.get_source_units(criteria=search))
+    units = []
+    for i in xrange(0, len(names), QUERY_BATCH_SIZE):
+        search = criteria.UnitAssociationCriteria(
+            type_ids=[constants.PACKAGE_TYPE_ID],
+            unit_filters={'name': {'$in': names[i:i + QUERY_BATCH_SIZE]}},
+            unit_fields=unit_fields)
+        units.extend(conduit.get_source_units(criteria=search))
+    return units
+
+
+def resolve_dependencies(conduit, units, dependency_types, packument_store, repo_id):
+    """
+    Return the units of the source repository that the given units depend on, directly or not,
+    that aren't among the given units. Each requirement selects the version that npm would install
+    from the versions in the source repository, preferring the version that the package's "latest"
+    dist-tag points to. The dependency graph is walked one level at a time, and the units of the
+    packages that a level requires are read with one query, which only reads their versions and
+    dependency edges.
+
+    :param conduit:          provides access to relevant Pulp functionality
+    :type  conduit:          pulp.plugins.conduits.unit_import.ImportUnitConduit
+    :param units:            The units whose dependencies are resolved
+    :type  units:            list of pulp.plugins.model.Unit
+    :param dependency_types: The sections of package.json whose dependencies are followed
+    :type  dependency_types: list of basestring
+    :param packument_store:  The packuments, which hold the dist-tags of the source repository
+    :type  packument_store:  pulp_npm.plugins.packuments.PackumentStore
+    :param repo_id:          The ID of the source repository
+    :type  repo_id:          basestring
+    :return:                 The units of the dependencies
+    :rtype:                  list of pulp.plugins.model.Unit
+    """
+    # Maps the names and versions of the packages that were read to their units
+    source_units = {}
+
+    def find_versions(names):
+        # The sections of package.json are only read for the units stored without their edges
+        found = {}
+        fields = [constants.METADATA_KEY_DEPENDENCIES] + list(dependency_types)
+        for unit in get_source_units(conduit, names, fields):
+            models.Package.decode_metadata(unit.metadata)
+            source_units[(unit.unit_key['name'], unit.unit_key['version'])] = unit
+            found.setdefault(unit.unit_key['name'], {})[unit.unit_key['version']] = unit.metadata
+        return found
+
+    def find_dist_tags(names):
+        return packument_store.get_upstream_tags(repo_id, names)
+
+    roots = [(u.unit_key['name'], u.unit_key['version']) for u in units]
+    closure, unsatisfied = dependencies.resolve_closure(roots, find_versions, dependency_types,
+                                                        find_dist_tags)
+    for name, spec in unsatisfied:
+        msg = _('No version of %(name)s in %(repo)s satisfies %(spec)s.')
+        _logger.warning(msg % {'name': name, 'repo': repo_id, 'spec': spec})
+    return [source_units[key] for key in closure]
+
+
+def associate(repo_id, units):
+    """
+    Associate the given units with a repository, ASSOCIATE_BATCH_SIZE units at a time.
+
+    :param repo_id: The ID of the repository
+    :type  repo_id: basestring
+    :param units:   The units
+    :type  units:   list of pulp.plugins.model.Unit
+    """
+    association_manager = manager_factory.repo_unit_association_manager()
+    for i in xrange(0, len(units), ASSOCIATE_BATCH_SIZE):
+        association_manager.associate_all_by_ids(
+            repo_id, constants.PACKAGE_TYPE_ID,
+            [u.id for u in units[i:i + ASSOCIATE_BATCH_SIZE]],
+            RepoContentUnit.OWNER_TYPE_IMPORTER, constants.IMPORTER_TYPE_ID)
+
+
+class DestinationUnits(object):
+    """
+    Looks the units of the destination repository of a copy up, the way that
+    packuments.reconcile() looks the units of a repository up.
+    """
+
+    def __init__(self, conduit):
+        """
+        Initialize the DestinationUnits.
+
+        :param conduit: provides access to relevant Pulp functionality
+        :type  conduit: pulp.plugins.conduits.unit_import.ImportUnitConduit
+        """
+        self.conduit = conduit
+
+    def get_units(self, criteria=None):
+        """
+        :param criteria: The criteria that the units must match
+        :type  criteria: pulp.server.db.model.criteria.UnitAssociationCriteria
+        :return:         The matching units of the destination repository
+        :rtype:          list of pulp.plugins.model.Unit
+        """
+        return self.conduit.get_destination_units(criteria=criteria)
@@ -0,0 +1,151 @@
+"""
+This module contains the routing of packages to the feeds they are synchronized from. Scoped
+packages can be served by a registry of their own, such as an internal one for "@ourco" packages,
+and each scope can list several mirrors. The mirrors are ordered by how fast they answer, and a
+download that fails at one of them is tried at the next.
+"""
+from gettext import gettext as _
+import logging
+import time
+import urllib2
+
+from pulp_npm.common import constants
+
+# How long to wait for a feed to answer the latency probe, in seconds
+PROBE_TIMEOUT = 10
+
+_logger = logging.getLogger(__name__)
+
+
+class FeedRouter(object):
+    """
+    Maps package names to the feeds that serve them, fastest first.
+    """
+
+    def __init__(self, routes):
+        """
+        Initialize the FeedRouter.
+
+        :param routes: Maps scopes, such as "@ourco", to the list of URLs of the feeds that serve
+                       the scope's packages. The feeds listed under "*" serve the other packages.
+        :type  routes: dict
+        """
+        self.routes = dict([(scope, list(urls)) for scope, urls in routes.items()])
+        # Maps feed URLs to the seconds they took to answer the probe, or None if they didn't
+        self.latencies = {}
+
+    def has_mirrors(self):
+        """
+        Return whether any scope is served by more than one feed.
+
+        :return: True if there is a choice of feeds to make
+        :rtype:  bool
+        """
+        return any(len(urls) > 1 for urls in self.routes.values())
+
+    def feeds_for(self, name):
+        """
+        Return the feeds that serve the given package, in the order they should be tried.
+
+        :param name: The name of a package
+        :type  name: basestring
+        :return:     The URLs of the feeds
+        :rtype:      list
+        """
+        scope = name.split('/')[0] if name.startswith('@') else constants.DEFAULT_FEED_ROUTE
+        if scope in self.routes:
+            return self.routes[scope]
+        return self.routes.get(constants.DEFAULT_FEED_ROUTE, [])
+
+    def feed_for(self, name):
+        """
+        Return the feed that the given package should be downloaded from first.
+
+        :param name: The name of a package
+        :type  name: basestring
+        :return:     The URL of the feed, or None if no feed serves the package
+        :rtype:      basestring
+        """
+        urls = self.feeds_for(name)
+        if urls:
+            return urls[0]
+        return None
+
+    def next_feed(self, name, url):
+        """
+        Return the feed to try after a download of the given URL failed.
+
+        :param name: The name of the package that the URL belongs to
+        :type  name: basestring
+        :param url:  The URL whose download failed
+        :type  url:  basestring
+        :return:     The URL of the next feed, or None if the URL isn't served by one of the
+                     package's feeds, or if that feed is the last one
+        :rtype:      basestring
+        """
+        urls = self.feeds_for(name)
+        for index, feed in enumerate(urls):
+            if url.startswith(feed):
+                if index + 1 < len(urls):
+                    return urls[index + 1]
+                return None
+        return None
+
+    def probe(self, timeout=PROBE_TIMEOUT, opener=None):
+        """
+        Measure how long each feed takes to answer a request for its root, and order the feeds of
+        each scope by it. Feeds that don't answer are moved to the end, and the order of feeds
+        that answer equally fast is kept.
+
+        :param timeout: How long to wait for each feed, in seconds
+        :type  timeout: float
+        :param opener:  The opener to reach the feeds with, as built by changes.build_opener()
+        :type  opener:  urllib2.OpenerDirector
+        """
+        opener = opener or urllib2.build_opener()
+        for urls in self.routes.values():
+            for url in urls:
+                if url not in self.latencies:
+                    self.latencies[url] = _measure_latency(url, timeout, opener)
+
+        def sort_key(url):
+            latency = self.latencies[url]
+            return (latency is None, latency)
+
+        for urls in self.routes.values():
+            urls.sort(key=sort_key)
+
+
+def _measure_latency(url, timeout, opener):
+    """
+    Return how long the given feed takes to answer a request for its root. Any HTTP response
+    counts as an answer, since registries may refuse requests for their root, such as a private
+    registry that answers 401 or 404.
+
+    :param url:     The URL of a feed
+    :type  url:     basestring
+    :param timeout: How long to wait for the feed, in seconds
+    :type  timeout: float
+    :param opener:  The opener to reach the feed with
+    :type  opener:  urllib2.OpenerDirector
+    :return:        The latency in seconds, or None if the feed didn't answer
+    :rtype:         float
+    """
+    start = time.time()
+    try:
+        try:
+            response = opener.open(url, timeout=timeout)
+        except urllib2.HTTPError as e:
+            # An error response is still an answer, and is read like one
+            response = e
+        try:
+            response.read(1)
+        finally:
+            response.close()
+    except (IOError, ValueError) as e:
+        _logger.warning(_('The feed %(url)s did not answer: %(e)s') % {'url': url, 'e': e})
+        return None
+    latency = time.time() - start
+    _logger.info(_('The feed %(url)s answered in %(latency).3f seconds.') %
+                 {'url': url, 'latency': latency})
+    return latency
@@ -0,0 +1,72 @@
+"""
+This module contains the policy that decides which fields of a package's metadata the importer
+stores in its unit, for the packages that it synchronizes and the ones that are uploaded.
+"""
+from pulp_npm.common import constants
+from pulp_npm.plugins import readmes
+
+# The metadata fields that are always kept, as the plugins rely on them
+REQUIRED_FIELDS = frozenset(['dist', 'id', '_from', '_shasum', constants.METADATA_KEY_DEFERRED,
+                             constants.METADATA_KEY_UPSTREAM_URL, constants.METADATA_KEY_README,
+                             constants.METADATA_KEY_DEPENDENCIES])
+
+
+class FieldPolicy(object):
+    """
+    Keeps only the listed metadata fields, drops the excluded ones, and moves readmes out of the
+    units into the readme store.
+    """
+
+    def __init__(self, fields=None, excluded_fields=None, readme_store=None):
+        """
+        Initialize the FieldPolicy.
+
+        :param fields:          If given, only these fields are kept, along with the required ones
+        :type  fields:          list of basestring
+        :param excluded_fields: Fields that are dropped, unless they are required
+        :type  excluded_fields: list of basestring
+        :param readme_store:    If given, readmes are stored here instead of in the units
+        :type  readme_store:    pulp_npm.plugins.readmes.ReadmeStore
+        """
+        self.fields = None
+        if fields is not None:
+            self.fields = frozenset(fields) | REQUIRED_FIELDS
+        self.excluded_fields = frozenset(excluded_fields or []) - REQUIRED_FIELDS
+        self.readme_store = readme_store
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the FieldPolicy that the given importer configuration describes.
+
+        :param config: Pulp configuration for the importer
+        :type  config: pulp.plugins.config.PluginCallConfiguration
+        :return:       The configured policy, or None if every field is to be stored in the units
+        :rtype:        pulp_npm.plugins.importers.fields.FieldPolicy
+        """
+        readme_store = None
+        if config.get(constants.CONFIG_KEY_SEPARATE_READMES):
+            readme_store = readmes.ReadmeStore()
+        policy = cls(config.get(constants.CONFIG_KEY_METADATA_FIELDS),
+                     config.get(constants.CONFIG_KEY_EXCLUDED_METADATA_FIELDS), readme_store)
+        if policy.fields is None and not policy.excluded_fields and readme_store is None:
+            return None
+        return policy
+
+    def apply(self, package):
+        """
+        Apply the policy to the metadata of the given package, before its unit is initialized.
+
+        :param package: The package
+        :type  package: pulp_npm.plugins.models.Package
+        """
+        metadata = package.metadata
+        for field in metadata.keys():
+            if (self.fields is not None and field not in self.fields) or \
+                    field in self.excluded_fields:
+                del metadata[field]
+        readme = metadata.pop('readme', None)
+        if readme and self.readme_store is not None:
+            metadata[constants.METADATA_KEY_README] = self.readme_store.put(package.name, readme)
+        elif readme is not None:
+            metadata['readme'] = readme
@@ -0,0 +1,207 @@
+"""
+This module contains the version filtering policies that the importer applies to the versions it
+finds in package manifests, before it decides which ones to download.
+"""
+from gettext import gettext as _
+
+from pulp_npm.common import constants, semver
+
+
+class VersionFilter(object):
+    """
+    Decides which versions of a package a sync should bring into the repository. The policies are
+    applied in this order: prereleases are excluded, the versions of a package are restricted to its
+    configured range, and then only the versions in the latest majors and minors are kept.
+    """
+
+    def __init__(self, version_ranges=None, latest_majors=None, latest_minors=None,
+                 exclude_prereleases=False):
+        """
+        Initialize the VersionFilter.
+
+        :param version_ranges:      Maps package names to the version range that their versions
+                                    must satisfy
+        :type  version_ranges:      dict
+        :param latest_majors:       If given, only versions of the latest this many major versions
+                                    of each package are kept
+        :type  latest_majors:       int
+        :param latest_minors:       If given, only versions of the latest this many minor versions
+                                    of each package are kept
+        :type  latest_minors:       int
+        :param exclude_prereleases: Whether prerelease versions are dropped
+        :type  exclude_prereleases: bool
+        """
+        self.version_ranges = dict([(name, semver.Range(spec)) for name, spec in
+                                    (version_ranges or {}).items()])
+        self.latest_majors = latest_majors
+        self.latest_minors = latest_minors
+        self.exclude_prereleases = exclude_prereleases
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the VersionFilter that the given importer configuration describes.
+
+        :param config: Pulp configuration for the importer
+        :type  config: pulp.plugins.config.PluginCallConfiguration
+        :return:       The configured filter, or None if no filtering policy is configured
+        :rtype:        pulp_npm.plugins.importers.filters.VersionFilter
+        """
+        version_ranges = parse_version_ranges(config.get(constants.CONFIG_KEY_VERSION_RANGES) or [])
+        version_filter = cls(version_ranges,
+                             config.get(constants.CONFIG_KEY_LATEST_MAJORS),
+                             config.get(constants.CONFIG_KEY_LATEST_MINORS),
+                             config.get(constants.CONFIG_KEY_EXCLUDE_PRERELEASES, False))
+        if version_filter.is_empty():
+            return None
+        return version_filter
+
+    def is_empty(self):
+        """
+        Return whether this filter keeps every version.
+
+        :return: True if no policy is set
+        :rtype:  bool
+        """
+        return not (self.version_ranges or self.latest_majors or self.latest_minors or
+                    self.exclude_prereleases)
+
+    def apply(self, name, versions):
+        """
+        Return the given versions of the named package that the policies keep. Versions that are
+        not valid semantic versions are dropped when any policy other than the prerelease exclusion
+        applies to the package.
+
+        :param name:     The name of a package
+        :type  name:     basestring
+        :param versions: Version strings of the package
+        :type  versions: iterable
+        :return:         The versions that are kept
+        :rtype:          set
+        """
+        version_range = self.version_ranges.get(name)
+        parsed = {}
+        invalid = set()
+        for version in versions:
+            try:
+                parsed[version] = semver.parse(version)
+            except ValueError:
+                invalid.add(version)
+
+        if self.exclude_prereleases:
+            parsed = dict([(v, p) for v, p in parsed.items() if not p.prerelease])
+        if version_range is not None:
+            parsed = dict([(v, p) for v, p in parsed.items() if version_range.test(p)])
+        if self.latest_majors:
+            majors = set(sorted(set([p[:1] for p in parsed.values()]))[-self.latest_majors:])
+            parsed = dict([(v, p) for v, p in parsed.items() if p[:1] in majors])
+        if self.latest_minors:
+            minors = set(sorted(set([p[:2] for p in parsed.values()]))[-self.latest_minors:])
+            parsed = dict([(v, p) for v, p in parsed.items() if p[:2] in minors])
+
+        kept = set(parsed)
+        if version_range is None and not (self.latest_majors or self.latest_minors):
+            kept |= invalid
+        return kept
+
+
+class PackageFilter(object):
+    """
+    Decides which units a copy brings into the destination repository: the versions of the listed
+    packages that satisfy one of the ranges given for them.
+    """
+
+    def __init__(self, specs):
+        """
+        Initialize the PackageFilter.
+
+        :param specs: The packages, each as <name> or <name>@<range>, such as "left-pad",
+                      "left-pad@^1.1.0" or "@scope/name@2.x"
+        :type  specs: list of basestring
+        :raises:      ValueError if a range is not valid
+        """
+        # Maps the names of the packages to the list of their ranges, or to None if every version
+        # of the package is kept
+        self.packages = {}
+        for spec in specs:
+            name, version_range = _split_spec(spec)
+            if version_range is None or self.packages.get(name, []) is None:
+                self.packages[name] = None
+            else:
+                self.packages.setdefault(name, []).append(semver.Range(version_range))
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the PackageFilter that the given importer configuration describes.
+
+        :param config: Pulp configuration for the importer
+        :type  config: pulp.plugins.config.PluginCallConfiguration
+        :return:       The configured filter, or None if no packages are listed
+        :rtype:        pulp_npm.plugins.importers.filters.PackageFilter
+        """
+        specs = config.get(constants.CONFIG_KEY_COPY_PACKAGES)
+        if not specs:
+            return None
+        return cls(specs)
+
+    def keeps(self, name, version):
+        """
+        Return whether the given version of the named package is kept.
+
+        :param name:    The name of a package
+        :type  name:    basestring
+        :param version: A version of the package
+        :type  version: basestring
+        :return:        True if the package is listed, and the version satisfies one of its ranges
+        :rtype:         bool
+        """
+        if name not in self.packages:
+            return False
+        if self.packages[name] is None:
+            return True
+        try:
+            parsed = semver.parse(version)
+        except ValueError:
+            return False
+        return any([r.test(parsed) for r in self.packages[name]])
+
+
+def parse_version_ranges(specs):
+    """
+    Return the version range that the given specs give each package. The ranges given for the same
+    package are combined, so that a version only needs to satisfy one of them. The ranges are
+    stored as a list of specs rather than a mapping, because MongoDB does not allow the dots of
+    names such as "socket.io" in keys.
+
+    :param specs: The packages and their ranges, each as <name>@<range>, such as "left-pad@^1.0.0"
+                  or "@scope/name@2.x"
+    :type  specs: list of basestring
+    :return:      Maps package names to version ranges
+    :rtype:       dict
+    :raises:      ValueError if a spec does not give a version range
+    """
+    ranges = {}
+    for spec in specs:
+        name, version_range = _split_spec(spec)
+        if version_range is None:
+            raise ValueError(_('%(spec)s does not give a version range.') % {'spec': spec})
+        ranges.setdefault(name, []).append(version_range)
+    return dict([(n, ' || '.join(r)) for n, r in ranges.items()])
+
+
+def _split_spec(spec):
+    """
+    Split a package name and the version range that may follow it, given as <name>[@<range>].
+
+    :param spec: A package name, optionally followed by "@" and a version range
+    :type  spec: basestring
+    :return:     A 2-tuple of the package name and the range, which is "*" if it is empty, or None
+                 if the spec only names the package
+    :rtype:      tuple
+    """
+    # The name of a scoped package starts with "@", so it can't end there
+    index = spec.rfind('@')
+    if index > 0:
+        return spec[:index], spec[index + 1:].strip() or '*'
+    return spec, None
@@ -1,13 +1,13 @@
 from gettext import gettext as _
+import os
 import shutil
 import tempfile
 
 from pulp.plugins.importer import Importer
-from pulp.server.db.model import criteria
 
 from pulp_npm.common import constants
-from pulp_npm.plugins import models
-from pulp_npm.plugins.importers import sync
+from pulp_npm.plugins import models, packuments
+from pulp_npm.plugins.importers import cache, configuration, copies, fields, shards, sync
 
 
 def entry_point():
@@ -51,6 +51,12 @@ class NpmImporter(Importer):
         units. If specified, only the units indicated should be imported (this
         is the case where the caller passed a filter to Pulp).
 
+        The copy_packages key of the config may list the packages to import, each as <name> or
+        <name>@<range>, in which case only the versions of those packages that satisfy one of
+        their ranges are imported. When the recursive key is true, the versions that the imported
+        units depend on in the source repository are imported along with them. The units are
+        associated in batches.
+
         :param source_repo:    metadata describing the repository containing the units to import
         :type  source_repo:    pulp.plugins.model.Repository
         :param dest_repo:      metadata describing the repository to import units into
@@ -64,14 +70,7 @@ class NpmImporter(Importer):
         :return:               list of Unit instances that were saved to the destination repository
         :rtype:                list
         """
-        if units is None:
-            search = criteria.UnitAssociationCriteria(type_ids=[constants.PACKAGE_TYPE_ID])
-            units = import_conduit.get_source_units(criteria=search)
-
-        for u in units:
-            import_conduit.associate_unit(u)
-
-        return units
+        return copies.copy_units(source_repo, dest_repo, import_conduit, config, units)
 
     @classmethod
     def metadata(cls):
@@ -123,8 +122,15 @@ class NpmImporter(Importer):
         """
         working_dir = tempfile.mkdtemp(dir=repo.working_dir)
         try:
+            # The download cache is kept between syncs, so that a failed sync can be resumed
+            download_cache_dir = os.path.join(repo.working_dir, cache.CACHE_DIR)
+            shard_count = configuration.get_sync_shards(config)
+            if shard_count > 1:
+                return shards.sync_sharded(repo, sync_conduit, config, shard_count,
+                                           download_cache_dir=download_cache_dir)
             sync_step = sync.SyncStep(repo=repo, conduit=sync_conduit, config=config,
-                                      working_dir=working_dir)
+                                      working_dir=working_dir,
+                                      download_cache_dir=download_cache_dir)
             return sync_step.sync()
         finally:
             shutil.rmtree(working_dir, ignore_errors=True)
@@ -181,23 +187,59 @@ class NpmImporter(Importer):
         :rtype:           dict
         """
         package = models.Package.from_archive(file_path)
+        field_policy = fields.FieldPolicy.from_config(config)
+        if field_policy is not None:
+            field_policy.apply(package)
         package.init_unit(conduit)
 
         shutil.move(file_path, package.storage_path)
 
         package.save_unit(conduit)
+        packuments.PackumentStore().add_versions(repo.id, package.name,
+                                                 {package.version: package.metadata})
 
         return {'success_flag': True, 'summary': {}, 'details': {}}
 
+    def remove_units(self, repo, units, config):
+        """
+        Remove the given units from the packuments of the repository, once Pulp has removed them
+        from the repository.
+
+        :param repo:   metadata describing the repository
+        :type  repo:   pulp.plugins.model.Repository
+        :param units:  the units that were removed
+        :type  units:  list of pulp.plugins.model.AssociatedUnit
+        :param config: plugin configuration for the repository
+        :type  config: pulp.plugins.config.PluginCallConfiguration
+        """
+        versions = {}
+        for u in units:
+            versions.setdefault(u.unit_key['name'], []).append(u.unit_key['version'])
+
+        store = packuments.PackumentStore()
+        for name in sorted(versions):
+            store.remove_versions(repo.id, name, versions[name])
+
+    def importer_removed(self, repo, config):
+        """
+        Remove the packuments of the repository, when its importer is removed.
+
+        :param repo:   metadata describing the repository
+        :type  repo:   pulp.plugins.model.Repository
+        :param config: plugin configuration for the repository
+        :type  config: pulp.plugins.config.PluginCallConfiguration
+        """
+        packuments.PackumentStore().remove(repo.id)
+
     def validate_config(self, repo, config):
         """
-        We don't have a config yet, so it's always valid
+        Validate the importer configuration of the given repository.
 
         :param repo:   metadata describing the repository
         :type  repo:   pulp.plugins.model.Repository
         :param config: plugin configuration for the repository
         :type  config: pulp.plugins.config.PluginCallConfiguration
-        :return:       This always returns (True, '')
+        :return:       tuple of (bool, str) to describe the result
         :rtype:        tuple
         """
-        return True, ''
+        return configuration.validate_config(config)
@@ -0,0 +1,195 @@
+"""
+This module contains the tracking of how long each package spends in each stage of a sync. The
+durations are summarized in a latency histogram for each stage, and the packages that took the
+longest are listed with the time they spent in each stage. Each duration can also be written to a
+JSON lines event log, for analysis once the sync is done.
+"""
+from contextlib import contextmanager
+from gettext import gettext as _
+import json
+import logging
+import threading
+import time
+
+# The stages that a package goes through during a sync
+STAGE_MANIFEST = 'manifest'
+STAGE_DIFF = 'diff'
+STAGE_DOWNLOAD = 'download'
+STAGE_VERIFY = 'verify'
+STAGE_PARSE = 'parse'
+STAGE_COPY = 'copy'
+STAGE_SAVE = 'save'
+STAGES = (STAGE_MANIFEST, STAGE_DIFF, STAGE_DOWNLOAD, STAGE_VERIFY, STAGE_PARSE, STAGE_COPY,
+          STAGE_SAVE)
+
+# The upper bounds of the histogram buckets, in seconds. Durations above the last one are counted
+# in an extra bucket whose bound is None.
+BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+
+# The number of slowest packages that are reported, unless configured otherwise
+SLOWEST_PACKAGES = 10
+
+_logger = logging.getLogger(__name__)
+
+
+class LatencyTracker(object):
+    """
+    Collects the time that each package spends in each stage of the sync. The download callbacks
+    run in the downloader's threads, so durations can be recorded from any thread.
+    """
+
+    def __init__(self, event_log=None, clock=time.time):
+        """
+        Initialize the LatencyTracker.
+
+        :param event_log: The path of a file that each duration is appended to as a line of JSON
+        :type  event_log: basestring
+        :param clock:     Returns the current time in seconds
+        :type  clock:     callable
+        """
+        self._event_log_path = event_log
+        self._event_log = None
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Maps package names to dictionaries that map stages to the seconds spent in them
+        self._durations = {}
+
+    def record(self, name, stage, seconds):
+        """
+        Record that the given package spent the given time in the given stage. Time spent in a
+        stage by several versions of the package is added up.
+
+        :param name:    The name of a package
+        :type  name:    basestring
+        :param stage:   One of STAGES
+        :type  stage:   basestring
+        :param seconds: How long the stage took
+        :type  seconds: float
+        """
+        self._lock.acquire()
+        try:
+            stages = self._durations.setdefault(name, {})
+            stages[stage] = stages.get(stage, 0.0) + seconds
+            if self._event_log_path:
+                self._log_event(name, stage, seconds)
+        finally:
+            self._lock.release()
+
+    @contextmanager
+    def timed(self, name, stage):
+        """
+        Record how long the block of the with statement takes, as time the given package spent in
+        the given stage. Nothing is recorded if the block raises an exception.
+
+        :param name:  The name of a package
+        :type  name:  basestring
+        :param stage: One of STAGES
+        :type  stage: basestring
+        """
+        started = self._clock()
+        yield
+        self.record(name, stage, self._clock() - started)
+
+    def record_download(self, name, stage, report):
+        """
+        Record the time that the download described by the given report took. Reports of files
+        that were found in the download cache have no times, and are not recorded.
+
+        :param name:   The name of a package
+        :type  name:   basestring
+        :param stage:  STAGE_MANIFEST or STAGE_DOWNLOAD
+        :type  stage:  basestring
+        :param report: The report of a successful download
+        :type  report: nectar.report.DownloadReport
+        """
+        start_time = getattr(report, 'start_time', None)
+        finish_time = getattr(report, 'finish_time', None)
+        if start_time is None or finish_time is None:
+            return
+        delta = finish_time - start_time
+        self.record(name, stage,
+                    delta.days * 86400 + delta.seconds + delta.microseconds / 1000000.0)
+
+    def report(self, slowest=SLOWEST_PACKAGES):
+        """
+        Summarize the recorded durations.
+
+        :param slowest: The number of slowest packages to list
+        :type  slowest: int
+        :return:        A dictionary with a histogram of each stage that was recorded, under
+                        stages, and the slowest packages with the seconds they spent in each stage,
+                        under slowest
+        :rtype:         dict
+        """
+        self._lock.acquire()
+        try:
+            durations = dict([(name, dict(stages)) for name, stages in self._durations.items()])
+        finally:
+            self._lock.release()
+
+        histograms = {}
+        for stage in STAGES:
+            seconds = [stages[stage] for stages in durations.values() if stage in stages]
+            if seconds:
+                histograms[stage] = _histogram(seconds)
+
+        totals = [(sum(stages.values()), name) for name, stages in durations.items()]
+        totals.sort(reverse=True)
+        slowest_packages = []
+        for total, name in totals[:slowest]:
+            slowest_packages.append({'name': name, 'total_seconds': round(total, 3),
+                                     'stages': dict([(stage, round(s, 3)) for stage, s in
+                                                     durations[name].items()])})
+        return {'stages': histograms, 'slowest': slowest_packages}
+
+    def close(self):
+        """
+        Close the event log, if it was opened.
+        """
+        if self._event_log is not None:
+            self._event_log.close()
+            self._event_log = None
+
+    def _log_event(self, name, stage, seconds):
+        """
+        Append an event to the event log. The log is opened the first time, and a log that can't
+        be written is given up on rather than failing the sync.
+
+        :param name:    The name of a package
+        :type  name:    basestring
+        :param stage:   One of STAGES
+        :type  stage:   basestring
+        :param seconds: How long the stage took
+        :type  seconds: float
+        """
+        try:
+            if self._event_log is None:
+                self._event_log = open(self._event_log_path, 'a')
+            self._event_log.write(json.dumps({'time': self._clock(), 'package': name,
+                                              'stage': stage, 'seconds': seconds}) + '\n')
+        except IOError as e:
+            _logger.warning(_('Could not write to the latency log %(path)s: %(error)s') %
+                            {'path': self._event_log_path, 'error': e})
+            self._event_log_path = None
+
+
+def _histogram(seconds):
+    """
+    Build the histogram of the given durations.
+
+    :param seconds: Durations, in seconds
+    :type  seconds: list of float
+    :return:        The count, total and maximum of the durations, and the buckets as a list of
+                    [upper bound, count] pairs
+    :rtype:         dict
+    """
+    counts = [0] * (len(BUCKETS) + 1)
+    for s in seconds:
+        index = 0
+        while index < len(BUCKETS) and s > BUCKETS[index]:
+            index += 1
+        counts[index] += 1
+    bounds = list(BUCKETS) + [None]
+    return {'count': len(seconds), 'total_seconds': round(sum(seconds), 3),
+            'max_seconds': round(max(seconds), 3),
+            'buckets': [[bound, count] for bound, count in zip(bounds, counts)]}
@@ -0,0 +1,143 @@
+"""
+This module contains the sync plan that a dry run produces. A dry run reads the package manifests
+as a sync would, but records the changes it would make to the repository instead of making them.
+The plan estimates how long the sync would take from the throughput of the repository's past
+syncs, which each sync records in the repository's scratchpad.
+"""
+from pulp_npm.common import constants
+
+# How much the throughput of the latest sync counts against the ones before it
+THROUGHPUT_WEIGHT = 0.5
+
+
+class SyncPlan(object):
+    """
+    The versions that a sync would download, and the ones it would associate with the repository.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty SyncPlan.
+        """
+        # Maps package names to the set of their versions that would be associated
+        self.versions_to_associate = {}
+        # Maps (name, version) tuples to the size of the version's tarball, or None if unknown
+        self.sizes = {}
+
+    def associate(self, name, versions):
+        """
+        Record that the given versions of a package would be associated with the repository.
+
+        :param name:     The name of a package
+        :type  name:     basestring
+        :param versions: Versions of the package that are in Pulp but not in the repository
+        :type  versions: iterable
+        """
+        if versions:
+            self.versions_to_associate.setdefault(name, set()).update(versions)
+
+    def add_sizes(self, name, versions):
+        """
+        Record the tarball sizes that the manifest of a package lists for the given versions. When
+        a registry doesn't list the size of a tarball, the unpacked size is used instead, as an
+        upper bound.
+
+        :param name:     The name of a package
+        :type  name:     basestring
+        :param versions: Maps versions to their metadata in the package manifest
+        :type  versions: dict
+        """
+        for version, metadata in versions.items():
+            dist = metadata.get('dist') or {}
+            self.sizes[(name, version)] = dist.get('size') or dist.get('unpackedSize')
+
+    def build(self, packages_to_download, throughput=None, units_to_remove=None):
+        """
+        Build the plan's summary and details.
+
+        :param packages_to_download: The packages that the sync would download, as found in
+                                     SyncStep._packages_to_download
+        :type  packages_to_download: list of dict
+        :param throughput:           The throughput of past syncs, in bytes per second
+        :type  throughput:           float
+        :param units_to_remove:      The unit keys of the versions that the sync would remove from
+                                     the repository, if it removes missing versions
+        :type  units_to_remove:      list of dict
+        :return:                     A 2-tuple of the summary and the details of the plan. The
+                                     details list the versions of each package.
+        :rtype:                      tuple
+        """
+        new_versions = {}
+        download_bytes = 0
+        unknown_sizes = 0
+        for p in packages_to_download:
+            new_versions.setdefault(p['name'], set()).add(p['version'])
+            size = self.sizes.get((p['name'], p['version']))
+            if size is None:
+                unknown_sizes += 1
+            else:
+                download_bytes += size
+
+        versions_to_remove = {}
+        for unit_key in units_to_remove or []:
+            versions_to_remove.setdefault(unit_key['name'], set()).add(unit_key['version'])
+
+        estimated_seconds = None
+        if throughput:
+            estimated_seconds = download_bytes / throughput
+
+        summary = {
+            'new_versions': sum([len(v) for v in new_versions.values()]),
+            'versions_to_associate': sum([len(v) for v in self.versions_to_associate.values()]),
+            'versions_to_remove': len(units_to_remove or []),
+            'download_bytes': download_bytes,
+            'versions_without_size': unknown_sizes,
+            'estimated_seconds': estimated_seconds}
+        details = {
+            'new_versions': _sorted_versions(new_versions),
+            'versions_to_associate': _sorted_versions(self.versions_to_associate),
+            'versions_to_remove': _sorted_versions(versions_to_remove)}
+        return summary, details
+
+
+def get_throughput(scratchpad):
+    """
+    Return the throughput of the repository's past syncs.
+
+    :param scratchpad: The repository's scratchpad
+    :type  scratchpad: dict
+    :return:           The throughput in bytes per second, or None if no sync has downloaded
+                       anything yet
+    :rtype:            float
+    """
+    return (scratchpad or {}).get(constants.SCRATCHPAD_KEY_THROUGHPUT)
+
+
+def update_throughput(scratchpad, downloaded_bytes, seconds):
+    """
+    Fold the throughput of a sync into the one recorded in the given scratchpad.
+
+    :param scratchpad:       The repository's scratchpad, which is updated
+    :type  scratchpad:       dict
+    :param downloaded_bytes: The number of bytes that the sync downloaded
+    :type  downloaded_bytes: int
+    :param seconds:          How long the sync spent downloading
+    :type  seconds:          float
+    """
+    throughput = downloaded_bytes / float(seconds)
+    previous = get_throughput(scratchpad)
+    if previous:
+        throughput = THROUGHPUT_WEIGHT * throughput + (1 - THROUGHPUT_WEIGHT) * previous
+    scratchpad[constants.SCRATCHPAD_KEY_THROUGHPUT] = throughput
+
+
+def _sorted_versions(versions):
+    """
+    Return the given sets of versions as sorted lists, so that they can be serialized.
+
+    :param versions: Maps package names to sets of versions
+    :type  versions: dict
+    :return:         Maps package names to sorted lists of versions
+    :rtype:          dict
+    """
+    return dict([(name, sorted(v)) for name, v in versions.items()])
@@ -0,0 +1,235 @@
+"""
+This module contains the sharding of large syncs. The package names of a repository are split into
+shards, and each shard but the first is synchronized by a task of its own, so that the shards run
+on separate workers. The task that synchronizes the repository works on the first shard, waits for
+the others, and merges their reports into its own, so that the repository is published once.
+
+The shard tasks don't reserve the repository, which the sync task holds until every shard is done.
+Before a shard is synchronized, it is taken by recording it in the database, so each shard is
+synchronized once, either by its own task or by the sync task, and a shard that hasn't started by
+the time the sync task gives up on it never runs. The shards write to the repository at the same
+time, which is safe because their packages don't overlap, the tarballs are claimed before they are
+downloaded, and associating a unit twice has no effect. The download throughput that each shard
+records in the repository's scratchpad may overwrite another shard's, which only affects the
+estimates of dry runs.
+"""
+from gettext import gettext as _
+import logging
+import shutil
+import tempfile
+import time
+import uuid
+
+from pulp.common import constants as pulp_constants
+from pulp.plugins.config import PluginCallConfiguration
+from pulp.plugins.conduits.repo_sync import RepoSyncConduit
+from pulp.plugins.model import Repository
+from pulp.server.async import tasks
+from pulp.server.async.celery_instance import celery
+from pulp.server.async.task_status_manager import TaskStatusManager
+from pulp.server.db import connection
+from pymongo.errors import DuplicateKeyError
+
+from pulp_npm.common import constants
+from pulp_npm.plugins.importers import sync
+
+# The resource that each shard task reserves, so that shards of one repository can run at once
+SHARD_RESOURCE_TYPE = 'pulp_npm:sync_shard'
+# How often the waiting task checks on the shard tasks, in seconds
+POLL_INTERVAL = 5
+# The collection that records which shards were taken
+COLLECTION_NAME = 'npm_sync_shards'
+# How long the records of taken shards are kept, in seconds
+RECORD_TIMEOUT = 7 * 24 * 60 * 60
+
+_logger = logging.getLogger(__name__)
+
+
+def split(names, count):
+    """
+    Split the given package names into at most the given number of shards of nearly equal size.
+
+    :param names: The names of the packages to synchronize
+    :type  names: list
+    :param count: The number of shards
+    :type  count: int
+    :return:      The non-empty shards, each a list of package names
+    :rtype:       list
+    """
+    return [names[i::count] for i in range(count) if names[i::count]]
+
+
+def take(shard_id):
+    """
+    Take the given shard, unless it was taken already.
+
+    :param shard_id: The ID of the shard
+    :type  shard_id: basestring
+    :return:         True if the shard was taken by this call
+    :rtype:          bool
+    """
+    collection = connection.get_collection(COLLECTION_NAME, create=True)
+    try:
+        collection.insert({'_id': shard_id, 'taken_at': time.time()})
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+@celery.task(base=tasks.Task, name='pulp_npm.plugins.importers.shards.sync_shard')
+def sync_shard(repo_id, config, package_names, shard_id, working_dir, download_cache_dir):
+    """
+    Synchronize the given packages into the given repository, as one shard of a larger sync,
+    unless the sync task took the shard first.
+
+    :param repo_id:            The ID of the repository
+    :type  repo_id:            basestring
+    :param config:             The flattened importer configuration of the sync
+    :type  config:             dict
+    :param package_names:      The names of the packages in the shard
+    :type  package_names:      list
+    :param shard_id:           The ID of the shard
+    :type  shard_id:           basestring
+    :param working_dir:        The working directory of the repository that the sync task was given
+    :type  working_dir:        basestring
+    :param download_cache_dir: The directory that the sync task downloads packages into
+    :type  download_cache_dir: basestring
+    :return:                   The shard's report, as returned by run_shard(), or None if the shard
+                               was taken by the sync task
+    :rtype:                    dict
+    """
+    if not take(shard_id):
+        _logger.info(_('Shard %(id)s of repository %(repo)s was taken by the sync task.') %
+                     {'id': shard_id, 'repo': repo_id})
+        return None
+    conduit = RepoSyncConduit(repo_id, constants.IMPORTER_TYPE_ID)
+    return run_shard(Repository(repo_id, working_dir=working_dir), conduit, config, package_names,
+                     download_cache_dir)
+
+
+def run_shard(repo, conduit, config, package_names, download_cache_dir=None):
+    """
+    Synchronize the given packages into the given repository.
+
+    :param repo:               metadata describing the repository
+    :type  repo:               pulp.plugins.model.Repository
+    :param conduit:            provides access to relevant Pulp functionality
+    :type  conduit:            pulp.plugins.conduits.repo_sync.RepoSyncConduit
+    :param config:             The flattened importer configuration of the sync
+    :type  config:             dict
+    :param package_names:      The names of the packages in the shard
+    :type  package_names:      list
+    :param download_cache_dir: The directory that packages are downloaded into. Defaults to a
+                               directory that is removed once the shard is done.
+    :type  download_cache_dir: basestring
+    :return:                   A dictionary with the success_flag, summary and details of the
+                               shard's sync report
+    :rtype:                    dict
+    """
+    shard_config = dict(config)
+    shard_config[constants.CONFIG_KEY_PACKAGE_NAMES] = ','.join(package_names)
+    shard_config[constants.CONFIG_KEY_SYNC_SHARDS] = 1
+    # A dry run is only honored in the override config
+    override_config = {}
+    if constants.CONFIG_KEY_DRY_RUN in shard_config:
+        override_config[constants.CONFIG_KEY_DRY_RUN] = shard_config.pop(
+            constants.CONFIG_KEY_DRY_RUN)
+    sync_config = PluginCallConfiguration({}, shard_config, override_config)
+    working_dir = tempfile.mkdtemp(dir=repo.working_dir)
+    try:
+        sync_step = sync.SyncStep(repo=repo, conduit=conduit,
+                                  config=sync_config,
+                                  working_dir=working_dir, download_cache_dir=download_cache_dir)
+        report = sync_step.sync()
+        return {'success_flag': report.success_flag, 'summary': report.summary,
+                'details': report.details}
+    finally:
+        shutil.rmtree(working_dir, ignore_errors=True)
+
+
+def sync_sharded(repo, conduit, config, count, download_cache_dir=None):
+    """
+    Synchronize the repository in the given number of shards, and merge their reports. The first
+    shard is synchronized by the calling task. Shards that no worker has started by the time it is
+    done are taken back from the queue and synchronized by the calling task as well, so that the
+    sync finishes even when every other worker is busy. If the calling task fails, the shards that
+    were not started are taken, so that they don't run once it has released the repository.
+
+    :param repo:               metadata describing the repository
+    :type  repo:               pulp.plugins.model.Repository
+    :param conduit:            provides access to relevant Pulp functionality
+    :type  conduit:            pulp.plugins.conduits.repo_sync.RepoSyncConduit
+    :param config:             plugin configuration
+    :type  config:             pulp.plugins.config.PluginCallConfiguration
+    :param count:              The number of shards
+    :type  count:              int
+    :param download_cache_dir: The directory that the calling task downloads packages into
+    :type  download_cache_dir: basestring
+    :return:                   The merged report of the shards
+    :rtype:                    pulp.plugins.model.SyncReport
+    """
+    flattened = config.flatten()
+    names = flattened[constants.CONFIG_KEY_PACKAGE_NAMES].split(',')
+    shards = split(names, count)
+    _logger.info(_('Synchronizing %(count)d packages in %(shards)d shards.') %
+                 {'count': len(names), 'shards': len(shards)})
+
+    connection.get_collection(COLLECTION_NAME, create=True).remove(
+        {'taken_at': {'$lt': time.time() - RECORD_TIMEOUT}})
+
+    reports = [None] * len(shards)
+    task_ids = {}
+    shard_ids = {}
+    for index in range(1, len(shards)):
+        shard_ids[index] = uuid.uuid4().hex
+        async_result = sync_shard.apply_async_with_reservation(
+            SHARD_RESOURCE_TYPE, '%s:%d' % (repo.id, index), repo.id, flattened, shards[index],
+            shard_ids[index], repo.working_dir, download_cache_dir)
+        task_ids[index] = async_result.id
+
+    try:
+        reports[0] = run_shard(repo, conduit, flattened, shards[0], download_cache_dir)
+        while task_ids:
+            for index, task_id in task_ids.items():
+                status = TaskStatusManager.find_by_task_id(task_id)
+                if status['state'] == pulp_constants.CALL_FINISHED_STATE:
+                    reports[index] = status['result']
+                elif status['state'] in pulp_constants.CALL_COMPLETE_STATES:
+                    reports[index] = {'success_flag': False, 'summary': {},
+                                      'details': {'error': status.get('error')}}
+                elif status['state'] == pulp_constants.CALL_WAITING_STATE and \
+                        take(shard_ids[index]):
+                    # The shard's task will find the shard taken if a worker starts it anyway
+                    tasks.cancel(task_id)
+                    reports[index] = run_shard(repo, conduit, flattened, shards[index],
+                                               download_cache_dir)
+                else:
+                    continue
+                del task_ids[index]
+            if task_ids:
+                time.sleep(POLL_INTERVAL)
+    finally:
+        for index, task_id in task_ids.items():
+            if take(shard_ids[index]):
+                tasks.cancel(task_id)
+
+    return merge_reports(conduit, reports)
+
+
+def merge_reports(conduit, reports):
+    """
+    Merge the reports of the shards of a sync into one sync report, which is only successful if
+    every shard was.
+
+    :param conduit: provides access to relevant Pulp functionality
+    :type  conduit: pulp.plugins.conduits.repo_sync.RepoSyncConduit
+    :param reports: The reports of the shards, as returned by run_shard()
+    :type  reports: list of dict
+    :return:        The merged report
+    :rtype:         pulp.plugins.model.SyncReport
+    """
+    summary = {'shards': [r['summary'] for r in reports]}
+    details = {'shards': [r['details'] for r in reports]}
+    if all([r['success_flag'] for r in reports]):
+        return conduit.build_success_report(summary, details)
+    return conduit.build_failure_report(summary, details)
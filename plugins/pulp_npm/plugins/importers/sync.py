@@ -3,30 +3,186 @@ This module contains the necessary means for a necessary means for syncing packa
 """
 from cStringIO import StringIO
 from gettext import gettext as _
+import itertools
 import json
 import logging
 import os
 import shutil
-from urlparse import urljoin
+import time
+import urllib
+from urlparse import urljoin, urlparse
 
-from nectar import request
+from nectar import report as nectar_report, request
+from nectar.downloaders.threaded import HTTPThreadedDownloader
 from pulp.common.plugins import importer_constants
 from pulp.plugins.util import publish_step
+from pulp.plugins.util.nectar_config import importer_config_to_nectar_config
 from pulp.server.db.model import criteria
+from pulp.server.db.model.repository import RepoContentUnit
+from pulp.server.managers import factory as manager_factory
 
-from pulp_npm.common import constants
-from pulp_npm.plugins import models
+from pulp_npm.common import constants, dependencies, lockfile
+from pulp_npm.plugins import exporter, instrumentation, models, packuments
+from pulp_npm.plugins.importers import (cache, changes, claims, configuration, feeds, fields,
+                                        filters, latency, plan, throttle)
+
+# The number of unit keys that are looked up in Pulp with a single query
+QUERY_BATCH_SIZE = 500
+# The number of units that are removed from the repository with a single query
+REMOVE_BATCH_SIZE = 1000
 
 _logger = logging.getLogger(__name__)
 
 
-class DownloadMetadataStep(publish_step.DownloadStep):
+class AdaptiveDownloadStep(instrumentation.InstrumentedStepMixin, publish_step.DownloadStep):
+    """
+    A DownloadStep whose requests are paced by an adaptive controller. The number of requests in
+    flight is kept under the concurrency configured for the step, and reduced when the registry
+    answers with 429 or 503. Throttled requests are retried after the wait that the registry asks
+    for, rather than failed. Subclasses set concurrency_key to the importer config key of their
+    concurrency.
+    """
+
+    concurrency_key = None
+    _throttle = None
+
+    def initialize(self):
+        """
+        Set up the downloader with the concurrency configured for this step, and the controller
+        that paces its requests. Each of the downloader's threads keeps its connections to the
+        registry alive for the whole step.
+        """
+        super(AdaptiveDownloadStep, self).initialize()
+        config = self.get_config()
+        concurrency = configuration.get_concurrency(config, self.concurrency_key)
+        if isinstance(self.downloader, HTTPThreadedDownloader):
+            flattened = config.flatten()
+            flattened[importer_constants.KEY_MAX_DOWNLOADS] = concurrency
+            self.downloader = HTTPThreadedDownloader(
+                importer_config_to_nectar_config(flattened), self)
+        self._throttle = throttle.AdaptiveController(concurrency)
+
+    def _process_block(self, item=None):
+        """
+        Download the requests, as fast as the controller allows.
+        """
+        self.downloader.download(self._paced(self.downloads))
+
+    def _paced(self, requests):
+        """
+        Return the given requests paced by the controller, followed by any retries.
+
+        :param requests: The requests to send
+        :type  requests: iterable of nectar.request.DownloadRequest
+        :return:         The requests to hand to the downloader
+        :rtype:          iterable
+        """
+        if self._throttle is None:
+            return requests
+        return self._throttle.feed(requests)
+
+    def _retry_request(self, report):
+        """
+        Build the request that retries the download that the given report describes.
+
+        :param report: The report of a throttled download
+        :type  report: nectar.report.DownloadReport
+        :return:       A request for the same URL
+        :rtype:        nectar.request.DownloadRequest
+        """
+        return request.DownloadRequest(report.url, report.destination, report.data)
+
+    def download_succeeded(self, report):
+        """
+        Let the controller know that a request finished, before counting the success and the bytes
+        that were downloaded.
+
+        :param report: The report that details the download
+        :type  report: nectar.report.DownloadReport
+        """
+        # Reports of files found in the download cache say that nothing was downloaded
+        self.bytes_moved += report.bytes_downloaded
+        if self._throttle is not None:
+            self._throttle.finished(report.url)
+        super(AdaptiveDownloadStep, self).download_succeeded(report)
+
+    def _failover_request(self, report):
+        """
+        Build the request that fetches the failed download that the given report describes from
+        the next feed, if there is one. Subclasses that know how to find their files at another
+        feed override this.
+
+        :param report: The report of a failed download
+        :type  report: nectar.report.DownloadReport
+        :return:       A request for the next feed, or None
+        :rtype:        nectar.request.DownloadRequest
+        """
+        return None
+
+    def download_failed(self, report):
+        """
+        Queue a throttled request to be retried, unless it has been retried too often already.
+        Requests that failed for good are tried at the next feed that serves the package, and
+        counted as failed once there is none left.
+
+        :param report: The report that details the download
+        :type  report: nectar.report.DownloadReport
+        :return:       True if the download will be tried again, False if it was counted as failed
+        :rtype:        bool
+        """
+        if self._throttle is not None:
+            failover = self._failover_request(report)
+            if failover is not None:
+                _logger.warning(_('Unable to download %(url)s, trying %(next)s instead.') %
+                                {'url': report.url, 'next': failover.url})
+            response_code = (report.error_report or {}).get('response_code')
+            if response_code in throttle.THROTTLE_CODES:
+                headers = getattr(report, 'headers', None) or {}
+                _logger.info(_('The feed throttled the request for %(url)s.') % {'url': report.url})
+                if self._throttle.throttled(self._retry_request(report),
+                                            headers.get('Retry-After'), failover):
+                    self.retries += 1
+                    return True
+            else:
+                self._throttle.finished(report.url, failover)
+                if failover is not None:
+                    self.retries += 1
+                    return True
+        super(AdaptiveDownloadStep, self).download_failed(report)
+        return False
+
+
+class DownloadMetadataStep(AdaptiveDownloadStep):
     """
     This DownloadStep subclass contains the code to process the downloaded manifests and decide what
     to download from the feed. It does this as it gets each metadata file to spread the load on the
     database.
     """
 
+    concurrency_key = constants.CONFIG_KEY_METADATA_CONCURRENCY
+
+    def _retry_request(self, report):
+        """
+        Build the request that retries the download of a manifest, with a fresh StringIO.
+
+        :param report: The report of a throttled download
+        :type  report: nectar.report.DownloadReport
+        :return:       A request for the same URL
+        :rtype:        nectar.request.DownloadRequest
+        """
+        return request.DownloadRequest(report.url, StringIO(), report.data)
+
+    def _failover_request(self, report):
+        """
+        Build the request that fetches the manifest from the next feed that serves the package.
+
+        :param report: The report of a failed download
+        :type  report: nectar.report.DownloadReport
+        :return:       A request for the next feed, or None if there is none
+        :rtype:        nectar.request.DownloadRequest
+        """
+        return _manifest_failover_request(self.parent.parent._feed_router, report)
+
     def download_failed(self, report):
         """
         This method is called by Nectar when we were unable to download the metadata file for a
@@ -54,14 +210,28 @@ class DownloadMetadataStep(publish_step.DownloadStep):
         """
         _logger.info(_('Processing metadata retrieved from %(url)s.') % {'url': report.url})
         report.destination.seek(0)
-        self.parent.parent._packages_to_download.extend(
-            self._process_manifest(report.destination.read(), self.conduit))
+        sync_step = self.parent.parent
+        name = report.data['name']
+        sync_step._touched_packages.add(name)
+        sync_step._latency.record_download(name, latency.STAGE_MANIFEST, report)
+        deferred = sync_step._download_policy == constants.DOWNLOAD_ON_DEMAND
+        with sync_step._latency.timed(name, latency.STAGE_DIFF):
+            manifest = json.loads(report.destination.read())
+            sync_step._upstream_tags[name] = manifest.get('dist-tags', {})
+            sync_step._packages_to_download.extend(
+                self._process_manifest(manifest, self.conduit,
+                                       deferred=deferred,
+                                       wanted_versions=sync_step._wanted_versions,
+                                       version_filter=sync_step._version_filter,
+                                       sync_plan=sync_step._plan,
+                                       units_to_remove=sync_step._units_to_remove))
         report.destination.close()
 
         super(DownloadMetadataStep, self).download_succeeded(report)
 
     @staticmethod
-    def _process_manifest(manifest, conduit):
+    def _process_manifest(manifest, conduit, deferred=False, wanted_versions=None,
+                          version_filter=None, sync_plan=None, units_to_remove=None):
         """
         This method reads the given package manifest to determine which versions of the package are
         available at the feed repo. It then compares these versions to the versions that are in the
@@ -70,25 +240,68 @@ class DownloadMetadataStep(publish_step.DownloadStep):
         association without downloading the packages. For package versions which are not available
         in Pulp, it will return a list of dictionaries describing the missing packages so that the
         DownloadPackagesStep can retrieve them later. Each dictionary has the following keys: name,
-        version, url, and checksum. The checksum is given in md5, as per the upstream PyPI feed.
+        version, tarball, and shasum. The shasum is given in sha1, as per the upstream npm feed.
+
+        Only the versions that are wanted and that the version filter keeps are downloaded or
+        associated with the repository, so that no request is built for a version that the policy
+        excludes.
+
+        When deferred is True, each dictionary also carries the manifest's metadata for its version
+        under the metadata key, so that the unit can be created without downloading the tarball.
+        When it is False, versions that are in Pulp only as deferred units whose tarball was never
+        retrieved are returned for download as well.
+
+        When a sync plan is given, the versions that would be associated with the repository are
+        recorded in it instead of being associated, along with the tarball sizes of the versions
+        that would be downloaded.
+
+        When units_to_remove is given, the unit keys of the versions in the repository that the
+        manifest no longer lists are appended to it, so that they can be removed from the
+        repository together once the sync is done.
 
-        :param manifest: A package manifest in JSON format, describing the versions of a package
-                         that are available for download.
-        :type  manifest: basestring
-        :param conduit:  The sync conduit. This is used to query Pulp for available packages.
-        :type  conduit:  pulp.plugins.conduits.repo_sync.RepoSyncConduit
-        :return:         A list of dictionaries, describing the packages that need to be downloaded.
-        :rtype:          list
+        :param manifest:        A package manifest in JSON format, or already parsed, describing
+                                the versions of a package that are available for download.
+        :type  manifest:        basestring or dict
+        :param conduit:         The sync conduit. This is used to query Pulp for available packages.
+        :type  conduit:         pulp.plugins.conduits.repo_sync.RepoSyncConduit
+        :param deferred:        Whether the sync uses the on_demand download policy
+        :type  deferred:        bool
+        :param wanted_versions: Maps package names to the set of their versions that should be
+                                synchronized. Every version of packages that are not in the map is
+                                synchronized.
+        :type  wanted_versions: dict
+        :param version_filter:  The configured version filtering policies, if any
+        :type  version_filter:  pulp_npm.plugins.importers.filters.VersionFilter
+        :param sync_plan:       The plan of a dry run, if this is one
+        :type  sync_plan:       pulp_npm.plugins.importers.plan.SyncPlan
+        :param units_to_remove: The unit keys of the versions to remove from the repository
+        :type  units_to_remove: list
+        :return:                A list of dictionaries, describing the packages that need to be
+                                downloaded.
+        :rtype:                 list
         """
-        package_json = json.loads(manifest)
+        if isinstance(manifest, basestring):
+            package_json = json.loads(manifest)
+        else:
+            package_json = manifest
         name = package_json['name']
         all_versions = set(package_json['versions'].keys())
+        if wanted_versions and name in wanted_versions:
+            all_versions &= wanted_versions[name]
+        if version_filter is not None:
+            all_versions = version_filter.apply(name, all_versions)
 
         # Find the versions that we have in Pulp
-        search = criteria.Criteria(filters={'name': name}, fields=['name', 'version'])
-        versions_in_pulp = set(
-            [u.unit_key['version'] for u in
-             conduit.search_all_units(constants.PACKAGE_TYPE_ID, criteria=search)])
+        search = criteria.Criteria(filters={'name': name},
+                                   fields=['name', 'version', constants.METADATA_KEY_DEFERRED,
+                                           '_storage_path'])
+        units_in_pulp = conduit.search_all_units(constants.PACKAGE_TYPE_ID, criteria=search)
+        versions_in_pulp = set([u.unit_key['version'] for u in units_in_pulp])
+        # These versions were added by an on_demand sync and their tarballs were never retrieved
+        versions_without_bits = set(
+            [u.unit_key['version'] for u in units_in_pulp
+             if u.metadata.get(constants.METADATA_KEY_DEFERRED) and
+             not os.path.exists(u.storage_path)])
 
         # Find the versions that we have in the repo already
         search = criteria.UnitAssociationCriteria(unit_filters={'name': name},
@@ -96,29 +309,212 @@ class DownloadMetadataStep(publish_step.DownloadStep):
         versions_in_repo = set([u.unit_key['version'] for u in
                                 conduit.get_units(criteria=search)])
 
-        # These versions are in Pulp, but are not associated with this repository. Associate them.
-        versions_to_associate = list(versions_in_pulp - versions_in_repo)
-        if versions_to_associate:
+        # These versions were unpublished upstream
+        if units_to_remove is not None:
+            units_to_remove.extend(
+                [{'name': name, 'version': v}
+                 for v in sorted(versions_in_repo - set(package_json['versions'].keys()))])
+
+        # These versions are in Pulp, but are not associated with this repository. Associate the
+        # ones that this sync wants.
+        versions_to_associate = list((versions_in_pulp - versions_in_repo) & all_versions)
+        if sync_plan is not None:
+            sync_plan.associate(name, versions_to_associate)
+        elif versions_to_associate:
             conduit.associate_existing(
                 constants.PACKAGE_TYPE_ID,
                 [{'name': name, 'version': v} for v in versions_to_associate])
 
         # We don't have these versions in Pulp yet. Let's download them!
         versions_to_dl = all_versions - versions_in_pulp
+        if not deferred:
+            versions_to_dl |= all_versions & versions_without_bits
         packages_to_dl = []
         for v in versions_to_dl:
-            packages_to_dl.append({'name': name, 'version': v,
-                                   'tarball': package_json['versions'][v]['dist']['tarball'],
-                                   'shasum': package_json['versions'][v]['dist']['shasum']})
+            package = {'name': name, 'version': v,
+                       'tarball': package_json['versions'][v]['dist']['tarball'],
+                       'shasum': package_json['versions'][v]['dist']['shasum']}
+            if deferred:
+                package['metadata'] = package_json['versions'][v]
+            packages_to_dl.append(package)
+        if sync_plan is not None:
+            sync_plan.add_sizes(name, dict([(v, package_json['versions'][v])
+                                            for v in versions_to_dl]))
         return packages_to_dl
 
 
-class DownloadPackagesStep(publish_step.DownloadStep):
+class DownloadPackagesStep(AdaptiveDownloadStep):
     """
     This DownloadStep retrieves the packages from the feed, processes each package for its metadata,
-    and adds the unit to the repository in Pulp.
+    and adds the unit to the repository in Pulp. The packages are downloaded into the SyncStep's
+    download cache, so a sync that fails part way leaves its downloads for the next one to use.
     """
 
+    concurrency_key = constants.CONFIG_KEY_PACKAGE_CONCURRENCY
+    # The seconds spent downloading the tarballs
+    download_seconds = 0.0
+    # The opener that partial downloads are resumed with, built when the first one is resumed
+    _opener = None
+
+    def _process_block(self, item=None):
+        """
+        Process the packages that an earlier sync downloaded but didn't add to Pulp, resume the
+        ones that it downloaded partially, and download the others. The packages are claimed a
+        batch at a time, just before their tarballs are downloaded. Packages that another sync
+        task is downloading are left to it, and associated with the repository once it has saved
+        them.
+        """
+        download_claims = self.parent._download_claims
+        requests = iter(self.downloads)
+        waiting = []
+        try:
+            while True:
+                batch = list(itertools.islice(requests, claims.CLAIM_BATCH_SIZE))
+                if not batch:
+                    break
+                held = download_claims.claim([r.data for r in batch])
+                downloads = []
+                for download_request in batch:
+                    if claims.claim_key(download_request.data) not in held:
+                        waiting.append(download_request)
+                        continue
+                    self._prepare_download(download_request, downloads)
+                self._download(downloads)
+            self._wait_for_claims(waiting)
+        finally:
+            download_claims.release_all()
+
+    def _download(self, downloads):
+        """
+        Hand the given requests to the downloader, and measure how long it takes to process them.
+
+        :param downloads: The requests for the tarballs to download
+        :type  downloads: list of nectar.request.DownloadRequest
+        """
+        started = time.time()
+        self.downloader.download(self._paced(downloads))
+        self.download_seconds += time.time() - started
+
+    def _prepare_download(self, download_request, downloads):
+        """
+        Process the given package straight away if its tarball is in the download cache, resuming
+        a partial download first if there is one. Otherwise, add its request to the downloads.
+
+        :param download_request: The request for the package's tarball
+        :type  download_request: nectar.request.DownloadRequest
+        :param downloads:        The requests that are left for the downloader
+        :type  downloads:        list
+        """
+        download_cache = self.parent._download_cache
+        key = _cache_key(download_request.data)
+        path = download_cache.lookup(download_request.url, key)
+        if path is None and download_cache.has_partial(download_request.url, key):
+            try:
+                path = download_cache.resume(download_request.url, key, self._get_opener())
+            except IOError as e:
+                _logger.warning(_('Unable to resume the download of %(url)s: %(e)s') %
+                                {'url': download_request.url, 'e': e})
+        if path is None:
+            download_cache.prepare(download_request.url, key)
+            downloads.append(download_request)
+            return
+        report = nectar_report.DownloadReport(download_request.url, path, download_request.data)
+        self.download_succeeded(report)
+
+    def _get_opener(self):
+        """
+        Return the opener that partial downloads are resumed with. Nectar isn't used for these,
+        since it can't ask for a range of bytes, so the opener is built from the importer's proxy,
+        SSL and basic auth settings instead.
+
+        :return: The opener
+        :rtype:  urllib2.OpenerDirector
+        """
+        if self._opener is None:
+            self._opener = changes.build_opener(self.get_config())
+        return self._opener
+
+    def _wait_for_claims(self, waiting):
+        """
+        Wait for the other sync tasks that claimed the given packages to release their claims, and
+        associate the units they saved with the repository. Packages that the other task failed to
+        save are downloaded by this task instead.
+
+        :param waiting: The requests for the tarballs that other tasks claimed
+        :type  waiting: list of nectar.request.DownloadRequest
+        """
+        download_claims = self.parent._download_claims
+        while waiting:
+            download_claims.refresh()
+            claimed = download_claims.claimed_elsewhere([r.data for r in waiting])
+            still_waiting = []
+            released = []
+            for download_request in waiting:
+                package = download_request.data
+                if claims.claim_key(package) in claimed:
+                    still_waiting.append(download_request)
+                elif self._associate_saved_unit(package):
+                    self.progress_successes += 1
+                    self.report_progress()
+                else:
+                    released.append(download_request)
+            held = download_claims.claim([r.data for r in released])
+            downloads = []
+            for download_request in released:
+                if claims.claim_key(download_request.data) in held:
+                    self._prepare_download(download_request, downloads)
+                else:
+                    still_waiting.append(download_request)
+            if downloads:
+                self._download(downloads)
+            waiting = still_waiting
+            if waiting:
+                _logger.info(_('Waiting for other tasks to download %(count)d packages.') %
+                             {'count': len(waiting)})
+                time.sleep(claims.POLL_INTERVAL)
+
+    def _associate_saved_unit(self, package):
+        """
+        Associate the given package with the repository, if another task saved it in Pulp along
+        with its tarball.
+
+        :param package: A package to download, as found in SyncStep._packages_to_download
+        :type  package: dict
+        :return:        True if the package was associated
+        :rtype:         bool
+        """
+        search = criteria.Criteria(filters={'name': package['name'],
+                                            'version': package['version']},
+                                   fields=['name', 'version', '_storage_path'])
+        units = self.get_conduit().search_all_units(constants.PACKAGE_TYPE_ID, criteria=search)
+        if not [u for u in units if os.path.exists(u.storage_path)]:
+            return False
+        self.get_conduit().associate_existing(
+            constants.PACKAGE_TYPE_ID, [{'name': package['name'], 'version': package['version']}])
+        return True
+
+    def _failover_request(self, report):
+        """
+        Build the request that fetches the tarball from the next feed that serves the package.
+        Only tarballs that were served by one of the package's feeds can be found at another one,
+        at the same path.
+
+        :param report: The report of a failed download
+        :type  report: nectar.report.DownloadReport
+        :return:       A request for the next feed, or None if there is none
+        :rtype:        nectar.request.DownloadRequest
+        """
+        package = report.data
+        feed = self.parent._feed_router.next_feed(package['name'], report.url)
+        if feed is None:
+            return None
+        filename = os.path.basename(urlparse(report.url).path)
+        url = urljoin(feed, '%s/-/%s' % (package['name'], filename))
+        download_cache = self.parent._download_cache
+        download_cache.prepare(package['tarball'], _cache_key(package))
+        return request.DownloadRequest(
+            url, download_cache.partial_path(package['tarball'], _cache_key(package)), package)
+
     def download_succeeded(self, report):
         """
         This method processes a downloaded Npm package. It opens the package and reads its
@@ -131,33 +527,261 @@ class DownloadPackagesStep(publish_step.DownloadStep):
         way.
 
         This method also ensures that the checksum of the downloaded package matches the checksum
-        that was listed in the manifest. If everything checks out, the package is added to the
-        repository and moved to the proper storage path.
+        that was listed in the manifest, or the integrity that was listed in the lockfile. If
+        everything checks out, the package is added to the repository and moved from the download
+        cache to the proper storage path. A package with the wrong checksum is removed from the
+        cache, so that the next sync downloads it again. The task's other claims are renewed while
+        it works through them.
 
         :param report: The report that details the download
         :type  report: nectar.report.DownloadReport
         """
         _logger.info(_('Processing package retrieved from %(url)s.') % {'url': report.url})
+        name = report.data['name']
+        tracker = self.parent._latency
+        tracker.record_download(name, latency.STAGE_DOWNLOAD, report)
+        download_cache = self.parent._download_cache
+        report.destination = download_cache.commit(report.destination)
 
-        shasum = models.Package.checksum(report.destination)
-        if shasum != report.data['shasum']:
+        with tracker.timed(name, latency.STAGE_VERIFY):
+            if report.data.get('integrity'):
+                expected, actual = lockfile.verify_integrity(report.destination,
+                                                             report.data['integrity'])
+            else:
+                expected = report.data['shasum']
+                actual = models.Package.checksum(report.destination)
+        if actual != expected:
+            download_cache.discard(report.destination)
             report.state = 'failed'
-            report.error_report = {'expected_checksum': report.data['shasum'],
-                                   'actual_checksum': shasum}
+            report.error_report = {'expected_checksum': expected, 'actual_checksum': actual}
             return self.download_failed(report)
 
-        package = models.Package.from_archive(report.destination)
-        package.init_unit(self.conduit)
+        with tracker.timed(name, latency.STAGE_PARSE):
+            package = models.Package.from_archive(report.destination)
+            if self.parent._field_policy is not None:
+                self.parent._field_policy.apply(package)
+            package.init_unit(self.conduit)
 
-        # Copy the package from working directory into its proper place
-        shutil.copy(report.destination, package.storage_path)
+        # Move the package from the download cache into its proper place
+        with tracker.timed(name, latency.STAGE_COPY):
+            shutil.move(report.destination, package.storage_path)
+        download_cache.discard(report.destination)
 
-        package.save_unit(self.conduit)
+        with tracker.timed(name, latency.STAGE_SAVE):
+            package.save_unit(self.conduit)
+        self.parent._download_claims.release(report.data)
+        self.parent._download_claims.refresh()
 
         super(DownloadPackagesStep, self).download_succeeded(report)
 
+    def download_failed(self, report):
+        """
+        Release the claim on a package that could not be downloaded, so that another task can try,
+        unless it will be tried again. The task's other claims are renewed.
+
+        :param report: The report that details the download
+        :type  report: nectar.report.DownloadReport
+        :return:       True if the download will be tried again, False if it was counted as failed
+        :rtype:        bool
+        """
+        retried = super(DownloadPackagesStep, self).download_failed(report)
+        if not retried:
+            self.parent._download_claims.release(report.data)
+        self.parent._download_claims.refresh()
+        return retried
+
+
+class ProcessLockfileStep(instrumentation.InstrumentedStepMixin, publish_step.PluginStep):
+    """
+    This step handles the packages from the configured lockfiles whose tarball URL and integrity
+    are known, so their package manifests don't need to be fetched. Packages that are already in
+    Pulp are associated with the repository, and the rest are scheduled for download.
+    """
+
+    def __init__(self, repo, conduit, config, working_dir):
+        """
+        Initialize the ProcessLockfileStep.
+
+        :param repo:        metadata describing the repository
+        :type  repo:        pulp.plugins.model.Repository
+        :param conduit:     provides access to relevant Pulp functionality
+        :type  conduit:     pulp.plugins.conduits.repo_sync.RepoSyncConduit
+        :param config:      plugin configuration
+        :type  config:      pulp.plugins.config.PluginCallConfiguration
+        :param working_dir: The working directory path that can be used for temporary storage
+        :type  working_dir: basestring
+        """
+        super(ProcessLockfileStep, self).__init__(
+            'sync_step_process_lockfile', repo, conduit, config, working_dir,
+            constants.IMPORTER_TYPE_ID)
+        self.description = _('Processing packages listed in lockfiles.')
+
+    def process_main(self):
+        """
+        Query Pulp for the locked packages in batches, associate the ones that Pulp already has and
+        add the others to the SyncStep's _packages_to_download attribute.
+        """
+        conduit = self.get_conduit()
+        packages = self.parent._locked_packages
+        self.total_units = len(packages)
+        for i in xrange(0, len(packages), QUERY_BATCH_SIZE):
+            batch = packages[i:i + QUERY_BATCH_SIZE]
+            unit_keys = [{'name': p['name'], 'version': p['version']} for p in batch]
+
+            search = criteria.Criteria(filters={'$or': unit_keys}, fields=['name', 'version'])
+            in_pulp = set([(u.unit_key['name'], u.unit_key['version']) for u in
+                           conduit.search_all_units(constants.PACKAGE_TYPE_ID, criteria=search)])
+            search = criteria.UnitAssociationCriteria(unit_filters={'$or': unit_keys},
+                                                      unit_fields=['name', 'version'])
+            in_repo = set([(u.unit_key['name'], u.unit_key['version']) for u in
+                           conduit.get_units(criteria=search)])
+
+            to_associate = [k for k in unit_keys
+                            if (k['name'], k['version']) in in_pulp - in_repo]
+            if self.parent._plan is not None:
+                for k in to_associate:
+                    self.parent._plan.associate(k['name'], [k['version']])
+            elif to_associate:
+                conduit.associate_existing(constants.PACKAGE_TYPE_ID, to_associate)
+
+            for p in batch:
+                if (p['name'], p['version']) not in in_pulp:
+                    self.parent._packages_to_download.append(
+                        {'name': p['name'], 'version': p['version'], 'tarball': p['resolved'],
+                         'shasum': None, 'integrity': p['integrity']})
+            self.progress_successes += len(batch)
+            self.report_progress()
+
+
+class SaveDeferredPackagesStep(instrumentation.InstrumentedStepMixin, publish_step.PluginStep):
+    """
+    This step is used instead of the DownloadPackagesStep when the on_demand download policy is
+    configured. It creates the units from the metadata found in the package manifests, without
+    downloading their tarballs. The tarballs are retrieved the first time a client requests them.
+    """
+
+    def __init__(self, repo, conduit, config, working_dir):
+        """
+        Initialize the SaveDeferredPackagesStep.
+
+        :param repo:        metadata describing the repository
+        :type  repo:        pulp.plugins.model.Repository
+        :param conduit:     provides access to relevant Pulp functionality
+        :type  conduit:     pulp.plugins.conduits.repo_sync.RepoSyncConduit
+        :param config:      plugin configuration
+        :type  config:      pulp.plugins.config.PluginCallConfiguration
+        :param working_dir: The working directory path that can be used for temporary storage
+        :type  working_dir: basestring
+        """
+        super(SaveDeferredPackagesStep, self).__init__(
+            'sync_step_save_deferred_packages', repo, conduit, config, working_dir,
+            constants.IMPORTER_TYPE_ID)
+        self.description = _('Adding Npm packages to be downloaded on demand.')
+
+    def process_main(self):
+        """
+        Create and save a unit for each package in the SyncStep's _packages_to_download attribute.
+        """
+        conduit = self.get_conduit()
+        packages = self.parent._packages_to_download
+        self.total_units = len(packages)
+        for p in packages:
+            package = models.Package.from_manifest(p['metadata'])
+            if self.parent._field_policy is not None:
+                self.parent._field_policy.apply(package)
+            package.init_unit(conduit)
+            package.save_unit(conduit)
+            self.progress_successes += 1
+            self.report_progress()
+
+
+class FollowChangesStep(instrumentation.InstrumentedStepMixin, publish_step.PluginStep):
+    """
+    This step reads the _changes feed of a registry replica from the sequence number that the
+    previous sync of the repository stopped at, and restricts the sync to the packages that changed
+    since then. The first sync of a repository processes every configured package, and only
+    records where the feed stands.
+    """
+
+    def __init__(self, repo, conduit, config, working_dir):
+        """
+        Initialize the FollowChangesStep.
+
+        :param repo:        metadata describing the repository
+        :type  repo:        pulp.plugins.model.Repository
+        :param conduit:     provides access to relevant Pulp functionality
+        :type  conduit:     pulp.plugins.conduits.repo_sync.RepoSyncConduit
+        :param config:      plugin configuration
+        :type  config:      pulp.plugins.config.PluginCallConfiguration
+        :param working_dir: The working directory path that can be used for temporary storage
+        :type  working_dir: basestring
+        """
+        super(FollowChangesStep, self).__init__(
+            'sync_step_follow_changes', repo, conduit, config, working_dir,
+            constants.IMPORTER_TYPE_ID)
+        self.description = _('Reading the changes feed.')
+
+    def process_main(self):
+        """
+        Replace the SyncStep's package names with the ones that changed since the last sync, and
+        remember the sequence number that the next sync should continue from.
+        """
+        sync_step = self.parent
+        feed_url = sync_step._changes_feed
+        scratchpad = self.get_conduit().get_repo_scratchpad() or {}
+        since = None
+        if scratchpad.get(constants.SCRATCHPAD_KEY_CHANGES_FEED) == feed_url:
+            since = scratchpad.get(constants.SCRATCHPAD_KEY_CHANGES_SEQ)
+
+        opener = changes.build_opener(self.get_config())
+        if since is None:
+            # Nothing to continue from, so every configured package is processed
+            sync_step._changes_seq = changes.get_update_seq(feed_url, opener=opener)
+            return
+
+        names, sync_step._changes_seq = changes.get_changed_packages(feed_url, since,
+                                                                     opener=opener)
+        _logger.info(_('%(count)d packages changed since sequence %(since)s.') %
+                     {'count': len(names), 'since': since})
+        if sync_step._package_names:
+            wanted = set(sync_step._package_names)
+            names = [n for n in names if n in wanted]
+        sync_step._package_names = names
+
+
+class ProbeFeedsStep(instrumentation.InstrumentedStepMixin, publish_step.PluginStep):
+    """
+    This step measures how fast each of the configured feeds answers, so that every package is
+    downloaded from the fastest feed that serves it.
+    """
+
+    def __init__(self, repo, conduit, config, working_dir):
+        """
+        Initialize the ProbeFeedsStep.
+
+        :param repo:        metadata describing the repository
+        :type  repo:        pulp.plugins.model.Repository
+        :param conduit:     provides access to relevant Pulp functionality
+        :type  conduit:     pulp.plugins.conduits.repo_sync.RepoSyncConduit
+        :param config:      plugin configuration
+        :type  config:      pulp.plugins.config.PluginCallConfiguration
+        :param working_dir: The working directory path that can be used for temporary storage
+        :type  working_dir: basestring
+        """
+        super(ProbeFeedsStep, self).__init__(
+            'sync_step_probe_feeds', repo, conduit, config, working_dir,
+            constants.IMPORTER_TYPE_ID)
+        self.description = _('Measuring the latency of the feeds.')
+
+    def process_main(self):
+        """
+        Order the feeds of each scope by their latency. The feeds are reached with the importer's
+        proxy, SSL and basic auth settings.
+        """
+        self.parent._feed_router.probe(opener=changes.build_opener(self.get_config()))
+
 
-class GetMetadataStep(publish_step.PluginStep):
+class GetMetadataStep(instrumentation.InstrumentedStepMixin, publish_step.PluginStep):
     """
     This step creates all the required download requests for each package that the user has asked us
     to synchronize.
@@ -197,21 +821,27 @@ class GetMetadataStep(publish_step.PluginStep):
         :rtype:  generator
         """
         # We need to retrieve the manifests for each of our packages
-        manifest_urls = [urljoin(self.parent._feed_url, '%s' % pn)
-                         for pn in self.parent._package_names]
-        for u in manifest_urls:
-            yield request.DownloadRequest(u, StringIO(), {})
+        feed_router = self.parent._feed_router
+        for pn in self.parent._package_names:
+            yield request.DownloadRequest(_manifest_url(feed_router.feed_for(pn), pn), StringIO(),
+                                          {'name': pn})
 
 
-class SyncStep(publish_step.PluginStep):
+class ResolveDependenciesStep(AdaptiveDownloadStep):
     """
-    This Step is the top level step in this module. It arranges all the other necessary steps for
-    a Npm repository sync.
+    This step is used instead of the GetMetadataStep when the importer is configured to resolve
+    dependencies. Starting from the package names, each optionally followed by "@" and a version
+    range, it selects the version of each package that npm would install, and follows the
+    dependencies of the selected versions until the whole dependency closure has been found. The
+    manifests are fetched concurrently, one level of the dependency graph at a time, and each
+    manifest is fetched only once. Only the selected versions are synchronized.
     """
 
+    concurrency_key = constants.CONFIG_KEY_METADATA_CONCURRENCY
+
     def __init__(self, repo, conduit, config, working_dir):
         """
-        Initialize the SyncStep, adding the appropriate child steps.
+        Initialize the ResolveDependenciesStep.
 
         :param repo:        metadata describing the repository
         :type  repo:        pulp.plugins.model.Repository
@@ -222,37 +852,407 @@ class SyncStep(publish_step.PluginStep):
         :param working_dir: The working directory path that can be used for temporary storage
         :type  working_dir: basestring
         """
+        super(ResolveDependenciesStep, self).__init__(
+            'sync_step_resolve_dependencies', repo=repo, conduit=conduit, config=config,
+            working_dir=working_dir, plugin_type=constants.IMPORTER_TYPE_ID,
+            description=_('Resolving the dependencies of Npm packages.'))
+        self._dependency_types = configuration.get_dependency_types(config)
+        # Maps package names to their manifests, or to None if the manifest could not be fetched
+        self._manifests = {}
+        # Maps package names to the set of their versions that were selected
+        self._selected = {}
+        # The reports of the manifests that were downloaded for the current level
+        self._reports = []
+
+    def get_total(self):
+        """
+        Return the number of root packages. The total grows as dependencies are discovered.
+
+        :return: The number of root packages
+        :rtype:  int
+        """
+        return len(self._get_roots())
+
+    def _get_roots(self):
+        """
+        Return the requirements that the resolution starts from. A package name without a version
+        range selects the version that its "latest" dist-tag points to, and a package that is only
+        listed in a lockfile selects each of its locked versions.
+
+        :return: A list of 2-tuples of a package name and a version range or dist-tag
+        :rtype:  list
+        """
+        roots = []
+        for spec in self.parent._package_names:
+            if spec in self.parent._wanted_versions:
+                roots.extend([(spec, v) for v in sorted(self.parent._wanted_versions[spec])])
+            else:
+                roots.append(dependencies.parse_requirement(spec))
+        return roots
+
+    def _process_block(self, item=None):
+        """
+        Resolve the dependency closure of the root packages, and then process the manifest of each
+        package in it so that only the selected versions are synchronized.
+        """
+        level = self._get_roots()
+        while level:
+            names = sorted(set([name for name, spec in level if name not in self._manifests]))
+            if names:
+                self._fetch_manifests(names)
+
+            next_level = []
+            for name, spec in level:
+                version = self._select(name, spec)
+                if version is None:
+                    continue
+                selected = self._selected.setdefault(name, set())
+                if version not in selected:
+                    selected.add(version)
+                    next_level.extend(
+                        self._get_requirements(self._manifests[name]['versions'][version]))
+            level = next_level
+
+        sync_step = self.parent
+        deferred = sync_step._download_policy == constants.DOWNLOAD_ON_DEMAND
+        for name in sorted(self._selected):
+            sync_step._touched_packages.add(name)
+            sync_step._upstream_tags[name] = self._manifests[name]['dist-tags']
+            with sync_step._latency.timed(name, latency.STAGE_DIFF):
+                sync_step._packages_to_download.extend(DownloadMetadataStep._process_manifest(
+                    self._manifests[name], self.get_conduit(), deferred=deferred,
+                    wanted_versions=self._selected, version_filter=sync_step._version_filter,
+                    sync_plan=sync_step._plan, units_to_remove=sync_step._units_to_remove))
+
+    def _fetch_manifests(self, names):
+        """
+        Download the manifests of the given packages concurrently, and remember them. Only the
+        parts of each manifest that a sync needs are kept in memory.
+
+        :param names: The names of the packages whose manifests should be fetched
+        :type  names: list
+        """
+        self.total_units = len(self._manifests) + len(names)
+        self._reports = []
+        self.downloader.download(self._paced(
+            [request.DownloadRequest(
+                _manifest_url(self.parent._feed_router.feed_for(name), name), StringIO(),
+                {'name': name})
+             for name in names]))
+        for report in self._reports:
+            self.parent._latency.record_download(report.data['name'], latency.STAGE_MANIFEST,
+                                                 report)
+            report.destination.seek(0)
+            manifest = json.loads(report.destination.read())
+            report.destination.close()
+            self._manifests[report.data['name']] = {
+                'name': manifest['name'], 'dist-tags': manifest.get('dist-tags', {}),
+                'versions': manifest.get('versions', {})}
+        for name in names:
+            self._manifests.setdefault(name, None)
+
+    def _select(self, name, spec):
+        """
+        Return the version of the given package that npm would install for the given version range
+        or dist-tag: the version the "latest" dist-tag points to if it satisfies the range, and the
+        highest version satisfying the range otherwise.
+
+        :param name: The name of a package
+        :type  name: basestring
+        :param spec: A version range or a dist-tag
+        :type  spec: basestring
+        :return:     The selected version, or None if no version could be selected
+        :rtype:      basestring
+        """
+        manifest = self._manifests[name]
+        if manifest is None:
+            return None
+        version = dependencies.select_version(manifest['versions'], spec, manifest['dist-tags'])
+        if version is None:
+            msg = _('No version of %(name)s satisfies %(spec)s.')
+            _logger.warning(msg % {'name': name, 'spec': spec})
+        return version
+
+    def _get_requirements(self, version_metadata):
+        """
+        Return the dependencies of one version of a package that should be followed. Dependencies
+        that are not retrieved from a registry, such as git, file and tarball URL dependencies, are
+        skipped.
+
+        :param version_metadata: The entry of a manifest's "versions" object for the version
+        :type  version_metadata: dict
+        :return:                 A list of 2-tuples of a package name and a version range
+        :rtype:                  list
+        """
+        return dependencies.get_requirements(version_metadata, self._dependency_types)
+
+    def _retry_request(self, report):
+        """
+        Build the request that retries the download of a manifest, with a fresh StringIO.
+
+        :param report: The report of a throttled download
+        :type  report: nectar.report.DownloadReport
+        :return:       A request for the same URL
+        :rtype:        nectar.request.DownloadRequest
+        """
+        return request.DownloadRequest(report.url, StringIO(), report.data)
+
+    def _failover_request(self, report):
+        """
+        Build the request that fetches the manifest from the next feed that serves the package.
+
+        :param report: The report of a failed download
+        :type  report: nectar.report.DownloadReport
+        :return:       A request for the next feed, or None if there is none
+        :rtype:        nectar.request.DownloadRequest
+        """
+        return _manifest_failover_request(self.parent._feed_router, report)
+
+    def download_succeeded(self, report):
+        """
+        Remember the report of each downloaded manifest, so that it can be processed once the whole
+        level has been fetched.
+
+        :param report: The report that details the download
+        :type  report: nectar.report.DownloadReport
+        """
+        self._reports.append(report)
+        super(ResolveDependenciesStep, self).download_succeeded(report)
+
+    def download_failed(self, report):
+        """
+        Free the memory used for a manifest that could not be downloaded.
+
+        :param report: The report that details the download
+        :type  report: nectar.report.DownloadReport
+        """
+        report.destination.close()
+        super(ResolveDependenciesStep, self).download_failed(report)
+
+
+class RemoveMissingStep(instrumentation.InstrumentedStepMixin, publish_step.PluginStep):
+    """
+    This step removes the versions that are no longer listed upstream from the repository, once
+    every other step is done. The units are removed in batches of REMOVE_BATCH_SIZE, each with a
+    single query, rather than one by one.
+    """
+
+    def __init__(self, repo, conduit, config, working_dir):
+        """
+        Initialize the RemoveMissingStep.
+
+        :param repo:        metadata describing the repository
+        :type  repo:        pulp.plugins.model.Repository
+        :param conduit:     provides access to relevant Pulp functionality
+        :type  conduit:     pulp.plugins.conduits.repo_sync.RepoSyncConduit
+        :param config:      plugin configuration
+        :type  config:      pulp.plugins.config.PluginCallConfiguration
+        :param working_dir: The working directory path that can be used for temporary storage
+        :type  working_dir: basestring
+        """
+        super(RemoveMissingStep, self).__init__(
+            'sync_step_remove_missing', repo, conduit, config, working_dir,
+            constants.IMPORTER_TYPE_ID)
+        self.description = _('Removing Npm packages that are no longer available upstream.')
+
+    def process_main(self):
+        """
+        Remove the units that the SyncStep's _units_to_remove attribute lists from the repository.
+        """
+        unit_keys = self.parent._units_to_remove
+        self.total_units = len(unit_keys)
+        association_manager = manager_factory.repo_unit_association_manager()
+        for i in range(0, len(unit_keys), REMOVE_BATCH_SIZE):
+            batch = unit_keys[i:i + REMOVE_BATCH_SIZE]
+            search = criteria.UnitAssociationCriteria(type_ids=[constants.PACKAGE_TYPE_ID],
+                                                      unit_filters={'$or': batch})
+            association_manager.unassociate_by_criteria(
+                self.get_repo().id, search, RepoContentUnit.OWNER_TYPE_IMPORTER,
+                constants.IMPORTER_TYPE_ID, notify_plugins=False)
+            self.progress_successes += len(batch)
+            self.report_progress()
+        if unit_keys:
+            _logger.info(_('Removed %(count)d versions that are no longer available upstream.') %
+                         {'count': len(unit_keys)})
+
+
+class UpdatePackumentsStep(instrumentation.InstrumentedStepMixin, publish_step.PluginStep):
+    """
+    This step brings the packuments of the packages that the sync processed in line with the
+    versions that are now in the repository, once every other step is done, so that the publisher
+    can serve them without reading every unit.
+    """
+
+    def __init__(self, repo, conduit, config, working_dir):
+        """
+        Initialize the UpdatePackumentsStep.
+
+        :param repo:        metadata describing the repository
+        :type  repo:        pulp.plugins.model.Repository
+        :param conduit:     provides access to relevant Pulp functionality
+        :type  conduit:     pulp.plugins.conduits.repo_sync.RepoSyncConduit
+        :param config:      plugin configuration
+        :type  config:      pulp.plugins.config.PluginCallConfiguration
+        :param working_dir: The working directory path that can be used for temporary storage
+        :type  working_dir: basestring
+        """
+        super(UpdatePackumentsStep, self).__init__(
+            'sync_step_update_packuments', repo, conduit, config, working_dir,
+            constants.IMPORTER_TYPE_ID)
+        self.description = _('Updating the aggregate metadata of the Npm packages.')
+
+    def process_main(self):
+        """
+        Reconcile the packuments of the packages whose manifest the sync processed, and of the
+        packages that it downloaded. The packuments of the packages whose manifest was processed
+        take their dist-tags from it.
+        """
+        sync_step = self.parent
+        names = set(sync_step._touched_packages)
+        names.update([p['name'] for p in sync_step._packages_to_download])
+        names.update([p['name'] for p in sync_step._locked_packages])
+        self.total_units = len(names)
+        packuments.reconcile(sync_step._packument_store, self.get_repo().id, self.get_conduit(),
+                             names, sync_step._upstream_tags)
+        self.progress_successes = len(names)
+
+
+class SyncStep(instrumentation.InstrumentedStepMixin, publish_step.PluginStep):
+    """
+    This Step is the top level step in this module. It arranges all the other necessary steps for
+    a Npm repository sync.
+    """
+
+    def __init__(self, repo, conduit, config, working_dir, download_cache_dir=None,
+                 packument_store=None):
+        """
+        Initialize the SyncStep, adding the appropriate child steps.
+
+        :param repo:               metadata describing the repository
+        :type  repo:               pulp.plugins.model.Repository
+        :param conduit:            provides access to relevant Pulp functionality
+        :type  conduit:            pulp.plugins.conduits.repo_sync.RepoSyncConduit
+        :param config:             plugin configuration
+        :type  config:             pulp.plugins.config.PluginCallConfiguration
+        :param working_dir:        The working directory path that can be used for temporary
+                                   storage
+        :type  working_dir:        basestring
+        :param download_cache_dir: The directory that packages are downloaded into. It should
+                                   outlive the sync, so that a failed sync can be resumed. Defaults
+                                   to a directory in the working directory.
+        :type  download_cache_dir: basestring
+        :param packument_store:    The packuments of the packages. Defaults to the ones in Pulp's
+                                   database.
+        :type  packument_store:    pulp_npm.plugins.packuments.PackumentStore
+        """
+        metrics_dir = config.get(constants.CONFIG_KEY_METRICS_DIR)
+        if metrics_dir:
+            conduit = exporter.CountingConduit(conduit)
         super(SyncStep, self).__init__('sync_step_main', repo, conduit, config, working_dir,
                                        constants.IMPORTER_TYPE_ID)
         self.description = _('Synchronizing %(id)s repository.') % {'id': repo.id}
+        if metrics_dir:
+            self._exporter = exporter.TextfileExporter(metrics_dir, 'importer', repo.id, conduit)
 
-        self._feed_url = config.get(importer_constants.KEY_FEED)
+        self._feed_router = feeds.FeedRouter(configuration.get_feeds(config))
         self._package_names = config.get(constants.CONFIG_KEY_PACKAGE_NAMES, [])
         if self._package_names:
             self._package_names = self._package_names.split(',')
+        else:
+            self._package_names = []
 
-        # Populated by the GetMetadataStep
+        self._download_policy = configuration.get_download_policy(config)
+        self._resolve_dependencies = config.get(constants.CONFIG_KEY_RESOLVE_DEPENDENCIES, False)
+        self._version_filter = filters.VersionFilter.from_config(config)
+        self._field_policy = fields.FieldPolicy.from_config(config)
+        self._changes_feed = config.get(constants.CONFIG_KEY_CHANGES_FEED)
+        # The sequence number of the changes feed to save once the sync has succeeded
+        self._changes_seq = None
+        self._locked_packages = []
+        self._wanted_versions = {}
+        self._add_locked_packages(config.get(constants.CONFIG_KEY_LOCKED_PACKAGES) or [])
+
+        # Populated by the ProcessLockfileStep and the GetMetadataStep or ResolveDependenciesStep
         self._packages_to_download = []
+        self._download_cache = cache.DownloadCache(
+            download_cache_dir or os.path.join(working_dir, cache.CACHE_DIR))
+        self._download_claims = claims.DownloadClaims()
+        self._latency = latency.LatencyTracker(config.get(constants.CONFIG_KEY_LATENCY_LOG))
+        self._slowest_packages = config.get(constants.CONFIG_KEY_SLOWEST_PACKAGES,
+                                            latency.SLOWEST_PACKAGES)
+        # A dry run only fills in this plan of the changes that the sync would make
+        self._plan = None
+        if configuration.is_dry_run(config):
+            self._plan = plan.SyncPlan()
+        self._download_step = None
+        # The unit keys of the versions that are no longer upstream, if they are to be removed
+        self._units_to_remove = None
+        if config.get(importer_constants.KEY_UNITS_REMOVE_MISSING):
+            self._units_to_remove = []
+        # The names of the packages whose manifest was processed
+        self._touched_packages = set()
+        # Maps the names of the packages whose manifest was processed to their dist-tags
+        self._upstream_tags = {}
+        self._packument_store = packument_store or packuments.PackumentStore()
 
-        self.add_child(GetMetadataStep(repo, conduit, config, working_dir))
+        if self._feed_router.has_mirrors():
+            self.add_child(ProbeFeedsStep(repo, conduit, config, working_dir))
+        if self._locked_packages:
+            self.add_child(ProcessLockfileStep(repo, conduit, config, working_dir))
+        if self._changes_feed:
+            self.add_child(FollowChangesStep(repo, conduit, config, working_dir))
+        # The step that downloads the package manifests
+        if self._resolve_dependencies:
+            self._manifest_step = ResolveDependenciesStep(repo, conduit, config, working_dir)
+            self.add_child(self._manifest_step)
+        else:
+            metadata_step = GetMetadataStep(repo, conduit, config, working_dir)
+            self._manifest_step = metadata_step.children[0]
+            self.add_child(metadata_step)
 
-        self.add_child(
-            DownloadPackagesStep(
+        if self._plan is not None:
+            return
+        if self._download_policy == constants.DOWNLOAD_ON_DEMAND:
+            self.add_child(SaveDeferredPackagesStep(repo, conduit, config, working_dir))
+        else:
+            self._download_step = DownloadPackagesStep(
                 'sync_step_download_packages', downloads=self.generate_download_requests(),
                 repo=repo, config=config, conduit=conduit, working_dir=working_dir,
-                description=_('Downloading and processing Npm packages.')))
+                description=_('Downloading and processing Npm packages.'))
+            self.add_child(self._download_step)
+        if self._units_to_remove is not None:
+            self.add_child(RemoveMissingStep(repo, conduit, config, working_dir))
+        self.add_child(UpdatePackumentsStep(repo, conduit, config, working_dir))
+
+    def _add_locked_packages(self, packages):
+        """
+        Sort the given locked packages into the ones that can be downloaded straight away, because
+        the lockfile records their tarball URL and integrity, and the ones whose package manifest
+        must be fetched first. Only the locked versions of the latter are synchronized, unless the
+        package is also listed in the package names.
+
+        :param packages: The packages listed in lockfiles, as returned by lockfile.collect()
+        :type  packages: list of dict
+        """
+        for p in packages:
+            if p['resolved'] and p['integrity'] and \
+                    self._download_policy != constants.DOWNLOAD_ON_DEMAND:
+                self._locked_packages.append(p)
+            elif p['name'] not in self._package_names:
+                self._wanted_versions.setdefault(p['name'], set()).add(p['version'])
+        self._package_names.extend(sorted(self._wanted_versions))
 
     def generate_download_requests(self):
         """
         For each package that is listed in self._packages_to_download, yield a Nectar
-        DownloadRequest for its url attribute.
+        DownloadRequest for its url attribute. Each package is downloaded into the download cache.
 
         :return: A generator that yields DownloadReqests for the Package files.
         :rtype:  generator
         """
         for p in self._packages_to_download:
-            yield request.DownloadRequest(p['tarball'], os.path.join(self.working_dir,
-                                          os.path.basename(p['tarball'])), p)
+            yield request.DownloadRequest(
+                p['tarball'], self._download_cache.partial_path(p['tarball'], _cache_key(p)), p)
 
     def sync(self):
         """
@@ -261,5 +1261,113 @@ class SyncStep(publish_step.PluginStep):
         :return: The final sync report.
         :rtype:  pulp.plugins.model.SyncReport
         """
-        self.process_lifecycle()
+        try:
+            self.process_lifecycle()
+        finally:
+            self._latency.close()
+        if self._plan is not None:
+            return self._build_plan_report()
+        if self._changes_seq is not None:
+            self._save_changes_seq()
+        self._save_throughput()
         return self._build_final_report()
+
+    def get_progress_report_summary(self):
+        """
+        Add the latency histogram of each stage of the sync, and the slowest packages, to the
+        summary.
+
+        :return: The summary of the progress report
+        :rtype:  dict
+        """
+        summary = super(SyncStep, self).get_progress_report_summary()
+        summary['latency'] = self._latency.report(self._slowest_packages)
+        return summary
+
+    def _build_plan_report(self):
+        """
+        Build the report of a dry run, which is the plan of the changes that the sync would make.
+        Nothing is downloaded by syncs that use the on_demand download policy, so their plans don't
+        estimate the time that downloads would take.
+
+        :return: The report, whose summary and details are those of the plan
+        :rtype:  pulp.plugins.model.SyncReport
+        """
+        throughput = None
+        if self._download_policy != constants.DOWNLOAD_ON_DEMAND:
+            throughput = plan.get_throughput(self.get_conduit().get_repo_scratchpad())
+        summary, details = self._plan.build(self._packages_to_download, throughput,
+                                            self._units_to_remove)
+        return self.get_conduit().build_success_report(summary, details)
+
+    def _save_throughput(self):
+        """
+        Record the download throughput of this sync in the repository's scratchpad, so that dry
+        runs can estimate how long the next sync will take.
+        """
+        step = self._download_step
+        if step is None or not step.bytes_moved or not step.download_seconds:
+            return
+        scratchpad = self.get_conduit().get_repo_scratchpad() or {}
+        plan.update_throughput(scratchpad, step.bytes_moved, step.download_seconds)
+        self.get_conduit().set_repo_scratchpad(scratchpad)
+
+    def _save_changes_seq(self):
+        """
+        Remember how far the changes feed was processed, so that the next sync continues from
+        there. Nothing is saved if a package manifest or tarball could not be retrieved, so that the
+        next sync processes the same changes again.
+        """
+        for step in (self._manifest_step, self._download_step):
+            if step is not None and step.progress_failures:
+                return
+        scratchpad = self.get_conduit().get_repo_scratchpad() or {}
+        scratchpad[constants.SCRATCHPAD_KEY_CHANGES_FEED] = self._changes_feed
+        scratchpad[constants.SCRATCHPAD_KEY_CHANGES_SEQ] = self._changes_seq
+        self.get_conduit().set_repo_scratchpad(scratchpad)
+
+
+def _cache_key(package):
+    """
+    Return the checksum that identifies the given package in the download cache.
+
+    :param package: A package to download, as found in SyncStep._packages_to_download
+    :type  package: dict
+    :return:        The package's integrity string, or its shasum if it has none
+    :rtype:         basestring
+    """
+    return package.get('integrity') or package['shasum']
+
+
+def _manifest_url(feed_url, name):
+    """
+    Return the URL of the manifest of the given package at the given feed. The slash in the name
+    of a scoped package is escaped, as the npm registry expects.
+
+    :param feed_url: The URL of the feed
+    :type  feed_url: basestring
+    :param name:     The name of a package
+    :type  name:     basestring
+    :return:         The URL of the package's manifest
+    :rtype:          basestring
+    """
+    return urljoin(feed_url, urllib.quote(name, safe='@'))
+
+
+def _manifest_failover_request(feed_router, report):
+    """
+    Build the request that fetches a manifest whose download failed from the next feed that serves
+    the package.
+
+    :param feed_router: Routes packages to their feeds
+    :type  feed_router: pulp_npm.plugins.importers.feeds.FeedRouter
+    :param report:      The report of the failed download, whose data holds the package name
+    :type  report:      nectar.report.DownloadReport
+    :return:            A request for the next feed, or None if there is none
+    :rtype:             nectar.request.DownloadRequest
+    """
+    name = report.data['name']
+    feed = feed_router.next_feed(name, report.url)
+    if feed is None:
+        return None
+    return request.DownloadRequest(_manifest_url(feed, name), StringIO(), report.data)
@@ -0,0 +1,214 @@
+"""
+This module contains the adaptive controller that paces the requests a sync sends to the registry.
+It keeps the number of requests in flight under a limit that grows while the registry answers and
+is halved when the registry signals that it is overloaded with a 429 or 503 response, waiting as
+long as the Retry-After header asks before sending anything more. Throttled requests are retried.
+"""
+from collections import deque
+from email.utils import mktime_tz, parsedate_tz
+import threading
+import time
+
+# The response codes that signal that the registry wants us to slow down
+THROTTLE_CODES = (429, 503)
+# The number of times a throttled request is retried before it is reported as failed
+MAX_RETRIES = 5
+# The longest wait between retries when the registry doesn't send a Retry-After header, in seconds
+MAX_BACKOFF = 60
+# How often the request feed checks whether it may send another request, in seconds
+POLL_INTERVAL = 0.05
+
+
+class AdaptiveController(object):
+    """
+    An additive increase, multiplicative decrease controller of the number of requests in flight.
+    The downloader pulls its requests from feed(), and the download step reports the outcome of
+    each one with finished() or throttled(). It is safe to use from the downloader's threads.
+    """
+
+    def __init__(self, max_concurrent, clock=time.time, sleep=time.sleep):
+        """
+        Initialize the AdaptiveController.
+
+        :param max_concurrent: The largest number of requests that may be in flight at once
+        :type  max_concurrent: int
+        :param clock:          Returns the current time in seconds
+        :type  clock:          callable
+        :param sleep:          Sleeps for the given number of seconds
+        :type  sleep:          callable
+        """
+        self.max_concurrent = max_concurrent
+        self.limit = max_concurrent
+        self.retries = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # Maps URLs to the number of requests for them that are in flight
+        self._in_flight = {}
+        self._in_flight_count = 0
+        self._successes = 0
+        self._resume_at = 0
+        self._last_decrease = None
+        self._attempts = {}
+        self._retry_queue = deque()
+
+    def feed(self, requests):
+        """
+        Yield the given requests, and the ones that need to be retried, no faster than the
+        controller allows. The generator ends once every request has finished.
+
+        :param requests: The requests to send
+        :type  requests: iterable of nectar.request.DownloadRequest
+        :return:         A generator of the requests to send
+        :rtype:          generator
+        """
+        requests = iter(requests)
+        exhausted = False
+        while True:
+            download_request = None
+            with self._lock:
+                delay = self._delay()
+                if not delay:
+                    if self._retry_queue:
+                        download_request = self._retry_queue.popleft()
+                    elif not exhausted:
+                        download_request = next(requests, None)
+                        exhausted = download_request is None
+                    if download_request is None and exhausted and not self._in_flight_count:
+                        return
+                    if download_request is not None:
+                        self._in_flight[download_request.url] = \
+                            self._in_flight.get(download_request.url, 0) + 1
+                        self._in_flight_count += 1
+            if download_request is None:
+                self._sleep(delay or POLL_INTERVAL)
+            else:
+                yield download_request
+
+    def finished(self, url, retry=None):
+        """
+        Record that the request for the given URL finished without being throttled, whether it
+        succeeded or not. Each success brings the limit closer to the maximum again.
+
+        :param url:   The URL of the request
+        :type  url:   basestring
+        :param retry: A request to send in its place, such as one that fetches a failed download
+                      from another feed
+        :type  retry: nectar.request.DownloadRequest
+        """
+        with self._lock:
+            if retry is not None:
+                self._retry_queue.append(retry)
+                self.retries += 1
+            if not self._release(url):
+                return
+            self._attempts.pop(url, None)
+            if self.limit < self.max_concurrent:
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self.limit += 1
+                    self._successes = 0
+
+    def throttled(self, download_request, retry_after=None, fallback=None):
+        """
+        Record that the registry throttled the given request. The limit is halved, at most once
+        per wait, and no request is sent until the wait is over. The request is queued to be sent
+        again unless it has been retried too often already, in which case the fallback is queued
+        instead.
+
+        :param download_request: A request that was answered with a 429 or 503 response
+        :type  download_request: nectar.request.DownloadRequest
+        :param retry_after:      The value of the response's Retry-After header, if any
+        :type  retry_after:      basestring
+        :param fallback:         A request to send once the request has been retried too often,
+                                 such as one for the same file at another feed
+        :type  fallback:         nectar.request.DownloadRequest
+        :return:                 True if the request or its fallback will be sent, False if it
+                                 should be reported as failed
+        :rtype:                  bool
+        """
+        with self._lock:
+            if not self._release(download_request.url):
+                return False
+            attempts = self._attempts.get(download_request.url, 0) + 1
+            now = self._clock()
+            wait = parse_retry_after(retry_after, now)
+            if wait is None:
+                wait = min(2 ** attempts, MAX_BACKOFF)
+            if self._last_decrease is None or now >= self._last_decrease:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+                self._last_decrease = now + wait
+            self._resume_at = max(self._resume_at, now + wait)
+
+            if attempts > MAX_RETRIES:
+                self._attempts.pop(download_request.url, None)
+                if fallback is None:
+                    return False
+                download_request = fallback
+            else:
+                self._attempts[download_request.url] = attempts
+            self._retry_queue.append(download_request)
+            self.retries += 1
+            return True
+
+    def _delay(self):
+        """
+        Return how long to wait before the next request may be sent, or 0 if it may be sent now.
+        The caller must hold the lock.
+
+        :return: The delay in seconds
+        :rtype:  float
+        """
+        delay = self._resume_at - self._clock()
+        if delay > 0:
+            return delay
+        if self._in_flight_count >= self.limit:
+            return POLL_INTERVAL
+        return 0
+
+    def _release(self, url):
+        """
+        Remove one request for the given URL from the ones in flight. The caller must hold the
+        lock.
+
+        :param url: The URL of the request
+        :type  url: basestring
+        :return:    False if no request for the URL was in flight, such as for a package that was
+                    found in the download cache
+        :rtype:     bool
+        """
+        count = self._in_flight.get(url, 0)
+        if not count:
+            return False
+        if count == 1:
+            del self._in_flight[url]
+        else:
+            self._in_flight[url] = count - 1
+        self._in_flight_count -= 1
+        return True
+
+
+def parse_retry_after(value, now=None):
+    """
+    Return the number of seconds that a Retry-After header asks to wait. The header holds either a
+    number of seconds or an HTTP date.
+
+    :param value: The value of the header
+    :type  value: basestring
+    :param now:   The current time in seconds, used to turn a date into a delay
+    :type  now:   float
+    :return:      The delay in seconds, or None if the value is missing or can't be parsed
+    :rtype:       float
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(0.0, mktime_tz(parsed) - now)
@@ -0,0 +1,192 @@
+"""
+This module contains the instrumentation of the sync and publish steps. Each instrumented step
+measures the wall and CPU time it takes, the bytes it moves, the items it processes per second and
+the peak resident set size of the process, and adds them to its progress report.
+
+Profiling is enabled by the profile_steps config key, or by setting the PULP_NPM_PROFILE
+environment variable of the worker. Each step that has no children then writes a cProfile file, and
+the top allocations traced by tracemalloc if it is installed, to the profiles directory of the
+repository's working directory.
+"""
+import cProfile
+from gettext import gettext as _
+import logging
+import os
+import resource
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    # tracemalloc is only part of the standard library from Python 3.4, and the pytracemalloc
+    # backport needs a patched interpreter
+    tracemalloc = None
+
+from pulp_npm.common import constants
+
+# The environment variable that enables profiling for every sync and publish of the worker
+PROFILE_ENV_VAR = 'PULP_NPM_PROFILE'
+# The directory of the repository's working directory that profiles are written to
+PROFILE_DIR = 'profiles'
+# The number of allocation sites listed in each tracemalloc dump
+TRACEMALLOC_TOP = 25
+
+_logger = logging.getLogger(__name__)
+
+
+class InstrumentedStepMixin(object):
+    """
+    A mixin that measures how a Pulp step runs. It must be listed before the step class in the
+    bases of the step. Steps that transfer data add the number of bytes to bytes_moved, and steps
+    that retry work count the retries. The metrics of a step with children include those of its
+    children.
+
+    The top level step of a task can set its _exporter attribute to a
+    pulp_npm.plugins.exporter.TextfileExporter, which is given the metrics each time a step
+    completes.
+    """
+
+    bytes_moved = 0
+    retries = 0
+    _exporter = None
+    # Set once the step has been processed
+    metrics = None
+
+    def process(self):
+        """
+        Process the step, measuring it, and profiling it if profiling is enabled.
+        """
+        profiler = None
+        tracing = False
+        if not self.children and self._profiling_enabled():
+            profiler = cProfile.Profile()
+            if tracemalloc is not None and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                tracing = True
+
+        wall_started = time.time()
+        cpu_started = _cpu_time()
+        try:
+            if profiler is None:
+                super(InstrumentedStepMixin, self).process()
+            else:
+                profiler.runcall(super(InstrumentedStepMixin, self).process)
+        finally:
+            self.metrics = self._measure(time.time() - wall_started, _cpu_time() - cpu_started)
+            if profiler is not None:
+                snapshot = None
+                if tracing:
+                    snapshot = tracemalloc.take_snapshot()
+                    tracemalloc.stop()
+                self._dump_profile(profiler, snapshot)
+            root = self
+            while isinstance(root.parent, InstrumentedStepMixin):
+                root = root.parent
+            if root._exporter is not None:
+                root._exporter.write(root)
+
+    def get_progress_report(self):
+        """
+        Add the metrics of the step to its progress report, once it has been processed.
+
+        :return: The progress report of the step
+        :rtype:  dict
+        """
+        report = super(InstrumentedStepMixin, self).get_progress_report()
+        if self.metrics is not None and not self.children:
+            report['metrics'] = self.metrics
+        return report
+
+    def get_progress_report_summary(self):
+        """
+        Add the metrics of the step and of each of its descendants to the summary, under their
+        step IDs.
+
+        :return: The summary of the progress report
+        :rtype:  dict
+        """
+        summary = super(InstrumentedStepMixin, self).get_progress_report_summary()
+        metrics = {}
+        steps = [self]
+        while steps:
+            step = steps.pop(0)
+            if getattr(step, 'metrics', None) is not None:
+                metrics[step.step_id] = step.metrics
+            steps.extend(step.children)
+        if metrics:
+            summary['metrics'] = metrics
+        return summary
+
+    def _measure(self, wall_seconds, cpu_seconds):
+        """
+        Build the metrics of the step.
+
+        :param wall_seconds: How long the step took
+        :type  wall_seconds: float
+        :param cpu_seconds:  The CPU time that the process used while the step ran, including that
+                             of its download threads
+        :type  cpu_seconds:  float
+        :return:             The metrics
+        :rtype:              dict
+        """
+        metrics = {'bytes': self.bytes_moved,
+                   'items': self.progress_successes + self.progress_failures,
+                   'failures': self.progress_failures, 'retries': self.retries}
+        for child in self.children:
+            if getattr(child, 'metrics', None) is not None:
+                for key in ('bytes', 'items', 'failures', 'retries'):
+                    metrics[key] += child.metrics[key]
+        metrics['items_per_second'] = None
+        if wall_seconds > 0:
+            metrics['items_per_second'] = round(metrics['items'] / wall_seconds, 3)
+        metrics['wall_seconds'] = round(wall_seconds, 3)
+        metrics['cpu_seconds'] = round(cpu_seconds, 3)
+        metrics['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return metrics
+
+    def _profiling_enabled(self):
+        """
+        :return: True if the step should be profiled
+        :rtype:  bool
+        """
+        if os.environ.get(PROFILE_ENV_VAR, '').lower() in ('1', 'true', 'yes'):
+            return True
+        config = self.get_config()
+        return bool(config is not None and config.get(constants.CONFIG_KEY_PROFILE_STEPS))
+
+    def _dump_profile(self, profiler, snapshot=None):
+        """
+        Write the profile of the step, and the top allocations of the given snapshot, to the
+        profiles directory. A profile that can't be written is logged, rather than failing the step.
+
+        :param profiler: The profiler that ran the step
+        :type  profiler: cProfile.Profile
+        :param snapshot: The allocations that tracemalloc traced while the step ran, if any
+        :type  snapshot: tracemalloc.Snapshot
+        """
+        profile_dir = os.path.join(self.get_repo().working_dir, PROFILE_DIR)
+        path = os.path.join(profile_dir, '%s-%s-%d' % (self.step_id, time.strftime('%Y%m%d%H%M%S'),
+                                                       os.getpid()))
+        try:
+            if not os.path.exists(profile_dir):
+                os.makedirs(profile_dir)
+            profiler.dump_stats(path + '.prof')
+            if snapshot is not None:
+                with open(path + '.tracemalloc', 'w') as dump:
+                    for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                        dump.write('%s\n' % stat)
+        except (IOError, OSError) as e:
+            _logger.warning(_('Could not write the profile of %(step)s: %(error)s') %
+                            {'step': self.step_id, 'error': e})
+            return
+        _logger.info(_('Wrote the profile of %(step)s to %(path)s.prof.') %
+                     {'step': self.step_id, 'path': path})
+
+
+def _cpu_time():
+    """
+    :return: The user and system CPU time that the process has used, in seconds
+    :rtype:  float
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
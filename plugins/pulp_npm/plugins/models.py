@@ -4,13 +4,14 @@ import json
 import os
 import re
 import tarfile
+from urlparse import urlparse
 
-
-from pulp_npm.common import constants
+from pulp_npm.common import constants, dependencies
 
 DEFAULT_CHECKSUM_TYPE = 'sha1'
-asciidot = re.compile('\.')
-unidot = re.compile(u'\uff0e')
+# MongoDB doesn't allow dots in keys, so they are stored as full width dots
+DOT = u'.'
+ENCODED_DOT = u'\uff0e'
 
 
 class Package(object):
@@ -88,6 +89,7 @@ class Package(object):
             cls.metadata['_shasum'] = checksum
             cls.metadata['dist'] = {'shasum': checksum}
             cls.metadata['dist']['tarball'] = filename
+            cls.metadata[constants.METADATA_KEY_DEPENDENCIES] = dependencies.get_edges(cls.metadata)
             cls.attrs['_filename'] = filename
             # TODO Figure out dist -> tarball (Need distributor base URL)
             package = cls()
@@ -96,6 +98,42 @@ class Package(object):
             if 'package_archive' in locals():
                 package_archive.close()
 
+    @classmethod
+    def from_manifest(cls, version_metadata):
+        """
+        Instantiate a Package using the metadata that the feed's package manifest lists for one
+        version of a package, without downloading its tarball. The resulting Package is marked as
+        deferred, and it remembers the upstream URL of its tarball so that the tarball can be
+        retrieved the first time a client asks for it.
+
+        :param version_metadata: The entry of the manifest's "versions" object that describes the
+                                 version this Package will represent.
+        :type  version_metadata: dict
+        :return:                 An instance of Package that represents the given version.
+        :rtype:                  pulp_npm.plugins.models.Package
+        """
+        metadata = dict(version_metadata)
+        dist = metadata.pop('dist')
+        filename = os.path.basename(urlparse(dist['tarball']).path)
+
+        package = cls()
+        package.name = metadata.pop('name')
+        # Because apparently, some versions have typos / old version schema
+        package.version = cls._sanitize_version(metadata.pop('version'))
+        package._filename = filename
+
+        if '_id' in metadata:
+            metadata['id'] = metadata.pop('_id', None)
+        if '_from' not in metadata:
+            metadata['_from'] = '.'
+        metadata['_shasum'] = dist['shasum']
+        metadata['dist'] = {'shasum': dist['shasum'], 'tarball': filename}
+        metadata[constants.METADATA_KEY_DEFERRED] = True
+        metadata[constants.METADATA_KEY_UPSTREAM_URL] = dist['tarball']
+        metadata[constants.METADATA_KEY_DEPENDENCIES] = dependencies.get_edges(metadata)
+        package.metadata = metadata
+        return package
+
     def init_unit(self, conduit):
         """
         Use the given conduit's init_unit() method to initialize this Unit and store the underlying
@@ -163,25 +201,24 @@ class Package(object):
 
     @staticmethod
     def _encode_metadata(dictionary):
-        keys_with_dot = []
-        for key in dictionary:
-            if asciidot.search(key):
-                keys_with_dot.append(key)
-            if type(dictionary[key]) == dict:
-                Package._encode_metadata(dictionary[key])
-        for key in keys_with_dot:
-            dictionary[asciidot.sub(u'\uff0e', key)] = dictionary.pop(key)
+        """
+        Replace the dots in the keys of the given metadata, and of the objects nested in it, with
+        full width dots, so that it can be stored in MongoDB.
+
+        :param dictionary: The metadata, which is changed in place
+        :type  dictionary: dict
+        """
+        _translate_keys(dictionary, DOT, _encode_key)
 
     @staticmethod
     def decode_metadata(dictionary):
-        keys_with_unidot = []
-        for key in dictionary:
-            if unidot.search(key):
-                keys_with_unidot.append(key)
-            if type(dictionary[key]) == dict:
-                Package.decode_metadata(dictionary[key])
-        for key in keys_with_unidot:
-            dictionary[unidot.sub('.', key)] = dictionary.pop(key)
+        """
+        Restore the dots in the keys of metadata that was encoded with _encode_metadata().
+
+        :param dictionary: The metadata, which is changed in place
+        :type  dictionary: dict
+        """
+        _translate_keys(dictionary, ENCODED_DOT, _decode_key)
 
     def __init__(self):
         """
@@ -201,3 +238,78 @@ class Package(object):
         :rtype:  basestring
         """
         return 'Npm Package: %(name)s@%(version)s' % {'name': self.name, 'version': self.version}
+
+
+def _translate_keys(document, needle, translate):
+    """
+    Translate the keys that contain the given string, in the given document and in all the
+    objects nested in it, including those in lists. The document is walked iteratively, so deep
+    nesting can't exhaust the stack, and objects whose keys don't contain the string are left
+    untouched.
+
+    :param document:  The document, which is changed in place
+    :type  document:  dict
+    :param needle:    The string that the keys to translate contain
+    :type  needle:    unicode
+    :param translate: Returns the translation of a key
+    :type  translate: callable
+    """
+    pending = [document]
+    pop = pending.pop
+    push = pending.append
+    while pending:
+        node = pop()
+        if type(node) is dict:
+            try:
+                renamed = [key for key in node if needle in key]
+            except UnicodeDecodeError:
+                # Byte string keys that aren't ASCII can't be compared with a unicode string, so
+                # they are searched for its UTF-8 encoding instead
+                renamed = [key for key in node if _contains(key, needle)]
+            for key in renamed:
+                node[translate(key)] = node.pop(key)
+            values = node.itervalues()
+        else:
+            values = node
+        for value in values:
+            value_type = type(value)
+            if value_type is dict or value_type is list:
+                push(value)
+
+
+def _contains(key, needle):
+    """
+    :param key:    A key
+    :type  key:    basestring
+    :param needle: The string to look for
+    :type  needle: unicode
+    :return:       True if the key contains the string
+    :rtype:        bool
+    """
+    if isinstance(key, unicode):
+        return needle in key
+    return needle.encode('utf-8') in key
+
+
+def _encode_key(key):
+    """
+    :param key: A key that contains dots
+    :type  key: basestring
+    :return:    The key with full width dots instead
+    :rtype:     unicode
+    """
+    if isinstance(key, str):
+        key = key.decode('utf-8')
+    return key.replace(DOT, ENCODED_DOT)
+
+
+def _decode_key(key):
+    """
+    :param key: A key that contains full width dots
+    :type  key: basestring
+    :return:    The key with dots instead
+    :rtype:     unicode
+    """
+    if isinstance(key, str):
+        key = key.decode('utf-8')
+    return key.replace(ENCODED_DOT, DOT)
@@ -0,0 +1,455 @@
+"""
+This module contains the store of packuments, the aggregate document of each package in a
+repository that the publisher serves as the package's metadata. A packument holds the metadata
+of each version of the package in the repository, its dist-tags and the top level fields that are
+taken from its latest version.
+
+The importer updates the packuments of a repository as it adds and removes units, so that
+publishing a package reads a single document instead of every unit of the package. The packuments
+are a cache of what the units say: the publisher checks them against the versions in the
+repository, and rebuilds the ones that are missing or out of date from the units.
+"""
+from gettext import gettext as _
+import logging
+
+from pulp.server.db import connection
+from pulp.server.db.model import criteria
+from pymongo.errors import DocumentTooLarge, DuplicateKeyError, OperationFailure
+
+from pulp_npm.common import constants, semver
+from pulp_npm.plugins.models import DOT, ENCODED_DOT
+
+
+COLLECTION_NAME = 'npm_packuments'
+# The number of packages whose units are looked up with a single query
+QUERY_BATCH_SIZE = 100
+# The fields of a package's metadata that are taken from its latest version
+TOP_LEVEL_FIELDS = ('author', 'bugs', 'contributors', 'description', 'homepage', 'keywords',
+                    'license', 'maintainers', 'readme', 'readmeFilename', 'repository',
+                    constants.METADATA_KEY_README)
+# The number of version keys that are cached
+VERSION_KEY_CACHE_SIZE = 100000
+
+_logger = logging.getLogger(__name__)
+# Maps versions to the keys that version_key() returned for them
+_version_keys = {}
+
+
+class PackumentStore(object):
+    """
+    The packuments of the packages in every repository, keyed on the repository's ID and the
+    package's name. Each packument carries a revision that every update increments, so that the
+    fields derived from its versions are only written by the last update.
+    """
+
+    def __init__(self, collection=None):
+        """
+        Initialize the PackumentStore.
+
+        :param collection: The collection that holds the packuments. Defaults to the npm_packuments
+                           collection of Pulp's database, which is only opened once it is used.
+        :type  collection: pymongo.collection.Collection
+        """
+        self._collection = collection
+
+    @property
+    def collection(self):
+        """
+        The collection that holds the packuments.
+
+        :rtype: pymongo.collection.Collection
+        """
+        if self._collection is None:
+            self._collection = connection.get_collection(COLLECTION_NAME, create=True)
+            self._collection.ensure_index('repo_id')
+        return self._collection
+
+    def add_versions(self, repo_id, name, versions, upstream_tags=None):
+        """
+        Add the given versions to the packument of a package, creating it if needed.
+
+        :param repo_id:       The ID of the repository
+        :type  repo_id:       basestring
+        :param name:          The name of the package
+        :type  name:          basestring
+        :param versions:      Maps the versions to the metadata of their units
+        :type  versions:      dict
+        :param upstream_tags: If given, the dist-tags of the package in the registry it was
+                              synchronized from, which replace the stored ones
+        :type  upstream_tags: dict
+        """
+        if not versions:
+            return
+        document_id = packument_id(repo_id, name)
+        update = {'$set': {'repo_id': repo_id, 'name': name},
+                  '$addToSet': {'all_versions': {'$each': versions.keys()}},
+                  '$inc': {'revision': 1}}
+        if upstream_tags is not None:
+            update['$set']['upstream_dist_tags'] = upstream_tags
+        for version, metadata in versions.items():
+            update['$set']['versions.' + encode_version(version)] = metadata
+        try:
+            self.collection.update({'_id': document_id, 'oversize': {'$ne': True}}, update,
+                                   upsert=True)
+        except DuplicateKeyError:
+            # The packument is too large to be stored, so the publisher uses the units instead
+            return
+        except (DocumentTooLarge, OperationFailure) as e:
+            self._mark_oversize(repo_id, name, e, upstream_tags)
+            return
+        self._refresh(document_id)
+
+    def remove_versions(self, repo_id, name, versions):
+        """
+        Remove the given versions from the packument of a package, and the packument itself once
+        it has no versions left.
+
+        :param repo_id:  The ID of the repository
+        :type  repo_id:  basestring
+        :param name:     The name of the package
+        :type  name:     basestring
+        :param versions: The versions to remove
+        :type  versions: list of basestring
+        """
+        if not versions:
+            return
+        document_id = packument_id(repo_id, name)
+        update = {'$unset': dict([('versions.' + encode_version(v), '') for v in versions]),
+                  '$pullAll': {'all_versions': list(versions)},
+                  '$inc': {'revision': 1}}
+        self.collection.update({'_id': document_id, 'oversize': {'$ne': True}}, update)
+        self._refresh(document_id)
+
+    def set_upstream_tags(self, repo_id, name, upstream_tags):
+        """
+        Replace the upstream dist-tags of the packument of a package, if it has one and they
+        changed.
+
+        :param repo_id:       The ID of the repository
+        :type  repo_id:       basestring
+        :param name:          The name of the package
+        :type  name:          basestring
+        :param upstream_tags: The dist-tags of the package in the registry it was synchronized from
+        :type  upstream_tags: dict
+        """
+        document_id = packument_id(repo_id, name)
+        result = self.collection.update(
+            {'_id': document_id, 'upstream_dist_tags': {'$ne': upstream_tags}},
+            {'$set': {'upstream_dist_tags': upstream_tags}, '$inc': {'revision': 1}})
+        if result and result.get('n'):
+            self._refresh(document_id)
+
+    def replace(self, repo_id, name, versions, upstream_tags=None):
+        """
+        Replace the packument of a package with one built from the given versions.
+
+        :param repo_id:       The ID of the repository
+        :type  repo_id:       basestring
+        :param name:          The name of the package
+        :type  name:          basestring
+        :param versions:      Maps the versions to the metadata of their units
+        :type  versions:      dict
+        :param upstream_tags: The dist-tags of the package in the registry it was synchronized from
+        :type  upstream_tags: dict
+        """
+        dist_tags, fields = summarize(versions, upstream_tags)
+        document = {'repo_id': repo_id, 'name': name, 'oversize': False,
+                    'versions': dict([(encode_version(v), m) for v, m in versions.items()]),
+                    'all_versions': versions.keys(), 'dist-tags': dist_tags, 'fields': fields,
+                    'upstream_dist_tags': upstream_tags or {}}
+        try:
+            self.collection.update({'_id': packument_id(repo_id, name)},
+                                   {'$set': document, '$inc': {'revision': 1}}, upsert=True)
+        except (DocumentTooLarge, OperationFailure) as e:
+            self._mark_oversize(repo_id, name, e, upstream_tags)
+
+    def find(self, repo_id):
+        """
+        Return the packuments of the given repository.
+
+        :param repo_id: The ID of the repository
+        :type  repo_id: basestring
+        :return:        The packuments
+        :rtype:         iterable of dict
+        """
+        return self.collection.find({'repo_id': repo_id})
+
+    def get_versions(self, repo_id, names):
+        """
+        Return the versions that the packuments of the given packages hold.
+
+        :param repo_id: The ID of the repository
+        :type  repo_id: basestring
+        :param names:   The names of the packages
+        :type  names:   list of basestring
+        :return:        Maps the names of the packages that have a packument to the set of its
+                        versions, or to None if the packument is too large to be stored
+        :rtype:         dict
+        """
+        ids = [packument_id(repo_id, name) for name in names]
+        found = {}
+        for document in self.collection.find({'_id': {'$in': ids}},
+                                             ['name', 'all_versions', 'oversize']):
+            if document.get('oversize'):
+                found[document['name']] = None
+            else:
+                found[document['name']] = set(document.get('all_versions', []))
+        return found
+
+    def get_upstream_tags(self, repo_id, names):
+        """
+        Return the upstream dist-tags that the packuments of the given packages hold.
+
+        :param repo_id: The ID of the repository
+        :type  repo_id: basestring
+        :param names:   The names of the packages
+        :type  names:   list of basestring
+        :return:        Maps the names of the packages whose packument holds upstream dist-tags to
+                        the tags
+        :rtype:         dict
+        """
+        found = {}
+        for i in xrange(0, len(names), QUERY_BATCH_SIZE):
+            ids = [packument_id(repo_id, name) for name in names[i:i + QUERY_BATCH_SIZE]]
+            for document in self.collection.find({'_id': {'$in': ids}},
+                                                 ['name', 'upstream_dist_tags']):
+                if document.get('upstream_dist_tags'):
+                    found[document['name']] = document['upstream_dist_tags']
+        return found
+
+    def remove(self, repo_id, names=None):
+        """
+        Remove the packuments of the given packages, or of every package, of a repository.
+
+        :param repo_id: The ID of the repository
+        :type  repo_id: basestring
+        :param names:   The names of the packages. Defaults to every package.
+        :type  names:   list of basestring
+        """
+        if names is None:
+            self.collection.remove({'repo_id': repo_id})
+        elif names:
+            self.collection.remove({'_id': {'$in': [packument_id(repo_id, n) for n in names]}})
+
+    def _refresh(self, document_id):
+        """
+        Update the dist-tags and top level fields of a packument from its versions, unless another
+        update came in since they were read, or remove it if it has no versions left.
+
+        :param document_id: The ID of the packument
+        :type  document_id: basestring
+        """
+        document = self.collection.find_one(
+            {'_id': document_id}, ['all_versions', 'revision', 'oversize', 'upstream_dist_tags'])
+        if document is None or document.get('oversize'):
+            return
+        spec = {'_id': document_id, 'revision': document['revision']}
+        if not document.get('all_versions'):
+            self.collection.remove(spec)
+            return
+        tags = dist_tags(set(document['all_versions']), document.get('upstream_dist_tags'))
+        key = encode_version(tags['latest'])
+        latest_metadata = self.collection.find_one({'_id': document_id},
+                                                   ['versions.' + key])['versions'][key]
+        fields = dict([(f, latest_metadata[f]) for f in TOP_LEVEL_FIELDS if f in latest_metadata])
+        self.collection.update(spec, {'$set': {'dist-tags': tags, 'fields': fields}})
+
+    def _mark_oversize(self, repo_id, name, error, upstream_tags=None):
+        """
+        Replace the packument of a package that is too large to be stored with a marker, so that
+        the publisher builds the package's metadata from its units instead. The marker keeps the
+        upstream dist-tags of the package.
+
+        :param repo_id:       The ID of the repository
+        :type  repo_id:       basestring
+        :param name:          The name of the package
+        :type  name:          basestring
+        :param error:         The error that the update raised
+        :type  error:         Exception
+        :param upstream_tags: If given, the dist-tags of the package in the registry it was
+                              synchronized from, which replace the stored ones
+        :type  upstream_tags: dict
+        """
+        _logger.warn(_('The packument of %(name)s in %(repo)s could not be stored: %(error)s') %
+                     {'name': name, 'repo': repo_id, 'error': error})
+        marker = {'repo_id': repo_id, 'name': name, 'oversize': True}
+        if upstream_tags is not None:
+            marker['upstream_dist_tags'] = upstream_tags
+        self.collection.update(
+            {'_id': packument_id(repo_id, name)},
+            {'$set': marker, '$unset': {'versions': '', 'all_versions': '', 'dist-tags': '',
+                                        'fields': ''}}, upsert=True)
+
+
+def reconcile(store, repo_id, conduit, names, upstream_tags=None):
+    """
+    Bring the packuments of the given packages in line with the units in the repository, adding
+    the versions that they lack and removing the ones that are no longer in the repository. Only
+    the metadata of the added versions is read.
+
+    :param store:         The packuments
+    :type  store:         pulp_npm.plugins.packuments.PackumentStore
+    :param repo_id:       The ID of the repository
+    :type  repo_id:       basestring
+    :param conduit:       A conduit whose get_units() returns the units of the repository
+    :type  conduit:       pulp.plugins.conduits.mixins.SingleRepoUnitsMixin
+    :param names:         The names of the packages
+    :type  names:         iterable of basestring
+    :param upstream_tags: Maps the names of the packages that were read from a registry to their
+                          dist-tags there
+    :type  upstream_tags: dict
+    """
+    upstream_tags = upstream_tags or {}
+    names = sorted(set(names))
+    for i in xrange(0, len(names), QUERY_BATCH_SIZE):
+        batch = names[i:i + QUERY_BATCH_SIZE]
+        search = criteria.UnitAssociationCriteria(type_ids=[constants.PACKAGE_TYPE_ID],
+                                                  unit_filters={'name': {'$in': batch}},
+                                                  unit_fields=['name', 'version'])
+        in_repo = {}
+        for unit in conduit.get_units(criteria=search):
+            in_repo.setdefault(unit.unit_key['name'], set()).add(unit.unit_key['version'])
+        in_store = store.get_versions(repo_id, batch)
+
+        to_add = []
+        for name in batch:
+            stored = in_store.get(name, set())
+            missing = in_repo.get(name, set()) - (stored or set())
+            if name in upstream_tags and name in in_repo and (stored is None or not missing):
+                store.set_upstream_tags(repo_id, name, upstream_tags[name])
+            if stored is None:
+                # The packument is too large to be stored, so the publisher uses the units
+                continue
+            to_add.extend([{'name': name, 'version': v} for v in missing])
+            removed = stored - in_repo.get(name, set())
+            if removed and name in in_repo:
+                store.remove_versions(repo_id, name, list(removed))
+        # The packages that are no longer in the repository at all
+        store.remove(repo_id, [name for name in in_store if name not in in_repo])
+
+        added = {}
+        if to_add:
+            search = criteria.UnitAssociationCriteria(type_ids=[constants.PACKAGE_TYPE_ID],
+                                                      unit_filters={'$or': to_add})
+            for unit in conduit.get_units(criteria=search):
+                added.setdefault(unit.unit_key['name'], {})[unit.unit_key['version']] = \
+                    unit.metadata
+        for name, versions in added.items():
+            store.add_versions(repo_id, name, versions, upstream_tags.get(name))
+
+
+def packument_id(repo_id, name):
+    """
+    :param repo_id: The ID of a repository
+    :type  repo_id: basestring
+    :param name:    The name of a package
+    :type  name:    basestring
+    :return:        The ID of the package's packument in the repository
+    :rtype:         basestring
+    """
+    return '%s/%s' % (repo_id, name)
+
+
+def encode_version(version):
+    """
+    :param version: A version
+    :type  version: basestring
+    :return:        The version, with full width dots so that it can be a key in MongoDB
+    :rtype:         unicode
+    """
+    if isinstance(version, str):
+        version = version.decode('utf-8')
+    return version.replace(DOT, ENCODED_DOT)
+
+
+def decode_version(key):
+    """
+    :param key: A version that encode_version() returned
+    :type  key: unicode
+    :return:    The version
+    :rtype:     unicode
+    """
+    return key.replace(ENCODED_DOT, DOT)
+
+
+def summarize(versions, upstream_tags=None):
+    """
+    Return the dist-tags and the top level fields of a package with the given versions.
+
+    :param versions:      Maps the versions of the package to their metadata
+    :type  versions:      dict
+    :param upstream_tags: The dist-tags of the package in the registry it was synchronized from
+    :type  upstream_tags: dict
+    :return:              The dist-tags, and the top level fields taken from the latest version
+    :rtype:               tuple
+    """
+    if not versions:
+        return {}, {}
+    tags = dist_tags(versions, upstream_tags)
+    latest = versions[tags['latest']]
+    return tags, dict([(f, latest[f]) for f in TOP_LEVEL_FIELDS if f in latest])
+
+
+def dist_tags(versions, upstream_tags=None):
+    """
+    Return the dist-tags of a package with the given versions. The upstream tags that point to one
+    of the versions are kept, and the latest tag is computed if the upstream one isn't kept.
+
+    :param versions:      The versions of the package. It must not be empty.
+    :type  versions:      list, set or dict of basestring
+    :param upstream_tags: The dist-tags of the package in the registry it was synchronized from
+    :type  upstream_tags: dict
+    :return:              Maps the tags to versions
+    :rtype:               dict
+    """
+    tags = dict([(tag, version) for tag, version in (upstream_tags or {}).items()
+                 if version in versions])
+    if 'latest' not in tags:
+        tags['latest'] = latest_version(versions)
+    return tags
+
+
+def latest_version(versions):
+    """
+    Return the latest of the given versions, preferring the ones that aren't prereleases. The
+    versions are scanned once, comparing their cached keys.
+
+    :param versions: Versions. It must not be empty.
+    :type  versions: iterable of basestring
+    :return:         The latest version
+    :rtype:          basestring
+    """
+    latest = latest_key = None
+    latest_release = latest_release_key = None
+    for version in versions:
+        key, release = version_key(version)
+        if latest is None or key > latest_key:
+            latest, latest_key = version, key
+        if release and (latest_release is None or key > latest_release_key):
+            latest_release, latest_release_key = version, key
+    if latest_release is not None:
+        return latest_release
+    return latest
+
+
+def version_key(version):
+    """
+    Return the key that orders the given version the way npm does, and whether it is a release.
+    The keys are cached, as the same versions are compared every time a package is updated.
+
+    :param version: A version
+    :type  version: basestring
+    :return:        The sort key of semver.sort_key(), and True if the version is a valid version
+                    that isn't a prerelease
+    :rtype:         tuple
+    """
+    try:
+        return _version_keys[version]
+    except KeyError:
+        pass
+    if len(_version_keys) >= VERSION_KEY_CACHE_SIZE:
+        _version_keys.clear()
+    key = semver.sort_key(version)
+    # Valid versions have a key of (1, (major, minor, patch, (1,))), unless they are prereleases
+    _version_keys[version] = result = (key, key[0] == 1 and key[1][3] == (1,))
+    return result
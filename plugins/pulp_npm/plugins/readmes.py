@@ -0,0 +1,95 @@
+"""
+This module contains the store of readmes that are kept out of the unit documents. Most versions of
+a package share its readme, and readmes can be megabytes long, so storing one in every unit bloats
+the database. Instead, each distinct readme of a package is stored once in a collection of its own,
+and the units refer to it by its key.
+"""
+import hashlib
+
+from pulp.server.db import connection
+from pymongo.errors import DuplicateKeyError
+
+COLLECTION_NAME = 'npm_readmes'
+# The number of readmes fetched by each query
+QUERY_BATCH_SIZE = 500
+
+
+class ReadmeStore(object):
+    """
+    The readmes of the packages, keyed on the package's name and the checksum of the readme.
+    """
+
+    def __init__(self, collection=None):
+        """
+        Initialize the ReadmeStore.
+
+        :param collection: The collection that holds the readmes. Defaults to the npm_readmes
+                           collection of Pulp's database, which is only opened once it is used.
+        :type  collection: pymongo.collection.Collection
+        """
+        self._collection = collection
+        # The keys of the readmes that are known to be stored
+        self._stored = set()
+
+    @property
+    def collection(self):
+        """
+        The collection that holds the readmes.
+
+        :rtype: pymongo.collection.Collection
+        """
+        if self._collection is None:
+            self._collection = connection.get_collection(COLLECTION_NAME, create=True)
+        return self._collection
+
+    def put(self, name, readme):
+        """
+        Store the given readme of a package, unless it is stored already.
+
+        :param name:   The name of the package
+        :type  name:   basestring
+        :param readme: The readme
+        :type  readme: basestring
+        :return:       The key that the readme is stored under
+        :rtype:        basestring
+        """
+        key = readme_key(name, readme)
+        if key not in self._stored:
+            try:
+                self.collection.insert({'_id': key, 'name': name, 'readme': readme})
+            except DuplicateKeyError:
+                pass
+            self._stored.add(key)
+        return key
+
+    def get_many(self, keys):
+        """
+        Fetch the readmes stored under the given keys.
+
+        :param keys: The keys of the readmes
+        :type  keys: iterable of basestring
+        :return:     Maps the keys to their readmes. Keys whose readme isn't stored are left out.
+        :rtype:      dict
+        """
+        keys = sorted(set(keys))
+        readmes = {}
+        for i in xrange(0, len(keys), QUERY_BATCH_SIZE):
+            for document in self.collection.find({'_id': {'$in': keys[i:i + QUERY_BATCH_SIZE]}}):
+                readmes[document['_id']] = document['readme']
+        return readmes
+
+
+def readme_key(name, readme):
+    """
+    Return the key that the given readme of a package is stored under.
+
+    :param name:   The name of the package
+    :type  name:   basestring
+    :param readme: The readme
+    :type  readme: basestring
+    :return:       The package's name and the SHA-1 checksum of the readme
+    :rtype:        basestring
+    """
+    if isinstance(readme, unicode):
+        readme = readme.encode('utf-8')
+    return '%s@%s' % (name, hashlib.sha1(readme).hexdigest())
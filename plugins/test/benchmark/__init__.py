@@ -0,0 +1,7 @@
+"""
+This package contains benchmarks of the plugins. They aren't run with the unit tests, and they
+expect Pulp, Nectar and the plugins to be installed, as they would be in a development environment.
+Each benchmark is a module that can be run with python -m from the plugins directory, for example:
+
+    python -m test.benchmark.bench_sync --packages 100,1000 --latency 0.02
+"""
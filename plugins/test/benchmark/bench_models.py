@@ -0,0 +1,236 @@
+"""
+This module benchmarks the code that runs for every unit: reading a package's tarball, computing
+its checksum, encoding and decoding its metadata for the database, sanitizing its version, and
+finding the latest of a package's versions. Each benchmark reports the operations per second, and
+the peak memory that one operation allocates if tracemalloc is available.
+
+The fixtures include a tiny tarball, a tarball of 50,000 files and a deeply nested package.json.
+Results saved with --output can be given to a later run with --baseline, which flags the ones that
+regressed by more than the threshold and exits with 1 if any did. For example, from the plugins
+directory:
+
+    python -m test.benchmark.bench_models --output baseline.json
+    python -m test.benchmark.bench_models --baseline baseline.json --threshold 0.1
+"""
+import copy
+import json
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    # tracemalloc is only part of the standard library from Python 3.4
+    tracemalloc = None
+
+from pulp_npm.plugins import models, packuments
+from test.benchmark import corpus, runner
+
+# The results that are compared with those of a baseline
+METRICS = ('ops_per_second', 'alloc_peak_bytes')
+HIGHER_IS_BETTER = ('ops_per_second',)
+
+# The number of files in the large tarball, and the depth of the nested package.json
+LARGE_TARBALL_FILES = 50000
+NESTED_DEPTH = 200
+# The number of dependencies in the large dependencies map
+DEPENDENCIES = 5000
+
+
+class Fixtures(object):
+    """
+    The files and values that the benchmarks work on, generated in a temporary directory.
+    """
+
+    def __init__(self, directory):
+        """
+        Generate the fixtures.
+
+        :param directory: The directory to write the fixtures to
+        :type  directory: basestring
+        """
+        package_json = {'name': 'tiny', 'version': '1.0.0', 'main': 'index.js'}
+        self.tiny_tarball = os.path.join(directory, 'tiny-1.0.0.tgz')
+        corpus.write_tarball(self.tiny_tarball, package_json, files=1, file_size=200)
+
+        package_json = {'name': 'large', 'version': '1.0.0', 'main': 'lib/0/0.js'}
+        self.large_tarball = os.path.join(directory, 'large-1.0.0.tgz')
+        corpus.write_tarball(self.large_tarball, package_json, files=LARGE_TARBALL_FILES,
+                             file_size=100)
+
+        package_json = corpus.nested_metadata(NESTED_DEPTH)
+        package_json.update({'name': 'nested', 'version': '1.0.0'})
+        self.nested_tarball = os.path.join(directory, 'nested-1.0.0.tgz')
+        corpus.write_tarball(self.nested_tarball, package_json)
+
+        self.large_file = os.path.join(directory, 'large.bin')
+        with open(self.large_file, 'wb') as large_file:
+            large_file.write(os.urandom(8 * 1024 * 1024))
+
+        units = corpus.generate_units(200, directory)
+        self.metadata = [u.metadata for u in units]
+        for metadata in self.metadata:
+            models.Package.decode_metadata(metadata)
+        self.nested_metadata = corpus.nested_metadata(NESTED_DEPTH)
+        # The dependencies of a package that bundles many small modules
+        self.dependencies_metadata = {'dependencies': dict(
+            [('module%s%d' % ('.' if i % 10 == 0 else '-', i), '^1.0.%d' % i)
+             for i in xrange(DEPENDENCIES)])}
+
+        self.versions = []
+        self.published_versions = []
+        for i in xrange(250):
+            release = '%d.%d.%d' % (i // 100, (i // 10) % 10, i % 10)
+            self.versions.extend([release, release + 'beta', release + '-rc.1', release + 'rc1'])
+            self.published_versions.extend([release, release + '-alpha.1', release + '-beta.1',
+                                            release + '-beta.2'])
+
+
+def benchmarks(fixtures):
+    """
+    Build the benchmarks.
+
+    :param fixtures: The fixtures that the benchmarks work on
+    :type  fixtures: Fixtures
+    :return:         (name, function, operations per call) tuples
+    :rtype:          list of tuple
+    """
+    def encode_decode(metadata):
+        def call():
+            for m in metadata:
+                models.Package._encode_metadata(m)
+                models.Package.decode_metadata(m)
+        return call
+
+    def sanitize_versions():
+        for v in fixtures.versions:
+            models.Package._sanitize_version(v)
+
+    def version_keys():
+        packuments._version_keys.clear()
+        for v in fixtures.published_versions:
+            packuments.version_key(v)
+
+    return [
+        ('from_archive_tiny', lambda: models.Package.from_archive(fixtures.tiny_tarball), 1),
+        ('from_archive_50k_files', lambda: models.Package.from_archive(fixtures.large_tarball),
+         1),
+        ('from_archive_nested', lambda: models.Package.from_archive(fixtures.nested_tarball), 1),
+        ('checksum_tiny', lambda: models.Package.checksum(fixtures.tiny_tarball), 1),
+        ('checksum_8mb', lambda: models.Package.checksum(fixtures.large_file), 1),
+        ('encode_decode_metadata', encode_decode(fixtures.metadata), len(fixtures.metadata)),
+        ('encode_decode_nested', encode_decode([copy.deepcopy(fixtures.nested_metadata)]), 1),
+        ('encode_decode_dependencies', encode_decode([fixtures.dependencies_metadata]), 1),
+        ('sanitize_version', sanitize_versions, len(fixtures.versions)),
+        ('version_key', version_keys, len(fixtures.published_versions)),
+        ('latest_version', lambda: packuments.latest_version(fixtures.published_versions),
+         len(fixtures.published_versions))]
+
+
+def measure(call, ops=1, min_time=0.2, repeat=3):
+    """
+    Measure how fast the given function runs. It is called in a loop that is long enough to take
+    min_time, and the fastest of the loops is used.
+
+    :param call:     The function to measure
+    :type  call:     callable
+    :param ops:      The number of operations that one call performs
+    :type  ops:      int
+    :param min_time: The minimum duration of a loop, in seconds
+    :type  min_time: float
+    :param repeat:   The number of loops
+    :type  repeat:   int
+    :return:         The operations per second, the peak memory allocated by an operation, and
+                     the number of calls in a loop
+    :rtype:          dict
+    """
+    loops = 1
+    elapsed = _time(call, loops)
+    while elapsed < min_time:
+        loops *= 2
+        elapsed = _time(call, loops)
+    for i in xrange(repeat - 1):
+        elapsed = min(elapsed, _time(call, loops))
+    return {'ops_per_second': round(loops * ops / elapsed, 1),
+            'alloc_peak_bytes': _allocations(call, ops), 'loops': loops}
+
+
+def _time(call, loops):
+    started = time.time()
+    for i in xrange(loops):
+        call()
+    return time.time() - started
+
+
+def _allocations(call, ops):
+    """
+    :return: The peak memory that one operation of the function allocates, in bytes, or None if
+             tracemalloc isn't available
+    :rtype:  int
+    """
+    if tracemalloc is None or tracemalloc.is_tracing():
+        return None
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return int((peak - before) / ops)
+
+
+def main(args=None):
+    """
+    Run the benchmarks, print their results, and compare them with a baseline if one is given.
+
+    :return: 1 if a benchmark regressed, or None
+    :rtype:  int
+    """
+    parser = optparse.OptionParser(description='Benchmark the per-unit code paths.')
+    parser.add_option('--filter', help='only run the benchmarks whose name contains this')
+    parser.add_option('--min-time', type='float', default=0.2,
+                      help='minimum seconds of each timed loop')
+    parser.add_option('--json', action='store_true', help='print the results as JSON')
+    parser.add_option('--output', help='file to save the results to')
+    parser.add_option('--baseline', help='file of earlier results to compare with')
+    parser.add_option('--threshold', type='float', default=0.1,
+                      help='relative change that is flagged as a regression')
+    options = parser.parse_args(args)[0]
+
+    directory = tempfile.mkdtemp(prefix='pulp_npm_bench_')
+    try:
+        fixtures = Fixtures(directory)
+        results = []
+        for name, call, ops in benchmarks(fixtures):
+            if options.filter and options.filter not in name:
+                continue
+            result = measure(call, ops, options.min_time)
+            result['name'] = name
+            results.append(result)
+    finally:
+        shutil.rmtree(directory)
+
+    if options.output:
+        runner.save(options.output, 'models', results)
+    if options.json:
+        print json.dumps(results, indent=2, sort_keys=True)
+    else:
+        print '%-24s %14s %18s' % ('benchmark', 'ops/s', 'alloc peak bytes')
+        for r in results:
+            print '%-24s %14.1f %18s' % (r['name'], r['ops_per_second'], r['alloc_peak_bytes'])
+    if options.baseline:
+        baseline = runner.load(options.baseline)
+        changes = runner.compare(baseline, results, 'name', METRICS)
+        regressed = runner.regressions(changes, options.threshold, HIGHER_IS_BETTER)
+        runner.print_comparison(baseline, changes, regressed)
+        if regressed:
+            return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
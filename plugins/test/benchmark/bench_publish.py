@@ -0,0 +1,156 @@
+"""
+This module benchmarks a whole publish of a repository of generated units, reporting the time that
+each step takes, the number of files published, the read and write system calls made and the peak
+resident set size of the process. The first publish builds the metadata from the units and stores
+the packuments along the way, and the repository is then published again from the packuments.
+
+The units are generated from a seed, so results can be saved on one commit and compared with those
+of another. Each repository size is published in a process of its own. For example, from the
+plugins directory:
+
+    python -m test.benchmark.bench_publish --units 1000,10000,100000 --output before.json
+    python -m test.benchmark.bench_publish --units 1000,10000,100000 --baseline before.json
+"""
+import json
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pulp.plugins.config import PluginCallConfiguration
+from pulp.plugins.model import Repository
+
+from pulp_npm.common import constants
+from pulp_npm.plugins.distributors import steps
+from test.benchmark import corpus, fakes, runner
+
+# The steps whose time is reported, with the name of their result
+STEPS = ((constants.PUBLISH_STEP_METADATA, 'metadata_seconds'),
+         (constants.PUBLISH_STEP_CONTENT, 'content_seconds'),
+         (constants.PUBLISH_STEP_OVER_HTTP, 'over_http_seconds'))
+# The results that are compared with those of a baseline
+METRICS = ('seconds', 'metadata_seconds', 'content_seconds', 'over_http_seconds',
+           'republish_seconds', 'republish_metadata_seconds', 'files', 'read_syscalls',
+           'write_syscalls', 'peak_rss_kb')
+
+
+def run(units, seed=0, readme_size=4 * 1024, large_readme_rate=0.02,
+        large_readme_size=100 * 1024):
+    """
+    Publish a repository of the given number of generated units.
+
+    :param units:             The number of units
+    :type  units:             int
+    :param seed:              The seed of the generated units
+    :type  seed:              int
+    :param readme_size:       The size of most readmes, in bytes
+    :type  readme_size:       int
+    :param large_readme_rate: The fraction of the packages whose readme is large
+    :type  large_readme_rate: float
+    :param large_readme_size: The size of the large readmes, in bytes
+    :type  large_readme_size: int
+    :return:                  The results of the benchmark
+    :rtype:                   dict
+    """
+    directory = tempfile.mkdtemp(prefix='pulp_npm_bench_')
+    try:
+        storage_dir = os.path.join(directory, 'storage')
+        conduit = fakes.FakeConduit(storage_dir)
+        conduit.add_units(corpus.generate_units(units, storage_dir, seed, readme_size,
+                                                large_readme_rate, large_readme_size))
+        repo = Repository('benchmark', working_dir=os.path.join(directory, 'working'))
+        publish_dir = os.path.join(directory, 'published')
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_PUBLISH_DIRECTORY: publish_dir})
+        packument_store = fakes.FakePackumentStore()
+        publisher = steps.NpmPublisher(repo, conduit, config, packument_store)
+
+        rss_before = runner.peak_rss()
+        io_before = runner.io_counters()
+        started = time.time()
+        publisher.process_lifecycle()
+        seconds = time.time() - started
+        io_after = runner.io_counters()
+
+        files = 0
+        for dirpath, dirnames, filenames in os.walk(publish_dir):
+            files += len(filenames)
+        results = {
+            'units': units, 'packages': len(set([u.unit_key['name'] for u in
+                                                 conduit.repo_units.values()])),
+            'seed': seed, 'seconds': round(seconds, 3), 'files': files,
+            'bytes_written': publisher.metrics['bytes'],
+            'read_syscalls': _delta(io_before, io_after, 'syscr'),
+            'write_syscalls': _delta(io_before, io_after, 'syscw'),
+            'blocks_written': _delta(io_before, io_after, 'oublock'),
+            'rss_before_kb': rss_before, 'peak_rss_kb': runner.peak_rss()}
+        steps_by_id = dict([(s.step_id, s) for s in publisher.children])
+        for step_id, result in STEPS:
+            results[result] = steps_by_id[step_id].metrics['wall_seconds']
+
+        repo = Repository('benchmark', working_dir=os.path.join(directory, 'republish'))
+        publisher = steps.NpmPublisher(repo, conduit, config, packument_store)
+        started = time.time()
+        publisher.process_lifecycle()
+        results['republish_seconds'] = round(time.time() - started, 3)
+        steps_by_id = dict([(s.step_id, s) for s in publisher.children])
+        results['republish_metadata_seconds'] = \
+            steps_by_id[constants.PUBLISH_STEP_METADATA].metrics['wall_seconds']
+        return results
+    finally:
+        shutil.rmtree(directory)
+
+
+def _delta(before, after, key):
+    if before[key] is None or after[key] is None:
+        return None
+    return after[key] - before[key]
+
+
+def main(args=None):
+    """
+    Run the benchmark for each of the repository sizes given on the command line, and print the
+    results.
+    """
+    parser = optparse.OptionParser(description='Benchmark a publish of generated units.')
+    parser.add_option('--units', default='1000,10000,100000',
+                      help='comma separated numbers of units to publish, one run each')
+    parser.add_option('--seed', type='int', default=0, help='seed of the generated units')
+    parser.add_option('--readme-size', type='int', default=4, help='size of most readmes, in KB')
+    parser.add_option('--large-readme-rate', type='float', default=0.02,
+                      help='fraction of the packages whose readme is large')
+    parser.add_option('--large-readme-size', type='int', default=100,
+                      help='size of the large readmes, in KB')
+    parser.add_option('--json', action='store_true', help='print the results as JSON')
+    parser.add_option('--output', help='file to save the results to')
+    parser.add_option('--baseline', help='file of earlier results to compare with')
+    options = parser.parse_args(args)[0]
+
+    results = []
+    for units in options.units.split(','):
+        results.append(runner.run_isolated(
+            run, units=int(units), seed=options.seed, readme_size=options.readme_size * 1024,
+            large_readme_rate=options.large_readme_rate,
+            large_readme_size=options.large_readme_size * 1024))
+
+    if options.output:
+        runner.save(options.output, 'publish', results)
+    if options.json:
+        print json.dumps(results, indent=2, sort_keys=True)
+        return
+    print '%8s %9s %9s %9s %9s %9s %8s %10s %10s %12s' % (
+        'units', 'seconds', 'metadata', 'content', 'over http', 'republish', 'files', 'reads',
+        'writes', 'peak RSS KB')
+    for r in results:
+        print '%8d %9.3f %9.3f %9.3f %9.3f %9.3f %8d %10s %10s %12d' % (
+            r['units'], r['seconds'], r['metadata_seconds'], r['content_seconds'],
+            r['over_http_seconds'], r['republish_seconds'], r['files'], r['read_syscalls'],
+            r['write_syscalls'], r['peak_rss_kb'])
+    if options.baseline:
+        baseline = runner.load(options.baseline)
+        runner.print_comparison(baseline, runner.compare(baseline, results, 'units', METRICS))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+This module benchmarks a whole sync against a local registry of generated packages, reporting the
+packages synchronized per second, the megabytes downloaded per second and the peak resident set
+size of the process. The registry can be given latency, a bandwidth limit and errors, to see how
+the sync copes with a distant or flaky registry.
+
+Each repository size is synchronized in a process of its own, so that the peak memory of one run
+doesn't hide that of the next. For example, from the plugins directory:
+
+    python -m test.benchmark.bench_sync --packages 100,1000 --versions 3 --latency 0.05
+"""
+import json
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pulp.common.plugins import importer_constants
+from pulp.plugins.config import PluginCallConfiguration
+from pulp.plugins.model import Repository
+
+from pulp_npm.common import constants
+from pulp_npm.plugins.importers import sync
+from test.benchmark import fakes, runner
+from test.benchmark.registry import BenchmarkRegistry
+
+MEGABYTE = 1024 * 1024.0
+# The results that are compared with those of a baseline
+METRICS = ('packages_per_second', 'mb_per_second', 'peak_rss_kb')
+
+
+def run(packages, versions=1, tarball_size=16 * 1024, latency=0, bandwidth=None, error_rate=0,
+        error_status=500, concurrency=None):
+    """
+    Sync a repository with the given number of packages from a new registry.
+
+    :param packages:     The number of packages
+    :type  packages:     int
+    :param versions:     The number of versions of each package
+    :type  versions:     int
+    :param tarball_size: The approximate size of each tarball, in bytes
+    :type  tarball_size: int
+    :param latency:      The seconds that each response of the registry is delayed by
+    :type  latency:      float
+    :param bandwidth:    The bytes per second that each response is limited to, or None
+    :type  bandwidth:    int
+    :param error_rate:   The fraction of requests that the registry fails
+    :type  error_rate:   float
+    :param error_status: The status of the failed requests
+    :type  error_status: int
+    :param concurrency:  The concurrency of the manifest and tarball downloads, or None for the
+                         default
+    :type  concurrency:  int
+    :return:             The results of the benchmark
+    :rtype:              dict
+    """
+    directory = tempfile.mkdtemp(prefix='pulp_npm_bench_')
+    try:
+        with BenchmarkRegistry(os.path.join(directory, 'registry'), latency, bandwidth,
+                               error_rate, error_status) as registry:
+            names = registry.generate(packages, versions, tarball_size)
+            working_dir = os.path.join(directory, 'working')
+            os.makedirs(working_dir)
+            repo = Repository('benchmark', working_dir=working_dir)
+            conduit = fakes.FakeConduit(os.path.join(directory, 'storage'))
+            config = {importer_constants.KEY_FEED: registry.url,
+                      constants.CONFIG_KEY_PACKAGE_NAMES: ','.join(names)}
+            if concurrency:
+                config[constants.CONFIG_KEY_METADATA_CONCURRENCY] = concurrency
+                config[constants.CONFIG_KEY_PACKAGE_CONCURRENCY] = concurrency
+            step = sync.SyncStep(repo, conduit, PluginCallConfiguration({}, config), working_dir,
+                                 packument_store=fakes.FakePackumentStore())
+
+            rss_before = runner.peak_rss()
+            started = time.time()
+            report = step.sync()
+            seconds = time.time() - started
+            peak_rss = runner.peak_rss()
+
+            synced = conduit.calls.get('save_unit', 0)
+            return {
+                'packages': packages, 'versions': packages * versions,
+                'tarball_size': tarball_size, 'latency': latency, 'bandwidth': bandwidth,
+                'error_rate': error_rate, 'success': report.success_flag,
+                'synced': synced, 'failures': step.metrics['failures'],
+                'retries': step.metrics['retries'], 'requests': len(registry.requests),
+                'injected_errors': registry.errors, 'seconds': round(seconds, 3),
+                'packages_per_second': round(synced / seconds, 3),
+                'mb_per_second': round(step.metrics['bytes'] / MEGABYTE / seconds, 3),
+                'rss_before_kb': rss_before, 'peak_rss_kb': peak_rss}
+    finally:
+        shutil.rmtree(directory)
+
+
+def main(args=None):
+    """
+    Run the benchmark for each of the repository sizes given on the command line, and print the
+    results.
+    """
+    parser = optparse.OptionParser(description='Benchmark a sync against a local registry.')
+    parser.add_option('--packages', default='100',
+                      help='comma separated numbers of packages to sync, one run each')
+    parser.add_option('--versions', type='int', default=1, help='versions of each package')
+    parser.add_option('--tarball-size', type='int', default=16,
+                      help='size of each tarball, in KB')
+    parser.add_option('--latency', type='float', default=0,
+                      help='seconds that each response is delayed by')
+    parser.add_option('--bandwidth', type='int', help='KB per second of each response')
+    parser.add_option('--error-rate', type='float', default=0,
+                      help='fraction of the requests that fail')
+    parser.add_option('--error-status', type='int', default=500,
+                      help='status of the failed requests, such as 429 or 503 to be throttled')
+    parser.add_option('--concurrency', type='int', help='concurrent downloads')
+    parser.add_option('--json', action='store_true', help='print the results as JSON')
+    parser.add_option('--output', help='file to save the results to')
+    parser.add_option('--baseline', help='file of earlier results to compare with')
+    options = parser.parse_args(args)[0]
+
+    results = []
+    for packages in options.packages.split(','):
+        results.append(runner.run_isolated(
+            run, packages=int(packages), versions=options.versions,
+            tarball_size=options.tarball_size * 1024, latency=options.latency,
+            bandwidth=options.bandwidth and options.bandwidth * 1024,
+            error_rate=options.error_rate, error_status=options.error_status,
+            concurrency=options.concurrency))
+
+    if options.output:
+        runner.save(options.output, 'sync', results)
+    if options.json:
+        print json.dumps(results, indent=2, sort_keys=True)
+        return
+    print '%10s %8s %8s %9s %10s %8s %12s' % (
+        'versions', 'synced', 'failed', 'seconds', 'packages/s', 'MB/s', 'peak RSS KB')
+    for r in results:
+        print '%10d %8d %8d %9.3f %10.3f %8.3f %12d' % (
+            r['versions'], r['synced'], r['failures'], r['seconds'], r['packages_per_second'],
+            r['mb_per_second'], r['peak_rss_kb'])
+    if options.baseline:
+        baseline = runner.load(options.baseline)
+        runner.print_comparison(baseline, runner.compare(baseline, results, 'versions', METRICS))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+This module generates the content that the benchmarks work on. The content is generated from a
+seed, so that every run of a benchmark works on the same content, and runs on different commits can
+be compared.
+"""
+import cStringIO
+import json
+import os
+import random
+import tarfile
+
+from pulp.plugins.model import Unit
+
+from pulp_npm.common import constants
+
+WORDS = ('the', 'package', 'module', 'install', 'npm', 'require', 'function', 'returns', 'options',
+         'callback', 'stream', 'buffer', 'string', 'object', 'array', 'value', 'example', 'usage',
+         'license', 'MIT', 'node', 'browser', 'promise', 'async', 'default', 'config', 'test')
+
+# Dependencies whose names contain dots, which are stored with the dots encoded
+DOTTED_DEPENDENCIES = ('lodash.merge', 'lodash.debounce', 'socket.io', 'highlight.js', 'chart.js')
+
+
+def text(rng, size):
+    """
+    Generate markdown-like text of about the given size.
+
+    :param rng:  The random number generator
+    :type  rng:  random.Random
+    :param size: The size of the text, in bytes
+    :type  size: int
+    :return:     The text
+    :rtype:      basestring
+    """
+    words = []
+    length = 0
+    while length < size:
+        if rng.random() < 0.05:
+            word = '\n\n## %s\n\n' % rng.choice(WORDS).title()
+        else:
+            word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def generate_units(count, storage_dir, seed=0, readme_size=4 * 1024, large_readme_rate=0.02,
+                   large_readme_size=100 * 1024):
+    """
+    Generate units that look like the ones a sync of the npm registry saves. Most packages have a
+    few versions and some have hundreds, a fifth of them are scoped, some versions are
+    prereleases, and the readme of each version is stored with it.
+
+    :param count:             The number of units
+    :type  count:             int
+    :param storage_dir:       The directory that the units' storage paths are in. The units'
+                              files are not created.
+    :type  storage_dir:       basestring
+    :param seed:              The seed of the content
+    :type  seed:              int
+    :param readme_size:       The size of most readmes, in bytes
+    :type  readme_size:       int
+    :param large_readme_rate: The fraction of the packages whose readme is large
+    :type  large_readme_rate: float
+    :param large_readme_size: The size of the large readmes, in bytes
+    :type  large_readme_size: int
+    :return:                  The units
+    :rtype:                   list of pulp.plugins.model.Unit
+    """
+    rng = random.Random(seed)
+    units = []
+    package = 0
+    while len(units) < count:
+        name = 'package-%06d' % package
+        if package % 5 == 4:
+            name = '@scope-%d/%s' % (package % 50, name)
+        versions = min(int(rng.paretovariate(1.2)), 300, count - len(units))
+        size = readme_size
+        if rng.random() < large_readme_rate:
+            size = large_readme_size
+        readme = text(rng, size)
+        for i in xrange(versions):
+            version = '%d.%d.%d' % (i // 100, (i // 10) % 10, i % 10)
+            if rng.random() < 0.1:
+                version += '-beta.%d' % rng.randint(0, 5)
+            units.append(_unit(rng, name, version, readme, storage_dir))
+        package += 1
+    return units
+
+
+def _unit(rng, name, version, readme, storage_dir):
+    """
+    Generate the unit of a version of a package.
+    """
+    filename = '%s-%s.tgz' % (name.split('/')[-1], version)
+    shasum = '%040x' % rng.getrandbits(160)
+    dependencies = {}
+    for i in xrange(rng.randint(0, 12)):
+        dependencies['dependency-%d' % rng.randint(0, 10000)] = '^%d.0.0' % rng.randint(0, 9)
+    if rng.random() < 0.2:
+        dependencies[rng.choice(DOTTED_DEPENDENCIES).replace('.', u'\uff0e')] = '^4.0.0'
+    metadata = {
+        'description': text(rng, 80), 'keywords': [rng.choice(WORDS) for i in xrange(5)],
+        'author': {'name': 'Author %d' % rng.randint(0, 1000), 'email': 'author@example.com'},
+        'maintainers': [{'name': 'maintainer', 'email': 'maintainer@example.com'}],
+        'repository': {'type': 'git', 'url': 'git+https://example.com/%s.git' % name},
+        'license': 'MIT', 'main': 'index.js', 'scripts': {'test': 'mocha'},
+        'engines': {'node': '>=0.10'}, 'dependencies': dependencies,
+        'readme': readme[:-1] + version[-1], 'readmeFilename': 'README.md',
+        '_from': '.', '_shasum': shasum, 'dist': {'shasum': shasum, 'tarball': filename}}
+    return Unit(constants.PACKAGE_TYPE_ID, {'name': name, 'version': version}, metadata,
+                os.path.join(storage_dir, name, filename))
+
+
+def write_tarball(path, package_json, files=0, file_size=0):
+    """
+    Write the tarball of a package, laid out as npm packs it, with the given package.json and the
+    given number of other files.
+
+    :param path:         The path of the tarball
+    :type  path:         basestring
+    :param package_json: The contents of the package.json file
+    :type  package_json: dict
+    :param files:        The number of other files
+    :type  files:        int
+    :param file_size:    The size of each of the other files, in bytes
+    :type  file_size:    int
+    """
+    archive = tarfile.open(path, mode='w:gz')
+    try:
+        body = json.dumps(package_json)
+        _add_file(archive, 'package/package.json', body)
+        body = 'x' * file_size
+        for i in xrange(files):
+            _add_file(archive, 'package/lib/%d/%d.js' % (i // 1000, i), body)
+    finally:
+        archive.close()
+
+
+def _add_file(archive, path, body):
+    info = tarfile.TarInfo(path)
+    info.size = len(body)
+    archive.addfile(info, cStringIO.StringIO(body))
+
+
+def nested_metadata(depth, width=3):
+    """
+    Generate metadata that nests objects to the given depth, with some of the keys containing
+    dots, such as the metadata of packages that embed their configuration.
+
+    :param depth: The number of levels of nested objects
+    :type  depth: int
+    :param width: The number of keys of each object, one of which holds the next level
+    :type  width: int
+    :return:      The metadata
+    :rtype:       dict
+    """
+    metadata = {'leaf.key': 'value'}
+    for level in xrange(depth):
+        parent = {'level.%d' % level: metadata}
+        for i in xrange(width - 1):
+            parent['key%d' % i] = {'plain': i, 'dotted.%d' % i: [i]}
+        metadata = parent
+    return metadata
@@ -0,0 +1,213 @@
+"""
+This module contains in-memory stand-ins for the conduits that Pulp gives to the plugins and for
+the packument store, so that the steps can be benchmarked without a database. The conduit keeps
+the units in Pulp and the ones in the repository in dictionaries, and records the calls made to
+it.
+"""
+import copy
+import os
+
+from pulp.plugins.model import Unit
+
+from pulp_npm.plugins import packuments
+
+
+class FakeReport(object):
+    """
+    The report that a task returns, as built by the conduit.
+    """
+
+    def __init__(self, success_flag, summary, details):
+        self.success_flag = success_flag
+        self.summary = summary
+        self.details = details
+        self.canceled_flag = False
+
+
+class FakeConduit(object):
+    """
+    An in-memory conduit for syncs and publishes. Units are matched against the filters of search
+    criteria on their unit keys and metadata, supporting equality, $in and $or.
+    """
+
+    def __init__(self, storage_dir):
+        """
+        Initialize an empty FakeConduit.
+
+        :param storage_dir: The directory that units are stored in
+        :type  storage_dir: basestring
+        """
+        self.storage_dir = storage_dir
+        # Map (name, version) tuples to units, for every unit in Pulp and for those in the
+        # repository
+        self.units = {}
+        self.repo_units = {}
+        self.scratchpad = {}
+        # Maps method names to the number of calls made to them
+        self.calls = {}
+
+    def _called(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def add_units(self, units, associate=True):
+        """
+        Add the given units to Pulp, and to the repository if associate is True.
+
+        :param units:     The units to add
+        :type  units:     list of pulp.plugins.model.Unit
+        :param associate: Whether the units are in the repository
+        :type  associate: bool
+        """
+        for unit in units:
+            key = (unit.unit_key['name'], unit.unit_key['version'])
+            self.units[key] = unit
+            if associate:
+                self.repo_units[key] = unit
+
+    def init_unit(self, type_id, unit_key, metadata, relative_path):
+        self._called('init_unit')
+        storage_path = os.path.join(self.storage_dir, unit_key['name'], relative_path)
+        if not os.path.exists(os.path.dirname(storage_path)):
+            os.makedirs(os.path.dirname(storage_path))
+        return Unit(type_id, unit_key, metadata, storage_path)
+
+    def save_unit(self, unit):
+        self._called('save_unit')
+        self.add_units([unit])
+        return unit
+
+    def search_all_units(self, type_id, criteria=None):
+        self._called('search_all_units')
+        return _match(self.units.values(), criteria and criteria.filters)
+
+    def get_units(self, criteria=None, as_generator=False):
+        self._called('get_units')
+        units = _match(self.repo_units.values(), criteria and criteria.unit_filters)
+        if as_generator:
+            return iter(units)
+        return units
+
+    def associate_existing(self, type_id, unit_keys):
+        self._called('associate_existing')
+        for unit_key in unit_keys:
+            key = (unit_key['name'], unit_key['version'])
+            self.repo_units[key] = self.units[key]
+
+    def get_repo_scratchpad(self):
+        self._called('get_repo_scratchpad')
+        return dict(self.scratchpad)
+
+    def set_repo_scratchpad(self, scratchpad):
+        self._called('set_repo_scratchpad')
+        self.scratchpad = dict(scratchpad)
+
+    def set_progress(self, status):
+        pass
+
+    def build_success_report(self, summary, details):
+        return FakeReport(True, summary, details)
+
+    def build_failure_report(self, summary, details):
+        return FakeReport(False, summary, details)
+
+
+class FakePackumentStore(object):
+    """
+    An in-memory packument store. Documents are copied as they are stored and read, as they are
+    by the database.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty FakePackumentStore.
+        """
+        # Maps (repo ID, package name) tuples to packuments
+        self.documents = {}
+
+    def add_versions(self, repo_id, name, versions, upstream_tags=None):
+        document = self.documents.setdefault(
+            (repo_id, name), {'repo_id': repo_id, 'name': name, 'versions': {}})
+        if upstream_tags is not None:
+            document['upstream_dist_tags'] = dict(upstream_tags)
+        for version, metadata in versions.items():
+            document['versions'][version] = copy.deepcopy(metadata)
+        self._refresh(repo_id, name)
+
+    def remove_versions(self, repo_id, name, versions):
+        document = self.documents.get((repo_id, name))
+        if document is None:
+            return
+        for version in versions:
+            document['versions'].pop(version, None)
+        self._refresh(repo_id, name)
+
+    def set_upstream_tags(self, repo_id, name, upstream_tags):
+        if (repo_id, name) in self.documents:
+            self.documents[(repo_id, name)]['upstream_dist_tags'] = dict(upstream_tags)
+            self._refresh(repo_id, name)
+
+    def replace(self, repo_id, name, versions, upstream_tags=None):
+        self.documents[(repo_id, name)] = {'repo_id': repo_id, 'name': name, 'versions': {}}
+        self.add_versions(repo_id, name, versions, upstream_tags or {})
+
+    def find(self, repo_id):
+        for key, document in self.documents.items():
+            if key[0] == repo_id:
+                document = copy.deepcopy(document)
+                document['versions'] = dict([(packuments.encode_version(v), m) for v, m in
+                                             document['versions'].items()])
+                yield document
+
+    def get_versions(self, repo_id, names):
+        return dict([(name, set(self.documents[(repo_id, name)]['versions']))
+                     for name in names if (repo_id, name) in self.documents])
+
+    def get_upstream_tags(self, repo_id, names):
+        return dict([(name, dict(self.documents[(repo_id, name)]['upstream_dist_tags']))
+                     for name in names if self.documents.get((repo_id, name), {}).get(
+                         'upstream_dist_tags')])
+
+    def remove(self, repo_id, names=None):
+        for key in self.documents.keys():
+            if key[0] == repo_id and (names is None or key[1] in names):
+                del self.documents[key]
+
+    def _refresh(self, repo_id, name):
+        document = self.documents[(repo_id, name)]
+        if not document['versions']:
+            del self.documents[(repo_id, name)]
+            return
+        document['all_versions'] = document['versions'].keys()
+        document['dist-tags'], document['fields'] = packuments.summarize(
+            document['versions'], document.get('upstream_dist_tags'))
+
+
+def _match(units, filters):
+    """
+    Return the units that match the given filters.
+
+    :param units:   The units to filter
+    :type  units:   list of pulp.plugins.model.Unit
+    :param filters: A MongoDB style query, or None to match every unit
+    :type  filters: dict
+    :return:        The matching units
+    :rtype:         list
+    """
+    if not filters:
+        return list(units)
+    return [u for u in units if _matches(u, filters)]
+
+
+def _matches(unit, filters):
+    for field, condition in filters.items():
+        if field == '$or':
+            if not [f for f in condition if _matches(unit, f)]:
+                return False
+            continue
+        value = unit.unit_key.get(field, unit.metadata.get(field))
+        if isinstance(condition, dict) and '$in' in condition:
+            if value not in condition['$in']:
+                return False
+        elif value != condition:
+            return False
+    return True
@@ -0,0 +1,189 @@
+"""
+This module contains a registry for benchmarks, which serves generated packages from a local thread
+as a registry replica would. Unlike the stand-in registry that the unit tests use, it answers
+requests concurrently, and it can be made slow or unreliable, so that a sync can be measured
+against a registry that behaves like a distant one.
+"""
+import BaseHTTPServer
+import cStringIO
+import hashlib
+import json
+import os
+import random
+import SocketServer
+import tarfile
+import threading
+import time
+import urlparse
+
+from test.unit.plugins.importers.registry import StandInRegistry
+
+# The number of bytes written at a time when the bandwidth is limited
+CHUNK_SIZE = 16 * 1024
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    An HTTP server that answers each request in its own thread.
+    """
+
+    daemon_threads = True
+
+
+class BenchmarkRegistry(StandInRegistry):
+    """
+    A registry of generated packages, whose tarballs are kept on disk so that they don't count
+    towards the memory of the process that is measured. Use it as a context manager, and generate
+    the packages once it is being served.
+    """
+
+    server_class = ThreadingHTTPServer
+
+    def __init__(self, directory, latency=0, bandwidth=None, error_rate=0, error_status=500,
+                 seed=0):
+        """
+        Initialize an empty registry.
+
+        :param directory:    The directory that the generated tarballs are written to
+        :type  directory:    basestring
+        :param latency:      The seconds that each response is delayed by
+        :type  latency:      float
+        :param bandwidth:    The bytes per second that each response is limited to, or None for no
+                             limit
+        :type  bandwidth:    int
+        :param error_rate:   The fraction of requests that are answered with error_status
+        :type  error_rate:   float
+        :param error_status: The status of the injected errors. Use 429 or 503 to have the sync
+                             throttle itself.
+        :type  error_status: int
+        :param seed:         The seed that picks the requests that fail
+        :type  seed:         int
+        """
+        super(BenchmarkRegistry, self).__init__()
+        self.directory = directory
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.errors = 0
+        # Maps the paths of the tarballs to their files in the directory
+        self.tarballs = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, packages, versions=1, tarball_size=16 * 1024, prefix='bench'):
+        """
+        Publish the given number of packages, each with the given number of versions. Every tenth
+        package is scoped.
+
+        :param packages:     The number of packages
+        :type  packages:     int
+        :param versions:     The number of versions of each package
+        :type  versions:     int
+        :param tarball_size: The approximate size of each tarball, in bytes
+        :type  tarball_size: int
+        :param prefix:       The prefix of the names of the packages
+        :type  prefix:       basestring
+        :return:             The names of the packages
+        :rtype:              list
+        """
+        names = []
+        for i in xrange(packages):
+            name = '%s-%05d' % (prefix, i)
+            if i % 10 == 9:
+                name = '@%s/%s' % (prefix, name)
+            names.append(name)
+            for v in xrange(versions):
+                self.add_package(name, '1.0.%d' % v, tarball_size)
+        return names
+
+    def add_package(self, name, version, tarball_size):
+        """
+        Publish a version of a package, with a generated tarball of about the given size.
+
+        :param name:         The name of the package
+        :type  name:         basestring
+        :param version:      The version to add
+        :type  version:      basestring
+        :param tarball_size: The approximate size of the tarball, in bytes
+        :type  tarball_size: int
+        """
+        self.publish(name, version)
+        dist = self.manifests[name]['versions'][version]['dist']
+        path = os.path.join(self.directory, urlparse.urlparse(dist['tarball']).path[1:])
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        body = build_tarball(name, version, tarball_size)
+        with open(path, 'wb') as tarball:
+            tarball.write(body)
+        dist['shasum'] = hashlib.sha1(body).hexdigest()
+        dist['size'] = len(body)
+        self.tarballs[urlparse.urlparse(dist['tarball']).path] = path
+
+    def _handle(self, path, byte_range=None):
+        """
+        Return the status and the body of the response to a GET of the given path, which is an
+        injected error for some of the requests.
+        """
+        if self.error_rate:
+            self._lock.acquire()
+            try:
+                failed = self._random.random() < self.error_rate
+                if failed:
+                    self.errors += 1
+            finally:
+                self._lock.release()
+            if failed:
+                return self.error_status, json.dumps({'error': 'injected'})
+        tarball = self.tarballs.get(urlparse.urlparse(path).path)
+        if tarball is not None:
+            with open(tarball, 'rb') as tarball_file:
+                return 200, tarball_file.read()
+        return super(BenchmarkRegistry, self)._handle(path, byte_range)
+
+    def _respond(self, handler, status, body):
+        """
+        Send the response to a request, after the latency and no faster than the bandwidth.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.bandwidth:
+            return super(BenchmarkRegistry, self)._respond(handler, status, body)
+        handler.send_response(status)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        for offset in xrange(0, len(body), CHUNK_SIZE):
+            chunk = body[offset:offset + CHUNK_SIZE]
+            handler.wfile.write(chunk)
+            time.sleep(len(chunk) / float(self.bandwidth))
+
+
+def build_tarball(name, version, size):
+    """
+    Build the tarball of a version of a package, laid out as npm packs it. Its index.js is random,
+    so that the tarball doesn't compress to less than the given size.
+
+    :param name:    The name of the package
+    :type  name:    basestring
+    :param version: The version of the package
+    :type  version: basestring
+    :param size:    The approximate size of the tarball, in bytes
+    :type  size:    int
+    :return:        The gzipped tarball
+    :rtype:         str
+    """
+    files = [('package/package.json',
+              json.dumps({'name': name, 'version': version, 'main': 'index.js',
+                          'description': 'A package generated for benchmarks.'})),
+             ('package/index.js', os.urandom(size))]
+    tarball = cStringIO.StringIO()
+    archive = tarfile.open(fileobj=tarball, mode='w:gz')
+    try:
+        for path, body in files:
+            info = tarfile.TarInfo(path)
+            info.size = len(body)
+            info.mtime = time.time()
+            archive.addfile(info, cStringIO.StringIO(body))
+    finally:
+        archive.close()
+    return tarball.getvalue()
@@ -0,0 +1,191 @@
+"""
+This module contains what the benchmarks share: running a benchmark in a process of its own, and
+saving results so that they can be compared with those of another commit.
+"""
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+
+
+def run_isolated(target, **kwargs):
+    """
+    Call the given function with the given keyword arguments in a new process, so that the peak
+    memory it measures is its own.
+
+    :param target: A module level function that returns a dictionary of results
+    :type  target: callable
+    :return:       The results that the function returned
+    :rtype:        dict
+    """
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run, args=(results, target, kwargs))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def _run(results, target, kwargs):
+    results.put(target(**kwargs))
+
+
+def peak_rss():
+    """
+    :return: The peak resident set size of the process, in KB
+    :rtype:  int
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def io_counters():
+    """
+    Return the I/O counters of the process. The kernel counts the read and write system calls of
+    each process, but not the others, so use strace -c to count those.
+
+    :return: The read and write system calls, and the blocks read and written, of the process. The
+             system calls are None where /proc/self/io isn't available.
+    :rtype:  dict
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    counters = {'syscr': None, 'syscw': None, 'inblock': usage.ru_inblock,
+                'oublock': usage.ru_oublock}
+    try:
+        with open('/proc/self/io') as io_file:
+            for line in io_file:
+                key, value = line.split(':')
+                if key in ('syscr', 'syscw'):
+                    counters[key] = int(value)
+    except IOError:
+        pass
+    return counters
+
+
+def environment():
+    """
+    Describe where the benchmark runs, so that results are only compared with comparable ones.
+
+    :return: The commit of the working tree, and the Python version and platform
+    :rtype:  dict
+    """
+    try:
+        commit = subprocess.Popen(
+            ['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, cwd=os.path.dirname(__file__)).communicate()[0].strip()
+    except OSError:
+        commit = None
+    return {'commit': commit or None, 'python': platform.python_version(),
+            'platform': platform.platform()}
+
+
+def save(path, benchmark, results):
+    """
+    Write the results of a benchmark to a JSON file.
+
+    :param path:      The path of the file
+    :type  path:      basestring
+    :param benchmark: The name of the benchmark
+    :type  benchmark: basestring
+    :param results:   The results of each run
+    :type  results:   list of dict
+    """
+    with open(path, 'w') as results_file:
+        json.dump({'benchmark': benchmark, 'environment': environment(), 'results': results},
+                  results_file, indent=2, sort_keys=True)
+
+
+def load(path):
+    """
+    Read the results that save() wrote.
+
+    :param path: The path of the file
+    :type  path: basestring
+    :return:     The saved benchmark, environment and results
+    :rtype:      dict
+    """
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def compare(baseline, results, key, metrics):
+    """
+    Compare the given metrics of the results with those of the baseline run with the same key.
+
+    :param baseline: Results of an earlier run, as returned by load()
+    :type  baseline: dict
+    :param results:  The results of each run
+    :type  results:  list of dict
+    :param key:      The field that identifies a run, such as its size
+    :type  key:      basestring
+    :param metrics:  The fields to compare
+    :type  metrics:  list of basestring
+    :return:         (key value, metric, baseline value, value, change) tuples, where the change is
+                     the relative difference to the baseline value
+    :rtype:          list of tuple
+    """
+    previous = dict([(r[key], r) for r in baseline['results']])
+    changes = []
+    for r in results:
+        if r[key] not in previous:
+            continue
+        for metric in metrics:
+            before = previous[r[key]].get(metric)
+            after = r.get(metric)
+            if before is None or after is None:
+                continue
+            change = None
+            if before:
+                change = (after - before) / float(before)
+            changes.append((r[key], metric, before, after, change))
+    return changes
+
+
+def regressions(changes, threshold, higher_is_better=()):
+    """
+    Return the changes that are regressions: metrics that grew by more than the threshold, or
+    that shrank by more than it for the metrics where higher is better.
+
+    :param changes:          The changes that compare() returned
+    :type  changes:          list of tuple
+    :param threshold:        The relative change that is tolerated, such as 0.1 for 10%
+    :type  threshold:        float
+    :param higher_is_better: The metrics where higher is better, such as throughputs
+    :type  higher_is_better: collection of basestring
+    :return:                 The changes that are regressions
+    :rtype:                  list of tuple
+    """
+    found = []
+    for change in changes:
+        metric, relative = change[1], change[4]
+        if relative is None:
+            continue
+        if metric in higher_is_better:
+            relative = -relative
+        if relative > threshold:
+            found.append(change)
+    return found
+
+
+def print_comparison(baseline, changes, regressed=()):
+    """
+    Print the changes that compare() found.
+
+    :param baseline:  Results of an earlier run, as returned by load()
+    :type  baseline:  dict
+    :param changes:   The changes that compare() returned
+    :type  changes:   list of tuple
+    :param regressed: The changes to flag as regressions
+    :type  regressed: list of tuple
+    """
+    print 'Compared with %s:' % (baseline['environment'].get('commit') or 'the baseline')
+    for change in changes:
+        value, metric, before, after, relative = change
+        change_text = 'n/a'
+        if relative is not None:
+            change_text = '%+.1f%%' % (relative * 100)
+        flag = ''
+        if change in regressed:
+            flag = 'REGRESSION'
+        print '%24s %-22s %14s %14s %8s %s' % (value, metric, before, after, change_text, flag)
@@ -0,0 +1,101 @@
+"""
+This module contains tests for the pulp_npm.plugins.distributors.deferred module.
+"""
+from cStringIO import StringIO
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+from pulp.common.plugins import importer_constants
+
+from pulp_npm.common import constants
+from pulp_npm.plugins.distributors import deferred
+
+
+class TestApplication(unittest.TestCase):
+    """
+    This class contains tests for the application() function.
+    """
+    def setUp(self):
+        self.web_root = tempfile.mkdtemp()
+        self.storage_path = os.path.join(self.web_root, 'storage', 'left-pad-1.1.0.tgz')
+        self.tarball = 'the tarball'
+        self.record = {'url': 'https://registry.npmjs.org/left-pad/-/left-pad-1.1.0.tgz',
+                       'shasum': hashlib.sha1(self.tarball).hexdigest(),
+                       'storage_path': self.storage_path,
+                       'feed_config': {importer_constants.KEY_PROXY_HOST: 'http://proxy'}}
+        link_dir = os.path.join(self.web_root, 'repo', 'left-pad', '-')
+        os.makedirs(link_dir)
+        record_path = os.path.join(link_dir, 'left-pad-1.1.0.tgz') + \
+            constants.DEFERRED_RECORD_SUFFIX
+        with open(record_path, 'w') as record_file:
+            json.dump(self.record, record_file)
+        self.environ = {'PATH_INFO': '/repo/left-pad/-/left-pad-1.1.0.tgz'}
+        self.start_response = mock.MagicMock()
+        patcher = mock.patch('pulp_npm.plugins.distributors.deferred._get_web_root',
+                             return_value=self.web_root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.web_root, ignore_errors=True)
+
+    @mock.patch('pulp_npm.plugins.distributors.deferred.changes.build_opener')
+    def test_fetches_and_stores(self, build_opener):
+        """
+        The first request retrieves the tarball from the feed, with the importer settings that
+        were recorded at publish time and a timeout, and stores it.
+        """
+        opener = build_opener.return_value
+        opener.open.return_value = StringIO(self.tarball)
+
+        body = ''.join(deferred.application(self.environ, self.start_response))
+
+        self.assertEqual(body, self.tarball)
+        build_opener.assert_called_once_with(self.record['feed_config'])
+        opener.open.assert_called_once_with(self.record['url'], timeout=deferred.FETCH_TIMEOUT)
+        self.assertEqual(self.start_response.mock_calls[0][1][0], '200 OK')
+        with open(self.storage_path) as stored:
+            self.assertEqual(stored.read(), self.tarball)
+
+    @mock.patch('pulp_npm.plugins.distributors.deferred.changes.build_opener')
+    def test_serves_stored_tarball(self, build_opener):
+        """
+        Once the tarball has been stored, it is not retrieved again.
+        """
+        os.makedirs(os.path.dirname(self.storage_path))
+        with open(self.storage_path, 'w') as stored:
+            stored.write(self.tarball)
+
+        body = ''.join(deferred.application(self.environ, self.start_response))
+
+        self.assertEqual(body, self.tarball)
+        self.assertEqual(build_opener.call_count, 0)
+
+    @mock.patch('pulp_npm.plugins.distributors.deferred.changes.build_opener')
+    def test_checksum_mismatch(self, build_opener):
+        """
+        A tarball that doesn't match the manifest's shasum is neither stored nor served.
+        """
+        build_opener.return_value.open.return_value = StringIO('something else')
+
+        body = ''.join(deferred.application(self.environ, self.start_response))
+
+        self.assertEqual(body, '')
+        self.assertEqual(self.start_response.mock_calls[0][1][0], '502 Bad Gateway')
+        self.assertFalse(os.path.exists(self.storage_path))
+        self.assertEqual(os.listdir(os.path.dirname(self.storage_path)), [])
+
+    def test_unknown_path(self):
+        """
+        Paths without a deferred record are not found.
+        """
+        environ = {'PATH_INFO': '/../../etc/passwd'}
+
+        deferred.application(environ, self.start_response)
+
+        self.assertEqual(self.start_response.mock_calls[0][1][0], '404 Not Found')
@@ -2,14 +2,20 @@
 This module contains tests for the pulp_npm.plugins.distributors.steps module.
 """
 from gettext import gettext as _
+import json
 import os
+import shutil
+import tempfile
 import unittest
 from xml.etree import cElementTree as ElementTree
 
 import mock
+from pulp.common.plugins import importer_constants
 from pulp.plugins.model import Unit
+from pulp.server.exceptions import MissingResource
 
 from pulp_npm.common import constants
+from pulp_npm.plugins import packuments
 from pulp_npm.plugins.distributors import steps
 
 
@@ -97,6 +103,29 @@ class TestPublishContentStep(unittest.TestCase):
         actual_mock_call_args = [c[1] for c in symlink.mock_calls]
         self.assertEqual(set(actual_mock_call_args), set(expected_symlink_args))
 
+    def test__write_deferred_record(self):
+        """
+        Assert that the deferred record holds the importer settings that the tarball is retrieved
+        with.
+        """
+        link_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, link_dir)
+        symlink_path = os.path.join(link_dir, 'left-pad-1.1.0.tgz')
+        unit = Unit(constants.PACKAGE_TYPE_ID, {'name': 'left-pad', 'version': '1.1.0'},
+                    {constants.METADATA_KEY_UPSTREAM_URL: 'https://registry.npmjs.org/left-pad.tgz',
+                     'dist': {'shasum': 'abcde'}},
+                    '/path/to/left-pad-1.1.0.tgz')
+        feed_config = {importer_constants.KEY_PROXY_HOST: 'http://proxy'}
+
+        steps.PublishContentStep._write_deferred_record(unit, symlink_path, feed_config)
+
+        with open(symlink_path + constants.DEFERRED_RECORD_SUFFIX) as record_file:
+            record = json.load(record_file)
+        self.assertEqual(record, {'url': 'https://registry.npmjs.org/left-pad.tgz',
+                                  'shasum': 'abcde',
+                                  'storage_path': '/path/to/left-pad-1.1.0.tgz',
+                                  'feed_config': feed_config})
+
 
 class TestPublishMetadataStep(unittest.TestCase):
     """
@@ -215,7 +244,7 @@ class TestNpmPublisher(unittest.TestCase):
     """
     This class contains tests for the NpmPublisher object.
     """
-    @mock.patch('pulp_npm.plugins.distributors.steps.AtomicDirectoryPublishStep')
+    @mock.patch('pulp_npm.plugins.distributors.steps.PublishOverHttpStep')
     @mock.patch('pulp_npm.plugins.distributors.steps.configuration.get_master_publish_dir')
     @mock.patch('pulp_npm.plugins.distributors.steps.configuration.get_web_publish_dir')
     @mock.patch('pulp_npm.plugins.distributors.steps.os.makedirs')
@@ -227,13 +256,14 @@ class TestNpmPublisher(unittest.TestCase):
     def test___init___working_dir_does_not_exist(
             self, PublishMetadataStep, PublishContentStep, get_working_dir,
             super___init__, makedirs, get_web_publish_dir, get_master_publish_dir,
-            AtomicDirectoryPublishStep):
+            PublishOverHttpStep):
         """
         Assert correct operation from the __init__() method when the working_dir does not exist.
         """
         repo = mock.MagicMock()
         publish_conduit = mock.MagicMock()
         config = mock.MagicMock()
+        config.get.return_value = None
         working_dir = os.path.join('/', 'some', 'working', 'dir')
         get_working_dir.return_value = working_dir
         publish_dir = os.path.join('/', 'some', 'web', 'publish', 'dir')
@@ -247,18 +277,18 @@ class TestNpmPublisher(unittest.TestCase):
                                                publish_conduit, config)
         get_web_publish_dir.assert_called_once_with(repo, config)
         makedirs.assert_called_once_with(working_dir)
-        AtomicDirectoryPublishStep.assert_called_once_with(
+        PublishOverHttpStep.assert_called_once_with(
             working_dir, [(repo.id, publish_dir)], master_publish_dir,
             step_type=constants.PUBLISH_STEP_OVER_HTTP)
-        self.assertEqual(AtomicDirectoryPublishStep.return_value.description,
+        self.assertEqual(PublishOverHttpStep.return_value.description,
                          _('Making files available via web.'))
         self.assertEqual(len(p.children), 3)
         self.assertEqual(
             set(p.children),
-            set([AtomicDirectoryPublishStep.return_value, PublishContentStep.return_value,
+            set([PublishOverHttpStep.return_value, PublishContentStep.return_value,
                  PublishMetadataStep.return_value]))
 
-    @mock.patch('pulp_npm.plugins.distributors.steps.AtomicDirectoryPublishStep')
+    @mock.patch('pulp_npm.plugins.distributors.steps.PublishOverHttpStep')
     @mock.patch('pulp_npm.plugins.distributors.steps.configuration.get_master_publish_dir')
     @mock.patch('pulp_npm.plugins.distributors.steps.configuration.get_web_publish_dir')
     @mock.patch('pulp_npm.plugins.distributors.steps.os.makedirs')
@@ -271,13 +301,14 @@ class TestNpmPublisher(unittest.TestCase):
     def test___init___working_dir_exists(
             self, PublishMetadataStep, PublishContentStep, get_working_dir,
             super___init__, exists, makedirs, get_web_publish_dir, get_master_publish_dir,
-            AtomicDirectoryPublishStep):
+            PublishOverHttpStep):
         """
         Assert correct operation from the __init__() method when the working_dir does exist.
         """
         repo = mock.MagicMock()
         publish_conduit = mock.MagicMock()
         config = mock.MagicMock()
+        config.get.return_value = None
         working_dir = os.path.join('/', 'some', 'working', 'dir')
         get_working_dir.return_value = working_dir
         publish_dir = os.path.join('/', 'some', 'web', 'publish', 'dir')
@@ -296,15 +327,15 @@ class TestNpmPublisher(unittest.TestCase):
         self.assertEqual(len(pulp_exists_calls), 1)
         self.assertEqual(pulp_exists_calls[0][1], (working_dir,))
         self.assertEqual(makedirs.call_count, 0)
-        AtomicDirectoryPublishStep.assert_called_once_with(
+        PublishOverHttpStep.assert_called_once_with(
             working_dir, [(repo.id, publish_dir)], master_publish_dir,
             step_type=constants.PUBLISH_STEP_OVER_HTTP)
-        self.assertEqual(AtomicDirectoryPublishStep.return_value.description,
+        self.assertEqual(PublishOverHttpStep.return_value.description,
                          _('Making files available via web.'))
         self.assertEqual(len(p.children), 3)
         self.assertEqual(
             set(p.children),
-            set([AtomicDirectoryPublishStep.return_value, PublishContentStep.return_value,
+            set([PublishOverHttpStep.return_value, PublishContentStep.return_value,
                  PublishMetadataStep.return_value]))
 
 
@@ -333,3 +364,158 @@ class TestGetPackages(unittest.TestCase):
                  'storage_path': '/path/to/nectar-1.3.1.tar.gz',
                  'filename': 'nectar-1.3.1.tar.gz'}]}
         self.assertEqual(packages, expected_packages)
+
+
+class TestGetFeedConfig(unittest.TestCase):
+    """
+    This class contains tests for the _get_feed_config() function.
+    """
+    @mock.patch('pulp_npm.plugins.distributors.steps.manager_factory.repo_importer_manager')
+    def test_connection_settings_only(self, repo_importer_manager):
+        """
+        Assert that only the proxy, SSL and basic auth settings of the importer are returned.
+        """
+        repo_importer_manager.return_value.get_importer.return_value = {
+            'config': {importer_constants.KEY_FEED: 'https://registry.npmjs.org',
+                       importer_constants.KEY_PROXY_HOST: 'http://proxy',
+                       importer_constants.KEY_SSL_VALIDATION: False}}
+
+        feed_config = steps._get_feed_config('repo')
+
+        repo_importer_manager.return_value.get_importer.assert_called_once_with('repo')
+        self.assertEqual(feed_config, {importer_constants.KEY_PROXY_HOST: 'http://proxy',
+                                       importer_constants.KEY_SSL_VALIDATION: False})
+
+    @mock.patch('pulp_npm.plugins.distributors.steps.manager_factory.repo_importer_manager')
+    def test_no_importer(self, repo_importer_manager):
+        """
+        Assert that a repository without an importer has no settings.
+        """
+        repo_importer_manager.return_value.get_importer.side_effect = MissingResource('repo')
+
+        self.assertEqual(steps._get_feed_config('repo'), {})
+
+
+class TestConstructMetadata(unittest.TestCase):
+    """
+    This class contains tests for the PublishMetadataStep._construct_metadata() method.
+    """
+    def setUp(self):
+        self.readme_store = mock.MagicMock()
+        self.readme_store.get_many.return_value = {'left-pad@bbbbb': u'# left-pad 1.1'}
+        self.packages = [
+            Unit(constants.PACKAGE_TYPE_ID, {'name': 'left-pad', 'version': version}, metadata,
+                 '/path/to/left-pad-%s.tgz' % version)
+            for version, metadata in (
+                ('1.0.0', {'dist': {'tarball': 'left-pad-1.0.0.tgz'}, 'readme': u'# left-pad 1.0'}),
+                ('1.1.0', {'dist': {'tarball': 'left-pad-1.1.0.tgz'},
+                           constants.METADATA_KEY_README: 'left-pad@bbbbb'}))]
+
+    def test_readmes(self):
+        """
+        Assert that the readmes kept out of the units are put back, with a single query.
+        """
+        metadata = steps.PublishMetadataStep._construct_metadata(
+            self.packages, 'example.com', 'repo', readme_store=self.readme_store)
+
+        versions = metadata['left-pad']['versions']
+        self.assertEqual(versions['1.0.0']['readme'], u'# left-pad 1.0')
+        self.assertEqual(versions['1.1.0']['readme'], u'# left-pad 1.1')
+        self.assertTrue(constants.METADATA_KEY_README not in versions['1.1.0'])
+        self.assertEqual(metadata['left-pad']['readme'], u'# left-pad 1.1')
+        self.readme_store.get_many.assert_called_once_with(['left-pad@bbbbb'])
+
+    def test_latest_readme_only(self):
+        """
+        Assert that only the latest version's readme is published, at the top of the metadata.
+        """
+        metadata = steps.PublishMetadataStep._construct_metadata(
+            self.packages, 'example.com', 'repo', True, self.readme_store)
+
+        versions = metadata['left-pad']['versions']
+        self.assertTrue('readme' not in versions['1.0.0'])
+        self.assertTrue('readme' not in versions['1.1.0'])
+        self.assertEqual(metadata['left-pad']['readme'], u'# left-pad 1.1')
+
+    def test_upstream_tags(self):
+        """
+        Assert that the upstream dist-tags that point to a version in the repository are published.
+        """
+        metadata = steps.PublishMetadataStep._construct_metadata(
+            self.packages, 'example.com', 'repo', readme_store=self.readme_store,
+            upstream_tags={'left-pad': {'latest': '1.0.0', 'next': '1.2.0-beta.1'}})
+
+        self.assertEqual(metadata['left-pad']['dist-tags'], {'latest': '1.0.0'})
+        self.assertEqual(metadata['left-pad']['readme'], u'# left-pad 1.0')
+
+    def test_no_separate_readmes(self):
+        """
+        Assert that the readme store isn't queried if no readme is kept out of the units.
+        """
+        del self.packages[1].metadata[constants.METADATA_KEY_README]
+
+        steps.PublishMetadataStep._construct_metadata(
+            self.packages, 'example.com', 'repo', readme_store=self.readme_store)
+
+        self.assertEqual(self.readme_store.get_many.call_count, 0)
+
+    def test_dependency_edges(self):
+        """
+        Assert that the dependency edges that Pulp indexes on the units are not published.
+        """
+        self.packages[0].metadata[constants.METADATA_KEY_DEPENDENCIES] = [
+            {'name': 'debug', 'range': '^2.6.0', 'type': 'dependencies'}]
+
+        metadata = steps.PublishMetadataStep._construct_metadata(
+            self.packages, 'example.com', 'repo', readme_store=self.readme_store)
+
+        for version_meta in metadata['left-pad']['versions'].values():
+            self.assertTrue(constants.METADATA_KEY_DEPENDENCIES not in version_meta)
+        self.assertEqual(self.packages[0].metadata[constants.METADATA_KEY_DEPENDENCIES][0]['name'],
+                         'debug')
+
+    def test_deferred(self):
+        """
+        Assert that the deferred download flag and the upstream tarball URL are not published.
+        """
+        self.packages[0].metadata.update({
+            constants.METADATA_KEY_DEFERRED: True,
+            constants.METADATA_KEY_UPSTREAM_URL: 'http://registry/left-pad-1.0.0.tgz'})
+
+        metadata = steps.PublishMetadataStep._construct_metadata(
+            self.packages, 'example.com', 'repo', readme_store=self.readme_store)
+
+        version_meta = metadata['left-pad']['versions']['1.0.0']
+        self.assertTrue(constants.METADATA_KEY_DEFERRED not in version_meta)
+        self.assertTrue(constants.METADATA_KEY_UPSTREAM_URL not in version_meta)
+        self.assertEqual(version_meta['dist']['tarball'],
+                         'http://example.com/pulp/npm/web/repo/left-pad/-/left-pad-1.0.0.tgz')
+
+
+class TestRenderPackument(unittest.TestCase):
+    """
+    This class contains tests for the PublishMetadataStep._render_packument() method.
+    """
+    def test_matches_units(self):
+        """
+        Assert that a package's metadata rendered from its packument is the same as the metadata
+        constructed from its units.
+        """
+        units = [
+            Unit(constants.PACKAGE_TYPE_ID, {'name': 'left-pad', 'version': version},
+                 {'dist': {'tarball': 'http://registry/left-pad-%s.tgz' % version},
+                  'description': 'Pads %s' % version, 'main': 'index.js'},
+                 '/path/to/left-pad-%s.tgz' % version)
+            for version in ('1.0.0', '1.1.0', '1.2.0-beta.1')]
+        versions = dict([(u.unit_key['version'], u.metadata) for u in units])
+        dist_tags, fields = packuments.summarize(versions)
+        document = {'name': 'left-pad', 'dist-tags': dist_tags, 'fields': fields,
+                    'versions': dict([(packuments.encode_version(v), m)
+                                      for v, m in versions.items()])}
+
+        rendered = steps.PublishMetadataStep._render_packument(document, 'example.com', 'repo')
+
+        expected = steps.PublishMetadataStep._construct_metadata(units, 'example.com', 'repo')
+        self.assertEqual(rendered, expected['left-pad'])
+        self.assertEqual(rendered['dist-tags'], {'latest': '1.1.0'})
+        self.assertEqual(rendered['description'], 'Pads 1.1.0')
@@ -0,0 +1,148 @@
+"""
+This module contains a small stand-in for an npm registry replica, served over HTTP from a local
+thread. It serves package manifests, tarballs, and a CouchDB style _changes feed, so that the code
+which reads them can be tested without reaching the network.
+"""
+import BaseHTTPServer
+import json
+import threading
+import urlparse
+
+
+class StandInRegistry(object):
+    """
+    An in-memory registry. Publishing a version records a change in the _changes feed, just as the
+    real registry does. Use it as a context manager to serve it at self.url.
+    """
+
+    # The class of the server, which answers one request at a time
+    server_class = BaseHTTPServer.HTTPServer
+
+    def __init__(self):
+        """
+        Initialize an empty registry.
+        """
+        self.manifests = {}
+        self.changes = []
+        # Maps paths to the bodies of the files served at them, such as tarballs
+        self.files = {}
+        # Whether Range requests are answered with the requested bytes
+        self.honor_range = True
+        self.requests = []
+        # The Authorization header of each request, or None if it had none
+        self.authorizations = []
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        The URL that the registry is served at, ending with a slash.
+
+        :rtype: basestring
+        """
+        return 'http://127.0.0.1:%d/' % self._server.server_port
+
+    def publish(self, name, version, dependencies=None):
+        """
+        Add a version of a package to the registry, which must be being served.
+
+        :param name:         The name of the package
+        :type  name:         basestring
+        :param version:      The version to add
+        :type  version:      basestring
+        :param dependencies: The dependencies of the version
+        :type  dependencies: dict
+        """
+        manifest = self.manifests.setdefault(
+            name, {'_id': name, 'name': name, 'dist-tags': {}, 'versions': {}})
+        filename = '%s-%s.tgz' % (name.split('/')[-1], version)
+        manifest['versions'][version] = {
+            'name': name, 'version': version, 'dependencies': dependencies or {},
+            'dist': {'shasum': '0' * 40, 'tarball': '%s%s/-/%s' % (self.url, name, filename)}}
+        manifest['dist-tags']['latest'] = version
+        self._change(name)
+
+    def unpublish(self, name):
+        """
+        Remove a package from the registry.
+
+        :param name: The name of the package
+        :type  name: basestring
+        """
+        del self.manifests[name]
+        self._change(name, deleted=True)
+
+    def _change(self, name, deleted=False):
+        change = {'seq': len(self.changes) + 1, 'id': name, 'changes': [{'rev': '1-a'}]}
+        if deleted:
+            change['deleted'] = True
+        self.changes.append(change)
+
+    def __enter__(self):
+        registry = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                registry.requests.append(self.path)
+                registry.authorizations.append(self.headers.get('Authorization'))
+                status, body = registry._handle(self.path, self.headers.get('Range'))
+                registry._respond(self, status, body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = self.server_class(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def _respond(self, handler, status, body):
+        """
+        Send the response to a request.
+
+        :param handler: The handler of the request
+        :type  handler: BaseHTTPServer.BaseHTTPRequestHandler
+        :param status:  The status of the response
+        :type  status:  int
+        :param body:    The body of the response
+        :type  body:    basestring
+        """
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _handle(self, path, byte_range=None):
+        """
+        Return the status and the body of the response to a GET of the given path.
+        """
+        parsed = urlparse.urlparse(path)
+        if parsed.path in self.files:
+            body = self.files[parsed.path]
+            if byte_range and self.honor_range:
+                start = int(byte_range[len('bytes='):].split('-')[0])
+                if start >= len(body):
+                    return 416, ''
+                return 206, body[start:]
+            return 200, body
+        query = urlparse.parse_qs(parsed.query)
+        if parsed.path == '/':
+            return 200, json.dumps({'db_name': 'registry', 'update_seq': len(self.changes)})
+        if parsed.path == '/_changes':
+            since = int(query.get('since', ['0'])[0])
+            limit = int(query.get('limit', [str(len(self.changes))])[0])
+            results = self.changes[since:since + limit]
+            last_seq = results[-1]['seq'] if results else since
+            return 200, json.dumps({'results': results, 'last_seq': last_seq})
+        name = urlparse.unquote(parsed.path[1:])
+        if name in self.manifests:
+            return 200, json.dumps(self.manifests[name])
+        return 404, json.dumps({'error': 'not_found'})
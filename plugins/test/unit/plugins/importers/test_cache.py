@@ -0,0 +1,115 @@
+"""
+This module contains tests for the pulp_npm.plugins.importers.cache module.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from pulp.common.plugins import importer_constants
+
+from pulp_npm.plugins.importers import cache, changes
+from test.unit.plugins.importers.registry import StandInRegistry
+
+
+TARBALL = ''.join([chr(i % 256) for i in xrange(3000)])
+
+
+class TestDownloadCache(unittest.TestCase):
+    """
+    This class contains tests for the DownloadCache class.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.download_cache = cache.DownloadCache(os.path.join(self.path, cache.CACHE_DIR))
+        self.registry = StandInRegistry().__enter__()
+        self.registry.files['/left-pad/-/left-pad-1.1.0.tgz'] = TARBALL
+        self.url = self.registry.url + 'left-pad/-/left-pad-1.1.0.tgz'
+
+    def tearDown(self):
+        self.registry.__exit__(None, None, None)
+        shutil.rmtree(self.path)
+
+    def _write_partial(self, bits):
+        self.download_cache.prepare(self.url, 'abc')
+        with open(self.download_cache.partial_path(self.url, 'abc'), 'wb') as partial_file:
+            partial_file.write(bits)
+
+    def test_entry_path(self):
+        """
+        Entries keep the tarball's file name, and depend on both the URL and the checksum.
+        """
+        path = self.download_cache.entry_path(self.url, 'abc')
+
+        self.assertEqual(os.path.basename(path), 'left-pad-1.1.0.tgz')
+        self.assertNotEqual(os.path.dirname(path),
+                            os.path.dirname(self.download_cache.entry_path(self.url, 'abd')))
+        self.assertEqual(self.download_cache.partial_path(self.url, 'abc'), path + '.part')
+
+    def test_lookup_and_commit(self):
+        """
+        Only committed downloads are found.
+        """
+        self._write_partial(TARBALL)
+        self.assertEqual(self.download_cache.lookup(self.url, 'abc'), None)
+        self.assertTrue(self.download_cache.has_partial(self.url, 'abc'))
+
+        path = self.download_cache.commit(self.download_cache.partial_path(self.url, 'abc'))
+
+        self.assertEqual(self.download_cache.lookup(self.url, 'abc'), path)
+        self.assertFalse(self.download_cache.has_partial(self.url, 'abc'))
+
+    def test_discard(self):
+        """
+        Discarding an entry removes its directory as well.
+        """
+        self._write_partial(TARBALL)
+        path = self.download_cache.commit(self.download_cache.partial_path(self.url, 'abc'))
+
+        self.download_cache.discard(path)
+
+        self.assertFalse(os.path.exists(os.path.dirname(path)))
+
+    def test_resume(self):
+        """
+        Only the missing bytes are requested.
+        """
+        self._write_partial(TARBALL[:1000])
+
+        path = self.download_cache.resume(self.url, 'abc')
+
+        self.assertEqual(open(path, 'rb').read(), TARBALL)
+
+    def test_resume_opener(self):
+        """
+        The download is resumed with the given opener, such as one that sends credentials.
+        """
+        self._write_partial(TARBALL[:1000])
+        opener = changes.build_opener({importer_constants.KEY_BASIC_AUTH_USER: 'me',
+                                       importer_constants.KEY_BASIC_AUTH_PASS: 'secret'})
+
+        path = self.download_cache.resume(self.url, 'abc', opener)
+
+        self.assertEqual(open(path, 'rb').read(), TARBALL)
+        self.assertEqual(self.registry.authorizations, ['Basic bWU6c2VjcmV0'])
+
+    def test_resume_range_ignored(self):
+        """
+        When the server sends the whole tarball, it replaces the partial download.
+        """
+        self.registry.honor_range = False
+        self._write_partial(TARBALL[:1000])
+
+        path = self.download_cache.resume(self.url, 'abc')
+
+        self.assertEqual(open(path, 'rb').read(), TARBALL)
+
+    def test_resume_range_not_satisfiable(self):
+        """
+        A partial download longer than the tarball is started over.
+        """
+        self._write_partial(TARBALL + 'garbage')
+
+        path = self.download_cache.resume(self.url, 'abc')
+
+        self.assertEqual(open(path, 'rb').read(), TARBALL)
@@ -0,0 +1,212 @@
+"""
+This module contains tests for the pulp_npm.plugins.importers.claims module.
+"""
+import unittest
+
+from pymongo.errors import DuplicateKeyError
+
+from pulp_npm.plugins.importers import claims
+
+
+def _matches(document, spec):
+    """
+    Return whether the given document matches the given query, which may only use the few
+    operators that claims use.
+    """
+    for key, condition in spec.items():
+        if key == '$or':
+            if not [c for c in condition if _matches(document, c)]:
+                return False
+        elif not isinstance(condition, dict):
+            if document.get(key) != condition:
+                return False
+        elif '$in' in condition and document.get(key) not in condition['$in']:
+            return False
+        elif '$ne' in condition and document.get(key) == condition['$ne']:
+            return False
+        elif '$lt' in condition and not document.get(key) < condition['$lt']:
+            return False
+        elif '$gte' in condition and not document.get(key) >= condition['$gte']:
+            return False
+    return True
+
+
+class FakeCollection(object):
+    """
+    An in-memory stand in for the few collection methods that claims use.
+    """
+    def __init__(self):
+        self.documents = {}
+        self.queries = 0
+
+    def insert(self, documents, continue_on_error=False):
+        self.queries += 1
+        duplicate = False
+        for document in documents:
+            if document['_id'] in self.documents:
+                duplicate = True
+                continue
+            self.documents[document['_id']] = dict(document)
+        if duplicate:
+            raise DuplicateKeyError('duplicate key')
+
+    def update(self, spec, update, multi=False):
+        self.queries += 1
+        for document in self.documents.values():
+            if _matches(document, spec):
+                document.update(update['$set'])
+
+    def find(self, spec, fields=None):
+        self.queries += 1
+        return [dict(d) for d in self.documents.values() if _matches(d, spec)]
+
+    def remove(self, spec):
+        self.queries += 1
+        for key, document in self.documents.items():
+            if _matches(document, spec):
+                del self.documents[key]
+
+
+class TestDownloadClaims(unittest.TestCase):
+    """
+    This class contains tests for the DownloadClaims class.
+    """
+    def setUp(self):
+        self.now = 1000.0
+        self.collection = FakeCollection()
+        self.package = {'name': 'left-pad', 'version': '1.1.0', 'shasum': 'aaaaa'}
+        self.key = claims.claim_key(self.package)
+
+    def _claims(self):
+        return claims.DownloadClaims(self.collection, clock=lambda: self.now, timeout=60)
+
+    def test_claim(self):
+        """
+        Only one task can claim a package, and it can claim it again.
+        """
+        first = self._claims()
+        second = self._claims()
+
+        self.assertEqual(first.claim([self.package]), set([self.key]))
+        self.assertEqual(second.claim([self.package]), set())
+        self.assertEqual(first.claim([self.package]), set([self.key]))
+        self.assertEqual(second.claimed_elsewhere([self.package]), set([self.key]))
+        self.assertEqual(first.claimed_elsewhere([self.package]), set())
+
+    def test_claim_batch(self):
+        """
+        A batch of packages is claimed with three queries, leaving out the packages that another
+        task holds.
+        """
+        first = self._claims()
+        second = self._claims()
+        other = dict(self.package, version='1.2.0')
+        first.claim([other])
+        self.collection.queries = 0
+
+        held = second.claim([self.package, other, dict(self.package)])
+
+        self.assertEqual(held, set([self.key]))
+        self.assertEqual(self.collection.queries, 3)
+        self.assertEqual(second.claim([]), set())
+        self.assertEqual(self.collection.queries, 3)
+
+    def test_claim_other_version(self):
+        """
+        Claims are kept per version and checksum.
+        """
+        first = self._claims()
+        second = self._claims()
+        first.claim([self.package])
+
+        self.assertEqual(len(second.claim([dict(self.package, version='1.2.0')])), 1)
+        self.assertEqual(len(second.claim([dict(self.package, shasum='bbbbb')])), 1)
+
+    def test_abandoned_claim(self):
+        """
+        A claim that is held for longer than the timeout can be taken over.
+        """
+        first = self._claims()
+        second = self._claims()
+        first.claim([self.package])
+
+        self.now += 61
+
+        self.assertEqual(second.claimed_elsewhere([self.package]), set())
+        self.assertEqual(second.claim([self.package]), set([self.key]))
+        self.assertEqual(first.claimed_elsewhere([self.package]), set([self.key]))
+
+    def test_claimed_elsewhere(self):
+        """
+        The claims that other tasks hold on a batch of packages are found with a single query.
+        """
+        first = self._claims()
+        second = self._claims()
+        other = dict(self.package, version='1.2.0')
+        first.claim([self.package])
+        second.claim([other])
+        self.collection.queries = 0
+
+        claimed = second.claimed_elsewhere([self.package, other, dict(self.package, shasum='b')])
+
+        self.assertEqual(claimed, set([self.key]))
+        self.assertEqual(self.collection.queries, 1)
+
+    def test_refresh(self):
+        """
+        A task's claims are renewed once a quarter of the timeout has passed, so that they are not
+        taken over while the task still works on them.
+        """
+        first = self._claims()
+        second = self._claims()
+        first.claim([self.package])
+        self.collection.queries = 0
+
+        self.now += 10
+        first.refresh()
+        self.assertEqual(self.collection.queries, 0)
+
+        self.now += 10
+        first.refresh()
+        self.assertEqual(self.collection.queries, 1)
+
+        self.now += 50
+        self.assertEqual(second.claimed_elsewhere([self.package]), set([self.key]))
+        self.assertEqual(second.claim([self.package]), set())
+
+    def test_release(self):
+        """
+        A task only releases its own claims.
+        """
+        first = self._claims()
+        second = self._claims()
+        first.claim([self.package])
+
+        second.release(self.package)
+        self.assertEqual(second.claimed_elsewhere([self.package]), set([self.key]))
+
+        first.release(self.package)
+        self.assertEqual(second.claimed_elsewhere([self.package]), set())
+        self.assertEqual(second.claim([self.package]), set([self.key]))
+
+    def test_release_all(self):
+        """
+        All of a task's claims are released at once.
+        """
+        first = self._claims()
+        second = self._claims()
+        first.claim([self.package, dict(self.package, version='1.2.0')])
+        second.claim([dict(self.package, version='1.3.0')])
+
+        first.release_all()
+
+        self.assertEqual(self.collection.documents.keys(), ['left-pad@1.3.0 aaaaa'])
+
+    def test_claim_key_integrity(self):
+        """
+        Packages from lockfiles are keyed by their integrity.
+        """
+        self.assertEqual(
+            claims.claim_key({'name': 'a', 'version': '1.0.0', 'shasum': None,
+                              'integrity': 'sha512-abc'}),
+            'a@1.0.0 sha512-abc')
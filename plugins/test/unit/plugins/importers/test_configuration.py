@@ -0,0 +1,329 @@
+"""
+This module contains tests for the pulp_npm.plugins.importers.configuration module.
+"""
+import unittest
+
+from pulp.common.plugins import importer_constants
+from pulp.plugins.config import PluginCallConfiguration
+
+from pulp_npm.common import constants
+from pulp_npm.plugins.importers import configuration
+
+
+class TestValidateConfig(unittest.TestCase):
+    """
+    This class contains tests for the validate_config() function.
+    """
+    def test_empty_config(self):
+        """
+        An empty config is valid.
+        """
+        self.assertEqual(configuration.validate_config({}), (True, ''))
+
+    def test_download_policy_valid(self):
+        """
+        Each of the known download policies is valid.
+        """
+        for policy in constants.DOWNLOAD_POLICIES:
+            config = {constants.CONFIG_KEY_DOWNLOAD_POLICY: policy}
+            self.assertEqual(configuration.validate_config(config), (True, ''))
+
+    def test_download_policy_invalid(self):
+        """
+        An unknown download policy is rejected.
+        """
+        config = {constants.CONFIG_KEY_DOWNLOAD_POLICY: 'background'}
+
+        valid, msg = configuration.validate_config(config)
+
+        self.assertFalse(valid)
+        self.assertTrue(constants.CONFIG_KEY_DOWNLOAD_POLICY in msg)
+
+    def test_resolve_dependencies_invalid(self):
+        """
+        resolve_dependencies must be a boolean.
+        """
+        config = {constants.CONFIG_KEY_RESOLVE_DEPENDENCIES: 'yes'}
+
+        valid, msg = configuration.validate_config(config)
+
+        self.assertFalse(valid)
+        self.assertTrue(constants.CONFIG_KEY_RESOLVE_DEPENDENCIES in msg)
+
+    def test_locked_packages(self):
+        """
+        locked_packages must be a list of the packages that lockfile.collect() returns.
+        """
+        package = {'name': 'socket.io', 'version': '2.0.0', 'resolved': None, 'integrity': None}
+        config = {constants.CONFIG_KEY_LOCKED_PACKAGES: [package]}
+        self.assertEqual(configuration.validate_config(config), (True, ''))
+
+        for value in ({'dependencies': {}}, [{'dependencies': {}}], [dict(package, version=1)],
+                      [dict(package, integrity=['sha1-a'])]):
+            valid, msg = configuration.validate_config(
+                {constants.CONFIG_KEY_LOCKED_PACKAGES: value})
+            self.assertFalse(valid)
+            self.assertTrue(constants.CONFIG_KEY_LOCKED_PACKAGES in msg)
+
+    def test_dependency_types(self):
+        """
+        dependency_types may only list known package.json sections.
+        """
+        config = {constants.CONFIG_KEY_RESOLVE_DEPENDENCIES: True,
+                  constants.CONFIG_KEY_DEPENDENCY_TYPES: ['peerDependencies']}
+        self.assertEqual(configuration.validate_config(config), (True, ''))
+
+        config[constants.CONFIG_KEY_DEPENDENCY_TYPES] = ['devDependencies']
+        valid, msg = configuration.validate_config(config)
+
+        self.assertFalse(valid)
+        self.assertTrue(constants.CONFIG_KEY_DEPENDENCY_TYPES in msg)
+
+    def test_version_filters_valid(self):
+        """
+        Version ranges, latest majors and minors, and prerelease exclusion may be configured.
+        """
+        config = {constants.CONFIG_KEY_VERSION_RANGES: ['left-pad@^1.0.0 || 2.x', 'socket.io@2.x'],
+                  constants.CONFIG_KEY_LATEST_MAJORS: 2,
+                  constants.CONFIG_KEY_LATEST_MINORS: 3,
+                  constants.CONFIG_KEY_EXCLUDE_PRERELEASES: True}
+
+        self.assertEqual(configuration.validate_config(config), (True, ''))
+
+    def test_version_filters_invalid(self):
+        """
+        Bad ranges, counts, and flags are rejected.
+        """
+        for key, value in ((constants.CONFIG_KEY_VERSION_RANGES, ['left-pad@one']),
+                           (constants.CONFIG_KEY_VERSION_RANGES, ['left-pad']),
+                           (constants.CONFIG_KEY_VERSION_RANGES, {'left-pad': '^1.0.0'}),
+                           (constants.CONFIG_KEY_LATEST_MAJORS, 0),
+                           (constants.CONFIG_KEY_LATEST_MINORS, '2'),
+                           (constants.CONFIG_KEY_EXCLUDE_PRERELEASES, 'true')):
+            valid, msg = configuration.validate_config({key: value})
+            self.assertFalse(valid)
+
+    def test_dry_run(self):
+        """
+        dry_run must be a boolean, and may only be given in the override config of a sync.
+        """
+        config = PluginCallConfiguration({}, {}, {constants.CONFIG_KEY_DRY_RUN: True})
+        self.assertEqual(configuration.validate_config(config), (True, ''))
+        config = PluginCallConfiguration({}, {}, {constants.CONFIG_KEY_DRY_RUN: 'yes'})
+        valid, msg = configuration.validate_config(config)
+        self.assertFalse(valid)
+        self.assertEqual(msg, 'dry_run must be a boolean.')
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_DRY_RUN: True})
+        valid, msg = configuration.validate_config(config)
+        self.assertFalse(valid)
+        self.assertEqual(msg, 'dry_run can only be given in the override config of a sync.')
+
+    def test_is_dry_run(self):
+        """
+        Only the override config of a sync can make it a dry run.
+        """
+        self.assertTrue(configuration.is_dry_run(
+            PluginCallConfiguration({}, {}, {constants.CONFIG_KEY_DRY_RUN: True})))
+        self.assertFalse(configuration.is_dry_run(
+            PluginCallConfiguration({constants.CONFIG_KEY_DRY_RUN: True}, {})))
+        self.assertFalse(configuration.is_dry_run({constants.CONFIG_KEY_DRY_RUN: True}))
+
+    def test_latency(self):
+        """
+        The latency log and metrics directory must be absolute paths, and the number of slowest
+        packages positive.
+        """
+        config = {constants.CONFIG_KEY_LATENCY_LOG: '/var/log/pulp/latency.jsonl',
+                  constants.CONFIG_KEY_SLOWEST_PACKAGES: 20,
+                  constants.CONFIG_KEY_METRICS_DIR: '/var/lib/node_exporter'}
+        self.assertEqual(configuration.validate_config(config), (True, ''))
+        for key, value in ((constants.CONFIG_KEY_LATENCY_LOG, 'latency.jsonl'),
+                           (constants.CONFIG_KEY_METRICS_DIR, 'node_exporter'),
+                           (constants.CONFIG_KEY_LATENCY_LOG, 5),
+                           (constants.CONFIG_KEY_SLOWEST_PACKAGES, 0)):
+            valid, msg = configuration.validate_config({key: value})
+            self.assertFalse(valid)
+
+    def test_remove_missing(self):
+        """
+        remove_missing must be a boolean.
+        """
+        config = {importer_constants.KEY_UNITS_REMOVE_MISSING: True}
+        self.assertEqual(configuration.validate_config(config), (True, ''))
+        valid, msg = configuration.validate_config({importer_constants.KEY_UNITS_REMOVE_MISSING: 1})
+        self.assertFalse(valid)
+        self.assertEqual(msg, 'remove_missing must be a boolean.')
+
+    def test_metadata_fields(self):
+        """
+        The metadata fields must be lists of field names, and separate_readmes a boolean.
+        """
+        config = {constants.CONFIG_KEY_METADATA_FIELDS: ['description', 'license'],
+                  constants.CONFIG_KEY_EXCLUDED_METADATA_FIELDS: ['scripts'],
+                  constants.CONFIG_KEY_SEPARATE_READMES: True}
+        self.assertEqual(configuration.validate_config(config), (True, ''))
+        for key, value in ((constants.CONFIG_KEY_METADATA_FIELDS, 'description'),
+                           (constants.CONFIG_KEY_EXCLUDED_METADATA_FIELDS, [1]),
+                           (constants.CONFIG_KEY_SEPARATE_READMES, 'true')):
+            valid, msg = configuration.validate_config({key: value})
+            self.assertFalse(valid)
+
+    def test_copy_packages(self):
+        """
+        The packages to copy must be a list of names, each optionally followed by a valid range,
+        and whether their dependencies are copied too must be a boolean.
+        """
+        config = {constants.CONFIG_KEY_COPY_PACKAGES: ['left-pad', '@scope/name@^2.0.0'],
+                  constants.CONFIG_KEY_RECURSIVE: True}
+        self.assertEqual(configuration.validate_config(config), (True, ''))
+
+        for value in ('left-pad', [1], ['left-pad@>>1']):
+            valid, msg = configuration.validate_config({constants.CONFIG_KEY_COPY_PACKAGES: value})
+            self.assertFalse(valid)
+        valid, msg = configuration.validate_config({constants.CONFIG_KEY_RECURSIVE: 'true'})
+        self.assertFalse(valid)
+
+    def test_sync_shards(self):
+        """
+        Syncs can be sharded, unless their package names are only known once the sync runs.
+        """
+        config = {constants.CONFIG_KEY_SYNC_SHARDS: 4}
+        self.assertEqual(configuration.validate_config(config), (True, ''))
+
+        for key, value in ((constants.CONFIG_KEY_CHANGES_FEED, 'https://replicate.npmjs.com/'),
+                           (constants.CONFIG_KEY_RESOLVE_DEPENDENCIES, True),
+                           (constants.CONFIG_KEY_LOCKED_PACKAGES,
+                            [{'name': 'a', 'version': '1.0.0', 'resolved': None,
+                              'integrity': None}])):
+            valid, msg = configuration.validate_config(dict(config, **{key: value}))
+            self.assertFalse(valid)
+            self.assertTrue(key in msg)
+        self.assertFalse(configuration.validate_config({constants.CONFIG_KEY_SYNC_SHARDS: 0})[0])
+
+    def test_feeds_valid(self):
+        """
+        Scopes and the default route may list one or more feeds.
+        """
+        config = {constants.CONFIG_KEY_FEEDS: {
+            '@ourco': 'https://npm.ourco.example/',
+            '*': ['https://mirror-a.example/', 'https://mirror-b.example/']}}
+
+        self.assertEqual(configuration.validate_config(config), (True, ''))
+
+    def test_feeds_invalid(self):
+        """
+        Feeds must be given per scope, and each scope needs at least one URL.
+        """
+        for feeds in (['https://mirror-a.example/'], {'ourco': ['https://npm.ourco.example/']},
+                      {'@ourco/pkg': ['https://npm.ourco.example/']}, {'@ourco': []},
+                      {'*': [None]}):
+            valid, msg = configuration.validate_config({constants.CONFIG_KEY_FEEDS: feeds})
+            self.assertFalse(valid)
+
+
+class TestGetDownloadPolicy(unittest.TestCase):
+    """
+    This class contains tests for the get_download_policy() function.
+    """
+    def test_default(self):
+        """
+        The immediate policy is used when none is configured.
+        """
+        self.assertEqual(configuration.get_download_policy({}), constants.DOWNLOAD_IMMEDIATE)
+
+    def test_configured(self):
+        """
+        The configured policy is returned.
+        """
+        config = {constants.CONFIG_KEY_DOWNLOAD_POLICY: constants.DOWNLOAD_ON_DEMAND}
+
+        self.assertEqual(configuration.get_download_policy(config), constants.DOWNLOAD_ON_DEMAND)
+
+
+class TestGetDependencyTypes(unittest.TestCase):
+    """
+    This class contains tests for the get_dependency_types() function.
+    """
+    def test_default(self):
+        """
+        Only dependencies are followed by default.
+        """
+        self.assertEqual(configuration.get_dependency_types({}), ['dependencies'])
+
+    def test_configured(self):
+        """
+        The configured types are followed in addition to dependencies.
+        """
+        config = {constants.CONFIG_KEY_DEPENDENCY_TYPES: ['peerDependencies',
+                                                          'optionalDependencies']}
+
+        self.assertEqual(configuration.get_dependency_types(config),
+                         ['dependencies', 'optionalDependencies', 'peerDependencies'])
+
+
+class TestGetConcurrency(unittest.TestCase):
+    """
+    This class contains tests for the get_concurrency() function.
+    """
+    def test_default(self):
+        """
+        The default concurrency is used when nothing is configured.
+        """
+        self.assertEqual(
+            configuration.get_concurrency({}, constants.CONFIG_KEY_METADATA_CONCURRENCY),
+            constants.DEFAULT_CONCURRENCY)
+
+    def test_max_downloads(self):
+        """
+        max_downloads is used when the step's concurrency isn't configured.
+        """
+        config = {importer_constants.KEY_MAX_DOWNLOADS: 8,
+                  constants.CONFIG_KEY_PACKAGE_CONCURRENCY: 3}
+
+        self.assertEqual(
+            configuration.get_concurrency(config, constants.CONFIG_KEY_METADATA_CONCURRENCY), 8)
+        self.assertEqual(
+            configuration.get_concurrency(config, constants.CONFIG_KEY_PACKAGE_CONCURRENCY), 3)
+
+
+class TestGetFeeds(unittest.TestCase):
+    """
+    This class contains tests for the get_feeds() function.
+    """
+    def test_feed_only(self):
+        """
+        The importer's feed serves every package.
+        """
+        config = {importer_constants.KEY_FEED: 'https://registry.npmjs.org'}
+
+        self.assertEqual(configuration.get_feeds(config), {'*': ['https://registry.npmjs.org/']})
+
+    def test_feeds(self):
+        """
+        The importer's feed comes before the other feeds of the default route, and scopes keep
+        their own feeds.
+        """
+        config = {importer_constants.KEY_FEED: 'https://registry.npmjs.org/',
+                  constants.CONFIG_KEY_FEEDS: {
+                      '@ourco': 'https://npm.ourco.example',
+                      '*': ['https://mirror.example/', 'https://registry.npmjs.org/']}}
+
+        self.assertEqual(configuration.get_feeds(config),
+                         {'@ourco': ['https://npm.ourco.example/'],
+                          '*': ['https://registry.npmjs.org/', 'https://mirror.example/']})
+
+
+class TestGetSyncShards(unittest.TestCase):
+    """
+    This class contains tests for the get_sync_shards() function.
+    """
+    def test_get_sync_shards(self):
+        """
+        There are never more shards than packages.
+        """
+        self.assertEqual(configuration.get_sync_shards({}), 1)
+        config = {constants.CONFIG_KEY_PACKAGE_NAMES: 'a,b,c,d,e',
+                  constants.CONFIG_KEY_SYNC_SHARDS: 3}
+        self.assertEqual(configuration.get_sync_shards(config), 3)
+        config[constants.CONFIG_KEY_PACKAGE_NAMES] = 'a,b'
+        self.assertEqual(configuration.get_sync_shards(config), 2)
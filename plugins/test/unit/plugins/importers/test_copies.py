@@ -0,0 +1,213 @@
+"""
+This module contains tests for the pulp_npm.plugins.importers.copies module.
+"""
+import unittest
+
+import mock
+
+from pulp_npm.common import constants
+from pulp_npm.plugins import models
+from pulp_npm.plugins.importers import copies
+
+
+class FakeUnit(object):
+    """
+    A stand in for the units that the conduit's get_source_units() returns.
+    """
+    def __init__(self, name, version, metadata=None):
+        self.id = '%s-%s' % (name, version)
+        self.unit_key = {'name': name, 'version': version}
+        self.metadata = metadata or {}
+
+
+class TestCopyUnits(unittest.TestCase):
+    """
+    This class contains tests for the copy_units() function.
+    """
+    def setUp(self):
+        self.source_repo = mock.MagicMock()
+        self.source_repo.id = 'dev'
+        self.dest_repo = mock.MagicMock()
+        self.dest_repo.id = 'prod'
+        self.conduit = mock.MagicMock()
+        self.store = mock.MagicMock()
+        self.store.get_upstream_tags.return_value = {'left-pad': {'latest': '1.1.0'}}
+
+    @mock.patch('pulp_npm.plugins.importers.copies.packuments.reconcile')
+    @mock.patch('pulp_npm.plugins.importers.copies.ASSOCIATE_BATCH_SIZE', 2)
+    @mock.patch('pulp_npm.plugins.importers.copies.manager_factory.repo_unit_association_manager')
+    def test_copy_all(self, repo_unit_association_manager, reconcile):
+        """
+        Every unit key of the source repository is read with one query, and the units are
+        associated in batches.
+        """
+        units = [FakeUnit('left-pad', '1.0.0'), FakeUnit('left-pad', '1.1.0'),
+                 FakeUnit('debug', '2.6.9')]
+        self.conduit.get_source_units.return_value = units
+
+        copied = copies.copy_units(self.source_repo, self.dest_repo, self.conduit, {},
+                                   packument_store=self.store)
+
+        self.assertEqual(copied, units)
+        search = self.conduit.get_source_units.mock_calls[0][2]['criteria']
+        self.assertEqual(search.unit_fields, ['name', 'version'])
+        associate = repo_unit_association_manager.return_value.associate_all_by_ids
+        self.assertEqual([c[1][2] for c in associate.mock_calls],
+                         [['left-pad-1.0.0', 'left-pad-1.1.0'], ['debug-2.6.9']])
+        self.assertEqual(associate.mock_calls[0][1][:2], ('prod', constants.PACKAGE_TYPE_ID))
+        self.store.get_upstream_tags.assert_called_once_with('dev', ['debug', 'left-pad'])
+        self.assertEqual(reconcile.mock_calls[0][1][1], 'prod')
+        self.assertEqual(reconcile.mock_calls[0][1][3], set(['left-pad', 'debug']))
+        self.assertEqual(reconcile.mock_calls[0][1][4], {'left-pad': {'latest': '1.1.0'}})
+
+    @mock.patch('pulp_npm.plugins.importers.copies.packuments.reconcile')
+    @mock.patch('pulp_npm.plugins.importers.copies.manager_factory.repo_unit_association_manager')
+    def test_copy_packages(self, repo_unit_association_manager, reconcile):
+        """
+        Only the units of the listed packages are read, and only the versions that satisfy their
+        range are copied.
+        """
+        self.conduit.get_source_units.return_value = [
+            FakeUnit('left-pad', '1.0.0'), FakeUnit('left-pad', '2.0.0'), FakeUnit('ms', '2.0.0')]
+        config = {constants.CONFIG_KEY_COPY_PACKAGES: ['left-pad@^1.0.0', 'ms']}
+
+        copied = copies.copy_units(self.source_repo, self.dest_repo, self.conduit, config,
+                                   packument_store=self.store)
+
+        self.assertEqual([u.id for u in copied], ['left-pad-1.0.0', 'ms-2.0.0'])
+        search = self.conduit.get_source_units.mock_calls[0][2]['criteria']
+        self.assertEqual(search.unit_filters, {'name': {'$in': ['left-pad', 'ms']}})
+        associate = repo_unit_association_manager.return_value.associate_all_by_ids
+        associate.assert_called_once_with('prod', constants.PACKAGE_TYPE_ID,
+                                          ['left-pad-1.0.0', 'ms-2.0.0'],
+                                          copies.RepoContentUnit.OWNER_TYPE_IMPORTER,
+                                          constants.IMPORTER_TYPE_ID)
+
+    @mock.patch('pulp_npm.plugins.importers.copies.packuments.reconcile')
+    @mock.patch('pulp_npm.plugins.importers.copies.manager_factory.repo_unit_association_manager')
+    def test_copy_given_units(self, repo_unit_association_manager, reconcile):
+        """
+        The units that Pulp selected are copied without looking any up, after the package filter
+        is applied to them.
+        """
+        units = [FakeUnit('left-pad', '1.0.0'), FakeUnit('debug', '2.6.9')]
+        config = {constants.CONFIG_KEY_COPY_PACKAGES: ['debug']}
+
+        copied = copies.copy_units(self.source_repo, self.dest_repo, self.conduit, config, units,
+                                   packument_store=self.store)
+
+        self.assertEqual(copied, units[1:])
+        self.assertEqual(self.conduit.get_source_units.call_count, 0)
+
+    @mock.patch('pulp_npm.plugins.importers.copies.packuments.reconcile')
+    @mock.patch('pulp_npm.plugins.importers.copies.resolve_dependencies')
+    @mock.patch('pulp_npm.plugins.importers.copies.manager_factory.repo_unit_association_manager')
+    def test_copy_recursive(self, repo_unit_association_manager, resolve_dependencies, reconcile):
+        """
+        A recursive copy associates the dependencies along with the selected units, at once.
+        """
+        units = [FakeUnit('debug', '2.6.9')]
+        resolve_dependencies.return_value = [FakeUnit('ms', '2.0.0')]
+        config = {constants.CONFIG_KEY_RECURSIVE: True,
+                  constants.CONFIG_KEY_DEPENDENCY_TYPES: ['peerDependencies']}
+
+        copied = copies.copy_units(self.source_repo, self.dest_repo, self.conduit, config, units,
+                                   packument_store=self.store)
+
+        self.assertEqual([u.id for u in copied], ['debug-2.6.9', 'ms-2.0.0'])
+        resolve_dependencies.assert_called_once_with(
+            self.conduit, units, ['dependencies', 'peerDependencies'], self.store, 'dev')
+        associate = repo_unit_association_manager.return_value.associate_all_by_ids
+        self.assertEqual(associate.mock_calls[0][1][2], ['debug-2.6.9', 'ms-2.0.0'])
+        self.assertEqual(reconcile.mock_calls[0][1][3], set(['debug', 'ms']))
+
+
+class TestResolveDependencies(unittest.TestCase):
+    """
+    This class contains tests for the resolve_dependencies() function.
+    """
+    def setUp(self):
+        # The dots of the dependencies' names are encoded in the stored metadata
+        lodash_get = models.ENCODED_DOT.join(['lodash', 'get'])
+        self.source = {
+            'express': [FakeUnit('express', '4.16.0', {'dependencies': {'debug': '^2.6.0',
+                                                                        'accepts': '~1.3.0'}})],
+            'debug': [FakeUnit('debug', '2.6.8', {'dependencies': {'ms': '2.0.0'}}),
+                      FakeUnit('debug', '2.6.9', {'dependencies': {'ms': '2.0.0'}})],
+            'ms': [FakeUnit('ms', '2.0.0', {'dependencies': {'debug': '2.6.9'}})],
+            'accepts': [FakeUnit('accepts', '1.3.5', {'dependencies': {lodash_get: '*'}})],
+            'lodash.get': [FakeUnit('lodash.get', '4.4.2')]}
+        self.conduit = mock.MagicMock()
+        self.conduit.get_source_units.side_effect = self.get_source_units
+        self.store = mock.MagicMock()
+        self.store.get_upstream_tags.return_value = {'debug': {'latest': '2.6.8'}}
+
+    def get_source_units(self, criteria):
+        """
+        Return the units of the packages that the criteria name.
+        """
+        units = []
+        for name in criteria.unit_filters['name']['$in']:
+            units.extend(self.source.get(name, []))
+        return units
+
+    def test_closure(self):
+        """
+        The closure is walked one level at a time, with one query for each level, and each
+        requirement selects the version that npm would install.
+        """
+        closure = copies.resolve_dependencies(self.conduit, self.source['express'],
+                                              ['dependencies'], self.store, 'dev')
+
+        # The latest tag is preferred, and the cycle between debug and ms ends
+        self.assertEqual([u.id for u in closure],
+                         ['accepts-1.3.5', 'debug-2.6.8', 'lodash.get-4.4.2', 'ms-2.0.0',
+                          'debug-2.6.9'])
+        searches = [c[2]['criteria'] for c in self.conduit.get_source_units.mock_calls]
+        self.assertEqual([s.unit_filters['name']['$in'] for s in searches],
+                         [['express'], ['accepts', 'debug'], ['lodash.get', 'ms']])
+        self.assertEqual(searches[0].unit_fields,
+                         ['name', 'version', constants.METADATA_KEY_DEPENDENCIES, 'dependencies'])
+
+    def test_edges(self):
+        """
+        The dependency edges of the units are followed when they have them.
+        """
+        self.source['debug'][1].metadata = {constants.METADATA_KEY_DEPENDENCIES: [
+            {'name': 'ms', 'range': '^2.0.0', 'type': 'dependencies'},
+            {'name': 'left-pad', 'range': '*', 'type': 'peerDependencies'}]}
+
+        closure = copies.resolve_dependencies(self.conduit, self.source['debug'][1:],
+                                              ['dependencies'], self.store, 'dev')
+
+        self.assertEqual([u.id for u in closure], ['ms-2.0.0'])
+
+    @mock.patch('pulp_npm.plugins.importers.copies._logger')
+    def test_unsatisfied(self, _logger):
+        """
+        Requirements that no version in the source repository satisfies are logged and skipped.
+        """
+        units = [FakeUnit('left-pad', '1.0.0', {'dependencies': {'missing': '^1.0.0'}})]
+        self.source['left-pad'] = units
+
+        closure = copies.resolve_dependencies(self.conduit, units, ['dependencies'], self.store,
+                                              'dev')
+
+        self.assertEqual(closure, [])
+        self.assertEqual(_logger.warning.call_count, 1)
+
+
+class TestDestinationUnits(unittest.TestCase):
+    """
+    This class contains tests for the DestinationUnits class.
+    """
+    def test_get_units(self):
+        """
+        The units are looked up in the destination repository.
+        """
+        conduit = mock.MagicMock()
+
+        units = copies.DestinationUnits(conduit).get_units(criteria='search')
+
+        self.assertEqual(units, conduit.get_destination_units.return_value)
+        conduit.get_destination_units.assert_called_once_with(criteria='search')
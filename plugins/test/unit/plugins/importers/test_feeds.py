@@ -0,0 +1,82 @@
+"""
+This module contains tests for the pulp_npm.plugins.importers.feeds module.
+"""
+import unittest
+
+from pulp.common.plugins import importer_constants
+
+from pulp_npm.plugins.importers import changes, feeds
+from test.unit.plugins.importers.registry import StandInRegistry
+
+
+class TestFeedRouter(unittest.TestCase):
+    """
+    This class contains tests for the FeedRouter class.
+    """
+    def setUp(self):
+        self.router = feeds.FeedRouter({
+            '@ourco': ['https://npm.ourco.example/'],
+            '*': ['https://mirror-a.example/', 'https://mirror-b.example/']})
+
+    def test_feeds_for(self):
+        """
+        Scoped packages are routed to their scope's feeds, and the others to the default ones.
+        """
+        self.assertEqual(self.router.feeds_for('@ourco/widgets'), ['https://npm.ourco.example/'])
+        self.assertEqual(self.router.feeds_for('@types/node'),
+                         ['https://mirror-a.example/', 'https://mirror-b.example/'])
+        self.assertEqual(self.router.feed_for('left-pad'), 'https://mirror-a.example/')
+
+    def test_feed_for_no_feed(self):
+        """
+        None is returned when no feed serves the package.
+        """
+        self.assertEqual(feeds.FeedRouter({}).feed_for('left-pad'), None)
+
+    def test_has_mirrors(self):
+        self.assertTrue(self.router.has_mirrors())
+        self.assertFalse(feeds.FeedRouter({'*': ['https://registry.npmjs.org/']}).has_mirrors())
+
+    def test_next_feed(self):
+        """
+        A failed download moves to the next feed of the package, until there is none left.
+        """
+        self.assertEqual(self.router.next_feed('left-pad', 'https://mirror-a.example/left-pad'),
+                         'https://mirror-b.example/')
+        self.assertEqual(self.router.next_feed('left-pad', 'https://mirror-b.example/left-pad'),
+                         None)
+        self.assertEqual(self.router.next_feed('left-pad', 'https://elsewhere.example/left-pad'),
+                         None)
+        self.assertEqual(
+            self.router.next_feed('@ourco/widgets', 'https://npm.ourco.example/@ourco%2fwidgets'),
+            None)
+
+    def test_probe(self):
+        """
+        The feeds are ordered by latency, and the ones that don't answer come last.
+        """
+        with StandInRegistry() as registry:
+            router = feeds.FeedRouter({'*': ['http://127.0.0.1:1/', registry.url]})
+
+            router.probe(timeout=5)
+
+        self.assertEqual(router.feeds_for('left-pad'), [registry.url, 'http://127.0.0.1:1/'])
+        self.assertEqual(router.latencies['http://127.0.0.1:1/'], None)
+        self.assertTrue(router.latencies[registry.url] >= 0)
+
+    def test_probe_error_response(self):
+        """
+        A feed that answers with an HTTP error, such as a registry that refuses requests for its
+        root, is reachable, and the opener's credentials are sent to it.
+        """
+        opener = changes.build_opener({importer_constants.KEY_BASIC_AUTH_USER: 'me',
+                                       importer_constants.KEY_BASIC_AUTH_PASS: 'secret'})
+        with StandInRegistry() as registry:
+            router = feeds.FeedRouter({'*': ['http://127.0.0.1:1/', registry.url + 'private/']})
+
+            router.probe(timeout=5, opener=opener)
+
+        self.assertEqual(router.feeds_for('left-pad'),
+                         [registry.url + 'private/', 'http://127.0.0.1:1/'])
+        self.assertTrue(router.latencies[registry.url + 'private/'] >= 0)
+        self.assertEqual(registry.authorizations, ['Basic bWU6c2VjcmV0'])
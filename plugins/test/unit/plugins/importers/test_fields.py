@@ -0,0 +1,107 @@
+"""
+This module contains tests for the pulp_npm.plugins.importers.fields module.
+"""
+import unittest
+
+from pulp.plugins.config import PluginCallConfiguration
+
+from pulp_npm.common import constants
+from pulp_npm.plugins import readmes
+from pulp_npm.plugins.importers import fields
+
+
+class FakePackage(object):
+    """
+    A stand in for the packages that the policy is applied to.
+    """
+    def __init__(self, name, version, metadata):
+        self.name = name
+        self.version = version
+        self.metadata = metadata
+
+
+class FakeReadmeStore(object):
+    """
+    An in-memory stand in for the readme store.
+    """
+    def __init__(self):
+        self.readmes = {}
+
+    def put(self, name, readme):
+        key = readmes.readme_key(name, readme)
+        self.readmes[key] = readme
+        return key
+
+
+class TestFieldPolicy(unittest.TestCase):
+    """
+    This class contains tests for the FieldPolicy class.
+    """
+    def setUp(self):
+        self.package = FakePackage('left-pad', '1.1.0', {
+            'dist': {'shasum': 'aaaaa', 'tarball': 'http://example.com/left-pad-1.1.0.tgz'},
+            'description': 'String left pad', 'scripts': {'test': 'node test'},
+            'readme': u'# left-pad', 'readmeFilename': 'README.md'})
+
+    def test_from_config_empty(self):
+        """
+        Assert that there is no policy if every field is stored in the units.
+        """
+        self.assertEqual(fields.FieldPolicy.from_config(PluginCallConfiguration({}, {})), None)
+
+    def test_from_config(self):
+        """
+        Assert that the policy has the configured fields and a readme store.
+        """
+        config = PluginCallConfiguration({}, {
+            constants.CONFIG_KEY_METADATA_FIELDS: ['description'],
+            constants.CONFIG_KEY_EXCLUDED_METADATA_FIELDS: ['dist', 'scripts'],
+            constants.CONFIG_KEY_SEPARATE_READMES: True})
+
+        policy = fields.FieldPolicy.from_config(config)
+
+        self.assertEqual(policy.fields, fields.REQUIRED_FIELDS | set(['description']))
+        self.assertEqual(policy.excluded_fields, frozenset(['scripts']))
+        self.assertTrue(isinstance(policy.readme_store, readmes.ReadmeStore))
+
+    def test_apply_fields(self):
+        """
+        Assert that only the listed fields and the required ones are kept.
+        """
+        fields.FieldPolicy(fields=['description']).apply(self.package)
+
+        self.assertEqual(sorted(self.package.metadata.keys()), ['description', 'dist'])
+
+    def test_apply_excluded_fields(self):
+        """
+        Assert that the excluded fields are dropped, but the required ones are kept.
+        """
+        fields.FieldPolicy(excluded_fields=['scripts', 'readme', 'dist']).apply(self.package)
+
+        self.assertEqual(sorted(self.package.metadata.keys()),
+                         ['description', 'dist', 'readmeFilename'])
+
+    def test_apply_readme_store(self):
+        """
+        Assert that the readme is moved into the store, and the unit refers to it by its key.
+        """
+        store = FakeReadmeStore()
+
+        fields.FieldPolicy(readme_store=store).apply(self.package)
+
+        key = self.package.metadata[constants.METADATA_KEY_README]
+        self.assertEqual(store.readmes, {key: u'# left-pad'})
+        self.assertTrue('readme' not in self.package.metadata)
+        self.assertEqual(self.package.metadata['readmeFilename'], 'README.md')
+
+    def test_apply_readme_store_empty_readme(self):
+        """
+        Assert that an empty readme is kept in the unit instead of being stored.
+        """
+        store = FakeReadmeStore()
+        self.package.metadata['readme'] = ''
+
+        fields.FieldPolicy(readme_store=store).apply(self.package)
+
+        self.assertEqual(store.readmes, {})
+        self.assertEqual(self.package.metadata['readme'], '')
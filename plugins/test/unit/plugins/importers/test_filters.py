@@ -0,0 +1,126 @@
+"""
+This module contains tests for the pulp_npm.plugins.importers.filters module.
+"""
+import unittest
+
+from pulp_npm.common import constants
+from pulp_npm.plugins.importers import filters
+
+
+VERSIONS = ['0.9.0', '1.0.0', '1.1.0', '1.1.1', '2.0.0-rc.1', '2.0.0', '2.1.0', '3.0.0-nightly.1',
+            'not-semver']
+
+
+class TestVersionFilter(unittest.TestCase):
+    """
+    This class contains tests for the VersionFilter class.
+    """
+    def test_from_config_empty(self):
+        """
+        No filter is built when no policy is configured.
+        """
+        self.assertEqual(filters.VersionFilter.from_config({}), None)
+
+    def test_from_config(self):
+        """
+        The policies are read from the config.
+        """
+        config = {constants.CONFIG_KEY_VERSION_RANGES: ['lodash.merge@^4.0.0'],
+                  constants.CONFIG_KEY_LATEST_MAJORS: 2,
+                  constants.CONFIG_KEY_EXCLUDE_PRERELEASES: True}
+
+        version_filter = filters.VersionFilter.from_config(config)
+
+        self.assertEqual(version_filter.version_ranges.keys(), ['lodash.merge'])
+        self.assertEqual(version_filter.latest_majors, 2)
+        self.assertEqual(version_filter.latest_minors, None)
+        self.assertTrue(version_filter.exclude_prereleases)
+
+    def test_exclude_prereleases(self):
+        """
+        Prereleases are dropped, and versions that aren't semantic versions are kept.
+        """
+        version_filter = filters.VersionFilter(exclude_prereleases=True)
+
+        self.assertEqual(version_filter.apply('a', VERSIONS),
+                         set(['0.9.0', '1.0.0', '1.1.0', '1.1.1', '2.0.0', '2.1.0', 'not-semver']))
+
+    def test_version_ranges(self):
+        """
+        Only the versions of a package that satisfy its range are kept, and other packages are
+        not restricted.
+        """
+        version_filter = filters.VersionFilter(version_ranges={'a': '>=1.1.0 <2.1.0'})
+
+        self.assertEqual(version_filter.apply('a', VERSIONS), set(['1.1.0', '1.1.1', '2.0.0']))
+        self.assertEqual(version_filter.apply('b', VERSIONS), set(VERSIONS))
+
+    def test_latest_majors(self):
+        """
+        Only the versions of the latest majors are kept.
+        """
+        version_filter = filters.VersionFilter(latest_majors=2)
+
+        self.assertEqual(version_filter.apply('a', VERSIONS),
+                         set(['2.0.0-rc.1', '2.0.0', '2.1.0', '3.0.0-nightly.1']))
+
+    def test_latest_minors_without_prereleases(self):
+        """
+        The latest minors are counted after the prereleases have been excluded.
+        """
+        version_filter = filters.VersionFilter(latest_minors=2, exclude_prereleases=True)
+
+        self.assertEqual(version_filter.apply('a', VERSIONS), set(['2.0.0', '2.1.0']))
+
+
+class TestPackageFilter(unittest.TestCase):
+    """
+    This class contains tests for the PackageFilter class.
+    """
+    def test_from_config_empty(self):
+        """
+        No filter is built when no packages are listed.
+        """
+        self.assertEqual(filters.PackageFilter.from_config({}), None)
+
+    def test_keeps(self):
+        """
+        The versions of the listed packages that satisfy one of their ranges are kept, and every
+        version of the packages listed without a range.
+        """
+        specs = ['a@^1.0.0', 'a@~2.0.0', '@scope/b', '@scope/b@1']
+        package_filter = filters.PackageFilter.from_config(
+            {constants.CONFIG_KEY_COPY_PACKAGES: specs})
+
+        self.assertEqual(sorted(package_filter.packages), ['@scope/b', 'a'])
+        self.assertEqual([v for v in VERSIONS if package_filter.keeps('a', v)],
+                         ['1.0.0', '1.1.0', '1.1.1', '2.0.0'])
+        self.assertEqual([v for v in VERSIONS if package_filter.keeps('@scope/b', v)], VERSIONS)
+        self.assertFalse(package_filter.keeps('c', '1.0.0'))
+
+    def test_invalid_range(self):
+        """
+        An invalid range is rejected.
+        """
+        self.assertRaises(ValueError, filters.PackageFilter, ['a@not a range!'])
+
+
+class TestParseVersionRanges(unittest.TestCase):
+    """
+    This class contains tests for the parse_version_ranges() function.
+    """
+    def test_parse_version_ranges(self):
+        """
+        The ranges of each package are combined, and scoped and dotted names are kept whole.
+        """
+        ranges = filters.parse_version_ranges(['socket.io@2.x', '@scope/a@^1.0.0',
+                                               'socket.io@^4.0.0'])
+
+        self.assertEqual(ranges, {'socket.io': '2.x || ^4.0.0', '@scope/a': '^1.0.0'})
+
+    def test_parse_version_ranges_without_range(self):
+        """
+        A package without a range is rejected.
+        """
+        self.assertRaises(ValueError, filters.parse_version_ranges, ['left-pad'])
+        self.assertRaises(ValueError, filters.parse_version_ranges, ['@scope/a'])
@@ -0,0 +1,121 @@
+"""
+This module contains tests for the pulp_npm.plugins.importers.latency module.
+"""
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pulp_npm.plugins.importers import latency
+
+
+class FakeClock(object):
+    """
+    A clock that moves forward by one second each time it is read.
+    """
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+class FakeReport(object):
+    """
+    A stand in for Nectar's DownloadReport.
+    """
+    def __init__(self, start_time=None, finish_time=None):
+        self.start_time = start_time
+        self.finish_time = finish_time
+
+
+class TestLatencyTracker(unittest.TestCase):
+    """
+    This class contains tests for the LatencyTracker class.
+    """
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_report(self):
+        """
+        Each stage gets a histogram, and the packages that took the longest are listed slowest
+        first, with the time spent by all of their versions in each stage.
+        """
+        tracker = latency.LatencyTracker()
+        tracker.record('left-pad', latency.STAGE_DOWNLOAD, 0.02)
+        tracker.record('left-pad', latency.STAGE_DOWNLOAD, 0.5)
+        tracker.record('debug', latency.STAGE_DOWNLOAD, 90)
+        tracker.record('express', latency.STAGE_SAVE, 0.001)
+
+        report = tracker.report(slowest=2)
+
+        self.assertEqual(sorted(report['stages'].keys()),
+                         [latency.STAGE_DOWNLOAD, latency.STAGE_SAVE])
+        download = report['stages'][latency.STAGE_DOWNLOAD]
+        self.assertEqual(download['count'], 2)
+        self.assertEqual(download['total_seconds'], 90.52)
+        self.assertEqual(download['max_seconds'], 90)
+        self.assertEqual(dict([(b[0], b[1]) for b in download['buckets'] if b[1]]),
+                         {1: 1, None: 1})
+        self.assertEqual(report['slowest'],
+                         [{'name': 'debug', 'total_seconds': 90,
+                           'stages': {latency.STAGE_DOWNLOAD: 90}},
+                          {'name': 'left-pad', 'total_seconds': 0.52,
+                           'stages': {latency.STAGE_DOWNLOAD: 0.52}}])
+
+    def test_timed(self):
+        tracker = latency.LatencyTracker(clock=FakeClock())
+
+        with tracker.timed('left-pad', latency.STAGE_VERIFY):
+            pass
+
+        self.assertEqual(tracker.report()['slowest'][0]['stages'], {latency.STAGE_VERIFY: 1})
+
+    def test_record_download(self):
+        """
+        The time a download took is taken from its report, unless the file was found in the cache.
+        """
+        tracker = latency.LatencyTracker()
+        start = datetime.datetime(2015, 1, 1)
+
+        tracker.record_download('left-pad', latency.STAGE_MANIFEST,
+                                FakeReport(start, start + datetime.timedelta(seconds=2.5)))
+        tracker.record_download('debug', latency.STAGE_MANIFEST, FakeReport())
+
+        self.assertEqual(tracker.report()['slowest'],
+                         [{'name': 'left-pad', 'total_seconds': 2.5,
+                           'stages': {latency.STAGE_MANIFEST: 2.5}}])
+
+    def test_event_log(self):
+        """
+        Each duration is appended to the event log as a line of JSON.
+        """
+        path = os.path.join(self.working_dir, 'latency.jsonl')
+        tracker = latency.LatencyTracker(event_log=path, clock=lambda: 42)
+
+        tracker.record('left-pad', latency.STAGE_PARSE, 0.25)
+        tracker.record('debug', latency.STAGE_COPY, 0.5)
+        tracker.close()
+
+        with open(path) as log:
+            events = [json.loads(line) for line in log]
+        self.assertEqual(events, [
+            {'time': 42, 'package': 'left-pad', 'stage': latency.STAGE_PARSE, 'seconds': 0.25},
+            {'time': 42, 'package': 'debug', 'stage': latency.STAGE_COPY, 'seconds': 0.5}])
+
+    def test_event_log_unwritable(self):
+        """
+        A log that can't be written doesn't stop the durations from being recorded.
+        """
+        path = os.path.join(self.working_dir, 'missing', 'latency.jsonl')
+        tracker = latency.LatencyTracker(event_log=path)
+
+        tracker.record('left-pad', latency.STAGE_PARSE, 0.25)
+
+        self.assertEqual(len(tracker.report()['slowest']), 1)
@@ -0,0 +1,67 @@
+"""
+This module contains tests for the pulp_npm.plugins.importers.plan module.
+"""
+import unittest
+
+from pulp_npm.common import constants
+from pulp_npm.plugins.importers import plan
+
+
+class TestSyncPlan(unittest.TestCase):
+    """
+    This class contains tests for the SyncPlan class.
+    """
+    def test_build(self):
+        """
+        The summary counts the versions and bytes of the plan, and estimates the download time.
+        """
+        sync_plan = plan.SyncPlan()
+        sync_plan.associate('left-pad', ['1.0.0'])
+        sync_plan.associate('debug', [])
+        units_to_remove = [{'name': 'left-pad', 'version': '0.0.9'}]
+        sync_plan.add_sizes('left-pad', {'1.1.0': {'dist': {'size': 300}},
+                                         '1.2.0': {'dist': {'unpackedSize': 700}},
+                                         '1.3.0': {'dist': {}}})
+        packages = [{'name': 'left-pad', 'version': v} for v in ('1.3.0', '1.1.0', '1.2.0')]
+
+        summary, details = sync_plan.build(packages, throughput=250.0,
+                                           units_to_remove=units_to_remove)
+
+        self.assertEqual(summary, {'new_versions': 3, 'versions_to_associate': 1,
+                                   'versions_to_remove': 1, 'download_bytes': 1000,
+                                   'versions_without_size': 1, 'estimated_seconds': 4.0})
+        self.assertEqual(details, {'new_versions': {'left-pad': ['1.1.0', '1.2.0', '1.3.0']},
+                                   'versions_to_associate': {'left-pad': ['1.0.0']},
+                                   'versions_to_remove': {'left-pad': ['0.0.9']}})
+
+    def test_build_without_throughput(self):
+        """
+        Without the throughput of a past sync, no download time is estimated.
+        """
+        summary, details = plan.SyncPlan().build([])
+
+        self.assertEqual(summary['estimated_seconds'], None)
+        self.assertEqual(details, {'new_versions': {}, 'versions_to_associate': {},
+                                   'versions_to_remove': {}})
+
+
+class TestUpdateThroughput(unittest.TestCase):
+    """
+    This class contains tests for the update_throughput() function.
+    """
+    def test_first_sync(self):
+        scratchpad = {}
+
+        plan.update_throughput(scratchpad, 1000, 4)
+
+        self.assertEqual(plan.get_throughput(scratchpad), 250.0)
+
+    def test_later_sync(self):
+        """
+        The throughput of a sync is averaged with the one of the syncs before it.
+        """
+        scratchpad = {constants.SCRATCHPAD_KEY_THROUGHPUT: 100.0}
+
+        plan.update_throughput(scratchpad, 1500, 5)
+
+        self.assertEqual(scratchpad[constants.SCRATCHPAD_KEY_THROUGHPUT], 200.0)
@@ -0,0 +1,240 @@
+"""
+This module contains tests for the pulp_npm.plugins.importers.shards module.
+"""
+import unittest
+
+import mock
+from pulp.common import constants as pulp_constants
+from pymongo.errors import DuplicateKeyError
+
+from pulp_npm.common import constants
+from pulp_npm.plugins.importers import shards
+
+
+class TestSplit(unittest.TestCase):
+    """
+    This class contains tests for the split() function.
+    """
+    def test_split(self):
+        """
+        The names are dealt out to the shards, so the shards differ in size by one at most.
+        """
+        self.assertEqual(shards.split(['a', 'b', 'c', 'd', 'e'], 2),
+                         [['a', 'c', 'e'], ['b', 'd']])
+
+    def test_more_shards_than_names(self):
+        """
+        Empty shards are left out.
+        """
+        self.assertEqual(shards.split(['a', 'b'], 4), [['a'], ['b']])
+
+
+class TestTake(unittest.TestCase):
+    """
+    This class contains tests for the take() function.
+    """
+    @mock.patch('pulp_npm.plugins.importers.shards.connection.get_collection')
+    def test_take(self, get_collection):
+        """
+        A shard that nobody took is recorded as taken.
+        """
+        self.assertTrue(shards.take('abc'))
+
+        get_collection.assert_called_once_with(shards.COLLECTION_NAME, create=True)
+        document = get_collection.return_value.insert.mock_calls[0][1][0]
+        self.assertEqual(document['_id'], 'abc')
+
+    @mock.patch('pulp_npm.plugins.importers.shards.connection.get_collection')
+    def test_taken(self, get_collection):
+        """
+        A shard can only be taken once.
+        """
+        get_collection.return_value.insert.side_effect = DuplicateKeyError('duplicate key')
+
+        self.assertFalse(shards.take('abc'))
+
+
+class TestRunShard(unittest.TestCase):
+    """
+    This class contains tests for the run_shard() function.
+    """
+    @mock.patch('pulp_npm.plugins.importers.shards.shutil.rmtree')
+    @mock.patch('pulp_npm.plugins.importers.shards.tempfile.mkdtemp')
+    @mock.patch('pulp_npm.plugins.importers.shards.sync.SyncStep')
+    def test_run_shard(self, SyncStep, mkdtemp, rmtree):
+        """
+        The shard is synchronized with its own package names, without being split again.
+        """
+        repo = mock.MagicMock()
+        conduit = mock.MagicMock()
+        config = {constants.CONFIG_KEY_PACKAGE_NAMES: 'a,b,c',
+                  constants.CONFIG_KEY_SYNC_SHARDS: 2}
+        report = SyncStep.return_value.sync.return_value
+
+        result = shards.run_shard(repo, conduit, config, ['a', 'c'], '/cache')
+
+        self.assertEqual(result, {'success_flag': report.success_flag, 'summary': report.summary,
+                                  'details': report.details})
+        shard_config = SyncStep.mock_calls[0][2]['config']
+        self.assertEqual(shard_config.get(constants.CONFIG_KEY_PACKAGE_NAMES), 'a,c')
+        self.assertEqual(shard_config.get(constants.CONFIG_KEY_SYNC_SHARDS), 1)
+        self.assertEqual(shard_config.override_config, {})
+        self.assertEqual(SyncStep.mock_calls[0][2]['download_cache_dir'], '/cache')
+        # The original config is left alone
+        self.assertEqual(config[constants.CONFIG_KEY_PACKAGE_NAMES], 'a,b,c')
+        rmtree.assert_called_once_with(mkdtemp.return_value, ignore_errors=True)
+
+    @mock.patch('pulp_npm.plugins.importers.shards.shutil.rmtree')
+    @mock.patch('pulp_npm.plugins.importers.shards.tempfile.mkdtemp')
+    @mock.patch('pulp_npm.plugins.importers.shards.sync.SyncStep')
+    def test_run_shard_dry_run(self, SyncStep, mkdtemp, rmtree):
+        """
+        A dry run is passed to the shard in the override config, where the sync honors it.
+        """
+        config = {constants.CONFIG_KEY_PACKAGE_NAMES: 'a,b', constants.CONFIG_KEY_DRY_RUN: True}
+
+        shards.run_shard(mock.MagicMock(), mock.MagicMock(), config, ['a'])
+
+        shard_config = SyncStep.mock_calls[0][2]['config']
+        self.assertEqual(shard_config.override_config, {constants.CONFIG_KEY_DRY_RUN: True})
+        self.assertFalse(constants.CONFIG_KEY_DRY_RUN in shard_config.repo_plugin_config)
+
+
+class TestSyncShard(unittest.TestCase):
+    """
+    This class contains tests for the sync_shard() task.
+    """
+    @mock.patch('pulp_npm.plugins.importers.shards.take', return_value=True)
+    @mock.patch('pulp_npm.plugins.importers.shards.run_shard')
+    @mock.patch('pulp_npm.plugins.importers.shards.RepoSyncConduit')
+    @mock.patch('pulp_npm.plugins.importers.shards.Repository')
+    def test_sync_shard(self, Repository, RepoSyncConduit, run_shard, take):
+        """
+        The shard is synchronized in the repository's working directory, into the sync task's
+        download cache.
+        """
+        result = shards.sync_shard('big', {'feed': 'url'}, ['b'], 'shard', '/working/big',
+                                   '/cache')
+
+        take.assert_called_once_with('shard')
+        Repository.assert_called_once_with('big', working_dir='/working/big')
+        RepoSyncConduit.assert_called_once_with('big', constants.IMPORTER_TYPE_ID)
+        run_shard.assert_called_once_with(Repository.return_value, RepoSyncConduit.return_value,
+                                          {'feed': 'url'}, ['b'], '/cache')
+        self.assertEqual(result, run_shard.return_value)
+
+    @mock.patch('pulp_npm.plugins.importers.shards.take', return_value=False)
+    @mock.patch('pulp_npm.plugins.importers.shards.run_shard')
+    def test_taken(self, run_shard, take):
+        """
+        A shard that the sync task took is not synchronized again.
+        """
+        result = shards.sync_shard('big', {}, ['b'], 'shard', '/working/big', '/cache')
+
+        self.assertEqual(result, None)
+        self.assertEqual(run_shard.call_count, 0)
+
+
+class TestSyncSharded(unittest.TestCase):
+    """
+    This class contains tests for the sync_sharded() function.
+    """
+    def setUp(self):
+        self.repo = mock.MagicMock()
+        self.repo.id = 'big'
+        self.repo.working_dir = '/working/big'
+        self.conduit = mock.MagicMock()
+        self.config = mock.MagicMock()
+        self.config.flatten.return_value = {constants.CONFIG_KEY_PACKAGE_NAMES: 'a,b,c,d'}
+
+    @mock.patch('pulp_npm.plugins.importers.shards.connection.get_collection')
+    @mock.patch('pulp_npm.plugins.importers.shards.take')
+    @mock.patch('pulp_npm.plugins.importers.shards.time.sleep')
+    @mock.patch('pulp_npm.plugins.importers.shards.tasks.cancel')
+    @mock.patch('pulp_npm.plugins.importers.shards.TaskStatusManager.find_by_task_id')
+    @mock.patch('pulp_npm.plugins.importers.shards.run_shard')
+    @mock.patch('pulp_npm.plugins.importers.shards.sync_shard.apply_async_with_reservation')
+    def test_sync_sharded(self, apply_async_with_reservation, run_shard, find_by_task_id, cancel,
+                          sleep, take, get_collection):
+        """
+        The first shard runs in the calling task, and the others in tasks of their own. A shard
+        that no worker started is taken and run by the calling task, and one that a worker took
+        while it was waiting is left to that worker.
+        """
+        conduit = self.conduit
+        apply_async_with_reservation.side_effect = [mock.MagicMock(id='task-1'),
+                                                    mock.MagicMock(id='task-2'),
+                                                    mock.MagicMock(id='task-3')]
+        states = {
+            'task-1': [{'state': pulp_constants.CALL_WAITING_STATE},
+                       {'state': pulp_constants.CALL_FINISHED_STATE,
+                        'result': {'success_flag': True, 'summary': 1, 'details': 1}}],
+            'task-2': [{'state': pulp_constants.CALL_WAITING_STATE}],
+            'task-3': [{'state': pulp_constants.CALL_ERROR_STATE, 'error': 'boom'}]}
+        find_by_task_id.side_effect = lambda task_id: states[task_id].pop(0)
+        run_shard.side_effect = lambda repo, conduit, config, names, cache_dir: {
+            'success_flag': True, 'summary': names, 'details': names}
+        # The first shard's task took its shard just before the calling task tried to
+        take.side_effect = lambda shard_id: \
+            shard_id != apply_async_with_reservation.mock_calls[0][1][5]
+
+        report = shards.sync_sharded(self.repo, conduit, self.config, 4,
+                                     download_cache_dir='/cache')
+
+        shard_ids = [c[1][5] for c in apply_async_with_reservation.mock_calls]
+
+        self.assertEqual([c[1][:2] for c in apply_async_with_reservation.mock_calls],
+                         [(shards.SHARD_RESOURCE_TYPE, 'big:1'),
+                          (shards.SHARD_RESOURCE_TYPE, 'big:2'),
+                          (shards.SHARD_RESOURCE_TYPE, 'big:3')])
+        self.assertEqual(len(set(shard_ids)), 3)
+        # The shard tasks work in the repository's working directory and share its download cache
+        self.assertEqual(set([c[1][6:] for c in apply_async_with_reservation.mock_calls]),
+                         set([('/working/big', '/cache')]))
+        self.assertEqual(take.mock_calls, [mock.call(shard_ids[0]), mock.call(shard_ids[1])])
+        self.assertEqual([c[1][3] for c in run_shard.mock_calls], [['a'], ['c']])
+        cancel.assert_called_once_with('task-2')
+        sleep.assert_called_once_with(shards.POLL_INTERVAL)
+        self.assertEqual(report, conduit.build_failure_report.return_value)
+        conduit.build_failure_report.assert_called_once_with(
+            {'shards': [['a'], 1, ['c'], {}]},
+            {'shards': [['a'], 1, ['c'], {'error': 'boom'}]})
+
+    @mock.patch('pulp_npm.plugins.importers.shards.connection.get_collection')
+    @mock.patch('pulp_npm.plugins.importers.shards.take')
+    @mock.patch('pulp_npm.plugins.importers.shards.tasks.cancel')
+    @mock.patch('pulp_npm.plugins.importers.shards.run_shard')
+    @mock.patch('pulp_npm.plugins.importers.shards.sync_shard.apply_async_with_reservation')
+    def test_sync_sharded_failure(self, apply_async_with_reservation, run_shard, cancel, take,
+                                  get_collection):
+        """
+        When the calling task fails, the shards that were not started are taken and canceled.
+        """
+        apply_async_with_reservation.side_effect = [mock.MagicMock(id='task-1'),
+                                                    mock.MagicMock(id='task-2')]
+        run_shard.side_effect = IOError('disk full')
+        # The first shard's task is running already
+        take.side_effect = lambda shard_id: \
+            shard_id != apply_async_with_reservation.mock_calls[0][1][5]
+
+        self.assertRaises(IOError, shards.sync_sharded, self.repo, self.conduit, self.config, 3)
+
+        shard_ids = [c[1][5] for c in apply_async_with_reservation.mock_calls]
+        self.assertEqual(sorted(take.mock_calls), sorted([mock.call(i) for i in shard_ids]))
+        cancel.assert_called_once_with('task-2')
+
+
+class TestMergeReports(unittest.TestCase):
+    """
+    This class contains tests for the merge_reports() function.
+    """
+    def test_success(self):
+        conduit = mock.MagicMock()
+        reports = [{'success_flag': True, 'summary': {'a': 1}, 'details': {'b': 2}},
+                   {'success_flag': True, 'summary': {'a': 3}, 'details': {'b': 4}}]
+
+        report = shards.merge_reports(conduit, reports)
+
+        self.assertEqual(report, conduit.build_success_report.return_value)
+        conduit.build_success_report.assert_called_once_with(
+            {'shards': [{'a': 1}, {'a': 3}]}, {'shards': [{'b': 2}, {'b': 4}]})
@@ -3,15 +3,18 @@ This module contains tests for the pulp_npm.plugins.importers.sync module.
 """
 from cStringIO import StringIO
 from gettext import gettext as _
-import os
+import copy
+import json
 import types
 import unittest
 
 import mock
+from pulp.common.plugins import importer_constants
+from pulp.plugins.config import PluginCallConfiguration
 from pulp.server.db.model import criteria
 
 from pulp_npm.common import constants
-from pulp_npm.plugins.importers import sync
+from pulp_npm.plugins.importers import feeds, filters, latency, plan, sync, throttle
 
 
 # This was taken from https://pypi.python.org/pypi/numpy/json, but was trimmed for brevity. It's a
@@ -446,6 +449,227 @@ macosx_10_9_x86_64.macosx_10_10_intel.macosx_10_10_x86_64.whl",
 """
 
 
+# A trimmed down npm package manifest, with two versions.
+LEFT_PAD_MANIFEST = """{
+    "name": "left-pad",
+    "dist-tags": {"latest": "1.1.0"},
+    "versions": {
+        "1.0.0": {
+            "name": "left-pad",
+            "version": "1.0.0",
+            "description": "String left pad",
+            "dist": {
+                "shasum": "aaaaa",
+                "tarball": "https://registry.npmjs.org/left-pad/-/left-pad-1.0.0.tgz"
+            }
+        },
+        "1.1.0": {
+            "name": "left-pad",
+            "version": "1.1.0",
+            "description": "String left pad",
+            "dist": {
+                "shasum": "bbbbb",
+                "tarball": "https://registry.npmjs.org/left-pad/-/left-pad-1.1.0.tgz"
+            }
+        }
+    }
+}
+"""
+
+
+def _claim_all(packages):
+    """
+    Stand in for DownloadClaims.claim() when no other task holds a claim on the packages.
+    """
+    return set([sync.claims.claim_key(p) for p in packages])
+
+
+class FakeUnit(object):
+    """
+    A stand in for the units that the conduit's search methods return.
+    """
+    def __init__(self, version, metadata=None, storage_path='/some/path', name='left-pad'):
+        self.unit_key = {'name': name, 'version': version}
+        self.metadata = metadata or {}
+        self.storage_path = storage_path
+
+
+class FakeDownloader(object):
+    """
+    A stand in for nectar's HTTPThreadedDownloader.
+    """
+    def __init__(self, config, event_listener):
+        self.config = config
+        self.event_listener = event_listener
+
+
+class TestAdaptiveDownloadStep(unittest.TestCase):
+    """
+    This class tests the AdaptiveDownloadStep class.
+    """
+    @mock.patch('pulp_npm.plugins.importers.sync.importer_config_to_nectar_config')
+    @mock.patch('pulp_npm.plugins.importers.sync.HTTPThreadedDownloader', FakeDownloader)
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.initialize')
+    def test_initialize(self, super_initialize, importer_config_to_nectar_config):
+        """
+        The downloader is rebuilt with the concurrency configured for the step.
+        """
+        config = mock.MagicMock()
+        config.flatten.return_value = {importer_constants.KEY_MAX_DOWNLOADS: 10}
+        config.get.side_effect = {constants.CONFIG_KEY_PACKAGE_CONCURRENCY: 2}.get
+        step = sync.DownloadPackagesStep('sync_step_download_packages', config=config)
+        step.downloader = FakeDownloader(None, step)
+
+        step.initialize()
+
+        super_initialize.assert_called_once_with()
+        importer_config_to_nectar_config.assert_called_once_with(
+            {importer_constants.KEY_MAX_DOWNLOADS: 2})
+        self.assertEqual(step.downloader.config, importer_config_to_nectar_config.return_value)
+        self.assertEqual(step.downloader.event_listener, step)
+        self.assertEqual(step._throttle.max_concurrent, 2)
+
+    def _packages_step(self):
+        """
+        Return a DownloadPackagesStep with a mocked controller, whose SyncStep has a single feed.
+        """
+        step = sync.DownloadPackagesStep('sync_step_download_packages')
+        step.parent = mock.MagicMock()
+        step.parent._feed_router = feeds.FeedRouter({'*': ['http://registry.example/']})
+        step._throttle = mock.MagicMock()
+        return step
+
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.download_failed')
+    def test_download_failed_throttled(self, super_download_failed):
+        """
+        A throttled download is queued to be retried instead of failing.
+        """
+        step = self._packages_step()
+        step._throttle.throttled.return_value = True
+        report = mock.MagicMock(url='http://registry.example/left-pad/-/left-pad-1.0.0.tgz',
+                                data={'name': 'left-pad'})
+        report.error_report = {'response_code': 429}
+        report.headers = {'Retry-After': '3'}
+
+        step.download_failed(report)
+
+        self.assertEqual(super_download_failed.call_count, 0)
+        retry, retry_after, failover = step._throttle.throttled.mock_calls[0][1]
+        self.assertEqual((retry.url, retry.destination, retry.data),
+                         (report.url, report.destination, report.data))
+        self.assertEqual(retry_after, '3')
+        self.assertEqual(failover, None)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.download_failed')
+    def test_download_failed_too_many_retries(self, super_download_failed):
+        """
+        A throttled download that won't be retried again is counted as failed.
+        """
+        step = self._packages_step()
+        step._throttle.throttled.return_value = False
+        report = mock.MagicMock(url='http://registry.example/left-pad/-/left-pad-1.0.0.tgz',
+                                data={'name': 'left-pad'})
+        report.error_report = {'response_code': 503}
+        report.headers = {}
+
+        step.download_failed(report)
+
+        super_download_failed.assert_called_once_with(report)
+        self.assertEqual(step._throttle.throttled.mock_calls[0][1][1], None)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.download_failed')
+    def test_download_failed_not_throttled(self, super_download_failed):
+        """
+        Other failures finish the request and are counted as failed.
+        """
+        step = self._packages_step()
+        report = mock.MagicMock(url='http://registry.example/left-pad/-/left-pad-1.0.0.tgz',
+                                data={'name': 'left-pad'})
+        report.error_report = {'response_code': 404}
+
+        step.download_failed(report)
+
+        step._throttle.finished.assert_called_once_with(report.url, None)
+        super_download_failed.assert_called_once_with(report)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.download_failed')
+    def test_download_failed_failover(self, super_download_failed):
+        """
+        A download that failed is tried at the next feed of the package.
+        """
+        step = sync.DownloadMetadataStep('sync_step_download_metadata')
+        step.parent = mock.MagicMock()
+        step.parent.parent._feed_router = feeds.FeedRouter(
+            {'*': ['http://mirror-a.example/', 'http://mirror-b.example/']})
+        step._throttle = mock.MagicMock()
+        report = mock.MagicMock()
+        report.url = 'http://mirror-a.example/left-pad'
+        report.data = {'name': 'left-pad'}
+        report.error_report = {'response_code': 500}
+
+        step.download_failed(report)
+
+        self.assertEqual(super_download_failed.call_count, 0)
+        url, failover = step._throttle.finished.mock_calls[0][1]
+        self.assertEqual(url, report.url)
+        self.assertEqual(failover.url, 'http://mirror-b.example/left-pad')
+        self.assertEqual(failover.data, {'name': 'left-pad'})
+
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.download_failed')
+    def test_download_failed_last_feed(self, super_download_failed):
+        """
+        A download that failed at the last feed of the package is counted as failed.
+        """
+        step = sync.DownloadMetadataStep('sync_step_download_metadata')
+        step.parent = mock.MagicMock()
+        step.parent.parent._feed_router = feeds.FeedRouter(
+            {'*': ['http://mirror-a.example/', 'http://mirror-b.example/']})
+        step._throttle = mock.MagicMock()
+        report = mock.MagicMock()
+        report.url = 'http://mirror-b.example/left-pad'
+        report.data = {'name': 'left-pad'}
+        report.error_report = {'response_code': 404}
+
+        step.download_failed(report)
+
+        step._throttle.finished.assert_called_once_with(report.url, None)
+        super_download_failed.assert_called_once_with(report)
+
+    def test__retry_request_manifest(self):
+        """
+        Manifests are retried into a fresh StringIO.
+        """
+        step = sync.DownloadMetadataStep('sync_step_download_metadata')
+        report = mock.MagicMock()
+
+        retry = step._retry_request(report)
+
+        self.assertEqual(retry.url, report.url)
+        self.assertNotEqual(retry.destination, report.destination)
+        self.assertEqual(retry.data, report.data)
+
+    def test__process_block(self):
+        """
+        The downloads are fed to the downloader through the controller.
+        """
+        requests = [mock.MagicMock(url='a'), mock.MagicMock(url='b')]
+        step = sync.DownloadMetadataStep('sync_step_download_metadata', downloads=requests)
+        step.downloader = mock.MagicMock()
+        step._throttle = throttle.AdaptiveController(2)
+        fed = []
+
+        def download(feed):
+            for download_request in feed:
+                fed.append(download_request)
+                step._throttle.finished(download_request.url)
+
+        step.downloader.download.side_effect = download
+
+        step._process_block()
+
+        self.assertEqual(fed, requests)
+
+
 class TestDownloadMetadataStep(unittest.TestCase):
     """
     This class tests the DownloadMetadataStep class.
@@ -476,6 +700,8 @@ class TestDownloadMetadataStep(unittest.TestCase):
         step.parent = mock.MagicMock()
         # Let's start with some packages to download to make sure the handler adds to it correctly
         step.parent.parent._packages_to_download = [{'a': 1}]
+        step.parent.parent._upstream_tags = {}
+        report.data = {'name': 'numpy'}
         report.destination.read.return_value = NUMPY_MANIFEST
         _process_manifest.return_value = [{'b': 2}, {'c': 3}]
 
@@ -483,8 +709,15 @@ class TestDownloadMetadataStep(unittest.TestCase):
 
         report.destination.close.assert_called_once_with()
         super_download_succeeded.assert_called_once_with(report)
-        _process_manifest.assert_called_once_with(NUMPY_MANIFEST, conduit)
+        _process_manifest.assert_called_once_with(
+            json.loads(NUMPY_MANIFEST), conduit, deferred=False,
+            wanted_versions=step.parent.parent._wanted_versions,
+            version_filter=step.parent.parent._version_filter,
+            sync_plan=step.parent.parent._plan,
+            units_to_remove=step.parent.parent._units_to_remove)
         self.assertEqual(step.parent.parent._packages_to_download, [{'a': 1}, {'b': 2}, {'c': 3}])
+        # The manifest has no dist-tags
+        self.assertEqual(step.parent.parent._upstream_tags, {'numpy': {}})
 
     def test__process_manifest_associates_existing_versions(self):
         """
@@ -674,6 +907,134 @@ class TestDownloadMetadataStep(unittest.TestCase):
         # No associations should have been made
         self.assertEqual(conduit.associate_existing.call_count, 0)
 
+    def test__process_manifest_deferred(self):
+        """
+        When deferred is True, _process_manifest() should hand back the manifest metadata of each
+        missing version, so that the units can be created without downloading them.
+        """
+        conduit = mock.MagicMock()
+        conduit.get_units.return_value = []
+        conduit.search_all_units.return_value = [FakeUnit('1.0.0')]
+
+        packages_to_dl = sync.DownloadMetadataStep._process_manifest(LEFT_PAD_MANIFEST, conduit,
+                                                                     deferred=True)
+
+        self.assertEqual(len(packages_to_dl), 1)
+        self.assertEqual(packages_to_dl[0]['version'], '1.1.0')
+        self.assertEqual(packages_to_dl[0]['shasum'], 'bbbbb')
+        self.assertEqual(packages_to_dl[0]['metadata']['description'], 'String left pad')
+
+    @mock.patch('pulp_npm.plugins.importers.sync.os.path.exists')
+    def test__process_manifest_downloads_deferred_units_without_bits(self, exists):
+        """
+        An immediate sync should download the versions that a previous on_demand sync added to Pulp
+        if their tarballs were never retrieved.
+        """
+        conduit = mock.MagicMock()
+        deferred = {constants.METADATA_KEY_DEFERRED: True}
+        conduit.get_units.return_value = [FakeUnit('1.0.0', deferred), FakeUnit('1.1.0', deferred)]
+        conduit.search_all_units.return_value = [FakeUnit('1.0.0', deferred, '/a'),
+                                                 FakeUnit('1.1.0', deferred, '/b')]
+        exists.side_effect = lambda path: path == '/a'
+
+        packages_to_dl = sync.DownloadMetadataStep._process_manifest(LEFT_PAD_MANIFEST, conduit)
+
+        self.assertEqual([p['version'] for p in packages_to_dl], ['1.1.0'])
+        self.assertFalse('metadata' in packages_to_dl[0])
+        self.assertEqual(conduit.associate_existing.call_count, 0)
+
+    def test__process_manifest_wanted_versions(self):
+        """
+        Only the wanted versions of a package are associated, even if Pulp holds other versions of
+        it.
+        """
+        conduit = mock.MagicMock()
+        conduit.get_units.return_value = []
+        conduit.search_all_units.return_value = [FakeUnit('0.9.0'), FakeUnit('1.0.0'),
+                                                 FakeUnit('1.1.0')]
+
+        packages_to_dl = sync.DownloadMetadataStep._process_manifest(
+            LEFT_PAD_MANIFEST, conduit, wanted_versions={'left-pad': set(['1.0.0'])})
+
+        self.assertEqual(packages_to_dl, [])
+        conduit.associate_existing.assert_called_once_with(
+            constants.PACKAGE_TYPE_ID, [{'name': 'left-pad', 'version': '1.0.0'}])
+
+    def test__process_manifest_sync_plan(self):
+        """
+        With a sync plan, the versions that would be associated are recorded in the plan instead of
+        being associated, along with the sizes of the versions to download.
+        """
+        conduit = mock.MagicMock()
+        conduit.get_units.return_value = []
+        conduit.search_all_units.return_value = [FakeUnit('1.0.0')]
+        manifest = json.loads(LEFT_PAD_MANIFEST)
+        manifest['versions']['1.1.0']['dist']['size'] = 1024
+        sync_plan = plan.SyncPlan()
+
+        packages_to_dl = sync.DownloadMetadataStep._process_manifest(manifest, conduit,
+                                                                     sync_plan=sync_plan)
+
+        self.assertEqual([p['version'] for p in packages_to_dl], ['1.1.0'])
+        self.assertEqual(conduit.associate_existing.call_count, 0)
+        self.assertEqual(sync_plan.versions_to_associate, {'left-pad': set(['1.0.0'])})
+        self.assertEqual(sync_plan.sizes, {('left-pad', '1.1.0'): 1024})
+
+    def test__process_manifest_units_to_remove(self):
+        """
+        The versions in the repository that are no longer upstream are listed for removal, even if
+        the version filter excludes them.
+        """
+        conduit = mock.MagicMock()
+        conduit.get_units.return_value = [FakeUnit('0.8.0'), FakeUnit('0.9.0'), FakeUnit('1.0.0')]
+        conduit.search_all_units.return_value = [FakeUnit('0.8.0'), FakeUnit('0.9.0'),
+                                                 FakeUnit('1.0.0')]
+        version_filter = filters.VersionFilter(version_ranges={'left-pad': '^1.0.0'})
+        units_to_remove = [{'name': 'debug', 'version': '2.6.9'}]
+
+        sync.DownloadMetadataStep._process_manifest(LEFT_PAD_MANIFEST, conduit,
+                                                    version_filter=version_filter,
+                                                    units_to_remove=units_to_remove)
+
+        self.assertEqual(units_to_remove, [{'name': 'debug', 'version': '2.6.9'},
+                                           {'name': 'left-pad', 'version': '0.8.0'},
+                                           {'name': 'left-pad', 'version': '0.9.0'}])
+
+    def test__process_manifest_version_filter(self):
+        """
+        Versions that the version filter excludes are neither downloaded nor associated.
+        """
+        conduit = mock.MagicMock()
+        conduit.get_units.return_value = []
+        conduit.search_all_units.return_value = [FakeUnit('0.9.0'), FakeUnit('1.0.0')]
+        version_filter = filters.VersionFilter(version_ranges={'left-pad': '^1.0.0'})
+
+        packages_to_dl = sync.DownloadMetadataStep._process_manifest(
+            json.loads(LEFT_PAD_MANIFEST), conduit, version_filter=version_filter)
+
+        self.assertEqual([p['version'] for p in packages_to_dl], ['1.1.0'])
+        conduit.associate_existing.assert_called_once_with(
+            constants.PACKAGE_TYPE_ID, [{'name': 'left-pad', 'version': '1.0.0'}])
+
+    def test__process_manifest_version_filter_latest_majors(self):
+        """
+        The latest majors are counted over all the upstream versions, so an older major that Pulp
+        holds is not associated.
+        """
+        conduit = mock.MagicMock()
+        conduit.get_units.return_value = []
+        conduit.search_all_units.return_value = [FakeUnit('0.9.0')]
+        manifest = json.loads(LEFT_PAD_MANIFEST)
+        manifest['versions']['0.9.0'] = copy.deepcopy(manifest['versions']['1.0.0'])
+        manifest['versions']['0.9.0']['version'] = '0.9.0'
+        version_filter = filters.VersionFilter(latest_majors=1)
+
+        packages_to_dl = sync.DownloadMetadataStep._process_manifest(
+            manifest, conduit, version_filter=version_filter)
+
+        self.assertEqual(sorted([p['version'] for p in packages_to_dl]), ['1.0.0', '1.1.0'])
+        self.assertEqual(conduit.associate_existing.call_count, 0)
+
 
 class TestDownloadPackagesStep(unittest.TestCase):
     """
@@ -683,17 +1044,19 @@ class TestDownloadPackagesStep(unittest.TestCase):
     @mock.patch('pulp_npm.plugins.importers.sync.models.Package.save_unit')
     @mock.patch('pulp_npm.plugins.importers.sync.DownloadPackagesStep.download_failed')
     @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.download_succeeded')
-    @mock.patch('pulp_npm.plugins.importers.sync.shutil.copy')
-    def test_download_succeeded_checksum_bad(self, copy, super_download_succeeded,
+    @mock.patch('pulp_npm.plugins.importers.sync.shutil.move')
+    def test_download_succeeded_checksum_bad(self, move, super_download_succeeded,
                                              download_failed, save_unit, checksum):
         """
         Test the download_succeeded() method when the checksum of the downloaded package is
         incorrect.
         """
         report = mock.MagicMock()
-        report.data = {'checksum': 'expected checksum'}
+        report.data = {'name': 'left-pad', 'shasum': 'expected checksum'}
         conduit = mock.MagicMock()
         step = sync.DownloadPackagesStep('sync_step_download_packages', conduit=conduit)
+        step.parent = mock.MagicMock()
+        step.parent._download_cache.commit.side_effect = lambda path: path
         checksum.return_value = 'bad checksum'
 
         step.download_succeeded(report)
@@ -709,30 +1072,39 @@ class TestDownloadPackagesStep(unittest.TestCase):
         download_failed.assert_called_once_with(report)
         # Make sure the checksum was calculated with the correct data
         checksum.assert_called_once_with(report.destination)
-        # copy and save_unit should not have been called since the download failed
-        self.assertEqual(copy.call_count, 0)
+        # move and save_unit should not have been called since the download failed
+        self.assertEqual(move.call_count, 0)
         self.assertEqual(save_unit.call_count, 0)
+        # The bad download should have been removed from the cache
+        step.parent._download_cache.discard.assert_called_once_with(report.destination)
 
     @mock.patch('pulp_npm.plugins.importers.sync.models.Package.checksum')
     @mock.patch('pulp_npm.plugins.importers.sync.models.Package.from_archive')
     @mock.patch('pulp_npm.plugins.importers.sync.DownloadPackagesStep.download_failed')
     @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.download_succeeded')
-    @mock.patch('pulp_npm.plugins.importers.sync.shutil.copy')
-    def test_download_succeeded_checksum_good(self, copy, super_download_succeeded, download_failed,
+    @mock.patch('pulp_npm.plugins.importers.sync.shutil.move')
+    def test_download_succeeded_checksum_good(self, move, super_download_succeeded, download_failed,
                                               from_archive, checksum):
         """
         Test the download_succeeded() method when the checksum of the downloaded package is correct.
         """
         report = mock.MagicMock()
-        report.data = {'checksum': 'good checksum'}
+        report.data = {'name': 'left-pad', 'shasum': 'good checksum'}
+        report.destination = '/cache/key/left-pad-1.1.0.tgz.part'
         conduit = mock.MagicMock()
         step = sync.DownloadPackagesStep('sync_step_download_packages', conduit=conduit)
+        step.parent = mock.MagicMock()
+        step.parent._download_cache.commit.return_value = '/cache/key/left-pad-1.1.0.tgz'
         checksum.return_value = 'good checksum'
 
         step.download_succeeded(report)
 
         # Download failed should not have been called
         self.assertEqual(download_failed.call_count, 0)
+        # The partial download should have been marked complete
+        step.parent._download_cache.commit.assert_called_once_with(
+            '/cache/key/left-pad-1.1.0.tgz.part')
+        self.assertEqual(report.destination, '/cache/key/left-pad-1.1.0.tgz')
         # Make sure the checksum was calculated with the correct data
         checksum.assert_called_once_with(report.destination)
         # The from_archive method should have been given the destination
@@ -740,13 +1112,300 @@ class TestDownloadPackagesStep(unittest.TestCase):
         # The Package's init_unit should have been handed the conduit
         package = from_archive.return_value
         package.init_unit.assert_called_once_with(conduit)
-        # The unit should have been copied to the storage path
-        copy.assert_called_once_with(report.destination, package.storage_path)
+        # The unit should have been moved from the cache to the storage path
+        move.assert_called_once_with(report.destination, package.storage_path)
+        step.parent._download_cache.discard.assert_called_once_with(report.destination)
         # The unit should have been saved to the DB
         package.save_unit.assert_called_once_with(conduit)
+        # Other tasks waiting for the package can now associate it
+        step.parent._download_claims.release.assert_called_once_with(report.data)
         # The superclass success method should have been called.
         super_download_succeeded.assert_called_once_with(report)
 
+    @mock.patch('pulp_npm.plugins.importers.sync.lockfile.verify_integrity')
+    @mock.patch('pulp_npm.plugins.importers.sync.models.Package.checksum')
+    @mock.patch('pulp_npm.plugins.importers.sync.DownloadPackagesStep.download_failed')
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.download_succeeded')
+    def test_download_succeeded_integrity_bad(self, super_download_succeeded, download_failed,
+                                              checksum, verify_integrity):
+        """
+        Packages from a lockfile are verified against their integrity rather than a shasum.
+        """
+        report = mock.MagicMock()
+        report.data = {'name': 'left-pad', 'shasum': None, 'integrity': 'sha512-abcd'}
+        step = sync.DownloadPackagesStep('sync_step_download_packages', conduit=mock.MagicMock())
+        step.parent = mock.MagicMock()
+        step.parent._download_cache.commit.side_effect = lambda path: path
+        verify_integrity.return_value = ('expected', 'actual')
+
+        step.download_succeeded(report)
+
+        verify_integrity.assert_called_once_with(report.destination, 'sha512-abcd')
+        self.assertEqual(checksum.call_count, 0)
+        self.assertEqual(report.error_report,
+                         {'expected_checksum': 'expected', 'actual_checksum': 'actual'})
+        download_failed.assert_called_once_with(report)
+        self.assertEqual(super_download_succeeded.call_count, 0)
+
+    def test__failover_request(self):
+        """
+        A tarball that a feed failed to serve is requested at the same path from the next feed,
+        into the same place in the download cache.
+        """
+        step = sync.DownloadPackagesStep('sync_step_download_packages')
+        step.parent = mock.MagicMock()
+        step.parent._feed_router = feeds.FeedRouter(
+            {'@ourco': ['http://npm-a.ourco.example/', 'http://npm-b.ourco.example/']})
+        package = {'name': '@ourco/widgets', 'version': '1.0.0', 'shasum': 'aaaaa',
+                   'tarball': 'http://npm-a.ourco.example/@ourco/widgets/-/widgets-1.0.0.tgz'}
+        report = mock.MagicMock()
+        report.url = package['tarball']
+        report.data = package
+
+        failover = step._failover_request(report)
+
+        self.assertEqual(failover.url,
+                         'http://npm-b.ourco.example/@ourco/widgets/-/widgets-1.0.0.tgz')
+        self.assertEqual(failover.data, package)
+        download_cache = step.parent._download_cache
+        download_cache.prepare.assert_called_once_with(package['tarball'], 'aaaaa')
+        self.assertEqual(failover.destination, download_cache.partial_path.return_value)
+
+        report.url = failover.url
+        self.assertEqual(step._failover_request(report), None)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.changes.build_opener')
+    @mock.patch('pulp_npm.plugins.importers.sync.DownloadPackagesStep.download_succeeded')
+    def test__process_block(self, download_succeeded, build_opener):
+        """
+        Cached packages are processed without being downloaded, partial downloads are resumed
+        with an opener built from the importer config, and the remaining packages are handed to
+        the downloader.
+        """
+        step = sync.DownloadPackagesStep('sync_step_download_packages', conduit=mock.MagicMock())
+        step.parent = mock.MagicMock()
+        step.downloader = mock.MagicMock()
+        download_cache = step.parent._download_cache
+        cached = {'/a.tgz': '/cache/a/a.tgz'}
+        download_cache.lookup.side_effect = lambda url, key: cached.get(url)
+        download_cache.has_partial.side_effect = lambda url, key: url in ('/b.tgz', '/c.tgz')
+        resumed = {'/b.tgz': '/cache/b/b.tgz'}
+
+        def resume(url, key, opener):
+            self.assertEqual(opener, build_opener.return_value)
+            if url not in resumed:
+                raise IOError('connection reset')
+            return resumed[url]
+
+        download_cache.resume.side_effect = resume
+        step.parent._download_claims.claim.side_effect = _claim_all
+        requests = [sync.request.DownloadRequest(url, url + '.part',
+                                                 {'name': url, 'version': '1.0.0', 'shasum': url})
+                    for url in ('/a.tgz', '/b.tgz', '/c.tgz', '/d.tgz')]
+        step._downloads = requests
+
+        step._process_block()
+
+        self.assertEqual([c[1][0].destination for c in download_succeeded.mock_calls],
+                         ['/cache/a/a.tgz', '/cache/b/b.tgz'])
+        step.downloader.download.assert_called_once_with(requests[2:])
+        self.assertEqual(download_cache.prepare.mock_calls,
+                         [mock.call('/c.tgz', '/c.tgz'), mock.call('/d.tgz', '/d.tgz')])
+        build_opener.assert_called_once_with(step.get_config())
+        step.parent._download_claims.release_all.assert_called_once_with()
+
+    @mock.patch('pulp_npm.plugins.importers.sync.claims.CLAIM_BATCH_SIZE', 2)
+    def test__process_block_batches(self):
+        """
+        The packages are claimed a batch at a time, and each batch is downloaded before the next
+        one is claimed.
+        """
+        step = sync.DownloadPackagesStep('sync_step_download_packages', conduit=mock.MagicMock())
+        step.parent = mock.MagicMock()
+        step.parent._download_cache.lookup.return_value = None
+        step.parent._download_cache.has_partial.return_value = False
+        step.downloader = mock.MagicMock()
+        download_claims = step.parent._download_claims
+        calls = []
+
+        def claim(packages):
+            calls.append([p['name'] for p in packages])
+            return _claim_all(packages)
+
+        def download(downloads):
+            calls.append([r.url for r in downloads])
+
+        download_claims.claim.side_effect = claim
+        step.downloader.download.side_effect = download
+        step._downloads = [
+            sync.request.DownloadRequest('/%s.tgz' % n, '/part',
+                                         {'name': n, 'version': '1.0.0', 'shasum': n})
+            for n in ('a', 'b', 'c')]
+
+        step._process_block()
+
+        self.assertEqual(calls, [['a', 'b'], ['/a.tgz', '/b.tgz'], ['c'], ['/c.tgz']])
+        download_claims.release_all.assert_called_once_with()
+
+    @mock.patch('pulp_npm.plugins.importers.sync.time.sleep')
+    @mock.patch('pulp_npm.plugins.importers.sync.DownloadPackagesStep._associate_saved_unit')
+    def test__process_block_claimed_elsewhere(self, _associate_saved_unit, sleep):
+        """
+        Packages that another task claimed are associated once it releases them, or downloaded if
+        it failed to save them.
+        """
+        step = sync.DownloadPackagesStep('sync_step_download_packages', conduit=mock.MagicMock())
+        step.parent = mock.MagicMock()
+        step.parent._download_cache.lookup.return_value = None
+        step.parent._download_cache.has_partial.return_value = False
+        step.downloader = mock.MagicMock()
+        download_claims = step.parent._download_claims
+        packages = [{'name': n, 'version': '1.0.0', 'shasum': n} for n in ('a', 'b', 'c')]
+        requests = [sync.request.DownloadRequest('/%s.tgz' % p['name'], '/part', p)
+                    for p in packages]
+        step._downloads = requests
+        # Another task holds a and b. It saves a after one poll, and gives up on b.
+        claimed = {'a': [True, False], 'b': [False]}
+        download_claims.claim.side_effect = lambda packages: set(
+            [sync.claims.claim_key(p) for p in packages if not claimed.get(p['name'])])
+        download_claims.claimed_elsewhere.side_effect = lambda packages: set(
+            [sync.claims.claim_key(p) for p in packages if claimed[p['name']].pop(0)])
+        _associate_saved_unit.side_effect = lambda p: p['name'] == 'a'
+
+        step._process_block()
+
+        self.assertEqual(step.downloader.download.mock_calls,
+                         [mock.call([requests[2]]), mock.call([requests[1]])])
+        self.assertEqual(step.progress_successes, 1)
+        sleep.assert_called_once_with(sync.claims.POLL_INTERVAL)
+        self.assertEqual(download_claims.claimed_elsewhere.call_count, 2)
+        download_claims.release_all.assert_called_once_with()
+
+    @mock.patch('pulp_npm.plugins.importers.sync.os.path.exists')
+    def test__associate_saved_unit(self, exists):
+        """
+        A unit that another task saved with its tarball is associated with the repository.
+        """
+        conduit = mock.MagicMock()
+        step = sync.DownloadPackagesStep('sync_step_download_packages', conduit=conduit)
+        package = {'name': 'left-pad', 'version': '1.1.0', 'shasum': 'aaaaa'}
+        conduit.search_all_units.return_value = [FakeUnit('1.1.0')]
+        exists.return_value = True
+
+        self.assertTrue(step._associate_saved_unit(package))
+        conduit.associate_existing.assert_called_once_with(
+            constants.PACKAGE_TYPE_ID, [{'name': 'left-pad', 'version': '1.1.0'}])
+
+        exists.return_value = False
+        self.assertFalse(step._associate_saved_unit(package))
+        conduit.search_all_units.return_value = []
+        self.assertFalse(step._associate_saved_unit(package))
+        self.assertEqual(conduit.associate_existing.call_count, 1)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.AdaptiveDownloadStep.download_failed')
+    def test_download_failed_releases_claim(self, super_download_failed):
+        """
+        The claim on a package is released once its download has failed for good.
+        """
+        step = sync.DownloadPackagesStep('sync_step_download_packages')
+        step.parent = mock.MagicMock()
+        report = mock.MagicMock()
+
+        super_download_failed.return_value = True
+        self.assertTrue(step.download_failed(report))
+        self.assertEqual(step.parent._download_claims.release.call_count, 0)
+
+        super_download_failed.return_value = False
+        self.assertFalse(step.download_failed(report))
+        step.parent._download_claims.release.assert_called_once_with(report.data)
+
+
+class TestProcessLockfileStep(unittest.TestCase):
+    """
+    This class contains tests for the ProcessLockfileStep class.
+    """
+    def test_process_main(self):
+        """
+        Locked packages in Pulp but not in the repo are associated, and the ones missing from Pulp
+        are scheduled for download without fetching their manifests.
+        """
+        conduit = mock.MagicMock()
+        conduit.search_all_units.return_value = [FakeUnit('1.0.0'), FakeUnit('1.1.0')]
+        conduit.get_units.return_value = [FakeUnit('1.0.0')]
+        step = sync.ProcessLockfileStep(mock.MagicMock(), conduit, {}, '/some/dir')
+        step.parent = mock.MagicMock()
+        step.parent._packages_to_download = []
+        step.parent._plan = None
+        step.parent._locked_packages = [
+            {'name': 'left-pad', 'version': v, 'resolved': 'http://a/%s.tgz' % v,
+             'integrity': 'sha512-%s' % v} for v in ['1.0.0', '1.1.0', '1.2.0']]
+
+        step.process_main()
+
+        conduit.associate_existing.assert_called_once_with(
+            constants.PACKAGE_TYPE_ID, [{'name': 'left-pad', 'version': '1.1.0'}])
+        self.assertEqual(
+            step.parent._packages_to_download,
+            [{'name': 'left-pad', 'version': '1.2.0', 'tarball': 'http://a/1.2.0.tgz',
+              'shasum': None, 'integrity': 'sha512-1.2.0'}])
+        self.assertEqual(step.progress_successes, 3)
+
+    def test_process_main_dry_run(self):
+        """
+        A dry run only records the locked packages that it would associate, and still schedules
+        the missing ones for download.
+        """
+        conduit = mock.MagicMock()
+        conduit.search_all_units.return_value = [FakeUnit('1.0.0'), FakeUnit('1.1.0')]
+        conduit.get_units.return_value = [FakeUnit('1.0.0')]
+        step = sync.ProcessLockfileStep(mock.MagicMock(), conduit, {}, '/some/dir')
+        step.parent = mock.MagicMock()
+        step.parent._packages_to_download = []
+        step.parent._plan = plan.SyncPlan()
+        step.parent._locked_packages = [
+            {'name': 'left-pad', 'version': v, 'resolved': 'http://a/%s.tgz' % v,
+             'integrity': 'sha512-%s' % v} for v in ['1.0.0', '1.1.0', '1.2.0']]
+
+        step.process_main()
+
+        self.assertEqual(conduit.associate_existing.call_count, 0)
+        self.assertEqual(step.parent._plan.versions_to_associate, {'left-pad': set(['1.1.0'])})
+        self.assertEqual([p['version'] for p in step.parent._packages_to_download], ['1.2.0'])
+        self.assertEqual(step.progress_successes, 3)
+
+
+class TestRemoveMissingStep(unittest.TestCase):
+    """
+    This class contains tests for the RemoveMissingStep class.
+    """
+    @mock.patch('pulp_npm.plugins.importers.sync.REMOVE_BATCH_SIZE', 2)
+    @mock.patch('pulp_npm.plugins.importers.sync.manager_factory.repo_unit_association_manager')
+    def test_process_main(self, repo_unit_association_manager):
+        """
+        The units are removed from the repository in batches, with one query for each batch.
+        """
+        repo = mock.MagicMock()
+        repo.id = 'cool_repo'
+        step = sync.RemoveMissingStep(repo, mock.MagicMock(), {}, '/some/dir')
+        step.parent = mock.MagicMock()
+        step.parent._units_to_remove = [{'name': 'left-pad', 'version': '0.8.0'},
+                                        {'name': 'left-pad', 'version': '0.9.0'},
+                                        {'name': 'debug', 'version': '2.6.9'}]
+
+        step.process_main()
+
+        unassociate = repo_unit_association_manager.return_value.unassociate_by_criteria
+        self.assertEqual(unassociate.call_count, 2)
+        for call, batch in zip(unassociate.mock_calls, [step.parent._units_to_remove[:2],
+                                                        step.parent._units_to_remove[2:]]):
+            self.assertEqual(call[1][0], 'cool_repo')
+            self.assertEqual(call[1][1].type_ids, [constants.PACKAGE_TYPE_ID])
+            self.assertEqual(call[1][1].unit_filters, {'$or': batch})
+            self.assertEqual(call[1][2:], (sync.RepoContentUnit.OWNER_TYPE_IMPORTER,
+                                           constants.IMPORTER_TYPE_ID))
+            self.assertEqual(call[2], {'notify_plugins': False})
+        self.assertEqual(step.progress_successes, 3)
+
 
 class TestGetMetadataStep(unittest.TestCase):
     """
@@ -804,7 +1463,7 @@ class TestGetMetadataStep(unittest.TestCase):
         working_dir = '/some/dir'
         step = sync.GetMetadataStep(repo, conduit, config, working_dir)
         step.parent = mock.MagicMock()
-        step.parent._feed_url = 'http://example.com'
+        step.parent._feed_router = feeds.FeedRouter({'*': ['http://example.com/']})
         step.parent._package_names = ['express', 'browserify']
 
         requests = step.generate_download_requests()
@@ -817,10 +1476,10 @@ class TestGetMetadataStep(unittest.TestCase):
         self.assertEqual(
             request_urls,
             ['http://example.com/express', 'http://example.com/browserify'])
-        # A StringIO should have been used for the destination, and the data should be an empty dict
+        # A StringIO should have been used for the destination, and the data should name the package
         for r in requests:
             self.assertEqual(type(r.destination), type(StringIO()))
-            self.assertEqual(r.data, {})
+        self.assertEqual([r.data for r in requests], [{'name': 'express'}, {'name': 'browserify'}])
 
 
 class TestSyncStep(unittest.TestCase):
@@ -849,15 +1508,18 @@ class TestSyncStep(unittest.TestCase):
         def fake_get(key, default=None):
             if key == constants.CONFIG_KEY_PACKAGE_NAMES:
                 return default
-            return 'http://example.com/'
+            if key == importer_constants.KEY_FEED:
+                return 'http://example.com/'
+            return default
 
         config.get.side_effect = fake_get
+        config.override_config = {}
 
         step = sync.SyncStep(repo, conduit, config, working_dir)
 
-        # The superclass __init__ method gets called four times. Once directly by this __init__, and
-        # three more times by the substeps it creates.
-        self.assertEqual(super___init__.call_count, 4)
+        # The superclass __init__ method gets called five times. Once directly by this __init__, and
+        # four more times by the substeps it creates.
+        self.assertEqual(super___init__.call_count, 5)
         # Let's assert that the direct call was cool.
         self.assertEqual(
             super___init__.mock_calls[0],
@@ -865,14 +1527,15 @@ class TestSyncStep(unittest.TestCase):
                       constants.IMPORTER_TYPE_ID))
         self.assertEqual(step.description, _('Synchronizing cool_repo repository.'))
         # Assert that the feed url and packages names are correct
-        self.assertEqual(step._feed_url, 'http://example.com/')
+        self.assertEqual(step._feed_router.feed_for('numpy'), 'http://example.com/')
         self.assertEqual(step._package_names, [])
         # _packages_to_download should have been initialized to the empty list
         self.assertEqual(step._packages_to_download, [])
-        # Two child steps should have been added
-        self.assertEqual(len(step.children), 2)
+        # Three child steps should have been added
+        self.assertEqual(len(step.children), 3)
         self.assertEqual(type(step.children[0]), sync.GetMetadataStep)
         self.assertEqual(type(step.children[1]), sync.DownloadPackagesStep)
+        self.assertEqual(type(step.children[2]), sync.UpdatePackumentsStep)
         # Make sure the steps were initialized properly
         get_metadata___init__.assert_called_once_with(step.children[0], repo, conduit, config,
                                                       working_dir)
@@ -904,15 +1567,18 @@ class TestSyncStep(unittest.TestCase):
         def fake_get(key, default=None):
             if key == constants.CONFIG_KEY_PACKAGE_NAMES:
                 return 'numpy'
-            return 'http://example.com/'
+            if key == importer_constants.KEY_FEED:
+                return 'http://example.com/'
+            return default
 
         config.get.side_effect = fake_get
+        config.override_config = {}
 
         step = sync.SyncStep(repo, conduit, config, working_dir)
 
-        # The superclass __init__ method gets called four times. Once directly by this __init__, and
-        # three more times by the substeps it creates.
-        self.assertEqual(super___init__.call_count, 4)
+        # The superclass __init__ method gets called five times. Once directly by this __init__, and
+        # four more times by the substeps it creates.
+        self.assertEqual(super___init__.call_count, 5)
         # Let's assert that the direct call was cool.
         self.assertEqual(
             super___init__.mock_calls[0],
@@ -920,14 +1586,15 @@ class TestSyncStep(unittest.TestCase):
                       constants.IMPORTER_TYPE_ID))
         self.assertEqual(step.description, _('Synchronizing cool_repo repository.'))
         # Assert that the feed url and packages names are correct
-        self.assertEqual(step._feed_url, 'http://example.com/')
+        self.assertEqual(step._feed_router.feed_for('numpy'), 'http://example.com/')
         self.assertEqual(step._package_names, ['numpy'])
         # _packages_to_download should have been initialized to the empty list
         self.assertEqual(step._packages_to_download, [])
-        # Two child steps should have been added
-        self.assertEqual(len(step.children), 2)
+        # Three child steps should have been added
+        self.assertEqual(len(step.children), 3)
         self.assertEqual(type(step.children[0]), sync.GetMetadataStep)
         self.assertEqual(type(step.children[1]), sync.DownloadPackagesStep)
+        self.assertEqual(type(step.children[2]), sync.UpdatePackumentsStep)
         # Make sure the steps were initialized properly
         get_metadata___init__.assert_called_once_with(step.children[0], repo, conduit, config,
                                                       working_dir)
@@ -959,15 +1626,18 @@ class TestSyncStep(unittest.TestCase):
         def fake_get(key, default=None):
             if key == constants.CONFIG_KEY_PACKAGE_NAMES:
                 return 'numpy,scipy,django'
-            return 'http://example.com/'
+            if key == importer_constants.KEY_FEED:
+                return 'http://example.com/'
+            return default
 
         config.get.side_effect = fake_get
+        config.override_config = {}
 
         step = sync.SyncStep(repo, conduit, config, working_dir)
 
-        # The superclass __init__ method gets called four times. Once directly by this __init__, and
-        # three more times by the substeps it creates.
-        self.assertEqual(super___init__.call_count, 4)
+        # The superclass __init__ method gets called five times. Once directly by this __init__, and
+        # four more times by the substeps it creates.
+        self.assertEqual(super___init__.call_count, 5)
         # Let's assert that the direct call was cool.
         self.assertEqual(
             super___init__.mock_calls[0],
@@ -975,14 +1645,15 @@ class TestSyncStep(unittest.TestCase):
                       constants.IMPORTER_TYPE_ID))
         self.assertEqual(step.description, _('Synchronizing cool_repo repository.'))
         # Assert that the feed url and packages names are correct
-        self.assertEqual(step._feed_url, 'http://example.com/')
+        self.assertEqual(step._feed_router.feed_for('numpy'), 'http://example.com/')
         self.assertEqual(step._package_names, ['numpy', 'scipy', 'django'])
         # _packages_to_download should have been initialized to the empty list
         self.assertEqual(step._packages_to_download, [])
-        # Two child steps should have been added
-        self.assertEqual(len(step.children), 2)
+        # Three child steps should have been added
+        self.assertEqual(len(step.children), 3)
         self.assertEqual(type(step.children[0]), sync.GetMetadataStep)
         self.assertEqual(type(step.children[1]), sync.DownloadPackagesStep)
+        self.assertEqual(type(step.children[2]), sync.UpdatePackumentsStep)
         # Make sure the steps were initialized properly
         get_metadata___init__.assert_called_once_with(step.children[0], repo, conduit, config,
                                                       working_dir)
@@ -998,11 +1669,12 @@ class TestSyncStep(unittest.TestCase):
         """
         repo = mock.MagicMock()
         conduit = mock.MagicMock()
-        config = mock.MagicMock()
+        config = {}
         working_dir = '/some/dir'
-        step = sync.SyncStep(repo, conduit, config, working_dir)
-        step._packages_to_download = [{'url': 'http://example.com/cool.tar.gz'},
-                                      {'url': 'http://example.com/beats.tar.gz'}]
+        step = sync.SyncStep(repo, conduit, config, working_dir, download_cache_dir='/cache')
+        step._packages_to_download = [
+            {'tarball': 'http://example.com/cool.tar.gz', 'shasum': 'aaaaa'},
+            {'tarball': 'http://example.com/beats.tar.gz', 'shasum': None, 'integrity': 'sha1-b'}]
 
         requests = step.generate_download_requests()
 
@@ -1014,11 +1686,13 @@ class TestSyncStep(unittest.TestCase):
         self.assertEqual(
             request_urls,
             ['http://example.com/cool.tar.gz', 'http://example.com/beats.tar.gz'])
-        # The destinations should both have been paths
+        # The destinations should both have been partial entries of the download cache
         request_destinations = [r.destination for r in requests]
         expected_destinations = [
-            os.path.join(working_dir, '%s.tar.gz' % f) for f in ['cool', 'beats']]
+            step._download_cache.partial_path('http://example.com/cool.tar.gz', 'aaaaa'),
+            step._download_cache.partial_path('http://example.com/beats.tar.gz', 'sha1-b')]
         self.assertEqual(request_destinations, expected_destinations)
+        self.assertTrue(request_destinations[0].startswith('/cache/'))
         requests_data = [r.data for r in requests]
         self.assertEqual(requests_data, step._packages_to_download)
 
@@ -1032,7 +1706,7 @@ class TestSyncStep(unittest.TestCase):
         """
         repo = mock.MagicMock()
         conduit = mock.MagicMock()
-        config = mock.MagicMock()
+        config = {importer_constants.KEY_FEED: 'http://example.com/'}
         working_dir = '/some/dir'
         step = sync.SyncStep(repo, conduit, config, working_dir)
 
@@ -1040,3 +1714,510 @@ class TestSyncStep(unittest.TestCase):
 
         process_lifecycle.assert_called_once_with(step)
         _build_final_report.assert_called_once_with(step)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.SyncStep._build_final_report',
+                autospec=True)
+    @mock.patch('pulp_npm.plugins.importers.sync.SyncStep.process_lifecycle',
+                autospec=True)
+    def test_sync_saves_throughput(self, process_lifecycle, _build_final_report):
+        """
+        The download throughput of the sync is folded into the one in the repository's scratchpad.
+        """
+        conduit = mock.MagicMock()
+        conduit.get_repo_scratchpad.return_value = {'other': 1,
+                                                    constants.SCRATCHPAD_KEY_THROUGHPUT: 2000.0}
+        config = {importer_constants.KEY_FEED: 'http://example.com/'}
+        step = sync.SyncStep(mock.MagicMock(), conduit, config, '/some/dir')
+        step._download_step.bytes_moved = 4000
+        step._download_step.download_seconds = 2.0
+
+        step.sync()
+
+        conduit.set_repo_scratchpad.assert_called_once_with(
+            {'other': 1, constants.SCRATCHPAD_KEY_THROUGHPUT: 2000.0})
+        _build_final_report.assert_called_once_with(step)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.SyncStep._build_final_report',
+                autospec=True)
+    @mock.patch('pulp_npm.plugins.importers.sync.SyncStep.process_lifecycle',
+                autospec=True)
+    def test_sync_dry_run(self, process_lifecycle, _build_final_report):
+        """
+        A dry run downloads no package and changes nothing, and reports its plan.
+        """
+        conduit = mock.MagicMock()
+        conduit.get_repo_scratchpad.return_value = {constants.SCRATCHPAD_KEY_THROUGHPUT: 100.0}
+        config = PluginCallConfiguration(
+            {}, {importer_constants.KEY_FEED: 'http://example.com/',
+                 constants.CONFIG_KEY_PACKAGE_NAMES: 'left-pad'},
+            {constants.CONFIG_KEY_DRY_RUN: True})
+        step = sync.SyncStep(mock.MagicMock(), conduit, config, '/some/dir')
+        step._plan.sizes[('left-pad', '1.1.0')] = 500
+        step._packages_to_download = [{'name': 'left-pad', 'version': '1.1.0'}]
+        step._changes_seq = 42
+
+        report = step.sync()
+
+        self.assertEqual([type(c) for c in step.children], [sync.GetMetadataStep])
+        self.assertEqual(report, conduit.build_success_report.return_value)
+        summary, details = conduit.build_success_report.mock_calls[0][1]
+        self.assertEqual(summary['new_versions'], 1)
+        self.assertEqual(summary['download_bytes'], 500)
+        self.assertEqual(summary['estimated_seconds'], 5.0)
+        self.assertEqual(details['new_versions'], {'left-pad': ['1.1.0']})
+        self.assertEqual(_build_final_report.call_count, 0)
+        self.assertEqual(conduit.set_repo_scratchpad.call_count, 0)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.PluginStep.__init__',
+                side_effect=sync.publish_step.PluginStep.__init__, autospec=True)
+    def test___init___on_demand(self, super___init__):
+        """
+        With the on_demand download policy, the packages should be saved without being downloaded.
+        """
+        repo = mock.MagicMock()
+        repo.id = 'cool_repo'
+        config = {importer_constants.KEY_FEED: 'http://example.com/',
+                  constants.CONFIG_KEY_DOWNLOAD_POLICY: constants.DOWNLOAD_ON_DEMAND}
+
+        step = sync.SyncStep(repo, mock.MagicMock(), config, '/some/dir')
+
+        self.assertEqual(step._download_policy, constants.DOWNLOAD_ON_DEMAND)
+        self.assertEqual([type(c) for c in step.children],
+                         [sync.GetMetadataStep, sync.SaveDeferredPackagesStep,
+                          sync.UpdatePackumentsStep])
+
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.PluginStep.__init__',
+                side_effect=sync.publish_step.PluginStep.__init__, autospec=True)
+    def test___init___locked_packages(self, super___init__):
+        """
+        Locked packages with a resolved URL and integrity skip the manifests, and the others only
+        have their locked versions synchronized.
+        """
+        repo = mock.MagicMock()
+        repo.id = 'cool_repo'
+        locked = [{'name': 'left-pad', 'version': '1.1.0',
+                   'resolved': 'http://a/left-pad-1.1.0.tgz', 'integrity': 'sha512-abcd'},
+                  {'name': 'debug', 'version': '2.6.9', 'resolved': None, 'integrity': None},
+                  {'name': 'express', 'version': '4.16.0', 'resolved': None, 'integrity': None}]
+        config = {importer_constants.KEY_FEED: 'http://example.com/',
+                  constants.CONFIG_KEY_PACKAGE_NAMES: 'express',
+                  constants.CONFIG_KEY_LOCKED_PACKAGES: locked}
+
+        step = sync.SyncStep(repo, mock.MagicMock(), config, '/some/dir')
+
+        self.assertEqual([p['name'] for p in step._locked_packages], ['left-pad'])
+        self.assertEqual(step._wanted_versions, {'debug': set(['2.6.9'])})
+        self.assertEqual(step._package_names, ['express', 'debug'])
+        self.assertEqual(type(step.children[0]), sync.ProcessLockfileStep)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.PluginStep.__init__',
+                side_effect=sync.publish_step.PluginStep.__init__, autospec=True)
+    def test___init___resolve_dependencies(self, super___init__):
+        """
+        When dependencies are resolved, the ResolveDependenciesStep replaces the GetMetadataStep.
+        """
+        repo = mock.MagicMock()
+        repo.id = 'cool_repo'
+        config = {importer_constants.KEY_FEED: 'http://example.com/',
+                  constants.CONFIG_KEY_PACKAGE_NAMES: 'express@^4.0.0',
+                  constants.CONFIG_KEY_RESOLVE_DEPENDENCIES: True}
+
+        step = sync.SyncStep(repo, mock.MagicMock(), config, '/some/dir')
+
+        self.assertEqual([type(c) for c in step.children],
+                         [sync.ResolveDependenciesStep, sync.DownloadPackagesStep,
+                          sync.UpdatePackumentsStep])
+
+    @mock.patch('pulp_npm.plugins.importers.sync.instrumentation.InstrumentedStepMixin.'
+                'get_progress_report_summary', return_value={'sync_step_main': 'complete'})
+    def test_get_progress_report_summary(self, super_get_progress_report_summary):
+        """
+        The summary reports the latency of each stage and the configured number of slowest
+        packages.
+        """
+        config = {importer_constants.KEY_FEED: 'http://example.com/',
+                  constants.CONFIG_KEY_SLOWEST_PACKAGES: 1}
+        step = sync.SyncStep(mock.MagicMock(), mock.MagicMock(), config, '/some/dir')
+        step._latency.record('left-pad', latency.STAGE_DOWNLOAD, 2)
+        step._latency.record('debug', latency.STAGE_DOWNLOAD, 1)
+
+        summary = step.get_progress_report_summary()
+
+        self.assertEqual(summary['sync_step_main'], 'complete')
+        self.assertEqual(summary['latency']['stages'][latency.STAGE_DOWNLOAD]['count'], 2)
+        self.assertEqual([p['name'] for p in summary['latency']['slowest']], ['left-pad'])
+
+    def test___init___remove_missing(self):
+        """
+        The versions that are no longer upstream are removed once the packages are downloaded.
+        """
+        repo = mock.MagicMock()
+        repo.id = 'cool_repo'
+        config = {importer_constants.KEY_FEED: 'http://example.com/',
+                  constants.CONFIG_KEY_PACKAGE_NAMES: 'left-pad',
+                  importer_constants.KEY_UNITS_REMOVE_MISSING: True}
+
+        step = sync.SyncStep(repo, mock.MagicMock(), config, '/some/dir')
+
+        self.assertEqual(step._units_to_remove, [])
+        self.assertEqual([type(c) for c in step.children],
+                         [sync.GetMetadataStep, sync.DownloadPackagesStep,
+                          sync.RemoveMissingStep, sync.UpdatePackumentsStep])
+
+    def test___init___feeds(self):
+        """
+        The feeds are probed first when there is a choice of feeds.
+        """
+        repo = mock.MagicMock()
+        repo.id = 'cool_repo'
+        config = {importer_constants.KEY_FEED: 'http://example.com/',
+                  constants.CONFIG_KEY_PACKAGE_NAMES: 'express,@ourco/widgets',
+                  constants.CONFIG_KEY_FEEDS: {'*': ['http://mirror.example/'],
+                                               '@ourco': 'http://npm.ourco.example/'}}
+
+        step = sync.SyncStep(repo, mock.MagicMock(), config, '/some/dir')
+
+        self.assertEqual(type(step.children[0]), sync.ProbeFeedsStep)
+        self.assertEqual(step._feed_router.feeds_for('express'),
+                         ['http://example.com/', 'http://mirror.example/'])
+        self.assertEqual(step._feed_router.feeds_for('@ourco/widgets'),
+                         ['http://npm.ourco.example/'])
+
+    def test__save_changes_seq(self):
+        """
+        The sequence number is saved in the scratchpad, keeping the scratchpad's other keys.
+        """
+        step = sync.SyncStep(mock.MagicMock(), mock.MagicMock(),
+                             {constants.CONFIG_KEY_CHANGES_FEED: 'http://replica/'}, '/some/dir')
+        step.conduit.get_repo_scratchpad.return_value = {'other': 1}
+        step._manifest_step.progress_failures = 0
+        step._download_step.progress_failures = 0
+        step._changes_seq = 42
+
+        step._save_changes_seq()
+
+        step.conduit.set_repo_scratchpad.assert_called_once_with(
+            {'other': 1, constants.SCRATCHPAD_KEY_CHANGES_FEED: 'http://replica/',
+             constants.SCRATCHPAD_KEY_CHANGES_SEQ: 42})
+
+    def test__save_changes_seq_failures(self):
+        """
+        Nothing is saved if a manifest could not be retrieved.
+        """
+        step = sync.SyncStep(mock.MagicMock(), mock.MagicMock(),
+                             {constants.CONFIG_KEY_CHANGES_FEED: 'http://replica/'}, '/some/dir')
+        step._manifest_step.progress_failures = 1
+        step._download_step.progress_failures = 0
+        step._changes_seq = 42
+
+        step._save_changes_seq()
+
+        self.assertEqual(step.conduit.set_repo_scratchpad.call_count, 0)
+
+    def test__save_changes_seq_download_failures(self):
+        """
+        Nothing is saved if a tarball could not be downloaded.
+        """
+        step = sync.SyncStep(mock.MagicMock(), mock.MagicMock(),
+                             {constants.CONFIG_KEY_CHANGES_FEED: 'http://replica/'}, '/some/dir')
+        step._manifest_step.progress_failures = 0
+        step._download_step.progress_failures = 1
+        step._changes_seq = 42
+
+        step._save_changes_seq()
+
+        self.assertEqual(step.conduit.set_repo_scratchpad.call_count, 0)
+
+
+class TestProbeFeedsStep(unittest.TestCase):
+    """
+    This class contains tests for the ProbeFeedsStep class.
+    """
+    @mock.patch('pulp_npm.plugins.importers.sync.changes.build_opener')
+    def test_process_main(self, build_opener):
+        """
+        The SyncStep's feeds are probed with an opener built from the importer config.
+        """
+        config = {importer_constants.KEY_BASIC_AUTH_USER: 'me'}
+        step = sync.ProbeFeedsStep(mock.MagicMock(), mock.MagicMock(), config, '/some/dir')
+        step.parent = mock.MagicMock()
+
+        step.process_main()
+
+        build_opener.assert_called_once_with(config)
+        step.parent._feed_router.probe.assert_called_once_with(opener=build_opener.return_value)
+
+
+class TestFollowChangesStep(unittest.TestCase):
+    """
+    This class contains tests for the FollowChangesStep class.
+    """
+    def setUp(self):
+        self.conduit = mock.MagicMock()
+        self.step = sync.FollowChangesStep(mock.MagicMock(), self.conduit, {}, '/some/dir')
+        self.step.parent = mock.MagicMock()
+        self.step.parent.get_conduit.return_value = self.conduit
+        self.step.parent._changes_feed = 'http://replica/'
+        self.step.parent._package_names = ['express', 'left-pad']
+
+    @mock.patch('pulp_npm.plugins.importers.sync.changes.build_opener')
+    @mock.patch('pulp_npm.plugins.importers.sync.changes.get_update_seq')
+    def test_process_main_first_sync(self, get_update_seq, build_opener):
+        """
+        Without a saved sequence number, every package is processed and the current sequence
+        number is remembered.
+        """
+        self.conduit.get_repo_scratchpad.return_value = None
+        get_update_seq.return_value = 10
+
+        self.step.process_main()
+
+        get_update_seq.assert_called_once_with('http://replica/',
+                                               opener=build_opener.return_value)
+        self.assertEqual(self.step.parent._package_names, ['express', 'left-pad'])
+        self.assertEqual(self.step.parent._changes_seq, 10)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.changes.build_opener')
+    @mock.patch('pulp_npm.plugins.importers.sync.changes.get_changed_packages')
+    def test_process_main(self, get_changed_packages, build_opener):
+        """
+        Only the configured packages that changed since the saved sequence number are processed.
+        """
+        self.conduit.get_repo_scratchpad.return_value = {
+            constants.SCRATCHPAD_KEY_CHANGES_FEED: 'http://replica/',
+            constants.SCRATCHPAD_KEY_CHANGES_SEQ: 10}
+        get_changed_packages.return_value = (['debug', 'left-pad'], 15)
+
+        self.step.process_main()
+
+        get_changed_packages.assert_called_once_with('http://replica/', 10,
+                                                     opener=build_opener.return_value)
+        self.assertEqual(self.step.parent._package_names, ['left-pad'])
+        self.assertEqual(self.step.parent._changes_seq, 15)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.changes.build_opener')
+    @mock.patch('pulp_npm.plugins.importers.sync.changes.get_changed_packages')
+    def test_process_main_mirror(self, get_changed_packages, build_opener):
+        """
+        Without package names, every changed package is processed.
+        """
+        self.conduit.get_repo_scratchpad.return_value = {
+            constants.SCRATCHPAD_KEY_CHANGES_FEED: 'http://replica/',
+            constants.SCRATCHPAD_KEY_CHANGES_SEQ: 10}
+        self.step.parent._package_names = []
+        get_changed_packages.return_value = (['debug', 'left-pad'], 15)
+
+        self.step.process_main()
+
+        self.assertEqual(self.step.parent._package_names, ['debug', 'left-pad'])
+
+    @mock.patch('pulp_npm.plugins.importers.sync.changes.build_opener')
+    @mock.patch('pulp_npm.plugins.importers.sync.changes.get_update_seq')
+    def test_process_main_other_feed(self, get_update_seq, build_opener):
+        """
+        A sequence number saved for another feed is not used.
+        """
+        self.conduit.get_repo_scratchpad.return_value = {
+            constants.SCRATCHPAD_KEY_CHANGES_FEED: 'http://other/',
+            constants.SCRATCHPAD_KEY_CHANGES_SEQ: 10}
+        get_update_seq.return_value = 3
+
+        self.step.process_main()
+
+        self.assertEqual(self.step.parent._changes_seq, 3)
+
+
+class TestSaveDeferredPackagesStep(unittest.TestCase):
+    """
+    This class contains tests for the SaveDeferredPackagesStep class.
+    """
+    @mock.patch('pulp_npm.plugins.importers.sync.models.Package.from_manifest')
+    def test_process_main(self, from_manifest):
+        """
+        Each package should be created from its manifest metadata and saved.
+        """
+        conduit = mock.MagicMock()
+        step = sync.SaveDeferredPackagesStep(mock.MagicMock(), conduit, {}, '/some/dir')
+        step.parent = mock.MagicMock()
+        step.parent.get_conduit.return_value = conduit
+        step.parent._packages_to_download = [{'metadata': {'a': 1}}, {'metadata': {'b': 2}}]
+
+        step.process_main()
+
+        self.assertEqual(from_manifest.mock_calls[0], mock.call({'a': 1}))
+        self.assertEqual(from_manifest.mock_calls[3], mock.call({'b': 2}))
+        self.assertEqual(from_manifest.return_value.init_unit.call_count, 2)
+        self.assertEqual(from_manifest.return_value.save_unit.call_count, 2)
+        self.assertEqual(step.progress_successes, 2)
+
+
+class TestUpdatePackumentsStep(unittest.TestCase):
+    """
+    This class contains tests for the UpdatePackumentsStep class.
+    """
+    @mock.patch('pulp_npm.plugins.importers.sync.packuments.reconcile')
+    def test_process_main(self, reconcile):
+        """
+        The packuments of the packages whose manifest was processed, and of the downloaded and
+        locked packages, are reconciled, along with the dist-tags of the processed manifests.
+        """
+        repo = mock.MagicMock()
+        repo.id = 'cool_repo'
+        conduit = mock.MagicMock()
+        step = sync.UpdatePackumentsStep(repo, conduit, {}, '/some/dir')
+        step.parent = mock.MagicMock()
+        step.parent._touched_packages = set(['left-pad', 'debug'])
+        step.parent._packages_to_download = [{'name': 'left-pad', 'version': '1.1.0'},
+                                             {'name': 'ms', 'version': '2.0.0'}]
+        step.parent._locked_packages = [{'name': 'express', 'version': '4.16.0'}]
+        step.parent._upstream_tags = {'left-pad': {'latest': '1.1.0'}, 'debug': {}}
+
+        step.process_main()
+
+        reconcile.assert_called_once_with(step.parent._packument_store, 'cool_repo', conduit,
+                                          set(['left-pad', 'debug', 'ms', 'express']),
+                                          step.parent._upstream_tags)
+        self.assertEqual(step.progress_successes, 4)
+
+
+# A tiny registry for the dependency resolution tests
+REGISTRY = {
+    'a': {'name': 'a', 'dist-tags': {'latest': '1.1.0'}, 'readme': 'A big readme',
+          'versions': {'1.0.0': {'dependencies': {'b': '^1.0.0'}},
+                       '1.1.0': {'dependencies': {'b': '^1.1.0', 'e': 'git+https://e.com/e.git'}},
+                       '2.0.0': {}}},
+    'b': {'name': 'b', 'dist-tags': {'latest': '1.1.0'},
+          'versions': {'1.0.0': {}, '1.1.0': {'dependencies': {'c': '~2.0.0'}},
+                       '1.2.0-beta': {}}},
+    'c': {'name': 'c', 'dist-tags': {'latest': '2.1.0'},
+          'versions': {'2.0.0': {}, '2.0.1': {'peerDependencies': {'d': '*'}},
+                       '2.1.0': {}}},
+    'd': {'name': 'd', 'dist-tags': {'latest': '1.0.0'}, 'versions': {'1.0.0': {}}},
+}
+
+
+class TestResolveDependenciesStep(unittest.TestCase):
+    """
+    This class contains tests for the ResolveDependenciesStep class.
+    """
+    def setUp(self):
+        self.config = {}
+        self.step = sync.ResolveDependenciesStep(mock.MagicMock(), mock.MagicMock(), self.config,
+                                                 '/some/dir')
+        self.step.parent = mock.MagicMock()
+        self.step.parent._feed_router = feeds.FeedRouter({'*': ['http://example.com/']})
+        self.step.parent._wanted_versions = {}
+        self.step.parent._packages_to_download = []
+        self.step.parent._download_policy = constants.DOWNLOAD_IMMEDIATE
+        self.step.downloader = mock.MagicMock()
+        self.step.downloader.download.side_effect = self._download
+
+    def _download(self, requests):
+        """
+        Answer the requests from the REGISTRY, failing the ones for unknown packages.
+        """
+        for r in requests:
+            report = mock.MagicMock()
+            report.url = r.url
+            report.data = r.data
+            report.destination = r.destination
+            if r.data['name'] in REGISTRY:
+                r.destination.write(json.dumps(REGISTRY[r.data['name']]))
+                self.step.download_succeeded(report)
+            else:
+                self.step.download_failed(report)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.DownloadMetadataStep._process_manifest')
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.download_succeeded')
+    def test__process_block(self, download_succeeded, _process_manifest):
+        """
+        The closure is resolved level by level, each manifest is fetched once, and only the
+        selected versions are processed.
+        """
+        self.step.parent._package_names = ['a', 'c@^2.0.0']
+        _process_manifest.return_value = [{'name': 'x'}]
+
+        self.step._process_block()
+
+        self.assertEqual(
+            [[r.data['name'] for r in c[1][0]] for c in self.step.downloader.download.mock_calls],
+            [['a', 'c'], ['b']])
+        self.assertEqual(self.step._selected,
+                         {'a': set(['1.1.0']), 'b': set(['1.1.0']),
+                          'c': set(['2.0.1', '2.1.0'])})
+        self.assertTrue('readme' not in self.step._manifests['a'])
+        self.assertEqual([c[1][0]['name'] for c in _process_manifest.mock_calls],
+                         ['a', 'b', 'c'])
+        self.assertEqual(_process_manifest.mock_calls[0][2],
+                         {'deferred': False, 'wanted_versions': self.step._selected,
+                          'version_filter': self.step.parent._version_filter,
+                          'sync_plan': self.step.parent._plan,
+                          'units_to_remove': self.step.parent._units_to_remove})
+        self.assertEqual(len(self.step.parent._packages_to_download), 3)
+
+    @mock.patch('pulp_npm.plugins.importers.sync.DownloadMetadataStep._process_manifest')
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.download_failed')
+    @mock.patch('pulp_npm.plugins.importers.sync.publish_step.DownloadStep.download_succeeded')
+    def test__process_block_peer_dependencies_and_failures(self, download_succeeded,
+                                                           download_failed, _process_manifest):
+        """
+        Configured dependency types are followed, and packages whose manifest can't be fetched
+        are skipped.
+        """
+        self.config[constants.CONFIG_KEY_DEPENDENCY_TYPES] = ['peerDependencies']
+        self.step._dependency_types = sync.configuration.get_dependency_types(self.config)
+        self.step.parent._package_names = ['c@2.0.1', 'missing']
+        _process_manifest.return_value = []
+
+        self.step._process_block()
+
+        self.assertEqual(self.step._selected, {'c': set(['2.0.1']), 'd': set(['1.0.0'])})
+        self.assertEqual(self.step._manifests['missing'], None)
+        self.assertEqual(download_failed.call_count, 1)
+
+    def test__get_roots_lockfile_versions(self):
+        """
+        Packages that are only listed in lockfiles are resolved to their locked versions.
+        """
+        self.step.parent._package_names = ['express@4.x', 'debug']
+        self.step.parent._wanted_versions = {'debug': set(['2.6.9', '2.6.8'])}
+
+        self.assertEqual(self.step._get_roots(),
+                         [('express', '4.x'), ('debug', '2.6.8'), ('debug', '2.6.9')])
+
+    def test__select(self):
+        """
+        The latest dist-tag is preferred when it satisfies the range.
+        """
+        self.step._manifests = dict(REGISTRY)
+
+        self.assertEqual(self.step._select('b', '^1.0.0'), '1.1.0')
+        self.assertEqual(self.step._select('b', '<1.1.0'), '1.0.0')
+        self.assertEqual(self.step._select('c', 'latest'), '2.1.0')
+        self.assertEqual(self.step._select('c', '^3.0.0'), None)
+        self.assertEqual(self.step._select('c', 'not a range'), None)
+
+    def test__get_requirements(self):
+        """
+        Aliases are followed to the real package, and URL dependencies are skipped.
+        """
+        metadata = {'dependencies': {'a': '^1.0.0', 'b': 'npm:c@~2.0.0', 'e': 'file:../e',
+                                     'f': 'user/repo'},
+                    'peerDependencies': {'d': '*'}}
+
+        self.assertEqual(self.step._get_requirements(metadata),
+                         [('a', '^1.0.0'), ('c', '~2.0.0')])
+
+
+class TestManifestURL(unittest.TestCase):
+    """
+    This class contains tests for the _manifest_url() function.
+    """
+    def test_scoped_name(self):
+        """
+        The slash of a scoped package is escaped.
+        """
+        self.assertEqual(sync._manifest_url('http://example.com/', '@types/node'),
+                         'http://example.com/@types%2Fnode')
+        self.assertEqual(sync._manifest_url('http://example.com/', 'express'),
+                         'http://example.com/express')
@@ -0,0 +1,160 @@
+"""
+This module contains tests for the pulp_npm.plugins.importers.throttle module.
+"""
+import unittest
+
+from pulp_npm.plugins.importers import throttle
+
+
+class FakeRequest(object):
+    def __init__(self, url):
+        self.url = url
+
+
+class FakeClock(object):
+    """
+    A clock that only moves when something sleeps.
+    """
+    def __init__(self):
+        self.now = 1000.0
+        # Called once, with the number of seconds, the next time something sleeps
+        self.on_sleep = None
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if self.on_sleep is not None:
+            on_sleep, self.on_sleep = self.on_sleep, None
+            on_sleep(seconds)
+        self.now += seconds
+
+
+class TestAdaptiveController(unittest.TestCase):
+    """
+    This class contains tests for the AdaptiveController class.
+    """
+    def setUp(self):
+        self.clock = FakeClock()
+        self.controller = throttle.AdaptiveController(4, clock=self.clock.time,
+                                                      sleep=self.clock.sleep)
+
+    def test_feed_limits_requests_in_flight(self):
+        """
+        No more requests are yielded than the limit allows until some finish.
+        """
+        requests = [FakeRequest(str(i)) for i in range(6)]
+        feed = self.controller.feed(requests)
+
+        sent = [next(feed) for i in range(4)]
+        self.assertEqual(self.controller._in_flight_count, 4)
+        # The next request only comes once another one has finished
+        self.clock.on_sleep = lambda seconds: self.controller.finished(sent[0].url)
+        self.assertEqual(next(feed).url, '4')
+
+    def test_feed_ends_when_everything_finished(self):
+        """
+        The feed waits for the requests in flight, since they might need to be retried.
+        """
+        request = FakeRequest('a')
+        feed = self.controller.feed([request])
+        self.assertEqual(next(feed), request)
+
+        self.clock.on_sleep = lambda seconds: self.controller.throttled(request, '5')
+
+        self.assertEqual(next(feed), request)
+        self.assertTrue(self.clock.now >= 1005)
+        self.controller.finished('a')
+        self.assertRaises(StopIteration, next, feed)
+
+    def test_throttled_halves_limit_and_waits(self):
+        """
+        A throttled request halves the limit once per wait, and delays the next request.
+        """
+        requests = [FakeRequest(str(i)) for i in range(4)]
+        list(zip(range(4), self.controller.feed(requests)))
+
+        self.assertTrue(self.controller.throttled(requests[0], '10'))
+        self.assertTrue(self.controller.throttled(requests[1], '10'))
+
+        self.assertEqual(self.controller.limit, 2)
+        self.assertEqual(self.controller._delay(), 10)
+        self.assertEqual(self.controller.retries, 2)
+        self.assertEqual(list(self.controller._retry_queue), requests[:2])
+
+    def test_finished_increases_limit(self):
+        """
+        After a decrease, the limit grows by one for every limit's worth of successes.
+        """
+        self.controller.limit = 2
+        requests = [FakeRequest(str(i)) for i in range(3)]
+        feed = self.controller.feed(requests)
+        for url in ('0', '1'):
+            next(feed)
+            self.controller.finished(url)
+
+        self.assertEqual(self.controller.limit, 3)
+
+    def test_finished_unknown_url(self):
+        """
+        Finishing a request that wasn't fed, such as a cached package, changes nothing.
+        """
+        self.controller.finished('cached')
+
+        self.assertEqual(self.controller._in_flight_count, 0)
+
+    def test_throttled_gives_up(self):
+        """
+        A request is only retried MAX_RETRIES times.
+        """
+        request = FakeRequest('a')
+        for i in range(throttle.MAX_RETRIES):
+            self.controller._in_flight = {'a': 1}
+            self.controller._in_flight_count = 1
+            self.assertTrue(self.controller.throttled(request))
+        self.controller._in_flight = {'a': 1}
+        self.controller._in_flight_count = 1
+
+        self.assertFalse(self.controller.throttled(request))
+
+    def test_throttled_falls_back(self):
+        """
+        Once a request has been retried too often, its fallback is sent instead.
+        """
+        request = FakeRequest('a')
+        fallback = FakeRequest('b')
+        self.controller._attempts = {'a': throttle.MAX_RETRIES}
+        self.controller._in_flight = {'a': 1}
+        self.controller._in_flight_count = 1
+
+        self.assertTrue(self.controller.throttled(request, fallback=fallback))
+        self.assertEqual(list(self.controller._retry_queue), [fallback])
+        self.assertEqual(self.controller._attempts, {})
+
+    def test_finished_with_retry(self):
+        """
+        A request that finished can be replaced by another one, which is sent first.
+        """
+        retry = FakeRequest('b')
+        feed = self.controller.feed([FakeRequest('a'), FakeRequest('c')])
+        self.assertEqual(next(feed).url, 'a')
+
+        self.controller.finished('a', retry)
+
+        self.assertEqual([next(feed).url, next(feed).url], ['b', 'c'])
+
+
+class TestParseRetryAfter(unittest.TestCase):
+    """
+    This class contains tests for the parse_retry_after() function.
+    """
+    def test_seconds(self):
+        self.assertEqual(throttle.parse_retry_after('120'), 120)
+
+    def test_date(self):
+        self.assertEqual(
+            throttle.parse_retry_after('Wed, 21 Oct 2015 07:28:30 GMT', now=1445412500), 10)
+
+    def test_invalid(self):
+        self.assertEqual(throttle.parse_retry_after(None), None)
+        self.assertEqual(throttle.parse_retry_after('soon'), None)
@@ -0,0 +1,111 @@
+"""
+This module contains tests for the pulp_npm.plugins.exporter module.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from pulp_npm.plugins import exporter
+
+
+class FakeConduit(object):
+    """
+    A stand in for a conduit, which records the unit keys that it is asked to associate.
+    """
+    def __init__(self):
+        self.associated = []
+
+    def associate_existing(self, type_id, unit_keys):
+        self.associated.extend(unit_keys)
+        return len(unit_keys)
+
+    def build_success_report(self, summary, details):
+        return summary
+
+
+class FakeStep(object):
+    """
+    A stand in for a step that has been measured.
+    """
+    def __init__(self, step_id, metrics, children=None):
+        self.step_id = step_id
+        self.metrics = metrics
+        self.children = children or []
+
+
+class TestCountingConduit(unittest.TestCase):
+    """
+    This class contains tests for the CountingConduit class.
+    """
+    def test_counts_database_calls(self):
+        """
+        Calls to the methods that reach the database are counted, and the others are forwarded.
+        """
+        fake = FakeConduit()
+        conduit = exporter.CountingConduit(fake)
+
+        self.assertEqual(conduit.associate_existing('npm_package', [{'name': 'a'}, {'name': 'b'}]),
+                         2)
+        conduit.associate_existing('npm_package', [{'name': 'c'}])
+        self.assertEqual(conduit.build_success_report({'a': 1}, {}), {'a': 1})
+
+        self.assertEqual(fake.associated, [{'name': 'a'}, {'name': 'b'}, {'name': 'c'}])
+        self.assertEqual(conduit.calls, {'associate_existing': 2})
+        self.assertEqual(conduit.units_associated, 3)
+
+
+class TestTextfileExporter(unittest.TestCase):
+    """
+    This class contains tests for the TextfileExporter class.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.conduit = exporter.CountingConduit(FakeConduit())
+        self.exporter = exporter.TextfileExporter(self.directory, 'importer', 'cool_repo',
+                                                  self.conduit)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write(self):
+        """
+        The metrics of each measured step are written, along with the counts of the conduit.
+        """
+        metrics = {'wall_seconds': 1.5, 'cpu_seconds': 0.5, 'bytes': 2048, 'items': 3,
+                   'failures': 1, 'retries': 2}
+        child = FakeStep('sync_step_download_packages', metrics)
+        root = FakeStep('sync_step_main', None, [child, FakeStep('sync_step_remove', None)])
+        self.conduit.associate_existing('npm_package', [{'name': 'a'}])
+
+        self.exporter.write(root)
+
+        self.assertEqual(os.listdir(self.directory), ['pulp_npm_importer_cool_repo.prom'])
+        with open(self.exporter.path) as textfile:
+            lines = textfile.read().splitlines()
+        labels = 'plugin="importer",repo="cool_repo",step="sync_step_download_packages"'
+        for line in ('# TYPE pulp_npm_step_duration_seconds gauge',
+                     'pulp_npm_step_duration_seconds{%s} 1.5' % labels,
+                     'pulp_npm_step_bytes{%s} 2048.0' % labels,
+                     'pulp_npm_step_failures{%s} 1.0' % labels,
+                     'pulp_npm_step_retries{%s} 2.0' % labels,
+                     'pulp_npm_db_calls{method="associate_existing",plugin="importer",'
+                     'repo="cool_repo"} 1.0',
+                     'pulp_npm_units_added{plugin="importer",repo="cool_repo"} 0.0',
+                     'pulp_npm_units_associated{plugin="importer",repo="cool_repo"} 1.0'):
+            self.assertTrue(line in lines, line)
+        self.assertFalse('sync_step_main' in '\n'.join(lines))
+
+    def test_write_failure(self):
+        """
+        A textfile that can't be written doesn't fail the task, and leaves no temporary file.
+        """
+        # A directory is in the way of the textfile
+        os.mkdir(self.exporter.path)
+
+        self.exporter.write(FakeStep('sync_step_main', None))
+
+        self.assertEqual(os.listdir(self.directory), ['pulp_npm_importer_cool_repo.prom'])
+
+    def test_escape(self):
+        self.assertEqual(exporter._escape('a"b\\c\nd'), 'a\\"b\\\\c\\nd')
@@ -0,0 +1,137 @@
+"""
+This module contains tests for the pulp_npm.plugins.instrumentation module.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from pulp_npm.common import constants
+from pulp_npm.plugins import instrumentation
+
+
+class FakeStep(object):
+    """
+    A stand in for the Pulp steps that the mixin is used with.
+    """
+    def __init__(self, step_id, children=None, config=None, working_dir=None):
+        self.step_id = step_id
+        self.parent = None
+        self.children = children or []
+        for child in self.children:
+            child.parent = self
+        self.progress_successes = 0
+        self.progress_failures = 0
+        self.config = config or {}
+        self.working_dir = working_dir
+
+    def process(self):
+        for child in self.children:
+            child.process()
+        self.progress_successes += 2
+        self.progress_failures += 1
+
+    def get_config(self):
+        return self.config
+
+    def get_repo(self):
+        return self
+
+    def get_progress_report(self):
+        return {'step_type': self.step_id}
+
+    def get_progress_report_summary(self):
+        return dict([(child.step_id, 'complete') for child in self.children])
+
+
+class InstrumentedStep(instrumentation.InstrumentedStepMixin, FakeStep):
+    """
+    A step that is measured.
+    """
+
+
+class TestInstrumentedStepMixin(unittest.TestCase):
+    """
+    This class contains tests for the InstrumentedStepMixin class.
+    """
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_process(self):
+        """
+        The metrics of a step include those of its children.
+        """
+        child = InstrumentedStep('child')
+        child.bytes_moved = 100
+        parent = InstrumentedStep('parent', [child])
+
+        parent.process()
+
+        self.assertEqual(child.metrics['bytes'], 100)
+        self.assertEqual(child.metrics['items'], 3)
+        self.assertEqual(parent.metrics['bytes'], 100)
+        self.assertEqual(parent.metrics['items'], 6)
+        for key in ('wall_seconds', 'cpu_seconds', 'items_per_second', 'peak_rss_kb'):
+            self.assertTrue(key in parent.metrics)
+        self.assertTrue(parent.metrics['peak_rss_kb'] > 0)
+        self.assertEqual(os.listdir(self.working_dir), [])
+
+    def test_process_exports(self):
+        """
+        The exporter of the top level step is given the metrics each time a step completes.
+        """
+        child = InstrumentedStep('child')
+        child.retries = 2
+        parent = InstrumentedStep('parent', [child])
+        written = []
+
+        class FakeExporter(object):
+            def write(self, step):
+                written.append((step, step.metrics))
+
+        parent._exporter = FakeExporter()
+
+        parent.process()
+
+        self.assertEqual(written, [(parent, None), (parent, parent.metrics)])
+        self.assertEqual(parent.metrics['failures'], 2)
+        self.assertEqual(parent.metrics['retries'], 2)
+
+    def test_reports(self):
+        """
+        Steps report their own metrics, and the summary lists those of every step.
+        """
+        child = InstrumentedStep('child')
+        parent = InstrumentedStep('parent', [child])
+
+        parent.process()
+
+        self.assertEqual(child.get_progress_report()['metrics'], child.metrics)
+        self.assertEqual(parent.get_progress_report_summary(),
+                         {'child': 'complete',
+                          'metrics': {'parent': parent.metrics, 'child': child.metrics}})
+
+    def test_reports_before_process(self):
+        """
+        Nothing is reported until the step has been processed.
+        """
+        step = InstrumentedStep('step')
+
+        self.assertEqual(step.get_progress_report(), {'step_type': 'step'})
+        self.assertEqual(step.get_progress_report_summary(), {})
+
+    def test_profile(self):
+        """
+        With profiling enabled, each step without children writes a profile.
+        """
+        config = {constants.CONFIG_KEY_PROFILE_STEPS: True}
+        child = InstrumentedStep('child', config=config, working_dir=self.working_dir)
+        parent = InstrumentedStep('parent', [child], config=config, working_dir=self.working_dir)
+
+        parent.process()
+
+        profiles = os.listdir(os.path.join(self.working_dir, instrumentation.PROFILE_DIR))
+        self.assertEqual([p.split('-')[0] for p in profiles if p.endswith('.prof')], ['child'])
@@ -0,0 +1,92 @@
+"""
+This module contains tests for the pulp_npm.plugins.models module.
+"""
+import copy
+import sys
+import unittest
+
+from pulp_npm.plugins import models
+
+
+class TestPackage(unittest.TestCase):
+    """
+    This class contains tests for the Package class.
+    """
+    def test_from_manifest(self):
+        """
+        Assert that from_manifest() builds a deferred Package from a manifest version entry, along
+        with its dependency edges.
+        """
+        version_metadata = {
+            'name': 'left-pad', 'version': '1.1.0', '_id': 'left-pad@1.1.0',
+            'description': 'String left pad',
+            'dependencies': {'lodash.get': '^4.4.0', 'git-dep': 'git://example.com/dep.git'},
+            'peerDependencies': {'pad': 'npm:left-pad@^1.0.0'},
+            'dist': {'shasum': 'abcde',
+                     'tarball': 'https://registry.npmjs.org/left-pad/-/left-pad-1.1.0.tgz'}}
+
+        package = models.Package.from_manifest(version_metadata)
+
+        self.assertEqual(package.name, 'left-pad')
+        self.assertEqual(package.version, '1.1.0')
+        self.assertEqual(package._filename, 'left-pad-1.1.0.tgz')
+        self.assertEqual(
+            package.metadata,
+            {'id': 'left-pad@1.1.0', 'description': 'String left pad', '_from': '.',
+             'dependencies': version_metadata['dependencies'],
+             'peerDependencies': version_metadata['peerDependencies'],
+             '_shasum': 'abcde', 'dist': {'shasum': 'abcde', 'tarball': 'left-pad-1.1.0.tgz'},
+             '_deferred': True,
+             '_upstream_url': 'https://registry.npmjs.org/left-pad/-/left-pad-1.1.0.tgz',
+             '_dependencies': [
+                 {'name': 'lodash.get', 'range': '^4.4.0', 'type': 'dependencies'},
+                 {'name': 'left-pad', 'range': '^1.0.0', 'type': 'peerDependencies'}]})
+        # The manifest itself should not have been altered
+        self.assertEqual(version_metadata['name'], 'left-pad')
+
+    def test__encode_metadata(self):
+        """
+        Assert that dots are encoded in the keys of nested objects, including those in lists,
+        and that keys without dots are left alone.
+        """
+        metadata = {'name': 'socket.io', 'dependencies': {'lodash.merge': '^4.0.0', 'a': '1'},
+                    'contributors': [{'e.mail': 'x'}, ['y', {'deep.er': {'deep.est': 1}}]],
+                    u'caf\xe9.js': 2, 'caf\xc3\xa9.css': 3}
+
+        models.Package._encode_metadata(metadata)
+
+        self.assertEqual(
+            metadata,
+            {'name': 'socket.io', 'dependencies': {u'lodash\uff0emerge': '^4.0.0', 'a': '1'},
+             'contributors': [{u'e\uff0email': 'x'},
+                              ['y', {u'deep\uff0eer': {u'deep\uff0eest': 1}}]],
+             u'caf\xe9\uff0ejs': 2, u'caf\xe9\uff0ecss': 3})
+
+    def test_decode_metadata(self):
+        """
+        Assert that decode_metadata() restores the metadata that _encode_metadata() encoded.
+        """
+        metadata = {'dependencies': {'lodash.merge': '^4.0.0'}, 'files': [{'a.js': [{'b.js': 1}]}]}
+        encoded = copy.deepcopy(metadata)
+        models.Package._encode_metadata(encoded)
+
+        models.Package.decode_metadata(encoded)
+
+        self.assertEqual(encoded, metadata)
+
+    def test__encode_metadata_deeply_nested(self):
+        """
+        Assert that metadata nested deeper than the recursion limit can be encoded and decoded.
+        """
+        metadata = {'leaf.key': 1}
+        for i in xrange(sys.getrecursionlimit() + 100):
+            metadata = {'level': [metadata]}
+
+        models.Package._encode_metadata(metadata)
+        leaf = metadata
+        while 'level' in leaf:
+            leaf = leaf['level'][0]
+        self.assertEqual(leaf, {u'leaf\uff0ekey': 1})
+
+        models.Package.decode_metadata(metadata)
+        self.assertEqual(leaf, {'leaf.key': 1})
@@ -0,0 +1,285 @@
+"""
+This module contains tests for the pulp_npm.plugins.packuments module.
+"""
+import unittest
+
+import mock
+from pymongo.errors import DocumentTooLarge, DuplicateKeyError
+
+from pulp_npm.common import constants
+from pulp_npm.plugins import packuments
+
+
+class FakeUnit(object):
+    """
+    A stand in for the units that the conduit's get_units() returns.
+    """
+    def __init__(self, name, version, metadata=None):
+        self.unit_key = {'name': name, 'version': version}
+        self.metadata = metadata or {}
+
+
+class TestPackumentStore(unittest.TestCase):
+    """
+    This class contains tests for the PackumentStore class.
+    """
+    def setUp(self):
+        self.collection = mock.MagicMock()
+        self.store = packuments.PackumentStore(self.collection)
+
+    def test_add_versions(self):
+        """
+        Assert that the versions are set with a single update, and the latest version's fields are
+        written unless the packument changed in the meantime.
+        """
+        self.collection.find_one.side_effect = [
+            {'all_versions': [u'1.0.0', u'1.1.0', u'2.0.0-beta.1'], 'revision': 3,
+             'upstream_dist_tags': {'latest': u'1.1.0', 'next': u'2.0.0-beta.1',
+                                    'beta': u'2.0.0-beta.0'}},
+            {'versions': {packuments.encode_version('1.1.0'): {'description': 'Pads',
+                                                               'main': 'index.js'}}}]
+
+        self.store.add_versions('repo', 'left-pad', {u'1.1.0': {'description': 'Pads',
+                                                                'main': 'index.js'}},
+                                {'latest': u'1.1.0', 'next': u'2.0.0-beta.1'})
+
+        self.assertEqual(self.collection.update.mock_calls, [
+            mock.call({'_id': 'repo/left-pad', 'oversize': {'$ne': True}},
+                      {'$set': {'repo_id': 'repo', 'name': 'left-pad',
+                                'upstream_dist_tags': {'latest': u'1.1.0',
+                                                       'next': u'2.0.0-beta.1'},
+                                'versions.' + packuments.encode_version('1.1.0'): {
+                                    'description': 'Pads', 'main': 'index.js'}},
+                       '$addToSet': {'all_versions': {'$each': [u'1.1.0']}},
+                       '$inc': {'revision': 1}}, upsert=True),
+            mock.call({'_id': 'repo/left-pad', 'revision': 3},
+                      {'$set': {'dist-tags': {'latest': u'1.1.0', 'next': u'2.0.0-beta.1'},
+                                'fields': {'description': 'Pads'}}})])
+
+    def test_add_versions_oversize(self):
+        """
+        Assert that a packument that is too large to be stored is replaced with a marker, and left
+        alone afterwards.
+        """
+        self.collection.update.side_effect = [DocumentTooLarge('too large'), None]
+
+        self.store.add_versions('repo', 'left-pad', {'1.1.0': {}})
+
+        self.collection.update.assert_called_with(
+            {'_id': 'repo/left-pad'},
+            {'$set': {'repo_id': 'repo', 'name': 'left-pad', 'oversize': True},
+             '$unset': {'versions': '', 'all_versions': '', 'dist-tags': '', 'fields': ''}},
+            upsert=True)
+
+        self.collection.update.side_effect = DuplicateKeyError('duplicate key')
+        self.store.add_versions('repo', 'left-pad', {'1.1.0': {}})
+        self.assertEqual(self.collection.find_one.call_count, 0)
+
+    def test_remove_versions_last(self):
+        """
+        Assert that a packument is removed once its last version is.
+        """
+        self.collection.find_one.return_value = {'all_versions': [], 'revision': 4}
+
+        self.store.remove_versions('repo', 'left-pad', ['1.1.0'])
+
+        self.collection.update.assert_called_once_with(
+            {'_id': 'repo/left-pad', 'oversize': {'$ne': True}},
+            {'$unset': {'versions.' + packuments.encode_version('1.1.0'): ''},
+             '$pullAll': {'all_versions': ['1.1.0']}, '$inc': {'revision': 1}})
+        self.collection.remove.assert_called_once_with({'_id': 'repo/left-pad', 'revision': 4})
+
+    def test_set_upstream_tags_unchanged(self):
+        """
+        Assert that the packument isn't refreshed if its upstream dist-tags didn't change.
+        """
+        self.collection.update.return_value = {'n': 0}
+
+        self.store.set_upstream_tags('repo', 'left-pad', {'latest': '1.1.0'})
+
+        self.collection.update.assert_called_once_with(
+            {'_id': 'repo/left-pad', 'upstream_dist_tags': {'$ne': {'latest': '1.1.0'}}},
+            {'$set': {'upstream_dist_tags': {'latest': '1.1.0'}}, '$inc': {'revision': 1}})
+        self.assertEqual(self.collection.find_one.call_count, 0)
+
+    def test_replace(self):
+        """
+        Assert that the whole packument is replaced, along with its dist-tags and fields.
+        """
+        self.store.replace('repo', 'left-pad', {'1.0.0': {'license': 'MIT'}, '1.1.0-beta.1': {}},
+                           {'latest': '1.0.0', 'next': '1.1.0-beta.1', 'old': '0.9.0'})
+
+        document = self.collection.update.mock_calls[0][1][1]['$set']
+        self.assertEqual(document['versions'],
+                         {packuments.encode_version('1.0.0'): {'license': 'MIT'},
+                          packuments.encode_version('1.1.0-beta.1'): {}})
+        self.assertEqual(document['dist-tags'], {'latest': '1.0.0', 'next': '1.1.0-beta.1'})
+        self.assertEqual(document['fields'], {'license': 'MIT'})
+        self.assertEqual(document['upstream_dist_tags'],
+                         {'latest': '1.0.0', 'next': '1.1.0-beta.1', 'old': '0.9.0'})
+
+    def test_get_versions(self):
+        """
+        Assert that the versions of the packuments are returned, and None for oversize ones.
+        """
+        self.collection.find.return_value = [
+            {'name': 'left-pad', 'all_versions': ['1.0.0', '1.1.0']},
+            {'name': 'express', 'oversize': True}]
+
+        versions = self.store.get_versions('repo', ['left-pad', 'express', 'debug'])
+
+        self.assertEqual(versions, {'left-pad': set(['1.0.0', '1.1.0']), 'express': None})
+        self.assertEqual(self.collection.find.mock_calls[0][1][0],
+                         {'_id': {'$in': ['repo/left-pad', 'repo/express', 'repo/debug']}})
+
+    def test_get_upstream_tags(self):
+        """
+        Assert that the packuments that hold upstream dist-tags return them.
+        """
+        self.collection.find.return_value = [
+            {'name': 'left-pad', 'upstream_dist_tags': {'latest': '1.1.0'}},
+            {'name': 'debug', 'upstream_dist_tags': {}}]
+
+        tags = self.store.get_upstream_tags('repo', ['left-pad', 'debug'])
+
+        self.assertEqual(tags, {'left-pad': {'latest': '1.1.0'}})
+
+
+class TestReconcile(unittest.TestCase):
+    """
+    This class contains tests for the reconcile() function.
+    """
+    def test_reconcile(self):
+        """
+        Assert that only the missing versions are read and added, and the versions and packages
+        that left the repository are removed.
+        """
+        store = mock.MagicMock()
+        store.get_versions.return_value = {'left-pad': set(['1.0.0', '0.9.0']),
+                                           'debug': set(['2.6.9']), 'express': None}
+        conduit = mock.MagicMock()
+        conduit.get_units.side_effect = [
+            [FakeUnit('left-pad', '1.0.0'), FakeUnit('left-pad', '1.1.0'),
+             FakeUnit('express', '4.16.0')],
+            [FakeUnit('left-pad', '1.1.0', {'license': 'MIT'})]]
+
+        packuments.reconcile(store, 'repo', conduit, ['left-pad', 'debug', 'express', 'debug'],
+                             {'left-pad': {'latest': '1.1.0'}, 'express': {'latest': '4.16.0'}})
+
+        criteria = conduit.get_units.mock_calls[1][2]['criteria']
+        self.assertEqual(criteria.unit_filters, {'$or': [{'name': 'left-pad', 'version': '1.1.0'}]})
+        store.add_versions.assert_called_once_with('repo', 'left-pad',
+                                                   {'1.1.0': {'license': 'MIT'}},
+                                                   {'latest': '1.1.0'})
+        # The tags of a package without new versions are set on their own
+        store.set_upstream_tags.assert_called_once_with('repo', 'express', {'latest': '4.16.0'})
+        store.remove_versions.assert_called_once_with('repo', 'left-pad', ['0.9.0'])
+        store.remove.assert_called_once_with('repo', ['debug'])
+
+
+class TestSummarize(unittest.TestCase):
+    """
+    This class contains tests for the summarize() function.
+    """
+    def test_summarize(self):
+        """
+        Assert that the latest release's top level fields are returned, including the key of a
+        readme that is stored separately.
+        """
+        versions = {'1.0.0': {'description': 'Old'},
+                    '1.1.0': {'description': 'Pads', 'main': 'index.js',
+                              constants.METADATA_KEY_README: 'left-pad@aaaaa'},
+                    '2.0.0-beta.1': {'description': 'Beta'}}
+
+        self.assertEqual(packuments.summarize(versions),
+                         ({'latest': '1.1.0'},
+                          {'description': 'Pads', constants.METADATA_KEY_README: 'left-pad@aaaaa'}))
+
+    def test_summarize_upstream_tags(self):
+        """
+        Assert that the upstream dist-tags that point to a version are kept, and the top level
+        fields are taken from the version that the latest tag points to.
+        """
+        versions = {'1.0.0': {'description': 'Old'}, '1.1.0': {'description': 'Pads'},
+                    '2.0.0-beta.1': {'description': 'Beta'}}
+        upstream_tags = {'latest': '1.0.0', 'next': '2.0.0-beta.1', 'canary': '3.0.0-canary.1'}
+
+        self.assertEqual(packuments.summarize(versions, upstream_tags),
+                         ({'latest': '1.0.0', 'next': '2.0.0-beta.1'}, {'description': 'Old'}))
+
+    def test_summarize_empty(self):
+        """
+        Assert that a package without versions has no dist-tags or fields.
+        """
+        self.assertEqual(packuments.summarize({}), ({}, {}))
+
+
+class TestDistTags(unittest.TestCase):
+    """
+    This class contains tests for the dist_tags() function.
+    """
+    def test_latest_not_in_repo(self):
+        """
+        Assert that the latest tag is computed if the upstream one points to a version that isn't
+        in the repository.
+        """
+        tags = packuments.dist_tags(set(['1.0.0', '1.1.0', '2.0.0-rc.1']),
+                                    {'latest': '2.0.0', 'next': '2.0.0-rc.1'})
+
+        self.assertEqual(tags, {'latest': '1.1.0', 'next': '2.0.0-rc.1'})
+
+    def test_no_upstream_tags(self):
+        """
+        Assert that only the latest tag is computed for packages that weren't synchronized.
+        """
+        self.assertEqual(packuments.dist_tags(['1.0.0']), {'latest': '1.0.0'})
+
+
+class TestLatestVersion(unittest.TestCase):
+    """
+    This class contains tests for the latest_version() function.
+    """
+    def test_release(self):
+        """
+        Assert that the highest release is returned, compared the way npm compares versions.
+        """
+        versions = ['1.9.0', '1.10.0', '1.10.1-beta.2', '2.0.0-rc.1', '1.2.0']
+
+        self.assertEqual(packuments.latest_version(versions), '1.10.0')
+
+    def test_prereleases_only(self):
+        """
+        Assert that the highest prerelease is returned if there are no releases.
+        """
+        versions = ['1.0.0-beta.2', '1.0.0-beta.10', '1.0.0-alpha.11']
+
+        self.assertEqual(packuments.latest_version(versions), '1.0.0-beta.10')
+
+    def test_version_key_cache(self):
+        """
+        Assert that the keys of the versions are cached, and that the cache is bounded.
+        """
+        packuments._version_keys.clear()
+
+        with mock.patch('pulp_npm.plugins.packuments.VERSION_KEY_CACHE_SIZE', 2):
+            with mock.patch('pulp_npm.plugins.packuments.semver.sort_key',
+                            wraps=packuments.semver.sort_key) as sort_key:
+                packuments.latest_version(['1.0.0', '1.1.0'])
+                packuments.latest_version(['1.0.0', '1.1.0'])
+                self.assertEqual(sort_key.call_count, 2)
+                packuments.version_key('1.2.0')
+                self.assertEqual(packuments._version_keys.keys(), ['1.2.0'])
+
+
+class TestVersionKeys(unittest.TestCase):
+    """
+    This class contains tests for the encode_version() and decode_version() functions.
+    """
+    def test_round_trip(self):
+        """
+        Assert that the dots of a version are replaced, and restored.
+        """
+        key = packuments.encode_version('1.2.3-beta.1')
+
+        self.assertTrue('.' not in key)
+        self.assertEqual(packuments.decode_version(key), u'1.2.3-beta.1')
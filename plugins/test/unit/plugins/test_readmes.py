@@ -0,0 +1,92 @@
+"""
+This module contains tests for the pulp_npm.plugins.readmes module.
+"""
+import unittest
+
+from pymongo.errors import DuplicateKeyError
+
+from pulp_npm.plugins import readmes
+
+
+class FakeCollection(object):
+    """
+    An in-memory stand in for the few collection methods that the readme store uses.
+    """
+    def __init__(self):
+        self.documents = {}
+        self.inserts = 0
+        self.finds = 0
+
+    def insert(self, document):
+        self.inserts += 1
+        if document['_id'] in self.documents:
+            raise DuplicateKeyError('duplicate key')
+        self.documents[document['_id']] = dict(document)
+
+    def find(self, spec):
+        self.finds += 1
+        return [self.documents[key] for key in spec['_id']['$in'] if key in self.documents]
+
+
+class TestReadmeStore(unittest.TestCase):
+    """
+    This class contains tests for the ReadmeStore class.
+    """
+    def setUp(self):
+        self.collection = FakeCollection()
+        self.store = readmes.ReadmeStore(self.collection)
+
+    def test_put(self):
+        """
+        Assert that a readme is stored under its key, once.
+        """
+        key = self.store.put('left-pad', u'# left-pad')
+        self.assertEqual(self.store.put('left-pad', u'# left-pad'), key)
+
+        self.assertEqual(key, readmes.readme_key('left-pad', u'# left-pad'))
+        self.assertEqual(self.collection.documents,
+                         {key: {'_id': key, 'name': 'left-pad', 'readme': u'# left-pad'}})
+        self.assertEqual(self.collection.inserts, 1)
+
+    def test_put_stored_by_another_store(self):
+        """
+        Assert that a readme that another store stored is not an error.
+        """
+        readmes.ReadmeStore(self.collection).put('left-pad', u'# left-pad')
+
+        key = self.store.put('left-pad', u'# left-pad')
+
+        self.assertEqual(self.collection.documents.keys(), [key])
+
+    def test_get_many(self):
+        """
+        Assert that the readmes are fetched in batches, and missing ones are left out.
+        """
+        keys = [self.store.put('package-%d' % i, u'readme %d' % i) for i in range(3)]
+
+        with_missing = keys + ['missing@0000']
+        self.assertEqual(self.store.get_many(with_missing * 2),
+                         dict([(key, u'readme %d' % i) for i, key in enumerate(keys)]))
+        self.assertEqual(self.collection.finds, 1)
+
+        readmes.QUERY_BATCH_SIZE, batch_size = 2, readmes.QUERY_BATCH_SIZE
+        try:
+            self.assertEqual(len(self.store.get_many(keys)), 3)
+        finally:
+            readmes.QUERY_BATCH_SIZE = batch_size
+        self.assertEqual(self.collection.finds, 3)
+
+
+class TestReadmeKey(unittest.TestCase):
+    """
+    This class contains tests for the readme_key() function.
+    """
+    def test_readme_key(self):
+        """
+        Assert that the key is the package's name and the checksum of the UTF-8 encoded readme.
+        """
+        self.assertEqual(readmes.readme_key('left-pad', u'caf\xe9'),
+                         readmes.readme_key('left-pad', 'caf\xc3\xa9'))
+        self.assertEqual(readmes.readme_key('left-pad', ''),
+                         'left-pad@da39a3ee5e6b4b0d3255bfef95601890afd80709')
+        self.assertNotEqual(readmes.readme_key('left-pad', 'a'), readmes.readme_key('pad', 'a'))
@@ -43,6 +43,7 @@ rm -rf %{buildroot}
 
 mkdir -p %{buildroot}/%{_sysconfdir}/pulp/
 mkdir -p %{buildroot}/%{_sysconfdir}/pulp/vhosts80/
+mkdir -p %{buildroot}/srv/pulp
 
 pushd common
 %{__python} setup.py install -O1 --skip-build --root %{buildroot}
@@ -61,6 +62,7 @@ mkdir -p %{buildroot}/%{_var}/lib/pulp/published/npm
 
 cp -R plugins/etc/httpd %{buildroot}/%{_sysconfdir}/
 cp plugins/etc/pulp/vhosts80/pulp_npm.conf %{buildroot}/%{_sysconfdir}/pulp/vhosts80/
+cp plugins/srv/pulp/npm_deferred.wsgi %{buildroot}/srv/pulp/
 # Types
 cp -R plugins/types/* %{buildroot}/%{_usr}/lib/pulp/plugins/types/
 
@@ -110,6 +112,7 @@ to provide Python package support.
 %{python_sitelib}/pulp_npm/plugins/
 %config(noreplace) %{_sysconfdir}/httpd/conf.d/pulp_npm.conf
 %config(noreplace) %{_sysconfdir}/pulp/vhosts80/pulp_npm.conf
+/srv/pulp/npm_deferred.wsgi
 %{_usr}/lib/pulp/plugins/types/python.json
 %{python_sitelib}/pulp_npm_plugins*.egg-info
 